@@ -0,0 +1,59 @@
+from flask import g, has_app_context
+
+from api.authentication.models import User
+
+
+def ref_id(doc, field: str):
+    """Return the ObjectId stored in a ReferenceField without dereferencing it."""
+    value = doc._data.get(field)
+    return getattr(value, 'id', value)
+
+
+class UserLoader:
+    """
+    Identity map that resolves user ids to usernames in batches.
+
+    Callers `prime` every id a response will need, and the first `username`
+    lookup resolves all pending ids with a single `$in` query. Ids that were
+    already resolved are never fetched again for the lifetime of the loader.
+    """
+
+    def __init__(self):
+        self._usernames = {}
+        self._pending = set()
+
+    def prime(self, user_ids):
+        """Queue user ids to be resolved by the next batch."""
+        for user_id in user_ids:
+            if user_id is not None and user_id not in self._usernames:
+                self._pending.add(user_id)
+        return self
+
+    def load(self):
+        """Resolve every pending id with one query."""
+        if not self._pending:
+            return
+        pending = list(self._pending)
+        self._pending.clear()
+        for user_id in pending:
+            self._usernames[user_id] = None
+        for row in User.objects(id__in=pending).only('_username').as_pymongo():
+            self._usernames[row['_id']] = row.get('_username')
+
+    def username(self, user_id, default='Unknown'):
+        """Return the username for `user_id`, loading pending ids first."""
+        if user_id is None:
+            return default
+        if user_id not in self._usernames:
+            self._pending.add(user_id)
+        self.load()
+        return self._usernames.get(user_id) or default
+
+
+def get_user_loader() -> UserLoader:
+    """Return the loader bound to the current request, creating it on first use."""
+    if not has_app_context():
+        return UserLoader()
+    if 'user_loader' not in g:
+        g.user_loader = UserLoader()
+    return g.user_loader
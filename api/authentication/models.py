@@ -72,6 +72,11 @@ class User(Document):
     
     
     
+# Auth tokens are only valid for their `_expiration_time` (at most a few hours);
+# MongoDB's TTL monitor removes them once this retention window has passed.
+AUTH_TOKEN_RETENTION_SECONDS = 7 * 24 * 3600
+
+
 class AuthToken(Document):
     """Authentication Token model"""
     _user = ReferenceField(User, required=True)
@@ -85,7 +90,12 @@ class AuthToken(Document):
 
     meta = {
         "collection": "auth_tokens",
-        "allow_inheritance": True
+        "allow_inheritance": True,
+        "indexes": [
+            # resend_verification: latest token of a user
+            ("_user", "-_created_at"),
+            {"fields": ["_created_at"], "expireAfterSeconds": AUTH_TOKEN_RETENTION_SECONDS, "cls": False},
+        ]
     }
 
     def to_dict(self):
@@ -4,7 +4,8 @@ from flask_jwt_extended import create_access_token
 
 from api.authentication.models import AuthToken, User
 from core.types import api_response
-from core.utils import bcrypt, error_response, send_email, success_response
+from core.email_outbox import queue_email
+from core.utils import bcrypt, error_response, success_response
 
 
 def register(data: dict) -> api_response:
@@ -44,7 +45,7 @@ def register(data: dict) -> api_response:
     )
     auth_token.save()
 
-    result = send_email(
+    result = queue_email(
         to_email=new_user.email,
         subject="Verificação de Email - Progef Metagil",
         template_html="verify_email",
@@ -53,7 +54,7 @@ def register(data: dict) -> api_response:
         },
     )
 
-    if not result:
+    if result[1] != 202:
         return error_response("Erro ao enviar email de verificação", 500)
 
     return success_response(
@@ -126,7 +127,7 @@ def resend_verification(data: dict) -> api_response:
         )
     auth_token.save()
 
-    result = send_email(
+    result = queue_email(
         to_email=user.email,
         subject="Verificação de Email - Progef Metagil",
         template_html="verify_email",
@@ -135,7 +136,7 @@ def resend_verification(data: dict) -> api_response:
         },
     )
 
-    if not result[1] == 200:
+    if result[1] != 202:
         return error_response("Erro ao enviar email de verificação", 500)
 
     return success_response(
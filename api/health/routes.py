@@ -15,4 +15,16 @@ def health():
 @jwt_required()
 def detailed_health():
     """Detailed health check with MongoDB connection test"""
-    return vi.detailed_health()
\ No newline at end of file
+    return vi.detailed_health()
+
+@health_bp.route('/moderation')
+@jwt_required()
+def moderation_health():
+    """Moderation pre-filter and verdict cache counters for this worker"""
+    return vi.moderation_health()
+
+@health_bp.route('/email')
+@jwt_required()
+def email_health():
+    """Email outbox backlog and this worker's SMTP connection counters"""
+    return vi.email_health()
@@ -5,6 +5,12 @@ from core.mongodb_connection_utils import test_mongodb_connection, test_database
 from datetime import datetime
 from core.utils import utc_to_brasilia
 from core.types import api_response
+from api.threads.moderation_policy import moderation_policy
+from core.email_outbox import outbox_stats
+from core.moderation_cache import verdict_cache
+from core.moderation_classifier import local_classifier
+from core.moderation_client import moderation_client
+from core.profanity import profanity_filter
 
 def health() -> api_response:
     try:
@@ -42,4 +48,18 @@ def detailed_health() -> api_response:
         response['database_operations'] = {'status': 'not_tested', 'reason': 'connection_failed'}
         status_code = 503
     
-    return response, status_code
\ No newline at end of file
+    return response, status_code
+
+def moderation_health() -> api_response:
+    # Counters are per worker process
+    return {
+        'verdict_cache': verdict_cache.stats(),
+        'prefilter': profanity_filter.stats(),
+        'client': moderation_client.stats(),
+        'policy': moderation_policy.stats(),
+        'classifier': local_classifier.stats(),
+    }
+
+def email_health() -> api_response:
+    # Outbox counts are shared; SMTP connection counters are per worker process
+    return outbox_stats()
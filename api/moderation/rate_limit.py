@@ -0,0 +1,72 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from mongoengine import DateTimeField, Document, IntField, StringField
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Per-user precheck quota
+#
+# Every precheck may cost a moderation call, so each user gets at most
+# PRECHECK_RATE_LIMIT of them per PRECHECK_RATE_WINDOW_SECONDS. The count
+# lives in MongoDB, one document per user and fixed window, so it is shared
+# by every worker process; a TTL index drops old windows.
+
+PRECHECK_RATE_LIMIT = int(os.getenv("PRECHECK_RATE_LIMIT", "30"))
+PRECHECK_RATE_WINDOW_SECONDS = int(os.getenv("PRECHECK_RATE_WINDOW_SECONDS", "60"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PrecheckQuota(Document):
+    """Prechecks a user made in one fixed window"""
+    _user = StringField(required=True)
+    _window = IntField(required=True)  # Window start, in seconds since the epoch
+    _count = IntField(default=0)
+    # In UTC: the TTL index compares against the server clock
+    _expires_at = DateTimeField(required=True)
+
+    meta = {
+        'collection': 'precheck_quotas',
+        'indexes': [
+            {'fields': ['_user', '_window'], 'unique': True},
+            {'fields': ['_expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+
+def take_precheck(user_id, now: datetime = None) -> int | None:
+    """
+    Count one precheck for `user_id` in the current window.
+
+    Returns:
+        int or None: seconds until the window ends when the user is over the
+        limit, None when the precheck may run
+    """
+    if PRECHECK_RATE_LIMIT <= 0:
+        return None
+    now = now or _utcnow()
+    epoch = int(now.replace(tzinfo=timezone.utc).timestamp())
+    window = epoch - epoch % PRECHECK_RATE_WINDOW_SECONDS
+    ends_at = window + PRECHECK_RATE_WINDOW_SECONDS
+
+    def increment():
+        return PrecheckQuota._get_collection().find_one_and_update(
+            {'_user': str(user_id), '_window': window},
+            {'$inc': {'_count': 1},
+             '$setOnInsert': {'_expires_at': datetime.fromtimestamp(ends_at, timezone.utc).replace(tzinfo=None)}},
+            projection={'_count': 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    try:
+        quota = increment()
+    except DuplicateKeyError:
+        quota = increment()  # Lost an insert race with the same user's other request
+
+    if quota['_count'] > PRECHECK_RATE_LIMIT:
+        return max(1, ends_at - epoch)
+    return None
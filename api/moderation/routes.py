@@ -0,0 +1,15 @@
+from flask import Blueprint, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from api.moderation import views as vi
+
+moderation_bp = Blueprint('moderation', __name__)
+
+
+@moderation_bp.route('/moderation/precheck', methods=['POST'])
+@jwt_required()
+def precheck():
+    """Moderate a draft while the user types; returns a verdict token for the submit"""
+    data = request.get_json() or {}
+    current_user = get_jwt_identity()
+    return vi.precheck(data, current_user)
@@ -0,0 +1,47 @@
+import hashlib
+import hmac
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from core.moderation_cache import VERDICT_VERSION, normalizar_texto
+
+# Precheck verdict tokens
+#
+# `POST /api/moderation/precheck` moderates a draft while the user is still
+# typing and, when it is safe, returns a token signed with the app secret.
+# The token carries the user id and a hash of the normalized fields, so the
+# create/update views can skip moderation when the submitted text is the
+# text that was checked. The hash includes VERDICT_VERSION: bumping it after
+# a prompt change voids every outstanding token, like the verdict cache.
+
+PRECHECK_TOKEN_MAX_AGE = 15 * 60
+_SALT = 'moderation-precheck'
+
+
+def content_hash(kind: str, *fields) -> str:
+    """Hash of a thread's (title, description) or a post's (content), as moderation compares texts."""
+    parts = [str(VERDICT_VERSION), kind] + [normalizar_texto(field or '') for field in fields]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt=_SALT)
+
+
+def sign_verdict(user_id, kind: str, *fields) -> str:
+    """A token stating that these fields passed moderation for this user."""
+    return _serializer().dumps({'user': str(user_id), 'hash': content_hash(kind, *fields)})
+
+
+def verdict_matches(token, user_id, kind: str, *fields) -> bool:
+    """Whether `token` is a valid, unexpired precheck token for exactly these fields and user."""
+    if not token or not isinstance(token, str):
+        return False
+    try:
+        payload = _serializer().loads(token, max_age=PRECHECK_TOKEN_MAX_AGE)
+    except BadSignature:  # Also raised for expired tokens
+        return False
+    if not isinstance(payload, dict) or payload.get('user') != str(user_id):
+        return False
+    return hmac.compare_digest(str(payload.get('hash', '')), content_hash(kind, *fields))
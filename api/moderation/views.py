@@ -0,0 +1,56 @@
+from api.moderation.rate_limit import take_precheck
+from api.moderation.tokens import PRECHECK_TOKEN_MAX_AGE, sign_verdict
+from core.moderation import (
+    verificar_post_estrito, verificar_post_fallback, verificar_thread_estrito, verificar_thread_fallback,
+)
+from core.types import api_response
+from core.utils import error_response, success_response
+
+
+def precheck(data: dict, current_user: str) -> api_response:
+    """Moderate a draft thread or post; a safe draft gets a token the create/update views accept"""
+    retry_after = take_precheck(current_user)
+    if retry_after is not None:
+        return error_response(f'Too many prechecks, try again in {retry_after} seconds', 429,
+                              details={'retry_after': retry_after})
+
+    kind = data.get('type', 'post')
+    if kind == 'thread':
+        title = (data.get('title') or '').strip()
+        description = (data.get('description') or '').strip()
+        if not title:
+            return error_response('Title is required', 400)
+        elif len(title) > 200:
+            return error_response('Title must be less than 200 characters', 400)
+        if len(description) > 500:
+            return error_response('Description must be less than 500 characters', 400)
+        fields = (title, description)
+        check, fallback = verificar_thread_estrito, verificar_thread_fallback
+    elif kind == 'post':
+        content = (data.get('content') or '').strip()
+        if not content:
+            return error_response('Content is required', 400)
+        fields = (content,)
+        check, fallback = verificar_post_estrito, verificar_post_fallback
+    else:
+        return error_response("Type must be 'thread' or 'post'", 400)
+
+    try:
+        is_safe, moderation_message = check(*fields)
+        verified = True
+    except Exception as e:
+        # Moderation unavailable: the local policy answers, but its approval is
+        # not a verdict, so no token; the submit will be moderated again
+        print(f"Precheck moderation unavailable ({e}) - local policy, no token")
+        is_safe, moderation_message = fallback(*fields)
+        verified = False
+
+    if not is_safe:
+        return success_response(data={'safe': False, 'error': moderation_message})
+    if not verified:
+        return success_response(data={'safe': True, 'moderation_token': None})
+    return success_response(data={
+        'safe': True,
+        'moderation_token': sign_verdict(current_user, kind, *fields),
+        'expires_in': PRECHECK_TOKEN_MAX_AGE,
+    })
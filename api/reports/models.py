@@ -1,10 +1,12 @@
 from mongoengine import Document, StringField, DateTimeField, ReferenceField
 from core.utils import get_brasilia_now
 from api.authentication.models import User
+from api.authentication.loaders import get_user_loader, ref_id
 
 class Report(Document):
     """Model for content reports/denúncias"""
-    _reporter = ReferenceField(User, required=True)  # Usuário que fez a denúncia
+    _reporter = ReferenceField(User)  # Usuário que fez a denúncia (vazio nas denúncias automáticas)
+    _source = StringField(default='user', choices=['user', 'moderation'])  # 'moderation': revisão em massa
     _content_type = StringField(required=True, choices=['thread', 'post'])  # Tipo: pergunta ou resposta
     _content_id = StringField(required=True)  # ID da pergunta ou resposta
     _report_type = StringField(required=True, choices=[
@@ -22,12 +24,25 @@ class Report(Document):
     
     meta = {
         'collection': 'reports',
-        'ordering': ['-_created_at']
+        'ordering': ['-_created_at'],
+        'indexes': [
+            # Duplicate check in create_report, and lookups of every report on one piece of content
+            ('_content_type', '_content_id', '_reporter'),
+            # list_reports: newest first
+            ('-_created_at',),
+            # At most one automatic report per piece of content (the rescan upserts on this key)
+            {'fields': ['_content_type', '_content_id', '_source'], 'unique': True,
+             'partialFilterExpression': {'_source': 'moderation'}},
+        ]
     }
 
     @property
     def reporter(self):
         return self._reporter
+
+    @property
+    def reporter_id(self):
+        return ref_id(self, '_reporter')
     
     @property
     def content_type(self):
@@ -49,11 +64,16 @@ class Report(Document):
     def status(self):
         return self._status
 
+    @property
+    def source(self):
+        return self._source or 'user'
+
     def to_dict(self):
         """Convert the Report document to a dictionary"""
         return {
             'id': str(self.id),
-            'reporter': self.reporter.username,
+            'reporter': get_user_loader().username(self.reporter_id) if self.reporter_id else None,
+            'source': self.source,
             'content_type': self.content_type,
             'content_id': self.content_id,
             'report_type': self.report_type,
@@ -1,6 +1,7 @@
 from bson import ObjectId
 from mongoengine.errors import DoesNotExist, ValidationError
 
+from api.authentication.loaders import get_user_loader
 from api.reports.models import Report
 from api.threads.models import Post, Thread
 from core.types import api_response
@@ -90,7 +91,8 @@ def create_report(data: dict, current_user: str) -> api_response:
 def list_reports(current_user: str) -> api_response:
     """List all reports (admin only in future)"""
     try:
-        reports = Report.objects()
+        reports = list(Report.objects())
+        get_user_loader().prime(report.reporter_id for report in reports)
         data = {"reports": [report.to_dict() for report in reports]}
         return success_response(data=data, status_code=200)
     except Exception as e:
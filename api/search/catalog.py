@@ -0,0 +1,142 @@
+import hashlib
+import json
+from itertools import combinations
+
+from api.search.engine import fold
+from core.constants import COURSES, DEFAULT_SUBJECTS, FILTER_CONFIG, SEMESTERS, SUBJECTS
+
+# Precomputed subject catalog
+#
+# Everything the filter endpoints serve comes from constants, so it is all
+# computed once at import: the subject list for every (courses, semester)
+# case, an n-gram index for subject search, and the serialized JSON bodies
+# of the static responses together with their ETags.
+
+NGRAM = 3
+
+_KNOWN_COURSES = sorted(SUBJECTS)
+_KNOWN_SEMESTERS = sorted({semester for course in SUBJECTS.values() for semester in course})
+_UNKNOWN_SEMESTER = -1  # A semester no course lists subjects for
+
+
+class PreparedResponse:
+    """A JSON body serialized once, with its strong ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+def _build_options(courses: tuple[str, ...], semester, has_courses: bool) -> tuple[str, ...]:
+    """The subject list for one case, following the rules of the original per-request walk."""
+    subjects = set()
+
+    # No filters: every subject
+    if not has_courses and semester is None:
+        for course_subjects in SUBJECTS.values():
+            for semester_subjects in course_subjects.values():
+                subjects.update(semester_subjects)
+        subjects.update(DEFAULT_SUBJECTS)
+
+    # Only semester: that semester in every course
+    elif not has_courses:
+        for course_subjects in SUBJECTS.values():
+            subjects.update(course_subjects.get(semester, ()))
+        subjects.update(DEFAULT_SUBJECTS)
+
+    # Only courses: every semester of those courses
+    elif semester is None:
+        for course in courses:
+            for semester_subjects in SUBJECTS[course].values():
+                subjects.update(semester_subjects)
+        if not subjects:
+            subjects.update(DEFAULT_SUBJECTS)
+
+    # Both
+    else:
+        found = False
+        for course in courses:
+            if semester in SUBJECTS[course]:
+                subjects.update(SUBJECTS[course][semester])
+                found = True
+        if not found:
+            subjects.update(DEFAULT_SUBJECTS)
+
+    return tuple(sorted(subjects))
+
+
+def _build_catalog() -> dict:
+    catalog = {}
+    semesters = [None, _UNKNOWN_SEMESTER, *_KNOWN_SEMESTERS]
+    for size in range(len(_KNOWN_COURSES) + 1):
+        for courses in combinations(_KNOWN_COURSES, size):
+            for semester in semesters:
+                for has_courses in ((False, True) if not courses else (True,)):
+                    catalog[(has_courses, frozenset(courses), semester)] = _build_options(courses, semester, has_courses)
+    return catalog
+
+
+def _key(course_ids, semester_id) -> tuple:
+    course_ids = course_ids or []
+    if not semester_id:
+        semester = None
+    elif semester_id in _KNOWN_SEMESTERS:
+        semester = semester_id
+    else:
+        semester = _UNKNOWN_SEMESTER
+    return bool(course_ids), frozenset(c for c in course_ids if c in SUBJECTS), semester
+
+
+def _ngrams(text: str) -> set[str]:
+    if len(text) <= NGRAM:
+        return {text}
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+_CATALOG = _build_catalog()
+_ALL_SUBJECTS = _CATALOG[(False, frozenset(), None)]
+_FOLDED = {subject: fold(subject) for subject in _ALL_SUBJECTS}
+
+# n-gram -> subjects containing it; grams shorter than NGRAM cover short queries
+_NGRAM_INDEX: dict[str, set[str]] = {}
+for _subject, _folded in _FOLDED.items():
+    for _n in range(1, NGRAM + 1):
+        for _i in range(len(_folded) - _n + 1):
+            _NGRAM_INDEX.setdefault(_folded[_i:_i + _n], set()).add(_subject)
+
+_SUBJECT_RESPONSES = {key: PreparedResponse(list(options)) for key, options in _CATALOG.items()}
+
+FILTER_CONFIG_RESPONSE = PreparedResponse(FILTER_CONFIG)
+SEMESTERS_RESPONSE = PreparedResponse(SEMESTERS)
+COURSES_RESPONSE = PreparedResponse(COURSES)
+
+
+def subject_options(course_ids=None, semester_id=None) -> tuple[str, ...]:
+    """Sorted subjects for the selected courses and semester."""
+    return _CATALOG[_key(course_ids, semester_id)]
+
+
+def subject_options_response(course_ids=None, semester_id=None) -> PreparedResponse:
+    """The serialized `subject_options` list."""
+    return _SUBJECT_RESPONSES[_key(course_ids, semester_id)]
+
+
+def search_subjects(query: str, course_ids=None, semester_id=None) -> list[str]:
+    """Subjects of the case containing `query`, ignoring case and accents, in alphabetical order."""
+    needle = fold(query)
+    if not needle:
+        return list(subject_options(course_ids, semester_id))
+
+    matches = None
+    for gram in _ngrams(needle):
+        holders = _NGRAM_INDEX.get(gram)
+        if not holders:
+            return []
+        matches = set(holders) if matches is None else matches & holders
+    if len(needle) > NGRAM:
+        # Shared n-grams do not guarantee the whole query appears in order
+        matches = {subject for subject in matches if needle in _FOLDED[subject]}
+
+    return [subject for subject in subject_options(course_ids, semester_id) if subject in matches]
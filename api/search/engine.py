@@ -0,0 +1,303 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from core.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Full-text thread search
+#
+# Each worker keeps an in-memory inverted index over thread titles and
+# descriptions. Writes made by this worker update it immediately; writes made
+# by other workers are pulled in by `refresh`, which asks Mongo for threads
+# whose `_updated_at` moved since the last sync (an indexed range query);
+# threads that became pending or rejected since then are dropped.
+# `_updated_at` is stamped by the worker that builds the document, not when it
+# is committed, so a thread can land with a timestamp older than one already
+# synced: each refresh re-reads the last SYNC_OVERLAP_SECONDS and skips the
+# threads it has already applied (see SyncWindow).
+# Deleted threads are dropped from the index when a search fails to load them.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+TITLE_WEIGHT = 2.0  # A title occurrence counts as this many description occurrences
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_PENALTY = 0.7  # Weight of a term that only matched as a prefix (partial word)
+MAX_PREFIX_EXPANSIONS = 64  # Keep only the most common completions of very short prefixes
+REFRESH_INTERVAL_SECONDS = 2.0
+# Longest expected gap between stamping `_updated_at` and committing the write
+# (a synchronous moderation call happens in between)
+SYNC_OVERLAP_SECONDS = 60.0
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents, so 'Autenticação' and 'autenticacao' compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into accent-folded alphanumeric tokens; everything else is a separator."""
+    return TOKEN_RE.findall(fold(text))
+
+
+class SyncWindow:
+    """
+    How far `refresh` has read, for the range query on `_updated_at`.
+
+    `since()` starts SYNC_OVERLAP_SECONDS before the newest timestamp seen,
+    so late commits are still found; `is_new()` filters out the threads of
+    that overlap that were already applied.
+    """
+
+    def __init__(self, overlap: float = SYNC_OVERLAP_SECONDS):
+        self._overlap = timedelta(seconds=overlap)
+        self.until = None
+        self._seen = {}  # thread_id -> `_updated_at` applied, for threads inside the overlap
+
+    def since(self) -> datetime | None:
+        return self.until - self._overlap if self.until is not None else None
+
+    def is_new(self, thread) -> bool:
+        """Record `thread`; False when this version of it was already applied."""
+        thread_id, updated_at = str(thread.id), thread._updated_at
+        if updated_at is None:
+            return True
+        if self._seen.get(thread_id) == updated_at:
+            return False
+        self._seen[thread_id] = updated_at
+        if self.until is None or updated_at > self.until:
+            self.until = updated_at
+        return True
+
+    def prune(self):
+        """Forget threads that fell out of the overlap."""
+        since = self.since()
+        if since is not None:
+            self._seen = {thread_id: at for thread_id, at in self._seen.items() if at >= since}
+
+
+class ThreadSearchIndex:
+    """In-memory BM25 inverted index over threads (title + description)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}  # term -> {thread_id: weighted term frequency}
+        self._terms = []  # sorted vocabulary, for prefix expansion
+        self._docs = {}  # thread_id -> {'length', 'terms', 'semester', 'courses', 'subjects', 'created_at'}
+        self._total_length = 0.0
+        self._built = False
+        self._synced = SyncWindow()
+        self._last_refresh = 0.0
+
+    # Maintenance
+
+    def __len__(self):
+        return len(self._docs)
+
+    def upsert(self, thread_id, title: str, description: str = "", semester=None,
+               courses=None, subjects=None, created_at=None):
+        """Add or replace one thread in the index."""
+        frequencies = {}
+        for token in tokenize(title):
+            frequencies[token] = frequencies.get(token, 0.0) + TITLE_WEIGHT
+        for token in tokenize(description):
+            frequencies[token] = frequencies.get(token, 0.0) + 1.0
+
+        with self._lock:
+            self._remove(thread_id)
+            for term, tf in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._terms, term)
+                postings[thread_id] = tf
+            length = sum(frequencies.values())
+            self._docs[thread_id] = {
+                "length": length,
+                "terms": tuple(frequencies),
+                "semester": semester,
+                "courses": frozenset(courses or ()),
+                "subjects": frozenset(subjects or ()),
+                "created_at": created_at or datetime.min,
+            }
+            self._total_length += length
+
+    def upsert_thread(self, thread):
+        """Index a Thread document."""
+        self.upsert(thread.id, thread._title, thread._description or "", thread.semester,
+                    thread.courses, thread.subjects, thread._created_at)
+
+    def clear(self):
+        """Forget everything; the next `refresh` reloads all threads."""
+        with self._lock:
+            self._reset()
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._remove(thread_id)
+
+    def _remove(self, thread_id):
+        doc = self._docs.pop(thread_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(thread_id, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._terms, term)
+                if i < len(self._terms) and self._terms[i] == term:
+                    del self._terms[i]
+
+    def refresh(self, force: bool = False):
+        """Load every thread on first use, then pull threads changed since the last sync."""
+        from api.threads.models import HIDDEN_STATUSES, Thread
+
+        now = time.monotonic()
+        if self._built and not force and now - self._last_refresh < REFRESH_INTERVAL_SECONDS:
+            return
+        # Only one refresh at a time; searches are served from the current data meanwhile
+        if not self._refresh_lock.acquire(blocking=not self._built):
+            return
+        try:
+            fields = ("_title", "_description", "semester", "courses", "subjects",
+                      "_status", "_created_at", "_updated_at")
+            since = self._synced.since()
+            if self._built and since is not None:
+                # Overlapping window, see SyncWindow. No status filter: threads hidden
+                # since then (e.g. a post-hoc rejection in another worker) must be seen to be dropped
+                queryset = Thread.objects(_updated_at__gte=since)
+            else:
+                # Pending and rejected threads are indexed once the moderation queue publishes them
+                queryset = Thread.objects(_status__nin=HIDDEN_STATUSES)
+            for thread in queryset.only(*fields).order_by("_updated_at"):
+                if not self._synced.is_new(thread):
+                    continue
+                if thread._status in HIDDEN_STATUSES:
+                    self.remove(thread.id)
+                else:
+                    self.upsert_thread(thread)
+            self._synced.prune()
+            self._built = True
+            self._last_refresh = now
+        finally:
+            self._refresh_lock.release()
+
+    # Querying
+
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        """Return (term, weight) pairs: the exact term plus completions of the token as a prefix."""
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + "\uffff")
+        completions = [term for term in self._terms[start:end] if term != token]
+        if len(completions) > MAX_PREFIX_EXPANSIONS:
+            completions.sort(key=lambda term: len(self._postings[term]), reverse=True)
+            completions = completions[:MAX_PREFIX_EXPANSIONS]
+        expanded = [(term, PREFIX_PENALTY) for term in completions]
+        if token in self._postings:
+            expanded.append((token, 1.0))
+        return expanded
+
+    def _matches_filters(self, doc: dict, semester_id, course_ids, subject_ids) -> bool:
+        if semester_id and doc["semester"] != semester_id:
+            return False
+        if course_ids and doc["courses"].isdisjoint(course_ids):
+            return False
+        if subject_ids and doc["subjects"].isdisjoint(subject_ids):
+            return False
+        return True
+
+    def _score(self, query: str, semester_id=None, course_ids=None, subject_ids=None) -> list[tuple]:
+        """BM25-score every thread matching the query and filters, unordered."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            docs = self._docs
+            # Length normalisation: tf / (tf + k1 * (1 - b + b * length / avg_length))
+            base = BM25_K1 * (1 - BM25_B)
+            per_length = BM25_K1 * BM25_B * n_docs / self._total_length if self._total_length else 0.0
+
+            scores = {}
+            get = scores.get
+            for token in tokens:
+                for term, weight in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    factor = weight * idf * (BM25_K1 + 1)
+                    for thread_id, tf in postings.items():
+                        scores[thread_id] = get(thread_id, 0.0) + factor * tf / (
+                            tf + base + per_length * docs[thread_id]["length"]
+                        )
+
+            filtered = semester_id or course_ids or subject_ids
+            return [
+                (relevance, docs[thread_id]["created_at"], thread_id)
+                for thread_id, relevance in scores.items()
+                if not filtered or self._matches_filters(docs[thread_id], semester_id, course_ids, subject_ids)
+            ]
+
+    def rank(self, query: str, semester_id=None, course_ids=None, subject_ids=None) -> list[tuple]:
+        """
+        Score every matching thread with BM25.
+
+        Ties on relevance are broken by newest first, then by id (descending),
+        so the order is total and can be resumed from a cursor.
+
+        Returns:
+            list: (relevance, created_at, thread_id) tuples, best first
+        """
+        return sorted(self._score(query, semester_id, course_ids, subject_ids), reverse=True)
+
+    def search(self, query: str, semester_id=None, course_ids=None, subject_ids=None,
+               limit: int = 20, cursor: str = None) -> tuple[list, int, str | None]:
+        """
+        Return one page of ranked thread ids.
+
+        Only the page is sorted (a bounded heap over the matches), so the cost
+        is linear in the number of matching threads.
+
+        Returns:
+            tuple: (page: list of (relevance, thread_id), total: int, next_cursor: str or None)
+        """
+        matches = self._score(query, semester_id, course_ids, subject_ids)
+        total = len(matches)
+
+        remaining = matches
+        if cursor:
+            relevance, created_at, thread_id = decode_cursor(cursor, 3)
+            if not isinstance(relevance, (int, float)) or not isinstance(created_at, datetime) \
+                    or not isinstance(thread_id, ObjectId):
+                raise InvalidCursor("Invalid cursor")
+            after = (relevance, created_at.replace(tzinfo=None), thread_id)  # json_util decodes dates as aware UTC
+            remaining = [match for match in matches if match < after]
+
+        page = heapq.nlargest(limit + 1, remaining)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(list(page[-1]))
+        return [(round(relevance, 6), thread_id) for relevance, _, thread_id in page], total, next_cursor
+
+
+# One index per worker process
+thread_index = ThreadSearchIndex()
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Facet counts for the thread filters
+#
+# For a filter selection, counts how many threads each semester, course and
+# subject option would match. Each facet ignores its own filter, so picking a
+# course still shows the counts of the other courses. Results are computed by
+# one `$facet` aggregation and cached per selection; writes made by this
+# worker patch the cached counts in place, and entries expire after
+# CACHE_TTL_SECONDS so writes made by other workers show up too.
+
+CACHE_SIZE = 256
+CACHE_TTL_SECONDS = 60.0
+
+
+def selection_key(semester=None, courses=None, subjects=None) -> tuple:
+    return semester or None, frozenset(courses or ()), frozenset(subjects or ())
+
+
+def thread_facet_values(thread) -> tuple:
+    """The (semester, courses, subjects) of a thread, as the cache compares them."""
+    return thread.semester, frozenset(thread.courses or ()), frozenset(thread.subjects or ())
+
+
+def _match(semester=None, courses=None, subjects=None) -> dict:
+    query = {}
+    if semester:
+        query['semester'] = semester
+    if courses:
+        query['courses'] = {'$in': list(courses)}
+    if subjects:
+        query['subjects'] = {'$in': list(subjects)}
+    return query
+
+
+def _count_by(field: str, match: dict, unwind: bool) -> list:
+    stages = [{'$match': match}] if match else []
+    if unwind:
+        stages.append({'$unwind': f'${field}'})
+    stages.append({'$group': {'_id': f'${field}', 'count': {'$sum': 1}}})
+    return stages
+
+
+def compute_facets(semester=None, courses=None, subjects=None) -> dict:
+    """
+    Count threads per semester, course and subject with a single aggregation.
+
+    Returns:
+        dict: {'semester': {id: n}, 'course': {id: n}, 'subject': {name: n}, 'total': n}
+    """
+    from api.threads.models import HIDDEN_STATUSES, Thread
+
+    pipeline = [
+        {'$match': {'_status': {'$nin': HIDDEN_STATUSES}}},
+        # Duplicate courses/subjects within one thread count once
+        {'$project': {
+            'semester': 1,
+            'courses': {'$setUnion': [{'$ifNull': ['$courses', []]}, []]},
+            'subjects': {'$setUnion': [{'$ifNull': ['$subjects', []]}, []]},
+        }},
+        {'$facet': {
+            'semester': _count_by('semester', _match(None, courses, subjects), unwind=False),
+            'course': _count_by('courses', _match(semester, None, subjects), unwind=True),
+            'subject': _count_by('subjects', _match(semester, courses, None), unwind=True),
+            'total': [{'$match': _match(semester, courses, subjects)}, {'$count': 'count'}],
+        }},
+    ]
+    result = next(Thread._get_collection().aggregate(pipeline))
+    facets = {
+        name: {row['_id']: row['count'] for row in result[name] if row['_id'] is not None}
+        for name in ('semester', 'course', 'subject')
+    }
+    facets['total'] = result['total'][0]['count'] if result['total'] else 0
+    return facets
+
+
+class FacetCache:
+    """LRU cache of facet counts per selection, patched in place on thread writes."""
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # selection key -> (computed_at, facets)
+        self._writes = 0  # Bumped by every thread write this cache sees
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, semester=None, courses=None, subjects=None) -> dict:
+        """Facet counts for a selection, from the cache when fresh."""
+        key = selection_key(semester, courses, subjects)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached[0] < self._ttl:
+                self._entries.move_to_end(key)
+                return self._copy(cached[1])
+            writes = self._writes
+
+        facets = compute_facets(*key)
+        with self._lock:
+            if writes != self._writes:
+                # A write landed while aggregating; it may or may not be counted, so don't cache
+                return self._copy(facets)
+            self._entries[key] = (now, facets)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return self._copy(facets)
+
+    @staticmethod
+    def _copy(facets: dict) -> dict:
+        return {name: dict(counts) if isinstance(counts, dict) else counts for name, counts in facets.items()}
+
+    def thread_changed(self, before: tuple = None, after: tuple = None):
+        """
+        Apply a thread write to every cached selection.
+
+        `before`/`after` are `thread_facet_values` of the thread before and after
+        the write: None before for a create, None after for a delete.
+        """
+        if before == after:
+            return
+        with self._lock:
+            self._writes += 1
+            for key, (_, facets) in self._entries.items():
+                if before is not None:
+                    self._apply(facets, key, before, -1)
+                if after is not None:
+                    self._apply(facets, key, after, 1)
+
+    @staticmethod
+    def _apply(facets: dict, key: tuple, values: tuple, delta: int):
+        semester, courses, subjects = key
+        thread_semester, thread_courses, thread_subjects = values
+        in_semester = not semester or thread_semester == semester
+        in_courses = not courses or not courses.isdisjoint(thread_courses)
+        in_subjects = not subjects or not subjects.isdisjoint(thread_subjects)
+
+        def bump(counts, value):
+            counts[value] = counts.get(value, 0) + delta
+            if counts[value] <= 0:
+                del counts[value]
+
+        if in_courses and in_subjects and thread_semester is not None:
+            bump(facets['semester'], thread_semester)
+        if in_semester and in_subjects:
+            for course in thread_courses:
+                bump(facets['course'], course)
+        if in_semester and in_courses:
+            for subject in thread_subjects:
+                bump(facets['subject'], subject)
+        if in_semester and in_courses and in_subjects:
+            facets['total'] += delta
+
+
+# One cache per worker process
+facet_cache = FacetCache()
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+import traceback
+
+from api.search.engine import REFRESH_INTERVAL_SECONDS, thread_index
+from api.search.facets import facet_cache, thread_facet_values
+from api.search.suggest import suggest_index
+
+# Keeps this worker's in-memory search indexes and facet counts in step with
+# the threads collection. The thread views call the hooks below after each
+# write; the background sync picks up writes made by the other workers.
+
+BACKGROUND_SYNC = os.getenv("SEARCH_BACKGROUND_SYNC", "1") != "0"
+
+_sync_thread = None
+
+
+def index_thread(thread, previous: tuple = None):
+    """
+    Call after a thread is created or edited.
+
+    `previous` is `thread_facet_values(thread)` taken before an edit; leave it
+    None for a new thread.
+    """
+    thread_index.upsert_thread(thread)
+    suggest_index.upsert_thread(thread)
+    facet_cache.thread_changed(previous, thread_facet_values(thread))
+
+
+def unindex_thread(thread):
+    """Call after a thread is deleted; needs its semester, courses and subjects loaded."""
+    thread_index.remove(thread.id)
+    suggest_index.remove(thread.id)
+    facet_cache.thread_changed(thread_facet_values(thread), None)
+
+
+def update_thread_score(thread_id, score: int):
+    """Call after a vote changes a thread's score."""
+    suggest_index.set_score(thread_id, score)
+
+
+def refresh_indexes(force: bool = False):
+    """Build the indexes if needed and pull changes made by other workers."""
+    thread_index.refresh(force)
+    suggest_index.refresh(force)
+
+
+def clear_indexes():
+    thread_index.clear()
+    suggest_index.clear()
+    facet_cache.clear()
+
+
+def _sync_forever():
+    while True:
+        try:
+            refresh_indexes(force=True)
+        except Exception as e:
+            print(f"Error syncing search indexes: {e}")
+            traceback.print_exc()
+        time.sleep(REFRESH_INTERVAL_SECONDS)
+
+
+def start_background_sync() -> bool:
+    """
+    Build the indexes and keep them synced from a daemon thread, so requests
+    never wait on Mongo for them. Disabled with SEARCH_BACKGROUND_SYNC=0.
+
+    Returns:
+        bool: whether the sync thread is running
+    """
+    global _sync_thread
+    if not BACKGROUND_SYNC:
+        return False
+    if _sync_thread is None or not _sync_thread.is_alive():
+        _sync_thread = threading.Thread(target=_sync_forever, name="search-index-sync", daemon=True)
+        _sync_thread.start()
+    return True
@@ -10,7 +10,17 @@ search_bp = Blueprint('search', __name__)
 @jwt_required()
 def get_filters_config():
     """Get the complete filter configuration."""
-    return vi.get_filters_config()
+    return vi.get_filters_config(request)
+
+@search_bp.route('/filters/facets', methods=['GET'])
+@jwt_required()
+def get_filters_facets():
+    """
+    Number of threads per semester, course and subject for the current
+    selection (semester, courses, subjects query params). Each facet ignores
+    its own filter, so the counts show what choosing another option would give.
+    """
+    return vi.get_filters_facets(request)
 
 @search_bp.route('/filters/<string:filter_type>', methods=['GET'])
 @jwt_required()
@@ -21,5 +31,21 @@ def get_filters_by_type(filter_type):
 @search_bp.route('/search/threads', methods=['GET'])
 @jwt_required()
 def search_threads():
-    """Search threads by title."""
-    return vi.search_threads(request)
\ No newline at end of file
+    """
+    Full-text search over thread titles and descriptions, ranked by relevance.
+
+    Query params: q (required), semester, courses, subjects, limit (default 20,
+    max 100) and cursor (the `next_cursor` of the previous page).
+    """
+    return vi.search_threads(request)
+
+@search_bp.route('/search/suggest', methods=['GET'])
+@jwt_required()
+def suggest_threads():
+    """
+    Typeahead over thread titles: the top threads by score whose title has a
+    word starting with each word of `q`.
+
+    Query params: q (required), semester, courses, subjects, limit (default 10, max 20).
+    """
+    return vi.suggest_threads(request)
@@ -0,0 +1,286 @@
+import bisect
+import heapq
+import threading
+import time
+
+from api.search.engine import REFRESH_INTERVAL_SECONDS, SyncWindow, tokenize
+
+# Typeahead over thread titles
+#
+# A sorted array of the accent-folded title tokens answers "which threads
+# have a word starting with this prefix", and a second array ordered by
+# `_score` lets common prefixes stop after the first k matching threads.
+# Like the search index, each worker keeps its own copy: writes and votes in
+# this worker update it directly, and `refresh` pulls everything else from Mongo.
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 20
+COLLECT_COST = 0.1  # Cost of collecting one candidate thread relative to checking one while walking
+SCORE_SYNC_SECONDS = 30.0  # Votes cast in other workers do not touch `_updated_at`
+
+
+class TitleSuggestIndex:
+    """In-memory prefix index over thread titles, ranked by score."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._threads = {}  # thread_id -> {'title', 'tokens', 'score', 'semester', 'courses', 'subjects'}
+        self._postings = {}  # token -> set of thread_ids
+        self._terms = []  # sorted tokens
+        self._by_score = []  # sorted (score, thread_id); best threads at the end
+        self._by_filter = {"semester": {}, "courses": {}, "subjects": {}}  # filter value -> set of thread_ids
+        self._built = False
+        self._synced = SyncWindow()
+        self._last_refresh = 0.0
+        self._last_score_sync = 0.0
+
+    # Maintenance
+
+    def __len__(self):
+        return len(self._threads)
+
+    def clear(self):
+        """Forget everything; the next `refresh` reloads all threads."""
+        with self._lock:
+            self._reset()
+
+    def upsert(self, thread_id, title: str, score: int = 0, semester=None, courses=None, subjects=None):
+        """Add or replace one thread."""
+        thread_id = str(thread_id)  # str hashes in C; ObjectId.__hash__ is Python code
+        tokens = tuple(dict.fromkeys(tokenize(title)))
+        with self._lock:
+            self._remove(thread_id)
+            for token in tokens:
+                holders = self._postings.get(token)
+                if holders is None:
+                    holders = self._postings[token] = set()
+                    bisect.insort(self._terms, token)
+                holders.add(thread_id)
+            entry = self._threads[thread_id] = {
+                "title": title,
+                "tokens": tokens,
+                "words": " " + " ".join(tokens),
+                "score": score or 0,
+                "semester": semester,
+                "courses": frozenset(courses or ()),
+                "subjects": frozenset(subjects or ()),
+            }
+            bisect.insort(self._by_score, (entry["score"], thread_id))
+            self._file(thread_id, entry, True)
+
+    def upsert_thread(self, thread):
+        """Index a Thread document."""
+        self.upsert(thread.id, thread._title, thread._score, thread.semester, thread.courses, thread.subjects)
+
+    def set_score(self, thread_id, score: int):
+        """Move a thread to its new position after a vote."""
+        thread_id = str(thread_id)
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            if entry is None or entry["score"] == score:
+                return
+            self._discard_score(entry["score"], thread_id)
+            entry["score"] = score
+            bisect.insort(self._by_score, (score, thread_id))
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._remove(str(thread_id))
+
+    def _discard_score(self, score, thread_id):
+        i = bisect.bisect_left(self._by_score, (score, thread_id))
+        if i < len(self._by_score) and self._by_score[i] == (score, thread_id):
+            del self._by_score[i]
+
+    def _file(self, thread_id, entry: dict, add: bool):
+        """Add the thread to (or drop it from) the set of each of its filter values."""
+        values = [("courses", value) for value in entry["courses"]] + [("subjects", value) for value in entry["subjects"]]
+        if entry["semester"]:
+            values.append(("semester", entry["semester"]))
+        for field, value in values:
+            holders = self._by_filter[field]
+            if add:
+                holders.setdefault(value, set()).add(thread_id)
+            elif value in holders:
+                holders[value].discard(thread_id)
+                if not holders[value]:
+                    del holders[value]
+
+    def _remove(self, thread_id):
+        entry = self._threads.pop(thread_id, None)
+        if entry is None:
+            return
+        self._file(thread_id, entry, False)
+        self._discard_score(entry["score"], thread_id)
+        for token in entry["tokens"]:
+            holders = self._postings.get(token)
+            if holders is None:
+                continue
+            holders.discard(thread_id)
+            if not holders:
+                del self._postings[token]
+                i = bisect.bisect_left(self._terms, token)
+                if i < len(self._terms) and self._terms[i] == token:
+                    del self._terms[i]
+
+    def refresh(self, force: bool = False):
+        """Load every thread on first use, then pull changed threads and, less often, every score."""
+        from api.threads.models import HIDDEN_STATUSES, Thread
+
+        now = time.monotonic()
+        if self._built and not force and now - self._last_refresh < REFRESH_INTERVAL_SECONDS:
+            return
+        # Only one refresh at a time; queries are served from the current data meanwhile
+        if not self._refresh_lock.acquire(blocking=not self._built):
+            return
+        try:
+            fields = ("_title", "_score", "semester", "courses", "subjects", "_status", "_updated_at")
+            since = self._synced.since()
+            if self._built and since is not None:
+                # Overlapping window (see SyncWindow in engine.py). No status filter:
+                # threads hidden since then must be seen to be dropped
+                queryset = Thread.objects(_updated_at__gte=since)
+            else:
+                # Pending and rejected threads are indexed once the moderation queue publishes them
+                queryset = Thread.objects(_status__nin=HIDDEN_STATUSES)
+            for thread in queryset.only(*fields).order_by("_updated_at"):
+                if not self._synced.is_new(thread):
+                    continue
+                if thread._status in HIDDEN_STATUSES:
+                    self.remove(thread.id)
+                else:
+                    self.upsert_thread(thread)
+            self._synced.prune()
+
+            if self._built and now - self._last_score_sync >= SCORE_SYNC_SECONDS:
+                scores = {str(doc["_id"]): doc.get("_score", 0) for doc in Thread.objects.only("_score").as_pymongo()}
+                with self._lock:
+                    for thread_id in list(self._threads):
+                        if thread_id not in scores:
+                            self._remove(thread_id)  # Deleted by another worker
+                        else:
+                            self.set_score(thread_id, scores[thread_id])
+                self._last_score_sync = now
+            elif not self._built:
+                self._last_score_sync = now
+
+            self._built = True
+            self._last_refresh = now
+        finally:
+            self._refresh_lock.release()
+
+    # Querying
+
+    def _prefix_range(self, prefix: str) -> tuple[int, int]:
+        return (
+            bisect.bisect_left(self._terms, prefix),
+            bisect.bisect_left(self._terms, prefix + "\uffff"),
+        )
+
+    def _estimate(self, prefix: str) -> int:
+        """Number of (token, thread) pairs for tokens starting with `prefix`: an upper bound on matches."""
+        start, end = self._prefix_range(prefix)
+        return sum(len(self._postings[term]) for term in self._terms[start:end])
+
+    def _filter_sets(self, semester_id, course_ids, subject_ids) -> list[set]:
+        """For each active filter, the set of threads passing it."""
+        sets = []
+        if semester_id:
+            sets.append(self._by_filter["semester"].get(semester_id, set()))
+        for field, values in (("courses", course_ids), ("subjects", subject_ids)):
+            if values:
+                holders = [self._by_filter[field][v] for v in values if v in self._by_filter[field]]
+                sets.append(holders[0] if len(holders) == 1 else set().union(*holders))
+        return sets
+
+    def suggest(self, query: str, semester_id=None, course_ids=None, subject_ids=None,
+                limit: int = DEFAULT_SUGGESTIONS) -> list[dict]:
+        """
+        Return the `limit` highest-scored threads whose title has, for every
+        word of the query, a word starting with it.
+
+        Either collects every thread matching the most selective word and keeps
+        the top `limit`, or walks all threads from the highest score down until
+        `limit` match, whichever is expected to touch fewer threads.
+
+        Returns:
+            list: {'id', 'title', 'score'} dicts, best first
+        """
+        prefixes = list(dict.fromkeys(tokenize(query)))
+        if not prefixes:
+            return []
+        # " prefix" inside " word1 word2 ..." means some title word starts with prefix
+        needles = [" " + prefix for prefix in prefixes]
+
+        with self._lock:
+            n = len(self._threads)
+            estimates = {prefix: self._estimate(prefix) for prefix in prefixes}
+            if not n or not all(estimates.values()):
+                return []
+            filter_sets = self._filter_sets(semester_id, course_ids, subject_ids)
+
+            # Expected number of threads to look at before `limit` match when walking by score
+            match_fraction = 1.0
+            for holders in filter_sets:
+                match_fraction *= len(holders) / n
+            for prefix in prefixes:
+                match_fraction *= min(1.0, estimates[prefix] / n)
+            walk_cost = limit / match_fraction if match_fraction else float("inf")
+
+            threads = self._threads
+            # Set operations run in C, so collecting costs far less per thread than walking.
+            # Mirror the loop below: build the set of each word, most selective first, until
+            # so few candidates are left that checking them one by one is cheaper.
+            collect_cost = 0.0
+            expected = None
+            for prefix in sorted(prefixes, key=estimates.get):
+                if expected is not None and expected < estimates[prefix] * COLLECT_COST:
+                    collect_cost += expected
+                else:
+                    collect_cost += estimates[prefix] * COLLECT_COST
+                    expected = estimates[prefix] if expected is None else expected * min(1.0, estimates[prefix] / n)
+            collect_cost += n * match_fraction
+            if collect_cost <= walk_cost:
+                candidates = None
+                remaining = []
+                for prefix in sorted(prefixes, key=estimates.get):
+                    if candidates is not None and len(candidates) < estimates[prefix] * COLLECT_COST:
+                        remaining.append(" " + prefix)  # Cheaper to check the few candidates left
+                        continue
+                    start, end = self._prefix_range(prefix)
+                    matching = set()
+                    for term in self._terms[start:end]:
+                        matching.update(self._postings[term])
+                    candidates = matching if candidates is None else candidates & matching
+                for holders in sorted(filter_sets, key=len):
+                    candidates &= holders
+                ranked = heapq.nlargest(
+                    limit,
+                    (
+                        (threads[thread_id]["score"], thread_id)
+                        for thread_id in candidates
+                        if all(needle in threads[thread_id]["words"] for needle in remaining)
+                    ),
+                )
+            else:
+                # Common prefixes: the best matching threads come up quickly
+                ranked = []
+                for score, thread_id in reversed(self._by_score):
+                    if all(thread_id in holders for holders in filter_sets) \
+                            and all(needle in threads[thread_id]["words"] for needle in needles):
+                        ranked.append((score, thread_id))
+                        if len(ranked) == limit:
+                            break
+
+            return [
+                {"id": thread_id, "title": threads[thread_id]["title"], "score": score}
+                for score, thread_id in ranked
+            ]
+
+
+# One index per worker process
+suggest_index = TitleSuggestIndex()
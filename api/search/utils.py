@@ -1,4 +1,5 @@
-from core.constants import FILTER_CONFIG, SEMESTERS, COURSES, SUBJECTS, DEFAULT_SUBJECTS
+from api.search import catalog
+from core.constants import FILTER_CONFIG, SEMESTERS, COURSES
 
 # Filter Configuration Utilities
 
@@ -15,102 +16,83 @@ def get_course_options():
     return COURSES
 
 def get_subject_options(course_ids=None, semester_id=None) -> list[str]:
-    """Get subject options based on selected courses and semester."""
-    subjects = set()
-    
-    if course_ids is None:
-        course_ids = []
-    
-    # Case 1: No filters selected - show ALL subjects
-    if not course_ids and not semester_id:
-        for course_subjects in SUBJECTS.values():
-            for semester_subjects in course_subjects.values():
-                subjects.update(semester_subjects)
-        subjects.update(DEFAULT_SUBJECTS)
-        return sorted(list(subjects))
-    
-    # Case 2: Only semester selected - show all subjects for that semester
-    if semester_id and not course_ids:
-        for course_id in SUBJECTS.keys():
-            if semester_id in SUBJECTS[course_id]:
-                subjects.update(SUBJECTS[course_id][semester_id])
-        subjects.update(DEFAULT_SUBJECTS)
-        return sorted(list(subjects))
-    
-    # Case 3: Only courses selected - show all subjects for those courses
-    if course_ids and not semester_id:
-        for course_id in course_ids:
-            if course_id in SUBJECTS:
-                for semester_subjects in SUBJECTS[course_id].values():
-                    subjects.update(semester_subjects)
-        if not subjects:
-            subjects.update(DEFAULT_SUBJECTS)
-        return sorted(list(subjects))
-    
-    # Case 4: Both course and semester selected
-    if course_ids and semester_id:
-        subjects_found = False
-        for course_id in course_ids:
-            if course_id in SUBJECTS and semester_id in SUBJECTS[course_id]:
-                subjects.update(SUBJECTS[course_id][semester_id])
-                subjects_found = True
-        
-        if not subjects_found:
-            subjects.update(DEFAULT_SUBJECTS)
-        
-        return sorted(list(subjects))
-    
-    return sorted(list(subjects))
+    """Get subject options based on selected courses and semester (precomputed in api/search/catalog.py)."""
+    return list(catalog.subject_options(course_ids, semester_id))
 
 def search_subjects(query, course_ids=None, semester_id=None) -> list[str]:
-    """Search subjects by query string."""
-    all_subjects = get_subject_options(course_ids, semester_id)
-    query_lower = query.lower()
-    
-    return [subject for subject in all_subjects if query_lower in subject.lower()]
-
-def search_threads_by_title(query: str, semester_id=None, course_ids=None, subject_ids=None):
-    """Search threads by title with optional filters."""
-    from api.threads.models import Thread, Post
-    
+    """Search subjects by query string, ignoring case and accents."""
+    return catalog.search_subjects(query, course_ids, semester_id)
+
+def get_filter_facets(semester_id=None, course_ids=None, subject_ids=None) -> dict:
+    """Thread counts per semester, course and subject for the current filter selection."""
+    from api.search.facets import facet_cache
+
+    return facet_cache.get(semester_id, course_ids, subject_ids)
+
+def search_threads_by_title(query: str, semester_id=None, course_ids=None, subject_ids=None,
+                            limit: int = 20, cursor: str = None) -> tuple[list, int, str | None]:
+    """
+    Full-text search over thread titles and descriptions with optional filters.
+
+    Results are ranked by BM25 relevance (see api/search/engine.py); matching is
+    accent- and case-insensitive and partial words match as prefixes.
+
+    Returns:
+        tuple: (results: list of dicts, total: int, next_cursor: str or None)
+    """
+    from api.threads.models import HIDDEN_STATUSES, Thread
+    from api.authentication.loaders import get_user_loader
+    from api.search.engine import thread_index
+
     if not query or not query.strip():
-        return []
-    
-    # Build the search query
-    search_query = {
-        '_title': {'$regex': query, '$options': 'i'}  # Case-insensitive search - use _title not title
-    }
-    
-    # Add optional filters
-    if semester_id:
-        search_query['semester'] = semester_id
-    
-    if course_ids:
-        search_query['courses'] = {'$in': course_ids}
-    
-    if subject_ids:
-        search_query['subjects'] = {'$in': subject_ids}
-    
-    # Execute search
-    threads = Thread.objects(__raw__=search_query).order_by('-_created_at')
-    
-    # Format results
+        return [], 0, None
+
+    thread_index.refresh()
+    while True:
+        page, total, next_cursor = thread_index.search(
+            query, semester_id, course_ids, subject_ids, limit=limit, cursor=cursor
+        )
+        if not page:
+            return [], total, next_cursor
+        threads = {
+            thread.id: thread
+            for thread in Thread.objects(id__in=[thread_id for _, thread_id in page], _status__nin=HIDDEN_STATUSES)
+        }
+        stale = [thread_id for _, thread_id in page if thread_id not in threads]
+        if not stale:
+            break
+        # Deleted or hidden by another worker since this index last synced; rank again without them
+        for thread_id in stale:
+            thread_index.remove(thread_id)
+
+    loader = get_user_loader().prime(thread.author_id for thread in threads.values())
+
+    # Format results in ranking order
     results = []
-    for thread in threads:
-        # Count posts for this thread
-        post_count = Post.objects(_thread=thread).count()
-        
+    for relevance, thread_id in page:
+        thread = threads[thread_id]
         results.append({
             'id': str(thread.id),
             'title': thread._title,
             'description': thread._description if thread._description else '',
-            'author': thread.author.username if thread.author else 'Unknown',
+            'author': loader.username(thread.author_id),
             'semester': thread.semester,
             'courses': thread.courses if thread.courses else [],
             'subjects': thread.subjects if thread.subjects else [],
             'score': thread.score,
             'created_at': thread._created_at.isoformat() if thread._created_at else None,
-            'post_count': post_count
+            'post_count': thread.post_count,
+            'relevance': relevance
         })
-    
-    return results
\ No newline at end of file
+
+    return results, total, next_cursor
+
+def suggest_thread_titles(query: str, semester_id=None, course_ids=None, subject_ids=None, limit: int = 10) -> list[dict]:
+    """Typeahead: the highest-scored threads whose title words start with the words typed so far."""
+    from api.search.suggest import suggest_index
+
+    if not query or not query.strip():
+        return []
+
+    suggest_index.refresh()
+    return suggest_index.suggest(query, semester_id, course_ids, subject_ids, limit=limit)
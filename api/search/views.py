@@ -1,53 +1,62 @@
-from flask import Request, request, jsonify
+from flask import Request, Response, request, jsonify
 from core.types import api_response
-from api.search.utils import get_filter_config, search_subjects, get_subject_options, get_course_options, get_semester_options, search_threads_by_title
+from api.search import catalog
+from api.search.utils import get_filter_facets, search_subjects, search_threads_by_title, suggest_thread_titles
+from api.search.suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+from core.pagination import InvalidCursor, parse_limit
 
 # FILTERS views
 
-def get_filters_config() -> api_response:
+def prepared_response(prepared: catalog.PreparedResponse, request: Request) -> api_response:
+    """Serve a pre-serialized body; answers 304 when the client already has it (If-None-Match)."""
+    response = Response(prepared.body, mimetype='application/json')
+    response.set_etag(prepared.etag)
+    response.cache_control.no_cache = True  # Cache, but revalidate with the ETag
+    response.make_conditional(request)
+    return response, response.status_code
+
+def get_filters_config(request: Request) -> api_response:
     """Get the complete filter configuration."""
-    try:
-        
-        return jsonify(get_filter_config()), 200
-    except ImportError:
-        return jsonify({'error': 'Filter configuration not available'}), 500
+    return prepared_response(catalog.FILTER_CONFIG_RESPONSE, request)
 
 def get_filters_by_type(filter_type: str, request: Request) -> api_response:
     """Get filter options by type."""
     if filter_type == 'semesters':
         # Get all semester options.
-        try:
-
-            return jsonify(get_semester_options()), 200
-        except ImportError:
-            return jsonify({'error': 'Filter configuration not available'}), 500
+        return prepared_response(catalog.SEMESTERS_RESPONSE, request)
 
     elif filter_type == 'courses':
         # Get all course options.
-        try:
-            return jsonify(get_course_options()), 200
-        except ImportError:
-            return jsonify({'error': 'Filter configuration not available'}), 500
+        return prepared_response(catalog.COURSES_RESPONSE, request)
+
     elif filter_type == 'subjects':
         # Get subject options based on selected courses and semester
-        try:
-            if request is None:
-                raise ValueError("Request object must be provided for subject filter")
-            course_ids = request.args.getlist('courses')
-            semester_id = request.args.get('semester', type=int)
-            query = request.args.get('q', '').strip()
-            
-            if query:
-                subjects = search_subjects(query, course_ids, semester_id)
-            else:
-                subjects = get_subject_options(course_ids, semester_id)
-            
-            return jsonify(subjects), 200
-        except ImportError:
-            return jsonify({'error': 'Filter configuration not available'}), 500
+        if request is None:
+            raise ValueError("Request object must be provided for subject filter")
+        course_ids = request.args.getlist('courses')
+        semester_id = request.args.get('semester', type=int)
+        query = request.args.get('q', '').strip()
+
+        if query:
+            return jsonify(search_subjects(query, course_ids, semester_id)), 200
+
+        return prepared_response(catalog.subject_options_response(course_ids, semester_id), request)
+
+    return jsonify({'error': f'Unknown filter type: {filter_type}'}), 404
+
+def get_filters_facets(request: Request) -> api_response:
+    """Thread counts per filter option for the current selection."""
+    try:
+        semester_id = request.args.get('semester', type=int)
+        course_ids = request.args.getlist('courses')
+        subject_ids = request.args.getlist('subjects')
+
+        return jsonify(get_filter_facets(semester_id, course_ids, subject_ids)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 def search_threads(request: Request) -> api_response:
-    """Search threads by title with optional filters."""
+    """Full-text search over threads with optional filters, ranked by relevance and cursor-paginated."""
     try:
         query = request.args.get('q', '').strip()
         
@@ -58,14 +67,49 @@ def search_threads(request: Request) -> api_response:
         semester_id = request.args.get('semester', type=int)
         course_ids = request.args.getlist('courses')
         subject_ids = request.args.getlist('subjects')
+
+        # Pagination
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
         
-        results = search_threads_by_title(query, semester_id, course_ids, subject_ids)
+        results, total, next_cursor = search_threads_by_title(
+            query, semester_id, course_ids, subject_ids, limit=limit, cursor=cursor
+        )
         
         return jsonify({
             'query': query,
-            'count': len(results),
-            'results': results
+            'count': total,
+            'results': results,
+            'next_cursor': next_cursor
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def suggest_threads(request: Request) -> api_response:
+    """Typeahead suggestions of thread titles for the text typed so far."""
+    try:
+        query = request.args.get('q', '').strip()
+
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+
+        # Optional filters
+        semester_id = request.args.get('semester', type=int)
+        course_ids = request.args.getlist('courses')
+        subject_ids = request.args.getlist('subjects')
+        limit = parse_limit(request.args.get('limit'), default=DEFAULT_SUGGESTIONS, maximum=MAX_SUGGESTIONS)
+
+        suggestions = suggest_thread_titles(query, semester_id, course_ids, subject_ids, limit=limit)
+
+        return jsonify({
+            'query': query,
+            'suggestions': suggestions
+        }), 200
+
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,152 @@
+import os
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from bson import ObjectId
+
+from api.reports.models import Report
+from api.threads.models import HIDDEN_STATUSES, Post, Thread, Vote
+from api.threads.moderation_queue import ModerationJob
+
+# Threads with more posts than this are cleaned up in the background so the
+# DELETE request returns in constant time. A cleanup cut short by a restart
+# leaves posts whose thread is gone; `flask threads purge-orphan-posts`
+# (purge_orphan_posts) finds and removes them.
+SYNC_DELETE_POST_LIMIT = int(os.getenv("CASCADE_DELETE_SYNC_LIMIT", "200"))
+
+# Only the cleanup of very large threads runs here; two workers are plenty.
+_cleanup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cascade-delete")
+
+
+def supports_transactions(client) -> bool:
+    """Multi-document transactions need a replica set or a sharded cluster."""
+    return client.topology_description.topology_type_name in ("ReplicaSetWithPrimary", "Sharded")
+
+
+def _run(callback):
+    """Run `callback(session)` in a transaction when the deployment allows it."""
+    client = Thread._get_db().client
+    if not supports_transactions(client):
+        return callback(None)
+    with client.start_session() as session:
+        return session.with_transaction(callback)
+
+
+def _delete_posts(thread_id: ObjectId, session=None) -> int:
+    """Delete every post of a thread together with the reports, votes and moderation jobs on them."""
+    posts = Post._get_collection()
+    post_ids = posts.distinct("_id", {"_thread": thread_id}, session=session)
+    if post_ids:
+        Report._get_collection().delete_many(
+            {"_content_type": "post", "_content_id": {"$in": [str(pid) for pid in post_ids]}},
+            session=session,
+        )
+        Vote._get_collection().delete_many(
+            {"_target_type": "post", "_target_id": {"$in": post_ids}},
+            session=session,
+        )
+        ModerationJob._get_collection().delete_many(
+            {"_target_type": "post", "_target_id": {"$in": post_ids}},
+            session=session,
+        )
+    return posts.delete_many({"_thread": thread_id}, session=session).deleted_count
+
+
+def _delete_thread_only(thread_id: ObjectId, session=None) -> None:
+    """Delete the thread document plus the reports, votes and moderation job of the thread itself."""
+    Report._get_collection().delete_many(
+        {"_content_type": "thread", "_content_id": str(thread_id)}, session=session
+    )
+    Vote._get_collection().delete_many(
+        {"_target_type": "thread", "_target_id": thread_id}, session=session
+    )
+    ModerationJob._get_collection().delete_many(
+        {"_target_type": "thread", "_target_id": thread_id}, session=session
+    )
+    Thread._get_collection().delete_one({"_id": thread_id}, session=session)
+
+
+def _cleanup_posts(thread_id: ObjectId) -> int:
+    """Background task: remove the posts left behind by a deleted large thread."""
+    try:
+        return _run(lambda session: _delete_posts(thread_id, session))
+    except Exception as e:
+        print(f"Error cleaning up posts of deleted thread {thread_id}: {e}")
+        traceback.print_exc()
+        raise
+
+
+def delete_thread_cascade(thread_id, sync_limit: int = None) -> Future | None:
+    """
+    Delete a thread with its posts and every report, vote and moderation job
+    pointing at them.
+
+    Each collection is cleared with a single `delete_many`, inside a
+    multi-document transaction when the deployment supports one. When the
+    thread has more than `sync_limit` posts, only the thread itself is removed
+    inline and its posts are purged by a background worker.
+
+    Returns:
+        Future or None: the background cleanup, if one was scheduled
+    """
+    thread_id = ObjectId(thread_id)
+    if sync_limit is None:
+        sync_limit = SYNC_DELETE_POST_LIMIT
+
+    post_count = Post._get_collection().count_documents({"_thread": thread_id}, limit=sync_limit + 1)
+    if post_count <= sync_limit:
+        def delete_all(session):
+            _delete_posts(thread_id, session)
+            _delete_thread_only(thread_id, session)
+
+        _run(delete_all)
+        return None
+
+    _run(lambda session: _delete_thread_only(thread_id, session))
+    return _cleanup_executor.submit(_cleanup_posts, thread_id)
+
+
+def delete_post_cascade(post_id) -> None:
+    """Delete a post with the reports, votes and moderation job pointing at it, and decrement its thread's post count."""
+    post_id = ObjectId(post_id)
+
+    def delete(session):
+        Report._get_collection().delete_many(
+            {"_content_type": "post", "_content_id": str(post_id)}, session=session
+        )
+        Vote._get_collection().delete_many(
+            {"_target_type": "post", "_target_id": post_id}, session=session
+        )
+        ModerationJob._get_collection().delete_many(
+            {"_target_type": "post", "_target_id": post_id}, session=session
+        )
+        deleted = Post._get_collection().find_one_and_delete(
+            {"_id": post_id}, projection={"_thread": 1, "_status": 1}, session=session
+        )
+        # Only the request that actually removed the post decrements the count,
+        # and only for posts that were counted (published)
+        if deleted is not None and deleted.get("_status") not in HIDDEN_STATUSES:
+            Thread.add_to_post_count(deleted["_thread"], -1, session=session)
+
+    _run(delete)
+
+
+def purge_orphan_posts() -> int:
+    """
+    Finish background cleanups lost to a restart: delete the posts (with their
+    reports, votes and moderation jobs) of every thread that no longer exists.
+
+    The orphaned thread ids come from one aggregation over `posts`; each is
+    then cleared like a background cleanup, so running this next to one is safe.
+
+    Returns:
+        int: number of posts deleted
+    """
+    orphaned = Post._get_collection().aggregate([
+        {"$group": {"_id": "$_thread"}},
+        {"$lookup": {"from": Thread._get_collection_name(), "localField": "_id",
+                     "foreignField": "_id", "as": "thread"}},
+        {"$match": {"thread": {"$size": 0}}},
+        {"$project": {"_id": 1}},
+    ])
+    return sum(_cleanup_posts(doc["_id"]) for doc in orphaned)
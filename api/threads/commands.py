@@ -0,0 +1,254 @@
+import click
+from bson import ObjectId
+from flask.cli import AppGroup
+from pymongo import UpdateOne
+
+from api.threads.cascade import purge_orphan_posts
+from api.threads.models import HIDDEN_STATUSES, Thread, Post, Vote
+from api.threads.moderation_rescan import RESCAN_BATCH_SIZE, RESCAN_CONCURRENCY, RESCAN_RATE, rescan_content
+from core import moderation_classifier
+from core.utils import get_brasilia_now
+
+threads_cli = AppGroup("threads", help="Maintenance commands for threads and posts.")
+
+
+def _flush(collection, ops: list) -> int:
+    """Send pending updates in one unordered bulk write and return how many changed."""
+    if not ops:
+        return 0
+    result = collection.bulk_write(ops, ordered=False)
+    ops.clear()
+    return result.modified_count
+
+
+def reconcile_scores(batch_size: int = 500) -> dict:
+    """
+    Recompute `_score` from the `votes` collection and fix drifted documents.
+
+    Drift is detected server-side with one aggregation per collection, so only
+    mismatched documents are sent back, and fixes are applied with bulk
+    writes. Each fix is conditional on the `_score` that was read, so a vote
+    landing in between is never overwritten.
+
+    Returns:
+        dict: number of fixed documents per collection
+    """
+    fixed = {}
+    for model, target_type in ((Thread, 'thread'), (Post, 'post')):
+        pipeline = [
+            {'$project': {'_score': 1}},
+            {'$lookup': {
+                'from': Vote._get_collection_name(),
+                'let': {'target_id': '$_id'},
+                'pipeline': [
+                    {'$match': {'_target_type': target_type,
+                                '$expr': {'$eq': ['$_target_id', '$$target_id']}}},
+                    {'$group': {'_id': None, 'total': {'$sum': '$_value'}}},
+                ],
+                'as': 'tally',
+            }},
+            {'$project': {
+                '_score': 1,
+                'actual': {'$ifNull': [{'$arrayElemAt': ['$tally.total', 0]}, 0]},
+            }},
+            {'$match': {'$expr': {'$ne': [{'$ifNull': ['$_score', 0]}, '$actual']}}},
+        ]
+        collection = model._get_collection()
+        ops = []
+        count = 0
+        for doc in collection.aggregate(pipeline):
+            ops.append(UpdateOne(
+                {'_id': doc['_id'], '_score': doc.get('_score')},
+                {'$set': {'_score': doc['actual']}},
+            ))
+            if len(ops) >= batch_size:
+                count += _flush(collection, ops)
+        count += _flush(collection, ops)
+        fixed[collection.name] = count
+    return fixed
+
+
+def reconcile_post_counts(batch_size: int = 500) -> int:
+    """
+    Backfill/fix `Thread._post_count` from the posts collection.
+
+    The real counts of published posts come from a single `$group`
+    aggregation over `posts`; the threads are then streamed with only their
+    stored count and mismatches are fixed with conditional bulk writes, so
+    concurrent `$inc`s are not lost.
+
+    Returns:
+        int: number of threads fixed
+    """
+    counts = {
+        row['_id']: row['count']
+        for row in Post._get_collection().aggregate([
+            {'$match': {'_status': {'$nin': HIDDEN_STATUSES}}},
+            {'$group': {'_id': '$_thread', 'count': {'$sum': 1}}},
+        ])
+    }
+
+    collection = Thread._get_collection()
+    ops = []
+    fixed = 0
+    for doc in collection.find({}, {'_post_count': 1}):
+        actual = counts.get(doc['_id'], 0)
+        if doc.get('_post_count') != actual:
+            ops.append(UpdateOne(
+                {'_id': doc['_id'], '_post_count': doc.get('_post_count')},
+                {'$set': {'_post_count': actual}},
+            ))
+            if len(ops) >= batch_size:
+                fixed += _flush(collection, ops)
+    fixed += _flush(collection, ops)
+    return fixed
+
+
+def migrate_votes(batch_size: int = 500) -> dict:
+    """
+    Move the legacy embedded `_upvoted_users`/`_downvoted_users` arrays into `votes`.
+
+    Documents are processed in `_id` order in batches. Each batch first upserts
+    its vote rows (`$setOnInsert`, so rows written by the new voting code win)
+    and only then unsets the arrays, which makes the migration resumable: a
+    crashed run is simply started again and picks up the documents that still
+    carry arrays.
+
+    Returns:
+        dict: number of migrated documents per collection
+    """
+    votes = Vote._get_collection()
+    migrated = {}
+    for model, target_type in ((Thread, 'thread'), (Post, 'post')):
+        collection = model._get_collection()
+        legacy = {'$or': [{'_upvoted_users': {'$exists': True}},
+                          {'_downvoted_users': {'$exists': True}}]}
+        count = 0
+        last_id = None
+        while True:
+            query = dict(legacy)
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            batch = list(collection.find(query, {'_upvoted_users': 1, '_downvoted_users': 1})
+                         .sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+
+            vote_ops = []
+            for doc in batch:
+                for field, value in (('_upvoted_users', 1), ('_downvoted_users', -1)):
+                    for user_id in doc.get(field) or []:
+                        if not ObjectId.is_valid(user_id):
+                            continue
+                        key = {'_target_type': target_type, '_target_id': doc['_id'],
+                               '_user': ObjectId(user_id)}
+                        vote_ops.append(UpdateOne(
+                            key,
+                            {'$setOnInsert': {'_value': value, '_updated_at': get_brasilia_now()}},
+                            upsert=True,
+                        ))
+            if vote_ops:
+                votes.bulk_write(vote_ops, ordered=False)
+
+            collection.update_many(
+                {'_id': {'$in': [doc['_id'] for doc in batch]}},
+                {'$unset': {'_upvoted_users': '', '_downvoted_users': ''}},
+            )
+            count += len(batch)
+            last_id = batch[-1]['_id']
+        migrated[collection.name] = count
+    return migrated
+
+
+@threads_cli.command("reconcile-scores")
+@click.option("--batch-size", default=500, show_default=True, help="Updates per bulk write.")
+def reconcile_scores_command(batch_size):
+    """Fix thread and post scores that drifted from their votes."""
+    for collection, count in reconcile_scores(batch_size).items():
+        click.echo(f"{collection}: {count} score(s) fixed")
+
+
+@threads_cli.command("reconcile-post-counts")
+@click.option("--batch-size", default=500, show_default=True, help="Updates per bulk write.")
+def reconcile_post_counts_command(batch_size):
+    """Backfill or fix the denormalized post count of every thread."""
+    click.echo(f"threads: {reconcile_post_counts(batch_size)} post count(s) fixed")
+
+
+@threads_cli.command("purge-orphan-posts")
+def purge_orphan_posts_command():
+    """Delete posts left behind by deleted threads whose background cleanup did not finish."""
+    click.echo(f"posts: {purge_orphan_posts()} orphaned post(s) deleted")
+
+
+@threads_cli.command("migrate-votes")
+@click.option("--batch-size", default=500, show_default=True, help="Documents per batch.")
+def migrate_votes_command(batch_size):
+    """Move embedded voter lists into the votes collection (safe to re-run)."""
+    for collection, count in migrate_votes(batch_size).items():
+        click.echo(f"{collection}: {count} document(s) migrated")
+
+
+@threads_cli.command("rescan-moderation")
+@click.option("--batch-size", default=RESCAN_BATCH_SIZE, show_default=True, help="Texts per moderation prompt.")
+@click.option("--concurrency", default=RESCAN_CONCURRENCY, show_default=True, help="Prompts in flight at once.")
+@click.option("--rate", default=RESCAN_RATE, show_default=True, help="Maximum prompts per second.")
+@click.option("--limit", type=int, default=None, help="Stop after this many documents; the next run resumes.")
+@click.option("--name", default=None, help="Checkpoint name (default: one per verdict version).")
+@click.option("--restart", is_flag=True, help="Discard the checkpoint and start over.")
+def rescan_moderation_command(batch_size, concurrency, rate, limit, name, restart):
+    """Re-moderate published threads and posts and report flagged ones (resumable)."""
+    result = rescan_content(name, batch_size, concurrency, rate, limit, restart)
+    state = "finished" if result['finished'] else "paused, run again to resume"
+    click.echo(f"{result['name']}: {result['scanned']} scanned, {result['flagged']} flagged, "
+               f"{result['errors']} to retry, {result['skipped']} given up, {result['reports']} new report(s) ({state})")
+
+
+@threads_cli.command("train-moderation-classifier")
+@click.option("--out", default=moderation_classifier.CLASSIFIER_PATH, show_default=True,
+              help="Weights file the workers load at startup.")
+@click.option("--epochs", default=moderation_classifier.TRAIN_EPOCHS, show_default=True,
+              help="Full passes over the training set.")
+@click.option("--limit", type=int, default=None, help="Train on at most this many stored verdicts.")
+@click.option("--holdout", default=0.2, show_default=True, help="Share of the verdicts kept aside to report accuracy.")
+def train_moderation_classifier_command(out, epochs, limit, holdout):
+    """Train the local moderation classifier from the stored model verdicts."""
+    if moderation_classifier.np is None:
+        raise click.ClickException("numpy is required to train the classifier")
+    texts, blocked = moderation_classifier.carregar_exemplos(limit)
+    click.echo(f"{len(texts)} verdict(s), {sum(blocked)} blocked")
+
+    # Every fifth verdict (by default) is only used to measure the result
+    step = round(1 / holdout) if holdout else 0
+    train = [i for i in range(len(texts)) if not step or i % step]
+    test = [i for i in range(len(texts)) if step and not i % step]
+    try:
+        weights = moderation_classifier.treinar([texts[i] for i in train], [blocked[i] for i in train],
+                                                epochs=epochs)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    if test:
+        classifier = moderation_classifier.LocalClassifier()
+        classifier.use(weights)
+        scores = classifier.probabilidades([texts[i] for i in test])
+        labels = [blocked[i] for i in test]
+        positives = sum(labels)
+        negatives = len(labels) - positives
+
+        def above(threshold):
+            flagged = [score >= threshold for score in scores]
+            return (sum(f and y for f, y in zip(flagged, labels)),
+                    sum(f and not y for f, y in zip(flagged, labels)))
+
+        allowed = [score <= moderation_classifier.CLASSIFIER_GATE_ALLOW for score in scores]
+        click.echo(f"held out {len(test)}: gate allows {sum(a and not y for a, y in zip(allowed, labels))}/{negatives} "
+                   f"safe and {sum(a and y for a, y in zip(allowed, labels))}/{positives} blocked without a call")
+        for label, threshold in (("fallback", moderation_classifier.CLASSIFIER_FALLBACK_THRESHOLD),
+                                 ("gate block", moderation_classifier.CLASSIFIER_GATE_BLOCK)):
+            caught, false_alarms = above(threshold)
+            click.echo(f"{label} (>= {threshold}): {caught}/{positives} blocked caught, "
+                       f"{false_alarms}/{negatives} safe flagged")
+
+    moderation_classifier.salvar_pesos(weights, out)
+    click.echo(f"weights saved to {out}; restart the workers to load them")
@@ -1,7 +1,258 @@
-from mongoengine import Document, StringField, DateTimeField, ReferenceField, ListField, IntField, ReferenceField
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, ListField, IntField, ReferenceField, ObjectIdField
 import mongoengine as me
+from bson import ObjectId
+from flask import g, has_app_context
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from core.utils import get_brasilia_now, utc_to_brasilia
 from api.authentication.models import User
+from api.authentication.loaders import get_user_loader, ref_id
+
+# Keyset ordering used for paginated thread listings; mirrors Thread.meta['ordering']
+# with _id as the final tiebreaker so every cursor position is unique.
+THREAD_SORT_KEYS = [('_score', -1), ('_created_at', -1), ('_id', -1)]
+
+# Moderation status of threads and posts. Content created before the status
+# existed has no `_status` and counts as published.
+PUBLISHED = 'published'
+PENDING_MODERATION = 'pending_moderation'
+REJECTED = 'rejected'
+CONTENT_STATUSES = [PUBLISHED, PENDING_MODERATION, REJECTED]
+HIDDEN_STATUSES = [PENDING_MODERATION, REJECTED]
+
+
+def visible_to(user_id: str) -> me.Q:
+    """Filter for threads/posts `user_id` may see: published ones plus their own pending or rejected ones"""
+    return me.Q(_status__nin=HIDDEN_STATUSES) | me.Q(_author=ObjectId(user_id))
+
+
+class Vote(Document):
+    """One user's vote on a thread or post; the net score is denormalized on the target"""
+    _target_type = StringField(required=True, choices=['thread', 'post'])
+    _target_id = ObjectIdField(required=True)
+    _user = ObjectIdField(required=True)
+    _value = IntField(required=True, choices=[-1, 0, 1])  # 0 keeps the row once a vote is toggled off
+    _updated_at = DateTimeField(default=get_brasilia_now)
+
+    meta = {
+        'collection': 'votes',
+        'indexes': [
+            {'fields': ['_target_type', '_target_id', '_user'], 'unique': True},
+        ],
+    }
+
+
+class VoteLoader:
+    """
+    Resolves one user's vote on many threads/posts with a single `$in` query.
+
+    Mirrors `UserLoader`: views `prime` the targets of a response and the first
+    `vote` lookup loads them all at once.
+    """
+
+    def __init__(self, user_id: str):
+        self._user = ObjectId(user_id)
+        self._votes = {}
+        self._pending = set()
+
+    def prime(self, target_type: str, target_ids):
+        for target_id in target_ids:
+            key = (target_type, target_id)
+            if key not in self._votes:
+                self._pending.add(key)
+        return self
+
+    def load(self):
+        if not self._pending:
+            return
+        by_type = {}
+        for target_type, target_id in self._pending:
+            by_type.setdefault(target_type, []).append(target_id)
+            self._votes[(target_type, target_id)] = None
+        self._pending.clear()
+
+        query = {
+            '_user': self._user,
+            '_value': {'$ne': 0},
+            '$or': [
+                {'_target_type': target_type, '_target_id': {'$in': ids}}
+                for target_type, ids in by_type.items()
+            ],
+        }
+        for row in Vote.objects(__raw__=query).as_pymongo():
+            vote = 'upvote' if row['_value'] > 0 else 'downvote'
+            self._votes[(row['_target_type'], row['_target_id'])] = vote
+
+    def vote(self, target_type: str, target_id):
+        """Return 'upvote', 'downvote' or None for the loader's user"""
+        key = (target_type, target_id)
+        if key not in self._votes:
+            self._pending.add(key)
+        self.load()
+        return self._votes.get(key)
+
+
+def get_vote_loader(user_id: str) -> VoteLoader:
+    """Return the current request's vote loader for `user_id`"""
+    if not has_app_context():
+        return VoteLoader(user_id)
+    loaders = g.setdefault('vote_loaders', {})
+    if user_id not in loaders:
+        loaders[user_id] = VoteLoader(user_id)
+    return loaders[user_id]
+
+
+class SelfVoteError(Exception):
+    """Raised when a user votes on their own thread or post"""
+
+
+def _legacy_vote(doc: dict, voter: ObjectId) -> int:
+    """The vote `voter` has in a document's legacy voter arrays: 1, -1 or 0"""
+    for field, value in (('_upvoted_users', 1), ('_downvoted_users', -1)):
+        voters = doc.get(field) or []
+        if voter in voters or str(voter) in voters:
+            return value
+    return 0
+
+
+def _legacy_vote_update(voter: ObjectId, value: int) -> list:
+    """
+    Pipeline update for a user's first vote row: applies `value` to `_score`
+    on top of the user's legacy vote (see `_legacy_vote`) and removes them
+    from the legacy arrays. Arrays stored as user id strings or ObjectIds.
+    """
+    ids = [voter, str(voter)]
+
+    def has_voter(field):
+        return {'$gt': [{'$size': {'$setIntersection': [{'$ifNull': [f'${field}', []]}, ids]}}, 0]}
+
+    def without_voter(field):
+        return {'$cond': [
+            {'$isArray': f'${field}'},
+            {'$filter': {'input': f'${field}', 'cond': {'$not': [{'$in': ['$$this', ids]}]}}},
+            '$$REMOVE',
+        ]}
+
+    old_value = {'$cond': [has_voter('_upvoted_users'), 1, {'$cond': [has_voter('_downvoted_users'), -1, 0]}]}
+    delta = {'$let': {
+        'vars': {'old': old_value},
+        'in': {'$subtract': [{'$cond': [{'$eq': ['$$old', value]}, 0, value]}, '$$old']},
+    }}
+    return [{'$set': {
+        '_score': {'$add': [{'$ifNull': ['$_score', 0]}, delta]},
+        '_upvoted_users': without_voter('_upvoted_users'),
+        '_downvoted_users': without_voter('_downvoted_users'),
+    }}]
+
+
+def cast_vote(document_cls, target_type: str, obj_id: str, user_id: str, value: int,
+              award_points: bool = False) -> int:
+    """
+    Toggle a user's vote on a thread or post.
+
+    `value` is 1 for an upvote and -1 for a downvote. The user's row in `votes`
+    is flipped with one atomic upsert (none -> vote, opposite -> vote,
+    vote -> none); its pre-image gives the score delta, which is applied to
+    the target's denormalized `_score` with `$inc` and, for threads, to the
+    author's points. The unique (target, user) index serializes concurrent
+    votes from the same user.
+
+    Authors cannot vote on their own content: the score update only matches
+    targets written by someone else, so self-votes (which would also raise
+    the reputation tier, see moderation_policy.py) are undone and rejected
+    without costing the common case a round trip.
+
+    Until `flask threads migrate-votes` has run, a user's earlier vote may
+    still sit in the target's legacy `_upvoted_users`/`_downvoted_users`
+    arrays instead of `votes`. A user's first vote row on a target is
+    therefore counted against those arrays in the same score update, which
+    also takes the user out of them, so the old vote is toggled rather than
+    counted twice.
+
+    A post vote takes two round trips (vote row, score) and a thread vote
+    three (plus the author's points). Two is not reachable for threads: the
+    three writes go to three collections, MongoDB has no single command that
+    writes to more than one, and a transaction adds its own round trips.
+    Points cannot be derived from the votes either, since `_pointMonth` is
+    reset monthly and `_pointTotal` predates the votes collection. Rarer
+    paths cost more: one more call for a lost insert race or for undoing a
+    legacy vote, two for a rejected self-vote. The writes are not atomic
+    together: a crash between them leaves a score that
+    `flask threads reconcile-scores` fixes, or author points off by that vote.
+
+    Returns:
+        int: the new score
+
+    Raises:
+        SelfVoteError: when `user_id` is the target's author
+    """
+    target_id = ObjectId(obj_id)
+    voter = ObjectId(user_id)
+    key = {'_target_type': target_type, '_target_id': target_id, '_user': voter}
+    votes = Vote._get_collection()
+
+    def flip():
+        return votes.find_one_and_update(
+            key,
+            [{'$set': {
+                '_value': {'$cond': [{'$eq': [{'$ifNull': ['$_value', 0]}, value]}, 0, value]},
+                '_updated_at': get_brasilia_now(),
+            }}],
+            projection={'_value': 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    try:
+        before = flip()
+    except DuplicateKeyError:
+        before = flip()  # Lost an insert race with the same user's other request
+
+    old_value = before['_value'] if before else 0
+    new_value = 0 if old_value == value else value
+    delta = new_value - old_value
+
+    targets = document_cls._get_collection()
+    if before is None:
+        # First vote row for this user: their old vote may be in the legacy arrays
+        target = targets.find_one_and_update(
+            {'_id': target_id, '_author': {'$ne': voter}},
+            _legacy_vote_update(voter, value),
+            projection={'_author': 1, '_score': 1, '_upvoted_users': 1, '_downvoted_users': 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if target is not None:
+            old_value = _legacy_vote(target, voter)
+            new_value = 0 if old_value == value else value
+            delta = new_value - old_value
+            target['_score'] = (target.get('_score') or 0) + delta
+            if new_value != value:
+                votes.update_one(key, {'$set': {'_value': new_value}})
+    else:
+        target = targets.find_one_and_update(
+            {'_id': target_id, '_author': {'$ne': voter}},
+            {'$inc': {'_score': delta}},
+            projection={'_author': 1, '_score': 1},
+            return_document=ReturnDocument.AFTER,
+        )
+    if target is None:
+        # Put the vote row back as it was
+        if before is None:
+            votes.delete_one(key)
+        else:
+            votes.update_one(key, {'$set': {'_value': old_value}})
+        if targets.count_documents({'_id': target_id}, limit=1):
+            raise SelfVoteError(f'Cannot vote on your own {target_type}')
+        raise document_cls.DoesNotExist(f'{document_cls.__name__} matching query does not exist.')
+
+    if award_points and delta:
+        User._get_collection().update_one(
+            {'_id': target['_author']},
+            {'$inc': {'_pointTotal': delta, '_pointMonth': delta}},
+        )
+
+    return target['_score']
+
 
 class Thread(Document): #perguntas
     _title = StringField(max_length=200, required=True)
@@ -13,11 +264,14 @@ class Thread(Document): #perguntas
     courses = ListField(StringField(max_length=50), default=list)  # Default to empty list
     subjects = ListField(StringField(max_length=100), default=lambda: ['Geral'])  # Default subject
 
-    # Voting fields
-    _upvoted_users = ListField(StringField(), default=list)  # Track users who have voted
-    _downvoted_users = ListField(StringField(), default=list)  # Track users who have voted
-    _score = IntField(default=0)  # Cached score for performance
+    # Voting fields (individual votes live in the `votes` collection)
+    _score = IntField(default=0)  # Denormalized net score, kept by cast_vote
+
+    _post_count = IntField(default=0)  # Denormalized number of published posts, kept with $inc by the post views
 
+    # Moderation (see api/threads/moderation_queue.py); only set on content moderated in the background
+    _status = StringField(choices=CONTENT_STATUSES)
+    _moderation_message = StringField()
 
     _created_at = DateTimeField(default=get_brasilia_now)
     _updated_at = DateTimeField(default=get_brasilia_now)
@@ -25,21 +279,51 @@ class Thread(Document): #perguntas
     
     meta = {
         'collection': 'threads',
-        'ordering': ['-_score', '-_created_at']
+        'ordering': ['-_score', '-_created_at'],
+        'strict': False,  # Tolerate voter lists not yet moved by `flask threads migrate-votes`
+        'indexes': [
+            # list_threads: keyset pages with and without the semester/course/subject filters
+            ('-_score', '-_created_at', '-id'),
+            ('semester', '-_score', '-_created_at', '-id'),
+            ('semester', 'courses', '-_score', '-_created_at', '-id'),
+            ('semester', 'subjects', '-_score', '-_created_at', '-id'),
+            # ThreadSearchIndex.refresh: threads changed since the last sync
+            ('_updated_at',),
+            # Moderation policy: an author's recent threads
+            ('_author', '-_created_at'),
+            # Moderation recovery: threads still waiting for a verdict
+            {'fields': ['_status'], 'partialFilterExpression': {'_status': PENDING_MODERATION}},
+        ]
     }
 
     @property
     def score(self):
-        """Calculate the net score (upvotes - downvotes)"""
-        new_score = len(self._upvoted_users) - len(self._downvoted_users)
-        if new_score != self._score:
-            self._score = new_score
-            self.save()
+        """Net score (upvotes - downvotes), maintained by the voting methods"""
         return self._score
     
     @property
     def author(self):
         return self._author
+
+    @property
+    def author_id(self):
+        return ref_id(self, '_author')
+
+    @property
+    def status(self):
+        return self._status or PUBLISHED
+
+    @property
+    def post_count(self):
+        return self._post_count or 0
+
+    @classmethod
+    def add_to_post_count(cls, thread_id, delta: int, session=None) -> bool:
+        """Atomically adjust a thread's post count; returns False if the thread does not exist"""
+        result = cls._get_collection().update_one(
+            {'_id': ObjectId(thread_id)}, {'$inc': {'_post_count': delta}}, session=session
+        )
+        return result.matched_count == 1
     
     def update(self, data: dict):
         """Update thread fields"""
@@ -50,40 +334,15 @@ class Thread(Document): #perguntas
         self._updated_at = get_brasilia_now()
         self.save()
     
-    def upvote(self, user_id: str):
-        """Add an upvote from a user"""
-        if user_id == self.author.id:
-            return  # Prevent users from upvoting their own posts
-        if user_id in self._downvoted_users:
-            self._downvoted_users.remove(user_id)
-            self._upvoted_users.append(user_id)
-            self._author.addPoints(2)
-        if user_id in self._upvoted_users:
-            self._upvoted_users.remove(user_id)
-            self._author.addPoints(-1)
-        else:
-            self._upvoted_users.append(user_id)
-            self._author.addPoints(1)
+    @classmethod
+    def upvote(cls, thread_id: str, user_id: str) -> int:
+        """Toggle a user's upvote and credit the author; returns the new score"""
+        return cast_vote(cls, 'thread', thread_id, user_id, 1, award_points=True)
 
-        self.save()
-
-    def downvote(self, user_id: str):
-        """Add a downvote from a user"""
-        if user_id == self.author.id:
-            return  # Prevent users from downvoting their own posts
-        if user_id in self._upvoted_users:
-            self._upvoted_users.remove(user_id)
-            self._downvoted_users.append(user_id)
-            self._author.addPoints(-2)
-        if user_id in self._downvoted_users:
-            self._downvoted_users.remove(user_id)
-            self._author.addPoints(1)            
-        else:
-            self._downvoted_users.append(user_id)
-            self._author.addPoints(-1)
-
-        self.save()
-        return 
+    @classmethod
+    def downvote(cls, thread_id: str, user_id: str) -> int:
+        """Toggle a user's downvote and debit the author; returns the new score"""
+        return cast_vote(cls, 'thread', thread_id, user_id, -1, award_points=True)
     
     def to_dict(self, user_id=None):
         """Convert the Thread document to a dictionary."""
@@ -91,22 +350,21 @@ class Thread(Document): #perguntas
             # Convert UTC stored time to Brasília time for display
             thread_dict = {
                 'id': str(self.id),
-                'author': self.author.username if self.author else 'Unknown',
+                'author': get_user_loader().username(self.author_id),
                 'title': self._title,
                 'description': self._description if self._description else '',
                 'semester': self.semester,
                 'courses': self.courses if self.courses else [],
                 'subjects': self.subjects if self.subjects else [],
                 'score': self.score,
+                'post_count': self.post_count,
+                'status': self.status,
                 'created_at': self._created_at.isoformat() if self._created_at else None,
             }
+            if self.status == REJECTED:
+                thread_dict['moderation_message'] = self._moderation_message
             if user_id:
-                if str(user_id) in self._upvoted_users:
-                    thread_dict['user_vote'] = 'upvote'
-                elif str(user_id) in self._downvoted_users:
-                    thread_dict['user_vote'] = 'downvote'
-                else:
-                    thread_dict['user_vote'] = None
+                thread_dict['user_vote'] = get_vote_loader(user_id).vote('thread', self.id)
             return thread_dict
         except Exception as e:
             print(f"Error in Thread.to_dict: {e}")
@@ -121,32 +379,50 @@ class Post(Document): #respostas
     _updated_at = DateTimeField(default=get_brasilia_now)
     _thread = ReferenceField(Thread, required=True)
     _pinned = me.BooleanField(default=False)  # Pin status for the post
-    _upvoted_users = ListField(StringField(), default=list)  # Track users who have voted
-    _downvoted_users = ListField(StringField(), default=list)  # Track users who have voted
-    _score = IntField(default=0)  # Cached score for performance
-    
+    _score = IntField(default=0)  # Denormalized net score, kept by cast_vote
+
+    # Moderation (see api/threads/moderation_queue.py); only set on content moderated in the background
+    _status = StringField(choices=CONTENT_STATUSES)
+    _moderation_message = StringField()
     
     meta = {
         'collection': 'posts',
-        'ordering': ['-_pinned', '-_score', '_created_at']  # Pinned posts first, then by creation date
+        'ordering': ['-_pinned', '-_score', '_created_at'],  # Pinned posts first, then by creation date
+        'strict': False,  # Tolerate voter lists not yet moved by `flask threads migrate-votes`
+        'indexes': [
+            # Posts of a thread in display order; also serves per-thread counts and deletes
+            ('_thread', '-_pinned', '-_score', '_created_at'),
+            # Moderation policy: an author's recent posts
+            ('_author', '-_created_at'),
+            # Moderation recovery: posts still waiting for a verdict
+            {'fields': ['_status'], 'partialFilterExpression': {'_status': PENDING_MODERATION}},
+        ]
     }
 
     @property
     def score(self):
-        """Calculate the net score (upvotes - downvotes)""" 
-        new_score = len(self._upvoted_users) - len(self._downvoted_users)
-        if new_score != self._score:
-            self._score = new_score
-            self.save()
+        """Net score (upvotes - downvotes), maintained by the voting methods"""
         return self._score
     
     @property
     def author(self):
         return self._author
 
+    @property
+    def author_id(self):
+        return ref_id(self, '_author')
+
     @property
     def thread(self):
         return self._thread
+
+    @property
+    def status(self):
+        return self._status or PUBLISHED
+
+    @property
+    def thread_id(self):
+        return ref_id(self, '_thread')
     
     @property
     def pinned(self):
@@ -158,30 +434,15 @@ class Post(Document): #respostas
         self._updated_at = get_brasilia_now()
         self.save()
     
-    def upvote(self, user_id: str):
-        """Add an upvote from a user"""
-        if user_id == self.author.id:
-            return  # Prevent users from upvoting their own posts
-        if user_id in self._downvoted_users:
-            self._downvoted_users.remove(user_id)
-        if user_id in self._upvoted_users:
-            self._upvoted_users.remove(user_id)
-        else:
-            self._upvoted_users.append(user_id)
-        self.save()
+    @classmethod
+    def upvote(cls, post_id: str, user_id: str) -> int:
+        """Toggle a user's upvote; returns the new score"""
+        return cast_vote(cls, 'post', post_id, user_id, 1)
 
-    def downvote(self, user_id: str):
-        """Add a downvote from a user"""
-        if user_id == self.author.id:
-            return  # Prevent users from downvoting their own posts
-        if user_id in self._upvoted_users:
-            self._upvoted_users.remove(user_id)
-        if user_id in self._downvoted_users:
-            self._downvoted_users.remove(user_id)
-        else:
-            self._downvoted_users.append(user_id)
-        self.save()
-        return 
+    @classmethod
+    def downvote(cls, post_id: str, user_id: str) -> int:
+        """Toggle a user's downvote; returns the new score"""
+        return cast_vote(cls, 'post', post_id, user_id, -1)
         
     def pin(self):
         """Pin the post"""
@@ -205,21 +466,19 @@ class Post(Document): #respostas
             # Convert UTC stored time to Brasília time for display
             post_dict = {
                 'id': str(self.id),
-                'thread_id': str(self._thread.id) if self._thread else None,
-                'author': self._author.username if self._author else 'Unknown',
+                'thread_id': str(self.thread_id) if self.thread_id else None,
+                'author': get_user_loader().username(self.author_id),
                 'content': self._content,
                 'pinned': self._pinned,
                 'score': self.score,
+                'status': self.status,
                 'created_at': self._created_at.isoformat() if self._created_at else None,
                 'updated_at': self._updated_at.isoformat() if self._updated_at else None,
             }
+            if self.status == REJECTED:
+                post_dict['moderation_message'] = self._moderation_message
             if user_id:
-                if str(user_id) in self._upvoted_users:
-                    post_dict['user_vote'] = 'upvote'
-                elif str(user_id) in self._downvoted_users:
-                    post_dict['user_vote'] = 'downvote'
-                else:
-                    post_dict['user_vote'] = None
+                post_dict['user_vote'] = get_vote_loader(user_id).vote('post', self.id)
             return post_dict
         except Exception as e:
             print(f"Error in Post.to_dict: {e}")
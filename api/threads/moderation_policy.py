@@ -0,0 +1,180 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from api.authentication.models import User
+from api.reports.models import Report
+from api.threads.models import REJECTED, Post, Thread
+from core.utils import get_brasilia_now
+
+# Reputation-based moderation policy
+#
+# With MODERATION_POLICY=1 the author's reputation decides how each new or
+# edited thread or post is moderated:
+#
+#   new      full check before saving (synchronous, or the pending queue
+#            with ASYNC_MODERATION=1), as without the policy
+#   trusted  local prefilter only, published at once; the remote check runs
+#            afterwards in the moderation queue and takes the content down
+#            if it is blocked (post-hoc)
+#   veteran  the same, but only a SAMPLE_RATE share of the submissions gets
+#            the post-hoc check
+#
+# Reputation is the author's `_pointTotal`, the account age and its strikes:
+# rejected content plus reports (not dismissed) on content written in the
+# last STRIKE_WINDOW_DAYS. A single strike puts the author back to "new".
+# Tiers are cached per worker for TIER_TTL_SECONDS; a post-hoc block drops
+# the author's entry in the worker that saw it.
+
+MODERATION_POLICY = os.getenv("MODERATION_POLICY", "0") == "1"
+SAMPLE_RATE = float(os.getenv("MODERATION_SAMPLE_RATE", "0.2"))
+
+TRUSTED_MIN_POINTS = 50
+TRUSTED_MIN_AGE_DAYS = 7
+VETERAN_MIN_POINTS = 200
+VETERAN_MIN_AGE_DAYS = 30
+STRIKE_WINDOW_DAYS = 90
+# Reports are looked up on at most this many of the author's latest threads and posts
+STRIKE_CONTENT_LIMIT = 200
+
+TIER_CACHE_SIZE = 4096
+TIER_TTL_SECONDS = 300.0
+
+NEW = 'new'
+TRUSTED = 'trusted'
+VETERAN = 'veteran'
+
+# What a submission gets
+SYNC = 'sync'        # Full check before publishing
+POSTHOC = 'posthoc'  # Published, then checked by the queue
+SKIP = 'skip'        # Published with the local prefilter only
+
+_DECISIONS = (SYNC, POSTHOC, SKIP)
+
+
+def tier_for(points: int, age_days: float, strikes: int) -> str:
+    """The reputation tier for an author's points, account age in days and strike count."""
+    if strikes:
+        return NEW
+    if points >= VETERAN_MIN_POINTS and age_days >= VETERAN_MIN_AGE_DAYS:
+        return VETERAN
+    if points >= TRUSTED_MIN_POINTS and age_days >= TRUSTED_MIN_AGE_DAYS:
+        return TRUSTED
+    return NEW
+
+
+def count_strikes(author_id) -> int:
+    """Rejected content plus reports that were not dismissed on the author's recent content."""
+    author = ObjectId(author_id)
+    since = get_brasilia_now() - timedelta(days=STRIKE_WINDOW_DAYS)
+    strikes = 0
+    for content_type, model in (('thread', Thread), ('post', Post)):
+        collection = model._get_collection()
+        query = {'_author': author, '_created_at': {'$gte': since}}
+        strikes += collection.count_documents(dict(query, _status=REJECTED))
+        ids = [
+            str(doc['_id'])
+            for doc in collection.find(query, {'_id': 1}).sort('_created_at', -1).limit(STRIKE_CONTENT_LIMIT)
+        ]
+        if ids:
+            strikes += Report._get_collection().count_documents({
+                '_content_type': content_type,
+                '_content_id': {'$in': ids},
+                '_status': {'$ne': 'dismissed'},
+            })
+    return strikes
+
+
+def author_tier(author_id, now: datetime = None) -> str:
+    """Compute an author's tier from the database; unknown authors are new."""
+    user = User.objects(id=author_id).only('_pointTotal', '_created_at').first()
+    if user is None:
+        return NEW
+    now = now or datetime.now()  # `User._created_at` is local time, unlike the content timestamps
+    age_days = (now - user._created_at).total_seconds() / 86400 if user._created_at else 0
+    points = user._pointTotal or 0
+    if tier_for(points, age_days, 0) == NEW:
+        return NEW  # No need to look for strikes
+    return tier_for(points, age_days, count_strikes(author_id))
+
+
+class ModerationPolicy:
+    """Per-submission moderation decision from the author's cached reputation tier."""
+
+    def __init__(self, sample_rate: float = SAMPLE_RATE, size: int = TIER_CACHE_SIZE,
+                 ttl: float = TIER_TTL_SECONDS, rng: random.Random = None):
+        self.sample_rate = sample_rate
+        self._size = size
+        self._ttl = ttl
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._tiers = OrderedDict()  # author id -> (computed_at, tier)
+        self._stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return dict({tier: 0 for tier in (NEW, TRUSTED, VETERAN)}, **{decision: 0 for decision in _DECISIONS})
+
+    def tier(self, author_id) -> str:
+        key = str(author_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._tiers.get(key)
+            if cached is not None and now - cached[0] < self._ttl:
+                self._tiers.move_to_end(key)
+                return cached[1]
+
+        tier = author_tier(key)
+        with self._lock:
+            self._tiers[key] = (now, tier)
+            self._tiers.move_to_end(key)
+            while len(self._tiers) > self._size:
+                self._tiers.popitem(last=False)
+        return tier
+
+    def decide(self, author_id) -> str:
+        """
+        SYNC, POSTHOC or SKIP for a submission by `author_id`.
+
+        Always SYNC while MODERATION_POLICY is off.
+        """
+        if not MODERATION_POLICY:
+            return SYNC
+        tier = self.tier(author_id)
+        if tier == NEW:
+            decision = SYNC
+        elif tier == TRUSTED or self._rng.random() < self.sample_rate:
+            decision = POSTHOC
+        else:
+            decision = SKIP
+        with self._lock:
+            self._stats[tier] += 1
+            self._stats[decision] += 1
+        return decision
+
+    def forget(self, author_id):
+        """Drop an author's cached tier, e.g. after their content was taken down."""
+        with self._lock:
+            self._tiers.pop(str(author_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._tiers.clear()
+            self._stats = self._empty_stats()
+
+    def stats(self) -> dict:
+        """Counters of this worker: submissions per tier and per decision."""
+        with self._lock:
+            stats = dict(self._stats)
+            cached = len(self._tiers)
+        stats.update(enabled=MODERATION_POLICY, sample_rate=self.sample_rate, cached_authors=cached)
+        return stats
+
+
+# One policy per worker process
+moderation_policy = ModerationPolicy()
@@ -0,0 +1,330 @@
+import os
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from mongoengine import BooleanField, DateTimeField, Document, IntField, ObjectIdField, StringField
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from api.threads.models import HIDDEN_STATUSES, PENDING_MODERATION, PUBLISHED, REJECTED, Post, Thread
+from core.utils import get_brasilia_now
+
+# Background moderation
+#
+# With ASYNC_MODERATION=1, new threads and posts are saved as
+# `pending_moderation`, the request returns 202 and a job is queued in the
+# `moderation_jobs` collection. A small pool of daemon threads in every worker
+# process claims jobs with an atomic update, runs the moderator and then
+# publishes or rejects the content. A claimed job carries a lease: if the
+# process dies mid-job, the lease runs out and any worker picks it up again.
+# The moderator raises when the moderation API cannot be reached, so failed
+# attempts are retried with exponential backoff; after MAX_ATTEMPTS the job is
+# kept as `failed` and the content is published, the same fail-open rule as
+# synchronous moderation. Enqueueing the same content again restarts a failed job.
+#
+# Post-hoc jobs (see api/threads/moderation_policy.py) check content that is
+# already published; a block takes it down as `rejected`, and giving up
+# leaves it published.
+#
+# When its author edits rejected content, it goes back through moderation
+# (see resubmit): `rejected` -> `pending_moderation`, and then published at
+# once if the edit passed the full check in the request, or queued otherwise.
+
+ASYNC_MODERATION = os.getenv("ASYNC_MODERATION", "0") == "1"
+MODERATION_WORKERS = int(os.getenv("MODERATION_WORKERS", "2"))
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+LEASE_SECONDS = 60.0
+POLL_INTERVAL_SECONDS = 1.0
+RECOVERY_INTERVAL_SECONDS = 300.0
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+
+_TARGETS = {'thread': Thread, 'post': Post}
+
+_workers = []
+_wakeup = threading.Event()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ModerationJob(Document):
+    """A thread or post waiting for a moderation verdict"""
+    _target_type = StringField(required=True, choices=list(_TARGETS))
+    _target_id = ObjectIdField(required=True)
+    _state = StringField(default=QUEUED, choices=[QUEUED, RUNNING, FAILED])
+    _attempts = IntField(default=0)
+    # The content is already published: a block takes it down
+    _posthoc = BooleanField(default=False)
+    # Queued: when the job may run next. Running: when its lease expires.
+    _run_at = DateTimeField(default=_utcnow)
+    _last_error = StringField()
+    _created_at = DateTimeField(default=_utcnow)
+
+    meta = {
+        'collection': 'moderation_jobs',
+        'indexes': [
+            # claim_job: ready jobs and expired leases, oldest first
+            ('_state', '_run_at'),
+            # One job per piece of content
+            {'fields': ['_target_type', '_target_id'], 'unique': True},
+        ]
+    }
+
+
+def enqueue(target_type: str, target_id, posthoc: bool = False) -> None:
+    """
+    Queue a pending thread or post for moderation, or with `posthoc` a
+    published one. A second call for the same content is a no-op while its
+    job is queued or running; a job that gave up is started over.
+    """
+    jobs = ModerationJob._get_collection()
+    restarted = jobs.update_one(
+        {'_target_type': target_type, '_target_id': ObjectId(target_id), '_state': FAILED},
+        {'$set': {'_state': QUEUED, '_attempts': 0, '_posthoc': posthoc, '_run_at': _utcnow()}},
+    )
+    if restarted.matched_count:
+        _wakeup.set()
+        return
+    try:
+        jobs.update_one(
+            {'_target_type': target_type, '_target_id': ObjectId(target_id)},
+            {'$setOnInsert': {'_state': QUEUED, '_attempts': 0, '_posthoc': posthoc,
+                              '_run_at': _utcnow(), '_created_at': _utcnow()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # Queued concurrently by recovery
+    _wakeup.set()
+
+
+def claim_job(now: datetime = None) -> ModerationJob | None:
+    """Take the oldest ready job (or one whose lease expired) and lease it to the caller."""
+    now = now or _utcnow()
+    doc = ModerationJob._get_collection().find_one_and_update(
+        {'_state': {'$in': [QUEUED, RUNNING]}, '_run_at': {'$lte': now}},
+        {
+            '$set': {'_state': RUNNING, '_run_at': now + timedelta(seconds=LEASE_SECONDS)},
+            '$inc': {'_attempts': 1},
+        },
+        sort=[('_run_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return ModerationJob._from_son(doc) if doc else None
+
+
+def moderate(target_type: str, target) -> tuple:
+    """
+    The default moderator: the same checks the synchronous views run, except
+    that an unreachable moderation API raises instead of failing open, so the
+    job is retried.
+
+    Returns:
+        tuple: (is_safe: bool, error_message: str or None)
+    """
+    from core.moderation import verificar_post_estrito, verificar_thread_estrito
+
+    if target_type == 'thread':
+        return verificar_thread_estrito(target._title, target._description)
+    return verificar_post_estrito(target._content)
+
+
+def _decide(target_type: str, target, is_safe: bool, message: str = None) -> None:
+    """Publish or reject pending content; content already decided or deleted is left alone."""
+    model = _TARGETS[target_type]
+    status = PUBLISHED if is_safe else REJECTED
+    changes = {'_status': status, '_updated_at': get_brasilia_now()}
+    if not is_safe:
+        changes['_moderation_message'] = message
+    result = model._get_collection().update_one(
+        {'_id': target.id, '_status': PENDING_MODERATION}, {'$set': changes}
+    )
+    if result.modified_count != 1 or not is_safe:
+        return
+
+    if target_type == 'thread':
+        from api.search.indexing import index_thread
+
+        target.reload()
+        index_thread(target)
+    elif not Thread.add_to_post_count(target.thread_id, 1):
+        target.delete()  # The thread was deleted while the post waited
+
+
+def _take_down(target_type: str, target, message: str) -> None:
+    """Reject published content that failed a post-hoc check; content already hidden or deleted is left alone."""
+    model = _TARGETS[target_type]
+    result = model._get_collection().update_one(
+        {'_id': target.id, '_status': {'$nin': HIDDEN_STATUSES}},
+        {'$set': {'_status': REJECTED, '_moderation_message': message, '_updated_at': get_brasilia_now()}},
+    )
+    if result.modified_count != 1:
+        return
+
+    from api.threads.moderation_policy import moderation_policy
+
+    moderation_policy.forget(target.author_id)
+    if target_type == 'thread':
+        from api.search.indexing import unindex_thread
+
+        unindex_thread(target)
+    else:
+        Thread.add_to_post_count(target.thread_id, -1)
+
+
+def resubmit(target_type: str, target, verified: bool) -> str:
+    """
+    Send rejected content its author edited back to moderation. An edit the
+    request already checked with the full moderator (`verified`) is published
+    right away; one that only passed the local pre-filter waits for a job.
+    Content that is not rejected is left alone.
+
+    Returns:
+        str: the content's status afterwards
+    """
+    model = _TARGETS[target_type]
+    result = model._get_collection().update_one(
+        {'_id': target.id, '_status': REJECTED},
+        {'$set': {'_status': PENDING_MODERATION, '_updated_at': get_brasilia_now()},
+         '$unset': {'_moderation_message': ''}},
+    )
+    if result.modified_count != 1:
+        return target.status
+    if not verified:
+        enqueue(target_type, target.id)
+        return PENDING_MODERATION
+    _decide(target_type, target, True)
+    return PUBLISHED
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay + random.uniform(0, RETRY_BASE_SECONDS)
+
+
+def process_job(job: ModerationJob, moderator=None) -> None:
+    """Moderate one claimed job, then delete it, retry it later or give up on it."""
+    moderator = moderator or moderate
+    jobs = ModerationJob._get_collection()
+    model = _TARGETS[job._target_type]
+    target = None
+    try:
+        if job._posthoc:
+            target = model.objects(id=job._target_id, _status__nin=HIDDEN_STATUSES).first()
+            if target is not None:
+                is_safe, message = moderator(job._target_type, target)
+                if not is_safe:
+                    _take_down(job._target_type, target, message)
+        else:
+            target = model.objects(id=job._target_id, _status=PENDING_MODERATION).first()
+            if target is not None:
+                is_safe, message = moderator(job._target_type, target)
+                _decide(job._target_type, target, is_safe, message)
+        jobs.delete_one({'_id': job.id})
+    except Exception as e:
+        print(f"Error moderating {job._target_type} {job._target_id} (attempt {job._attempts}): {e}")
+        traceback.print_exc()
+        if job._attempts >= MAX_ATTEMPTS:
+            if target is not None and not job._posthoc:
+                _decide(job._target_type, target, True)  # Fail open, as synchronous moderation does
+            jobs.update_one({'_id': job.id}, {'$set': {'_state': FAILED, '_last_error': str(e)}})
+        else:
+            retry_at = _utcnow() + timedelta(seconds=_backoff(job._attempts))
+            jobs.update_one(
+                {'_id': job.id},
+                {'$set': {'_state': QUEUED, '_run_at': retry_at, '_last_error': str(e)}},
+            )
+
+
+def process_next(moderator=None, now: datetime = None) -> bool:
+    """Claim and process one job; returns False when none is ready."""
+    job = claim_job(now)
+    if job is None:
+        return False
+    process_job(job, moderator)
+    return True
+
+
+def drain_moderation_queue(moderator=None, now: datetime = None) -> int:
+    """
+    Process every ready job in the calling thread, for tests and scripts.
+
+    `moderator(target_type, target) -> (is_safe, message)` replaces the
+    remote checks. Pass a later `now` to also run jobs waiting on a retry
+    backoff or held by an expired lease.
+
+    Returns:
+        int: number of jobs processed
+    """
+    processed = 0
+    while process_next(moderator, now):
+        processed += 1
+    return processed
+
+
+def recover_pending() -> int:
+    """
+    Queue pending content that has no job, e.g. when a process died between
+    saving it and enqueueing it, or whose job gave up without deciding it.
+
+    Returns:
+        int: number of jobs queued
+    """
+    jobs = ModerationJob._get_collection()
+    queued = 0
+    for target_type, model in _TARGETS.items():
+        for doc in model._get_collection().find({'_status': PENDING_MODERATION}, {'_id': 1}):
+            live = {'_target_type': target_type, '_target_id': doc['_id'], '_state': {'$ne': FAILED}}
+            if jobs.count_documents(live, limit=1):
+                continue
+            enqueue(target_type, doc['_id'])
+            queued += 1
+    return queued
+
+
+def _work_forever(recovers: bool):
+    last_recovery = None
+    while True:
+        try:
+            if recovers and (last_recovery is None or time.monotonic() - last_recovery >= RECOVERY_INTERVAL_SECONDS):
+                recover_pending()
+                last_recovery = time.monotonic()
+            if not process_next():
+                _wakeup.wait(POLL_INTERVAL_SECONDS)
+                _wakeup.clear()
+        except Exception as e:
+            print(f"Error in moderation worker: {e}")
+            traceback.print_exc()
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def start_moderation_workers() -> bool:
+    """
+    Start this process's moderation threads. Does nothing unless
+    ASYNC_MODERATION=1 or MODERATION_POLICY=1 (post-hoc checks).
+
+    Returns:
+        bool: whether the workers are running
+    """
+    from api.threads.moderation_policy import MODERATION_POLICY
+
+    if not (ASYNC_MODERATION or MODERATION_POLICY):
+        return False
+    _workers[:] = [worker for worker in _workers if worker.is_alive()]
+    for i in range(len(_workers), MODERATION_WORKERS):
+        worker = threading.Thread(
+            target=_work_forever, args=(i == 0,), name=f"moderation-worker-{i}", daemon=True
+        )
+        worker.start()
+        _workers.append(worker)
+    return True
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from bson import ObjectId
+from mongoengine import DateTimeField, DictField, Document, IntField, StringField
+from pymongo.errors import DuplicateKeyError
+
+from api.reports.models import Report
+from api.threads.models import HIDDEN_STATUSES, Post, Thread
+from core import moderation
+from core.moderation_cache import VERDICT_VERSION
+from core.moderation_client import CLOSED, ModerationError, ModerationUnavailable
+from core.utils import get_brasilia_now
+
+# Bulk moderation rescan
+#
+# Re-checks every published thread and post, e.g. after the prompt or the
+# moderation policy changed. Documents are streamed from a cursor in `_id`
+# order and packed into batch prompts (`verificar_lote_async`), `concurrency`
+# batches at a time, at most `rate` batch calls per second. After each page
+# the last `_id` and the counters are saved in `moderation_rescans`, so an
+# interrupted run resumes where it stopped. Flagged content gets a pending
+# report with source "moderation" in the `reports` collection.
+#
+# Documents whose batch kept failing, or that the model left out of its
+# reply, are recorded in the checkpoint and checked again, one per prompt, at
+# the start of the next run; the rescan only finishes once none are left. A
+# document that failed in MAX_TEXT_ATTEMPTS runs is given up on: it gets an
+# "other" report for a human to look at and is counted as skipped. If a whole
+# page fails while the circuit breaker is open (the API is down), the run
+# stops there without moving the checkpoint, and failures while the API is
+# down do not count as attempts.
+
+RESCAN_BATCH_SIZE = 20
+RESCAN_CONCURRENCY = 4
+RESCAN_RATE = 2.0  # Batch calls per second
+MAX_BATCH_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 2.0
+MAX_TEXT_ATTEMPTS = 3  # Runs that may fail to check a document before it is given up on
+GIVE_UP_MESSAGE = "Revisão em massa: não foi possível verificar este conteúdo automaticamente"
+
+_TARGETS = (('thread', Thread), ('post', Post))
+_PROJECTIONS = {'thread': {'_title': 1, '_description': 1}, 'post': {'_content': 1}}
+
+# Report type for each word that may show up in the model's category
+_REPORT_TYPES = (
+    ('sexual', 'sexual'), ('sex', 'sexual'),
+    ('violên', 'violence'), ('violen', 'violence'), ('ameaça', 'violence'), ('threat', 'violence'),
+    ('discrimina', 'discrimination'), ('racis', 'discrimination'), ('ódio', 'discrimination'),
+    ('hate', 'discrimination'),
+    ('golpe', 'scam'), ('fraude', 'scam'), ('scam', 'scam'),
+    ('suicíd', 'self_harm'), ('mutila', 'self_harm'), ('self', 'self_harm'),
+    ('spam', 'spam'),
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RescanCheckpoint(Document):
+    """Progress of one rescan run"""
+    _name = StringField(primary_key=True)
+    # Collection name -> last `_id` checked
+    _positions = DictField()
+    # Collection name -> {`_id` as a string: runs that failed to check it}
+    _failed = DictField()
+    _scanned = IntField(default=0)
+    _flagged = IntField(default=0)
+    _errors = IntField(default=0)  # Documents in `_failed`
+    _skipped = IntField(default=0)  # Documents given up on after MAX_TEXT_ATTEMPTS
+    _started_at = DateTimeField(default=_utcnow)
+    _updated_at = DateTimeField(default=_utcnow)
+    _finished_at = DateTimeField()
+
+    meta = {'collection': 'moderation_rescans'}
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.pk,
+            'scanned': self._scanned,
+            'flagged': self._flagged,
+            'errors': self._errors,
+            'skipped': self._skipped,
+            'finished': self._finished_at is not None,
+        }
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart, across every task that shares it."""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def report_type_for(category: str | None) -> str:
+    """Map the model's free-text category to a `Report` type ('other' when nothing matches)."""
+    category = (category or '').lower()
+    for word, report_type in _REPORT_TYPES:
+        if word in category:
+            return report_type
+    return 'other'
+
+
+def _failed_attempts(checkpoint: RescanCheckpoint, collection_name: str) -> dict:
+    """`_failed` of one collection as {`_id` string: attempts}; checkpoints saved as a plain id list count one each"""
+    failed = checkpoint._failed.get(collection_name) or {}
+    if isinstance(failed, list):
+        return {str(_id): 1 for _id in failed}
+    return dict(failed)
+
+
+def _text(target_type: str, doc: dict) -> str:
+    if target_type == 'thread':
+        return f"{doc.get('_title') or ''}\n\n{doc.get('_description') or ''}".strip()
+    return doc.get('_content') or ''
+
+
+def _report(target_type: str, content_id: str, verdict: tuple) -> bool:
+    """File a pending moderation report, unless this content already has one. Returns whether it was new."""
+    _, flagged, message = verdict
+    try:
+        result = Report._get_collection().update_one(
+            {'_content_type': target_type, '_content_id': content_id, '_source': 'moderation'},
+            {'$setOnInsert': {
+                '_report_type': report_type_for((flagged or {}).get('category')),
+                '_description': (message or '')[:500],
+                '_status': 'pending',
+                '_created_at': get_brasilia_now(),
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False  # Filed concurrently by another run (unique index on the key)
+    return result.upserted_id is not None
+
+
+async def _check_batch(items: list, limiter: RateLimiter) -> dict:
+    """Moderate one batch, retrying failed calls; returns {} if every attempt failed."""
+    for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+        await limiter.wait()
+        try:
+            return await moderation.verificar_lote_async(items)
+        except (ModerationError, ModerationUnavailable, json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"Rescan batch of {len(items)} failed (attempt {attempt}/{MAX_BATCH_ATTEMPTS}): {e}")
+            if attempt < MAX_BATCH_ATTEMPTS:
+                await asyncio.sleep(RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return {}
+
+
+async def _check_page(batches: list, limiter: RateLimiter) -> list:
+    return await asyncio.gather(*(_check_batch(batch, limiter) for batch in batches))
+
+
+def _moderate(target_type: str, page: list, batch_size: int, limiter: RateLimiter) -> tuple:
+    """
+    Moderate a page of documents and report the flagged ones.
+
+    Returns:
+        tuple: (`_id`s left unchecked, number flagged, number of new reports)
+    """
+    items = [(str(doc['_id']), _text(target_type, doc)) for doc in page]
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    verdicts = {}
+    for result in moderation.moderation_client.run(_check_page(batches, limiter)):
+        verdicts.update(result)
+
+    flagged = reports = 0
+    for content_id, _ in items:
+        verdict = verdicts.get(content_id)
+        if verdict is not None and not verdict[0]:
+            flagged += 1
+            reports += _report(target_type, content_id, verdict)
+    failed = [doc['_id'] for doc in page if str(doc['_id']) not in verdicts]
+    return failed, flagged, reports
+
+
+def rescan_content(name: str = None, batch_size: int = RESCAN_BATCH_SIZE,
+                   concurrency: int = RESCAN_CONCURRENCY, rate: float = RESCAN_RATE,
+                   limit: int = None, restart: bool = False) -> dict:
+    """
+    Re-moderate published threads and posts, resuming the checkpoint `name`.
+
+    The default name is tied to `VERDICT_VERSION`, so bumping the version
+    after a prompt change starts a fresh rescan. Documents whose batch kept
+    failing, or that the model left out of its reply, are counted in
+    `errors` and retried first by the next call; after MAX_TEXT_ATTEMPTS
+    calls they are reported for review and counted in `skipped`. `limit`
+    only counts new documents.
+
+    Args:
+        limit: stop after this many documents (the next call resumes)
+        restart: discard the checkpoint and start over
+
+    Returns:
+        dict: name, scanned, flagged, errors, skipped, finished and reports (new reports in this call)
+    """
+    name = name or f"verdict-v{VERDICT_VERSION}"
+    if restart:
+        RescanCheckpoint.objects(pk=name).delete()
+    checkpoint = RescanCheckpoint.objects(pk=name).first() or RescanCheckpoint(_name=name)
+    if checkpoint._finished_at is not None:
+        return dict(checkpoint.to_dict(), reports=0)
+
+    limiter = RateLimiter(rate)
+    page_size = batch_size * concurrency
+    remaining = limit
+    reports = 0
+    stalled = False
+    for target_type, model in _TARGETS:
+        collection = model._get_collection()
+        projection = _PROJECTIONS[target_type]
+
+        # What failed last time goes first, one text per prompt so a text that
+        # breaks the batch does not fail the others again; content hidden or
+        # deleted since is dropped
+        retry = _failed_attempts(checkpoint, collection.name)
+        if retry:
+            docs = list(collection.find({'_id': {'$in': [ObjectId(_id) for _id in retry]},
+                                         '_status': {'$nin': HIDDEN_STATUSES}}, projection).sort('_id', 1))
+            still_failed = {}
+            for i in range(0, len(docs), page_size):
+                page = docs[i:i + page_size]
+                failed, flagged, new_reports = _moderate(target_type, page, 1, limiter)
+                api_down = len(failed) == len(page) and moderation.moderation_client.breaker.state != CLOSED
+                for _id in failed:
+                    attempts = retry[str(_id)] + (0 if api_down else 1)
+                    if attempts < MAX_TEXT_ATTEMPTS:
+                        still_failed[str(_id)] = attempts
+                    else:
+                        # Give up, but leave it for a human rather than drop it silently
+                        checkpoint._skipped += 1
+                        new_reports += _report(target_type, str(_id), (False, None, GIVE_UP_MESSAGE))
+                checkpoint._flagged += flagged
+                reports += new_reports
+            checkpoint._failed[collection.name] = still_failed
+            checkpoint._updated_at = _utcnow()
+            checkpoint.save()
+
+        query = {'_status': {'$nin': HIDDEN_STATUSES}}
+        last_id = checkpoint._positions.get(collection.name)
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        cursor = collection.find(query, projection).sort('_id', 1).batch_size(page_size)
+
+        while remaining is None or remaining > 0:
+            page = list(islice(cursor, page_size if remaining is None else min(page_size, remaining)))
+            if not page:
+                break
+            failed, flagged, new_reports = _moderate(target_type, page, batch_size, limiter)
+            if len(failed) == len(page) and moderation.moderation_client.breaker.state != CLOSED:
+                # The API is down: stop here and check this page again next time
+                stalled = True
+                break
+
+            checkpoint._positions[collection.name] = page[-1]['_id']
+            checkpoint._failed[collection.name] = dict(_failed_attempts(checkpoint, collection.name),
+                                                       **{str(_id): 1 for _id in failed})
+            checkpoint._scanned += len(page)
+            checkpoint._flagged += flagged
+            reports += new_reports
+            checkpoint._updated_at = _utcnow()
+            checkpoint.save()
+            if remaining is not None:
+                remaining -= len(page)
+        cursor.close()
+
+        if stalled or remaining == 0:
+            break
+
+    checkpoint._errors = sum(len(ids) for ids in checkpoint._failed.values())
+    if not stalled and remaining != 0 and not checkpoint._errors:
+        checkpoint._finished_at = _utcnow()
+    checkpoint._updated_at = _utcnow()
+    checkpoint.save()
+
+    return dict(checkpoint.to_dict(), reports=reports)
@@ -18,6 +18,8 @@ def list_threads():
     - semester (int): Filter by semester (1-10)
     - courses (list): Filter by course IDs (can be multiple)
     - subjects (list): Filter by subject names (can be multiple)
+    - limit (int): Page size (default 20, max 100)
+    - cursor (str): Opaque cursor from a previous page's next_cursor
     """
     current_user = get_jwt_identity()
     return vi.list_threads(current_user)
@@ -1,16 +1,31 @@
 from flask import request, jsonify
-from api.threads.models import Thread, Post
+from api.threads.models import Thread, Post, THREAD_SORT_KEYS, PENDING_MODERATION, PUBLISHED, REJECTED, SelfVoteError, get_vote_loader, visible_to
+from api.threads import moderation_queue
+from api.threads.moderation_policy import POSTHOC, SKIP, SYNC, moderation_policy
+from api.moderation.tokens import verdict_matches
+from api.threads.cascade import delete_thread_cascade, delete_post_cascade
 from api.authentication.models import User
+from api.authentication.loaders import get_user_loader
 from mongoengine.errors import DoesNotExist, ValidationError
 from core.types import api_response
 from core.utils import success_response, error_response, validation_error_response
 from typing import Literal
 from bson import ObjectId
-from core.moderation import verificar_thread, verificar_post
+from core.moderation import verificar_thread, verificar_post, verificar_thread_local, verificar_post_local
+from core.pagination import InvalidCursor, paginate, parse_limit
+from api.search.facets import thread_facet_values
+from api.search.indexing import index_thread, unindex_thread, update_thread_score
 
 # THREADS views
+def _moderation_decision(data: dict, current_user: str, kind: str, *fields) -> str:
+    """SYNC, POSTHOC or SKIP; SKIP when the request carries a precheck token for exactly these fields"""
+    if verdict_matches(data.get('moderation_token'), current_user, kind, *fields):
+        return SKIP
+    return moderation_policy.decide(current_user)
+
+
 def list_threads(current_user: str) -> api_response:
-    """List all threads with optional filters"""
+    """List threads with optional filters, one keyset-paginated page at a time"""
     try:
         from flask import request
         
@@ -18,6 +33,10 @@ def list_threads(current_user: str) -> api_response:
         semester = request.args.get('semester', type=int)
         courses = request.args.getlist('courses')
         subjects = request.args.getlist('subjects')
+
+        # Get pagination parameters
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
         
         # Build query
         filters = {}
@@ -31,16 +50,21 @@ def list_threads(current_user: str) -> api_response:
         if subjects:
             filters['subjects__in'] = subjects
         
-        # Apply filters
-        if filters:
-            threads = Thread.objects(**filters)
-        else:
-            threads = Thread.objects()
+        # Apply filters and fetch the requested page
+        queryset = Thread.objects(visible_to(current_user), **filters)
+        threads, next_cursor = paginate(queryset, THREAD_SORT_KEYS, limit, cursor)
+        get_user_loader().prime(tr.author_id for tr in threads)
+        get_vote_loader(current_user).prime('thread', [tr.id for tr in threads])
        
-        data = {'threads': [tr.to_dict(user_id=current_user) for tr in threads]}
+        data = {
+            'threads': [tr.to_dict(user_id=current_user) for tr in threads],
+            'next_cursor': next_cursor,
+        }
         
         return success_response(data=data, status_code=200)
     
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
     except Exception as e:
         import traceback
         print(f"Error in list_threads: {e}")
@@ -50,8 +74,10 @@ def list_threads(current_user: str) -> api_response:
 def get_thread_by_id(thread_id: str, current_user: str) -> api_response:
     """Get a specific thread by ID along with its posts"""
     try:
-        thread = Thread.objects.get(id=thread_id)
-        posts = Post.objects(_thread=thread)
+        thread = Thread.objects(visible_to(current_user)).get(id=thread_id)
+        posts = list(Post.objects(visible_to(current_user), _thread=thread))
+        get_user_loader().prime([thread.author_id, *(p.author_id for p in posts)])
+        get_vote_loader(current_user).prime('thread', [thread.id]).prime('post', [p.id for p in posts])
         data = thread.to_dict(user_id=current_user)
         data['posts'] = [p.to_dict(user_id=current_user) for p in posts]
         return success_response(data=data, status_code=200)
@@ -89,10 +115,14 @@ def create_thread(data: dict, current_user: str) -> api_response:
     except (ValueError, IndexError):
         return error_response('Semester must be a valid number', 400)
 
-    # Verificar moderação de conteúdo
-    is_safe, moderation_message = verificar_thread(title, description)
-    if not is_safe:
-        return error_response(moderation_message, 400)
+    # Verificar moderação de conteúdo (ou deixar para a fila, conforme o token de pré-verificação e a reputação do autor)
+    decision = _moderation_decision(data, current_user, 'thread', title, description)
+    pending = decision == SYNC and moderation_queue.ASYNC_MODERATION
+    if not pending:
+        check = verificar_thread if decision == SYNC else verificar_thread_local
+        is_safe, moderation_message = check(title, description)
+        if not is_safe:
+            return error_response(moderation_message, 400)
     
     try:
         thread = Thread(
@@ -101,9 +131,16 @@ def create_thread(data: dict, current_user: str) -> api_response:
             _description=description,
             semester=semester,
             courses=courses,
-            subjects=subjects
+            subjects=subjects,
+            _status=PENDING_MODERATION if pending else None
         )
         thread.save()
+        if pending:
+            moderation_queue.enqueue('thread', thread.id)
+            return success_response(data=thread.to_dict(user_id=current_user), message="Thread submitted for moderation", status_code=202)
+        index_thread(thread)
+        if decision == POSTHOC:
+            moderation_queue.enqueue('thread', thread.id, posthoc=True)
         return success_response(data=thread.to_dict(user_id=current_user), message="Thread created successfully", status_code=201)
     except ValidationError as e:
         return error_response(str(e), 400)
@@ -119,17 +156,30 @@ def update_thread_by_id(thread_id: str, data: dict, current_user: str) -> api_re
         title_to_check = data.get('title', '').strip() if 'title' in data else None
         description_to_check = data.get('description', '').strip() if 'description' in data else None
         
-        if title_to_check or description_to_check:
-            is_safe, moderation_message = verificar_thread(
+        decision = SYNC
+        edited = bool(title_to_check or description_to_check)
+        if edited:
+            fields = (
                 title_to_check or thread._title,
                 description_to_check if 'description' in data else thread._description
             )
+            decision = _moderation_decision(data, current_user, 'thread', *fields)
+            check = verificar_thread if decision == SYNC else verificar_thread_local
+            is_safe, moderation_message = check(*fields)
             if not is_safe:
                 return error_response(moderation_message, 400)
         
         # Update fields if provided
-        
+        previous = thread_facet_values(thread)
         thread.update(data)
+        if thread.status == REJECTED and edited:
+            # Back through moderation; published now only if the full check ran above
+            if moderation_queue.resubmit('thread', thread, verified=decision != POSTHOC) == PENDING_MODERATION:
+                return success_response(message="Thread submitted for moderation", status_code=202)
+        elif thread.status == PUBLISHED:
+            index_thread(thread, previous)
+            if decision == POSTHOC:
+                moderation_queue.enqueue('thread', thread.id, posthoc=True)
         
         return success_response(message="Thread updated successfully", status_code=201)
     except DoesNotExist:
@@ -143,16 +193,15 @@ def update_thread_by_id(thread_id: str, data: dict, current_user: str) -> api_re
 def delete_thread_by_id(thread_id: str, current_user: str) -> api_response:
     """Delete a thread and all its associated posts"""
     try:
-        thread = Thread.objects.get(id=thread_id)
+        thread = Thread.objects.only('_author', 'semester', 'courses', 'subjects', '_status').get(id=thread_id)
         
-        if str(thread.author.id) != current_user:
+        if str(thread.author_id) != current_user:
             return error_response('Only the thread owner can delete the thread', 403)
         
-        # Delete associated posts
-        Post.objects(_thread=thread)
-        for post in Post.objects(_thread=thread):
-            post.delete()
-        thread.delete()
+        # Delete the thread with its posts, reports and votes
+        delete_thread_cascade(thread.id)
+        if thread.status == PUBLISHED:
+            unindex_thread(thread)
 
         return success_response(message='Thread and associated posts deleted successfully', status_code=200)
     except DoesNotExist:
@@ -166,7 +215,7 @@ def delete_thread_by_id(thread_id: str, current_user: str) -> api_response:
 def get_post_by_id(post_id: str, current_user: str) -> api_response:
     """Get a specific post by ID"""
     try:
-        post = Post.objects.get(id=post_id)
+        post = Post.objects(visible_to(current_user)).get(id=post_id)
         return success_response(data=post.to_dict(user_id=current_user), status_code=200)
     except DoesNotExist:
         return error_response('Post not found', 404)
@@ -179,14 +228,32 @@ def create_post(thread_id: str, data: dict, current_user: str) -> api_response:
         content = data.get('content')
         if not content:
             return error_response('Content is required', 400)
-
-        # Verificar moderação do conteúdo
-        is_safe, moderation_message = verificar_post(content)
+        # A thread hidden from the caller (pending or rejected) takes no replies from them
+        if not Thread.objects(visible_to(current_user), id=thread_id).only('id').first():
+            raise DoesNotExist()
+
+        decision = _moderation_decision(data, current_user, 'post', content)
+        if decision == SYNC and moderation_queue.ASYNC_MODERATION:
+            # Counted on the thread once the moderation queue publishes it
+            post = Post(_thread=ObjectId(thread_id), _author=ObjectId(current_user), _content=content,
+                        _status=PENDING_MODERATION)
+            post.save()
+            moderation_queue.enqueue('post', post.id)
+            return success_response(data=post.to_dict(user_id=current_user), message="Post submitted for moderation", status_code=202)
+
+        # Verificar moderação do conteúdo (autores confiáveis: só o pré-filtro local agora)
+        check = verificar_post if decision == SYNC else verificar_post_local
+        is_safe, moderation_message = check(content)
         if not is_safe:
             return error_response(moderation_message, 400)
 
         post = Post(_thread=ObjectId(thread_id), _author=ObjectId(current_user), _content=content)
         post.save()
+        if not Thread.add_to_post_count(thread_id, 1):
+            post.delete()
+            raise DoesNotExist()
+        if decision == POSTHOC:
+            moderation_queue.enqueue('post', post.id, posthoc=True)
         return success_response(data=post.to_dict(user_id=current_user), message="Post created successfully", status_code=201)
     except DoesNotExist:
         return error_response('Thread not found', 404)
@@ -199,18 +266,29 @@ def update_post_by_id(post_id: str, data: dict, current_user: str) -> api_respon
     """Update a post's content or author"""
     try:
         post = Post.objects.get(id=post_id)
-        if str(post.author.id) != current_user:
+        if str(post.author_id) != current_user:
             return error_response('You do not have permission to update this post', 403)
 
         # Verificar moderação do conteúdo se estiver sendo atualizado
+        decision = SYNC
+        edited = False
         if 'content' in data:
             content_to_check = data.get('content', '').strip()
+            edited = bool(content_to_check)
             if content_to_check:
-                is_safe, moderation_message = verificar_post(content_to_check)
+                decision = _moderation_decision(data, current_user, 'post', content_to_check)
+                check = verificar_post if decision == SYNC else verificar_post_local
+                is_safe, moderation_message = check(content_to_check)
                 if not is_safe:
                     return error_response(moderation_message, 400)
         
         post.update_content(data['content'])
+        if post.status == REJECTED and edited:
+            # Back through moderation; published now only if the full check ran above
+            if moderation_queue.resubmit('post', post, verified=decision != POSTHOC) == PENDING_MODERATION:
+                return success_response(message="Post submitted for moderation", status_code=202)
+        elif decision == POSTHOC and post.status == PUBLISHED:
+            moderation_queue.enqueue('post', post.id, posthoc=True)
 
         return success_response(message="Post updated successfully", status_code=201)
     except DoesNotExist:
@@ -222,10 +300,10 @@ def update_post_by_id(post_id: str, data: dict, current_user: str) -> api_respon
 def delete_post_by_id(post_id: str, current_user: str) -> api_response:
     """Delete a specific post"""
     try:
-        post = Post.objects.get(id=post_id)
-        if str(post.author.id) != current_user:
+        post = Post.objects.only('_author').get(id=post_id)
+        if str(post.author_id) != current_user:
             return error_response('You do not have permission to delete this post', 403)
-        post.delete()
+        delete_post_cascade(post.id)
         return success_response(message='Post deleted successfully', status_code=200)
     except DoesNotExist:
         return error_response('Post not found', 404)
@@ -240,22 +318,26 @@ def upvote_by_id(obj_id: str, current_user: str, obj_type: Literal["threads","po
     """Upvote a specific post (one vote per user)"""
     try:
         if obj_type == "posts":
-            obj = Post.objects.get(id=obj_id)
+            model = Post
         elif obj_type == "threads":
-            obj = Thread.objects.get(id=obj_id)
+            model = Thread
         else:
             return error_response('Object not found', 404)
         
         # Upvote logic
-        obj.upvote(current_user)
+        score = model.upvote(obj_id, current_user)
+        if model is Thread:
+            update_thread_score(ObjectId(obj_id), score)
 
         return success_response(
-            data={'score': obj.score},
+            data={'score': score},
             message =f'{obj_type} upvoted successfully',
             status_code=201
         )
     except DoesNotExist:
         return error_response(f'{obj_type} not found', 404)
+    except SelfVoteError:
+        return error_response(f'Cannot vote on your own {obj_type[:-1]}', 403)
     except Exception as e:
         return error_response('Invalid obj ID or voting failed', 400)
 
@@ -265,22 +347,26 @@ def downvote_by_id(obj_id: str, current_user: str, obj_type: Literal["thread","p
     """Downvote a specific post (one vote per user)"""
     try:
         if obj_type == "posts":
-            obj = Post.objects.get(id=obj_id)
+            model = Post
         elif obj_type == "threads":
-            obj = Thread.objects.get(id=obj_id)
+            model = Thread
         else:
             return error_response('Object not found', 404)
 
         # Donwvote logic
-        obj.downvote(current_user)
+        score = model.downvote(obj_id, current_user)
+        if model is Thread:
+            update_thread_score(ObjectId(obj_id), score)
         
         return success_response(
-            data={'score': obj.score},
+            data={'score': score},
             message=f'{obj_type} downvoted successfully',
             status_code=201
         )
     except DoesNotExist:
         return error_response(f'{obj_type} not found', 404)
+    except SelfVoteError:
+        return error_response(f'Cannot vote on your own {obj_type[:-1]}', 403)
     except Exception as e:
         return error_response('Invalid obj ID or voting failed', 400)
 
@@ -297,7 +383,7 @@ def pin_post_by_id(post_id: str, current_user: str) -> api_response:
         thread = post.thread
         
         # Check if current user is the thread owner
-        if str(thread.author.id) != current_user:
+        if str(thread.author_id) != current_user:
             return error_response('Only the thread owner can pin posts', 403)
         
         # Pin the post
@@ -320,7 +406,7 @@ def unpin_post_by_id(post_id: str, current_user: str) -> api_response:
         thread = post.get_thread()
         
         # Check if current user is the thread owner
-        if str(thread.author.id) != current_user:
+        if str(thread.author_id) != current_user:
             return error_response('Only the thread owner can unpin posts', 403)
         
         # Unpin the post
@@ -0,0 +1,98 @@
+"""
+Benchmark: throughput of the local moderation classifier (core/moderation_classifier.py).
+
+Trains the hashed bag-of-words logistic regression on synthetic forum texts
+(course questions, plus spam sentences as the blocked class), saves the
+weights to a temporary .npy and opens them memory-mapped, as the workers do.
+Everything runs in one thread, so the rates are per core. Reports the
+training time and held-out accuracy, the p50/p99 latency of scoring one text
+(the fallback and gate path), and texts per second when scoring in batches.
+
+Usage:
+    python benchmarks/bench_classifier.py [--texts 20000] [--batch 256]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import moderation_classifier  # noqa: E402
+from core.moderation_classifier import LocalClassifier, salvar_pesos, treinar  # noqa: E402
+
+WORDS = (
+    "alguém pode me ajudar com a lista de exercícios cálculo não entendi questão sobre limites "
+    "laterais continuidade valeu obrigado prova projeto python função classe recursão banco dados "
+    "professor monitoria entrega prazo dúvida exemplo resposta código erro teste"
+).split()
+SPAM = (
+    "compre seguidores baratos curtidas grátis clique no link da bio ganhe dinheiro rápido "
+    "promoção imperdível pix premiado"
+).split()
+
+
+def make_texts(rng: random.Random, n: int) -> tuple[list[str], list[bool]]:
+    texts, blocked = [], []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.choice([4, 8, 20, 40, 80]))]
+        spam = rng.random() < 0.1
+        if spam:
+            for _ in range(rng.randint(2, 5)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(SPAM))
+        texts.append(" ".join(words).capitalize() + "?")
+        blocked.append(spam)
+    return texts, blocked
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def main():
+    if moderation_classifier.np is None:
+        sys.exit("numpy is not installed")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    train_texts, train_labels = make_texts(rng, args.texts)
+    test_texts, test_labels = make_texts(rng, args.texts // 4)
+
+    start = time.perf_counter()
+    weights = treinar(train_texts, train_labels)
+    print(f"trained on {len(train_texts)} texts in {time.perf_counter() - start:.1f} s "
+          f"({len(weights) - 1} features, {weights.nbytes / 2 ** 20:.1f} MiB)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "classifier.npy")
+        salvar_pesos(weights, path)
+        classifier = LocalClassifier()
+        classifier.load(path)
+
+        predicted = classifier.probabilidades(test_texts) >= 0.5
+        accuracy = sum(p == y for p, y in zip(predicted, test_labels)) / len(test_labels)
+        print(f"held-out accuracy {accuracy:.1%} on {len(test_texts)} texts")
+
+        samples = []
+        for text in test_texts:
+            start = time.perf_counter()
+            classifier.probabilidade(text)
+            samples.append((time.perf_counter() - start) * 1e6)
+        samples.sort()
+        print(f"one text       p50 {percentile(samples, 0.5):7.1f} us   p99 {percentile(samples, 0.99):7.1f} us   "
+              f"{len(samples) / (sum(samples) / 1e6):9.0f} texts/s")
+
+        start = time.perf_counter()
+        for i in range(0, len(test_texts), args.batch):
+            classifier.probabilidades(test_texts[i:i + args.batch])
+        elapsed = time.perf_counter() - start
+        print(f"batch of {args.batch:<5}                                {len(test_texts) / elapsed:9.0f} texts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: hedged moderation calls against a heavy-tailed endpoint (core/moderation_client.py).
+
+Starts the local fake moderation endpoint from tests/fake_moderation.py with
+a latency distribution where most replies take about 100 ms and a few
+percent take one to three seconds. It then sends the same calls through a
+ModerationClient without hedging and with hedging (p95 delay, 5% budget),
+from several threads at once like gunicorn workers would, and reports
+p50/p95/p99 per call and the share of extra calls the hedges cost.
+
+Usage:
+    python benchmarks/bench_hedging.py [--calls 400] [--threads 8] [--tail 0.04]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import moderation  # noqa: E402
+from core.moderation_client import HedgeBudget, ModerationClient  # noqa: E402
+from tests.fake_moderation import FakeModerationServer  # noqa: E402
+
+
+def heavy_tail(seed: int, tail: float):
+    rng = random.Random(seed)
+
+    def latency(call_number: int) -> float:
+        if rng.random() < tail:
+            return rng.uniform(1.0, 3.0)
+        return rng.lognormvariate(-2.3, 0.3)  # median ~100 ms
+
+    return latency
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(label: str, server: FakeModerationServer, client: ModerationClient, args) -> None:
+    server.reset()
+    server.latency = heavy_tail(args.seed, args.tail)
+
+    def call(i: int) -> float:
+        start = time.perf_counter()
+        client.run(client.post_json(
+            server.url,
+            moderation._montar_payload(f"Resposta {i}: como pensar o caso base da recursão?"),
+            timeout=moderation.MODERATION_TIMEOUT,
+        ))
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        samples = sorted(pool.map(call, range(args.calls)))
+    client.close()
+
+    stats = client.stats()
+    extra = len(server.calls) - args.calls
+    print(f"{label:<10} p50 {percentile(samples, 0.5):7.1f} ms   p95 {percentile(samples, 0.95):7.1f} ms   "
+          f"p99 {percentile(samples, 0.99):7.1f} ms   max {samples[-1]:7.1f} ms   "
+          f"extra calls {extra} ({extra / args.calls:.1%}, {stats['hedges_won']} won)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--tail", type=float, default=0.04, help="share of replies taking 1-3 s")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with FakeModerationServer() as server:
+        print(f"fake endpoint {server.url}, {args.calls} calls from {args.threads} threads, "
+              f"{args.tail:.0%} slow replies")
+        # Room for the hedges: a copy is only sent when a concurrency slot is free
+        slots = 2 * args.threads
+        run("plain", server, ModerationClient(max_concurrency=slots, hedging=False), args)
+        run("hedged", server, ModerationClient(max_concurrency=slots, hedging=True,
+                                               hedge_budget=HedgeBudget(ratio=0.05)), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: thread moderation latency, sequential vs concurrent (core/moderation.py).
+
+Starts the local fake moderation endpoint from tests/fake_moderation.py with
+a fixed reply delay and times `verificar_thread` (title and description
+checked concurrently over aiohttp) against the old flow, which checked the
+title and then the description with one blocking `requests.post` each.
+The concurrent p50 should sit near one reply delay, the sequential near two.
+
+Usage:
+    python benchmarks/bench_moderation.py [--delay 0.2] [--rounds 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import moderation  # noqa: E402
+from tests.fake_moderation import FakeModerationServer  # noqa: E402
+
+
+def sequential_thread_check(title: str, description: str):
+    """The previous verificar_thread: one blocking call per field, in order."""
+    for label, text in (("Título impróprio", title), ("Descrição imprópria", description)):
+        response = requests.post(
+            moderation.AZURE_OPENAI_ENDPOINT,
+            params={"api-version": moderation.AZURE_API_VERSION},
+            headers={"Content-Type": "application/json", "api-key": moderation.AZURE_API_KEY},
+            json=moderation._montar_payload(text),
+            timeout=moderation.MODERATION_TIMEOUT,
+        )
+        is_safe, _, message = moderation._interpretar_resposta(response.json())
+        if not is_safe:
+            return False, f"{label}: {message}"
+    return True, None
+
+
+def run(label: str, check, rounds: int):
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        check(f"Dúvida {i} sobre recursão", f"Descrição {i}: como pensar o caso base?")
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<12} p50 {statistics.median(samples):7.1f} ms   max {samples[-1]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.2, help="fake endpoint reply delay in seconds")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with FakeModerationServer(delay=args.delay) as server:
+        moderation.AZURE_OPENAI_ENDPOINT = server.url
+        print(f"fake endpoint {server.url}, reply delay {args.delay * 1000:.0f} ms, {args.rounds} rounds")
+        run("sequential", sequential_thread_check, args.rounds)
+        run("concurrent", moderation.verificar_thread, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
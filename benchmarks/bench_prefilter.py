@@ -0,0 +1,71 @@
+"""
+Benchmark: latency of the local moderation pre-filter (core/profanity.py).
+
+Checks synthetic forum texts of increasing length (short replies up to
+500-character descriptions), some with an obfuscated offensive term mixed
+in, and reports p50/p99 per check in microseconds, plus how many of the
+texts would have skipped the remote call with MODERATION_SKIP_SHORT_SAFE=1.
+
+Usage:
+    python benchmarks/bench_prefilter.py [--texts 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.profanity import ProfanityFilter  # noqa: E402
+
+WORDS = (
+    "alguém pode me ajudar com a lista de exercícios cálculo não entendi questão sobre limites "
+    "laterais continuidade valeu obrigado prova projeto python função classe recursão banco dados "
+    "professor monitoria entrega prazo dúvida exemplo resposta código erro teste"
+).split()
+OFFENSIVE = ["p0rra", "merdaaa", "c4ralh0", "f.d.p", "sh!t"]
+
+
+def make_texts(rng: random.Random, n: int) -> list[str]:
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.choice([2, 4, 8, 20, 40, 80]))]
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(OFFENSIVE))
+        texts.append(" ".join(words).capitalize() + "?")
+    return texts
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20000)
+    args = parser.parse_args()
+
+    texts = make_texts(random.Random(42), args.texts)
+    prefilter = ProfanityFilter()
+
+    by_size = {"short (<=40)": [], "medium (<=200)": [], "long (>200)": []}
+    for text in texts:
+        start = time.perf_counter()
+        prefilter.check(text, skip_short_safe=True)
+        elapsed = (time.perf_counter() - start) * 1e6
+        bucket = "short (<=40)" if len(text) <= 40 else "medium (<=200)" if len(text) <= 200 else "long (>200)"
+        by_size[bucket].append(elapsed)
+
+    for label, samples in by_size.items():
+        samples.sort()
+        if samples:
+            print(f"{label:<15} n={len(samples):<6} p50 {percentile(samples, 0.5):7.1f} us   p99 {percentile(samples, 0.99):7.1f} us")
+
+    stats = prefilter.stats()
+    print(f"blocked locally {stats['blocked']}, short texts skipped {stats['skipped_short']}, "
+          f"remote calls avoided {stats['remote_calls_avoided']}/{stats['checked']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: thread search through the in-memory BM25 index vs the old regex scan.
+
+Generates a synthetic forum of N threads (default 100k) and times a set of
+queries both ways:
+
+  regex  - what search_threads_by_title used to do: a case-insensitive regex
+           over every title, then sort the matches by `_created_at`. Mongo
+           cannot use an index for an unanchored regex, so this is a full scan;
+           it is reproduced here with `re` over the same data.
+  index  - ThreadSearchIndex.search (api/search/engine.py), first page of 20.
+
+With --mongo URI the regex query is also run against a real MongoDB holding
+the same documents (inserted into a scratch database that is dropped at the end).
+
+Usage:
+    python benchmarks/bench_search.py [--threads 100000] [--mongo mongodb://localhost:27017]
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.search.engine import ThreadSearchIndex  # noqa: E402
+
+WORDS = (
+    "como implementar autenticação jwt flask dúvida banco dados relacionais sessão cálculo "
+    "integral derivada matriz vetor álgebra linear estatística probabilidade regressão "
+    "marketing digital roi finanças contabilidade economia microeconomia python java "
+    "recursão algoritmo grafo árvore ordenação complexidade prova lista exercício projeto "
+    "entrega prazo professor monitoria aula horário sala laboratório docker deploy api"
+).split()
+
+QUERIES = ["jwt", "autenticacao", "banco de dados", "calc", "regressão linear", "docker deploy", "xyznonexistent"]
+
+
+def make_vocabulary(rng: random.Random, size: int = 30_000) -> tuple[list[str], list[float]]:
+    """The forum words plus random filler words, with Zipf-like frequencies like real text."""
+    letters = "abcdefghijlmnoprstuvç"
+    filler = {"".join(rng.choices(letters, k=rng.randint(3, 11))) for _ in range(size)}
+    words = WORDS + sorted(filler - set(WORDS))
+    rng.shuffle(words)
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+def make_threads(n: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    words, cum_weights = make_vocabulary(rng)
+    start = datetime(2025, 1, 1)
+
+    def text(k):
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=k))
+
+    return [
+        {
+            "_id": ObjectId(),
+            "_title": text(rng.randint(4, 10)).capitalize(),
+            "_description": text(rng.randint(10, 40)),
+            "semester": rng.randint(1, 10),
+            "courses": [rng.choice(["cc", "adm", "eco", "mec"])],
+            "subjects": [],
+            "_created_at": start + timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {label:<8} median {statistics.median(samples):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def regex_search(threads: list[dict], query: str) -> list[dict]:
+    pattern = re.compile(query, re.IGNORECASE)
+    hits = [t for t in threads if pattern.search(t["_title"])]
+    hits.sort(key=lambda t: t["_created_at"], reverse=True)
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo", help="MongoDB URI to also time the regex query against a real server")
+    args = parser.parse_args()
+
+    threads = make_threads(args.threads)
+
+    index = ThreadSearchIndex()
+    t0 = time.perf_counter()
+    for t in threads:
+        index.upsert(t["_id"], t["_title"], t["_description"], t["semester"], t["courses"], t["subjects"], t["_created_at"])
+    print(f"Indexed {len(index)} threads in {time.perf_counter() - t0:.1f} s")
+
+    collection = None
+    if args.mongo:
+        from pymongo import MongoClient
+        collection = MongoClient(args.mongo)["search_benchmark"]["threads"]
+        collection.drop()
+        collection.insert_many(threads)
+        collection.create_index([("_created_at", -1)])
+
+    try:
+        for query in QUERIES:
+            page, total, _ = index.search(query, limit=20)
+            print(f"\nq={query!r}: regex hits {len(regex_search(threads, query))}, index hits {total}")
+            report("regex", timed(lambda: regex_search(threads, query), args.repeat))
+            report("index", timed(lambda: index.search(query, limit=20), args.repeat))
+            if collection is not None:
+                mongo_query = {"_title": {"$regex": query, "$options": "i"}}
+                report("mongo", timed(lambda: list(collection.find(mongo_query).sort("_created_at", -1)), args.repeat))
+    finally:
+        if collection is not None:
+            collection.database.client.drop_database("search_benchmark")
+
+
+if __name__ == "__main__":
+    main()
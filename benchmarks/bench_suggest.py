@@ -0,0 +1,75 @@
+"""
+Benchmark: typeahead latency of TitleSuggestIndex (api/search/suggest.py).
+
+Indexes N synthetic threads (default 100k, same generator as bench_search.py)
+with random scores, then replays keystrokes: every prefix of one or two title
+words of randomly picked threads, with and without filters. Reports p50/p99
+per call; the target is p99 under 5 ms.
+
+Usage:
+    python benchmarks/bench_suggest.py [--threads 100000] [--queries 5000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import make_threads  # noqa: E402
+from api.search.suggest import TitleSuggestIndex  # noqa: E402
+
+
+def keystrokes(rng: random.Random, threads: list[dict], n: int) -> list[str]:
+    """Prefixes a user produces while typing the first one or two words of a title."""
+    queries = []
+    while len(queries) < n:
+        words = rng.choice(threads)["_title"].split()
+        typed = " ".join(words[:rng.choice([1, 2])])
+        queries.extend(typed[:i] for i in range(1, len(typed) + 1) if not typed[:i].endswith(" "))
+    return queries[:n]
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(label: str, index: TitleSuggestIndex, queries: list[str], **filters):
+    samples = []
+    for query in queries:
+        t0 = time.perf_counter()
+        index.suggest(query, **filters)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    print(f"  {label:<22} p50 {statistics.median(samples):6.3f} ms   p99 {percentile(samples, 0.99):6.3f} ms"
+          f"   max {samples[-1]:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    threads = make_threads(args.threads)
+
+    index = TitleSuggestIndex()
+    t0 = time.perf_counter()
+    for t in threads:
+        index.upsert(t["_id"], t["_title"], rng.randint(-5, 50), t["semester"], t["courses"], t["subjects"])
+    print(f"Indexed {len(index)} titles in {time.perf_counter() - t0:.1f} s")
+
+    queries = keystrokes(rng, threads, args.queries)
+    print(f"{len(queries)} keystrokes:")
+    run("no filters", index, queries)
+    run("semester=3", index, queries, semester_id=3)
+    run("courses=cc", index, queries, course_ids=["cc"])
+    run("semester=3, courses=cc", index, queries, semester_id=3, course_ids=["cc"])
+
+
+if __name__ == "__main__":
+    main()
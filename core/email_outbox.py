@@ -0,0 +1,413 @@
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from mongoengine import DateTimeField, DictField, Document, IntField, StringField
+from pymongo import ReturnDocument
+
+from core.email_registry import email_templates
+from core.utils import build_email, validate_email_request
+
+# Transactional email outbox
+#
+# Request handlers call queue_email(), which only inserts the message into
+# the `email_outbox` collection; the request never talks to the SMTP server.
+# A few daemon threads in every worker process claim messages with an atomic
+# update (the same lease scheme as api/threads/moderation_queue.py), render
+# them and send them over authenticated SMTP connections kept in SMTPPool,
+# so the TLS handshake and login are paid once per connection instead of
+# once per message. Sends are spaced to EMAIL_RATE_PER_SECOND per process.
+# Temporary failures (connection errors, 4xx replies, a recipient refused
+# with 4xx such as greylisting) are retried with exponential backoff;
+# permanent ones (5xx replies, a recipient refused with 5xx, a broken
+# template) and messages past MAX_ATTEMPTS are kept as `failed`.
+# Sent messages are deleted.
+#
+# Any SMTP server can stand in for Gmail, e.g. for local testing:
+#   python -m aiosmtpd -n -l localhost:8025
+#   EMAIL_SMTP_HOST=localhost EMAIL_SMTP_PORT=8025 EMAIL_SMTP_SECURITY=none EMAIL_SMTP_LOGIN=0
+
+EMAIL_SENDER = os.getenv("EMAIL_SENDER", "1") != "0"
+EMAIL_SENDER_WORKERS = int(os.getenv("EMAIL_SENDER_WORKERS", "2"))
+EMAIL_RATE_PER_SECOND = float(os.getenv("EMAIL_RATE_PER_SECOND", "5"))
+
+SMTP_HOST = os.getenv("EMAIL_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("EMAIL_SMTP_PORT", "465"))
+SMTP_SECURITY = os.getenv("EMAIL_SMTP_SECURITY", "ssl")  # ssl, starttls or none
+SMTP_LOGIN = os.getenv("EMAIL_SMTP_LOGIN", "1") != "0"
+SMTP_TIMEOUT_SECONDS = 20.0
+# Idle connections older than this are closed rather than reused; servers drop them anyway
+SMTP_IDLE_SECONDS = 60.0
+# Reconnect after this many messages on one connection (Gmail caps messages per session)
+SMTP_MESSAGES_PER_CONNECTION = 100
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 600.0
+LEASE_SECONDS = 60.0
+POLL_INTERVAL_SECONDS = 1.0
+
+QUEUED = 'queued'
+SENDING = 'sending'
+FAILED = 'failed'
+
+_workers = []
+_wakeup = threading.Event()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class OutboxEmail(Document):
+    """A templated email waiting to be sent"""
+    _to = StringField(required=True)
+    _subject = StringField(required=True)
+    _template = StringField(required=True)
+    _context = DictField()
+    _state = StringField(default=QUEUED, choices=[QUEUED, SENDING, FAILED])
+    _attempts = IntField(default=0)
+    # Queued: when the message may be sent next. Sending: when its lease expires.
+    _run_at = DateTimeField(default=_utcnow)
+    _last_error = StringField()
+    _created_at = DateTimeField(default=_utcnow)
+
+    meta = {
+        'collection': 'email_outbox',
+        'indexes': [
+            # claim_email: ready messages and expired leases, oldest first
+            ('_state', '_run_at'),
+        ]
+    }
+
+
+class PermanentEmailError(Exception):
+    """A message that retrying will not deliver"""
+
+
+class SMTPPool:
+    """
+    Authenticated SMTP connections reused across messages.
+
+    Idle connections are kept up to `size`; one that sat idle longer than
+    `idle_seconds` or already sent `max_messages` is closed instead of reused.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, security: str = SMTP_SECURITY,
+                 login: bool = SMTP_LOGIN, username: str = None, password: str = None,
+                 size: int = EMAIL_SENDER_WORKERS, idle_seconds: float = SMTP_IDLE_SECONDS,
+                 max_messages: int = SMTP_MESSAGES_PER_CONNECTION, timeout: float = SMTP_TIMEOUT_SECONDS):
+        if security not in ('ssl', 'starttls', 'none'):
+            raise ValueError(f"Unknown SMTP security '{security}'")
+        self.host = host
+        self.port = port
+        self.security = security
+        self.login = login
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = []  # [(smtp, messages sent, last used)], most recently used last
+        self._stats = {'connections': 0, 'reused': 0, 'sent': 0}
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == 'ssl':
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == 'starttls':
+                smtp.starttls(context=ssl.create_default_context())
+        try:
+            if self.login:
+                smtp.login(self.username or os.environ.get("EMAIL", "example@email.com"),
+                           self.password or os.environ.get("EMAIL_PASS", "1234567890"))
+        except Exception:
+            _close(smtp)
+            raise
+        with self._lock:
+            self._stats['connections'] += 1
+        return smtp
+
+    def _acquire(self) -> tuple:
+        """An idle connection that is still fresh, or a new one; returns (smtp, messages sent, reused)."""
+        stale = []
+        acquired = None
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                smtp, sent, last_used = self._idle.pop()
+                if now - last_used < self.idle_seconds:
+                    acquired = (smtp, sent, True)
+                    self._stats['reused'] += 1
+                    break
+                stale.append(smtp)
+        for smtp in stale:
+            _close(smtp)
+        if acquired is None:
+            acquired = (self._connect(), 0, False)
+        return acquired
+
+    def _release(self, smtp: smtplib.SMTP, sent: int):
+        with self._lock:
+            if sent < self.max_messages and len(self._idle) < self.size:
+                self._idle.append((smtp, sent, time.monotonic()))
+                return
+        _close(smtp)
+
+    def send(self, message) -> None:
+        """
+        Send a MIME message over a pooled connection.
+
+        A reused connection that the server already closed is replaced by a
+        fresh one, without counting as a failed attempt. Errors about the message itself
+        leave the connection in the pool; any other error discards it.
+        """
+        while True:
+            smtp, sent, reused = self._acquire()
+            try:
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                _close(smtp)
+                if reused:
+                    continue
+                raise
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                try:
+                    smtp.rset()
+                except smtplib.SMTPException:
+                    _close(smtp)
+                else:
+                    self._release(smtp, sent + 1)
+                raise
+            except Exception:
+                _close(smtp)
+                raise
+            with self._lock:
+                self._stats['sent'] += 1
+            self._release(smtp, sent + 1)
+            return
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for smtp, _, _ in idle:
+            _close(smtp)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        return stats
+
+
+def _close(smtp: smtplib.SMTP):
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+class RateLimiter:
+    """Spaces calls to at most `rate` per second, shared by the threads of one process."""
+
+    def __init__(self, rate: float = EMAIL_RATE_PER_SECOND):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# One pool and one rate limit per worker process
+smtp_pool = SMTPPool()
+rate_limiter = RateLimiter()
+
+
+def queue_email(to_email, subject, template_html="", context=None):
+    """
+    Store an email in the outbox to be sent in the background.
+
+    Takes the same arguments as `core.utils.send_email`; the context must be
+    storable in MongoDB.
+
+    Returns:
+        tuple: (response_data, status_code), 202 once the message is queued
+    """
+    error = validate_email_request(to_email, subject)
+    if error:
+        return error
+    if not email_templates.exists(template_html):
+        return {
+            "error": {
+                "code": "TEMPLATE_NOT_FOUND",
+                "message": "Email template not found",
+                "details": f"Could not find template file '{template_html}'",
+            }
+        }, 400
+
+    email = OutboxEmail(_to=to_email, _subject=subject, _template=template_html, _context=context or {})
+    email.save()
+    _wakeup.set()
+    return {
+        "data": {
+            "email_id": str(email.id),
+            "recipient": to_email,
+            "subject": subject,
+            "queued_at": email._created_at.isoformat(),
+            "status": QUEUED,
+        },
+        "message": "Email queued",
+    }, 202  # Accepted
+
+
+def claim_email(now: datetime = None) -> OutboxEmail | None:
+    """Take the oldest ready message (or one whose lease expired) and lease it to the caller."""
+    now = now or _utcnow()
+    doc = OutboxEmail._get_collection().find_one_and_update(
+        {'_state': {'$in': [QUEUED, SENDING]}, '_run_at': {'$lte': now}},
+        {
+            '$set': {'_state': SENDING, '_run_at': now + timedelta(seconds=LEASE_SECONDS)},
+            '$inc': {'_attempts': 1},
+        },
+        sort=[('_run_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return OutboxEmail._from_son(doc) if doc else None
+
+
+def deliver(email: OutboxEmail, pool: SMTPPool = None) -> None:
+    """
+    Render and send one message.
+
+    Raises:
+        PermanentEmailError: when retrying cannot help
+    """
+    pool = pool or smtp_pool
+    message, error = build_email(email._to, email._subject, email._template, email._context)
+    if error:
+        raise PermanentEmailError(error[0]["error"]["message"])
+    try:
+        pool.send(message)
+    except smtplib.SMTPRecipientsRefused as e:
+        # {address: (code, message)}; a 4xx (450/451/452: mailbox busy, greylisting, full) may pass later
+        codes = [code for code, _ in e.recipients.values()]
+        if codes and all(500 <= code < 600 for code in codes):
+            raise PermanentEmailError(f"Recipient refused: {e.recipients}") from e
+        raise
+    except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+        if 500 <= e.smtp_code < 600:
+            raise PermanentEmailError(f"{e.smtp_code} {e.smtp_error!r}") from e
+        raise
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay + random.uniform(0, RETRY_BASE_SECONDS)
+
+
+def process_email(email: OutboxEmail, pool: SMTPPool = None) -> bool:
+    """Send one claimed message, then delete it, retry it later or give up on it; returns whether it was sent."""
+    outbox = OutboxEmail._get_collection()
+    try:
+        deliver(email, pool)
+    except Exception as e:
+        print(f"Error sending email {email.id} to {email._to} (attempt {email._attempts}): {e}")
+        if isinstance(e, PermanentEmailError) or email._attempts >= MAX_ATTEMPTS:
+            outbox.update_one({'_id': email.id}, {'$set': {'_state': FAILED, '_last_error': str(e)}})
+        else:
+            retry_at = _utcnow() + timedelta(seconds=_backoff(email._attempts))
+            outbox.update_one(
+                {'_id': email.id},
+                {'$set': {'_state': QUEUED, '_run_at': retry_at, '_last_error': str(e)}},
+            )
+        return False
+    outbox.delete_one({'_id': email.id})
+    return True
+
+
+def process_next(pool: SMTPPool = None, now: datetime = None, limiter: RateLimiter = None) -> bool:
+    """Wait for `limiter` if given, then claim and send one message; returns False when none is ready."""
+    # Waiting before the claim keeps the rate limit out of the message's lease
+    if limiter is not None:
+        limiter.wait()
+    email = claim_email(now)
+    if email is None:
+        return False
+    process_email(email, pool)
+    return True
+
+
+def drain_outbox(pool: SMTPPool = None, now: datetime = None) -> int:
+    """
+    Send every ready message in the calling thread, for tests and scripts,
+    without the rate limit.
+
+    Pass a later `now` to also send messages waiting on a retry backoff or
+    held by an expired lease.
+
+    Returns:
+        int: number of messages processed
+    """
+    processed = 0
+    while process_next(pool, now):
+        processed += 1
+    return processed
+
+
+def outbox_stats() -> dict:
+    """Messages waiting and failed in the shared outbox, plus this process's connection counters."""
+    outbox = OutboxEmail._get_collection()
+    return {
+        'queued': outbox.count_documents({'_state': {'$in': [QUEUED, SENDING]}}),
+        'failed': outbox.count_documents({'_state': FAILED}),
+        'smtp': smtp_pool.stats(),
+        'rate_per_second': rate_limiter.rate,
+    }
+
+
+def _send_forever():
+    while True:
+        try:
+            if not process_next(limiter=rate_limiter):
+                _wakeup.wait(POLL_INTERVAL_SECONDS)
+                _wakeup.clear()
+        except Exception as e:
+            print(f"Error in email sender: {e}")
+            traceback.print_exc()
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def start_email_sender() -> bool:
+    """
+    Start this process's email sender threads. Disabled with EMAIL_SENDER=0,
+    e.g. when another process drains the outbox.
+
+    Returns:
+        bool: whether the senders are running
+    """
+    if not EMAIL_SENDER:
+        return False
+    _workers[:] = [worker for worker in _workers if worker.is_alive()]
+    for i in range(len(_workers), EMAIL_SENDER_WORKERS):
+        worker = threading.Thread(target=_send_forever, name=f"email-sender-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    return True
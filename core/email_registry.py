@@ -0,0 +1,138 @@
+import html
+import os
+import re
+import threading
+
+from jinja2 import (
+    Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined, TemplateNotFound, select_autoescape,
+)
+
+# Compiled email templates
+#
+# Every `<name>.html` in core/email_templates is compiled once, at startup,
+# by a Jinja Environment with a bytecode cache: the compiled code is stored
+# in EMAIL_TEMPLATE_CACHE_DIR (the system temp dir by default), so other
+# workers and later restarts load it instead of parsing the template again.
+# Each template also gets a plain-text alternative, `<name>.txt` when that
+# file exists, otherwise derived once from the HTML source. After
+# precompile(), rendering a message is one call with no file access.
+#
+# Templates render with StrictUndefined: a variable missing from the context
+# is an error instead of an empty string, so a bad call never sends an email
+# with a blank verification link. HTML templates are autoescaped.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "email_templates")
+TEMPLATE_CACHE_DIR = os.getenv("EMAIL_TEMPLATE_CACHE_DIR") or None
+
+_HIDDEN = re.compile(r"<(head|style|script)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_LINK = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*(["'])(.*?)\1[^>]*>(.*?)</a\s*>""", re.IGNORECASE | re.DOTALL)
+_PARAGRAPH = re.compile(r"</(p|h[1-6]|table|ul|ol)\s*>", re.IGNORECASE)
+_BREAK = re.compile(r"<br\s*/?>|</(div|li|tr)\s*>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+
+
+def html_to_text(source: str) -> str:
+    """
+    Plain-text version of an HTML template's source; Jinja tags are kept, so
+    the result is itself a template.
+    """
+    text = _HIDDEN.sub("", source)
+    text = _LINK.sub(lambda m: f"{_TAG.sub('', m.group(3)).strip()}: {m.group(2)}", text)
+    text = _PARAGRAPH.sub("\n\n", text)
+    text = _BREAK.sub("\n", text)
+    text = html.unescape(_TAG.sub("", text))
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip() + "\n"
+
+
+class _EmailTemplateLoader(FileSystemLoader):
+    """Serves `<name>.txt` derived from `<name>.html` when there is no such file."""
+
+    def get_source(self, environment, template):
+        try:
+            return super().get_source(environment, template)
+        except TemplateNotFound:
+            if not template.endswith(".txt"):
+                raise
+        source, filename, uptodate = super().get_source(environment, template[:-len(".txt")] + ".html")
+        return html_to_text(source), filename, uptodate
+
+
+class EmailTemplateRegistry:
+    """HTML templates and their plain-text parts, compiled once per process."""
+
+    def __init__(self, directory: str = TEMPLATE_DIR, cache_dir: str = TEMPLATE_CACHE_DIR):
+        self.directory = directory
+        self.environment = Environment(
+            loader=_EmailTemplateLoader(directory),
+            bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+            undefined=StrictUndefined,
+            auto_reload=False,  # No mtime checks on every lookup
+        )
+        self._lock = threading.Lock()
+        self._templates = {}  # name -> (html template, text template)
+
+    def names(self) -> list[str]:
+        """Template names (file names without `.html`) found in the directory."""
+        return sorted(name[:-len(".html")] for name in self.environment.list_templates(extensions=["html"]))
+
+    def _compile(self, name: str) -> tuple:
+        return (
+            self.environment.get_template(f"{name}.html"),
+            self.environment.get_template(f"{name}.txt"),
+        )
+
+    def precompile(self) -> list[str]:
+        """
+        Compile every template and its plain-text part.
+
+        Returns:
+            list: names of the compiled templates
+        """
+        compiled = {name: self._compile(name) for name in self.names()}
+        with self._lock:
+            self._templates.update(compiled)
+        return list(compiled)
+
+    def get(self, name: str) -> tuple:
+        """
+        The compiled (html, text) templates for `name`; compiled on first use if not precompiled.
+
+        Raises:
+            jinja2.TemplateNotFound: when there is no `<name>.html`
+        """
+        templates = self._templates.get(name)
+        if templates is None:
+            templates = self._compile(name)
+            with self._lock:
+                self._templates[name] = templates
+        return templates
+
+    def exists(self, name: str) -> bool:
+        if name in self._templates:
+            return True
+        try:
+            self.get(name)
+        except TemplateNotFound:
+            return False
+        return True
+
+    def render(self, name: str, context: dict = None) -> tuple[str, str]:
+        """
+        Render both parts of an email.
+
+        Returns:
+            tuple: (html, text)
+
+        Raises:
+            jinja2.TemplateNotFound: when there is no such template
+            jinja2.UndefinedError: when the context lacks a variable the template uses
+        """
+        html_template, text_template = self.get(name)
+        context = context or {}
+        return html_template.render(context), text_template.render(context)
+
+
+# One registry per worker process
+email_templates = EmailTemplateRegistry()
@@ -0,0 +1,42 @@
+import click
+from flask.cli import AppGroup
+
+db_cli = AppGroup("db", help="Database maintenance commands.")
+
+
+def indexed_models() -> list:
+    """Every Document whose meta declares indexes."""
+    from api.authentication.models import AuthToken, User
+    from api.moderation.rate_limit import PrecheckQuota
+    from api.reports.models import Report
+    from api.threads.models import Post, Thread, Vote
+    from api.threads.moderation_queue import ModerationJob
+    from core.email_outbox import OutboxEmail
+    from core.moderation_cache import ModerationVerdict
+
+    return [User, AuthToken, Thread, Post, Vote, Report, ModerationVerdict, ModerationJob, OutboxEmail,
+            PrecheckQuota]
+
+
+def ensure_indexes() -> list[str]:
+    """
+    Create the indexes declared in each model's meta.
+
+    MongoDB skips indexes that already exist, so this is safe to run on every
+    startup and from deploy scripts.
+
+    Returns:
+        list: names of the collections that were checked
+    """
+    collections = []
+    for model in indexed_models():
+        model.ensure_indexes()
+        collections.append(model._get_collection_name())
+    return collections
+
+
+@db_cli.command("ensure-indexes")
+def ensure_indexes_command():
+    """Create any missing indexes declared by the models."""
+    for collection in ensure_indexes():
+        click.echo(f"{collection}: indexes ensured")
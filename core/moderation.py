@@ -1,38 +1,38 @@
+import asyncio
 import os
-import requests
 import json
+import time
+import traceback
+
+from core.moderation_cache import chave_texto, normalizar_texto, verdict_cache
+from core.moderation_chunks import dividir_em_trechos, mais_grave
+from core.moderation_classifier import (
+    CLASSIFIER_FALLBACK_THRESHOLD, CLASSIFIER_GATE, CLASSIFIER_GATE_ALLOW, CLASSIFIER_GATE_BLOCK, local_classifier,
+)
+from core.moderation_client import (
+    QUEUE_TIMEOUT_SECONDS, ModerationError, ModerationRejected, ModerationUnavailable, moderation_client,
+)
+from core.profanity import ALLOW, BLOCK, profanity_filter
 
 # Azure OpenAI Configuration
-AZURE_OPENAI_ENDPOINT = "https://openai-insper.openai.azure.com/openai/deployments/gpt-4_MarcioJunior_PECC/chat/completions"
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "https://openai-insper.openai.azure.com/openai/deployments/gpt-4_MarcioJunior_PECC/chat/completions")
 AZURE_API_VERSION = "2025-01-01-preview"
-AZURE_API_KEY = "a0d9b9f7c34d4662a90e2a829f572333"
+AZURE_API_KEY = os.getenv("AZURE_OPENAI_API_KEY", "a0d9b9f7c34d4662a90e2a829f572333")
 
-def verificar_conteudo(texto):
-    """
-    Verifica se o conteúdo contém linguagem imprópria usando Azure OpenAI GPT-4.
-    
-    Returns:
-        tuple: (is_safe: bool, flagged_categories: dict or None, error_message: str or None)
-    """
-    if not texto or not texto.strip():
-        return True, None, None
-    
-    if not AZURE_API_KEY:
-        print("⚠️  AZURE_OPENAI_API_KEY não configurada - moderação desabilitada")
-        return True, None, None
-    
-    try:
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": AZURE_API_KEY
-        }
-        
-        # Prompt para análise de moderação
-        prompt = f"""Analise o seguinte texto e verifique se ele contém conteúdo inapropriado.
+# Tempo máximo de uma chamada de moderação, em segundos
+MODERATION_TIMEOUT = 10
 
-Texto: "{texto}"
+# Categoria dos textos bloqueados pelo pré-filtro local (core/profanity.py)
+LOCAL_BLOCK_CATEGORY = "linguagem ofensiva"
+LOCAL_BLOCK_MESSAGE = f"Conteúdo bloqueado: {LOCAL_BLOCK_CATEGORY} - termo ofensivo detectado"
+
+# Política quando a API não responde: "allow" ou "block_risky" (ver veredito_local)
+MODERATION_FALLBACK = os.getenv("MODERATION_FALLBACK", "allow")
+UNAVAILABLE_CATEGORY = "moderação indisponível"
+# Categoria dos textos bloqueados pelo classificador local (core/moderation_classifier.py)
+CLASSIFIER_CATEGORY = "conteúdo impróprio (classificador local)"
 
-Categorias a verificar:
+CATEGORIAS = """Categorias a verificar:
 - Conteúdo sexual explícito
 - Violência ou ameaças
 - Discriminação, racismo ou ódio
@@ -40,7 +40,19 @@ Categorias a verificar:
 - Auto-mutilação ou suicídio
 - Golpes ou fraudes
 - Spam excessivo
-- Palavrões ou linguagem ofensiva
+- Palavrões ou linguagem ofensiva"""
+
+SYSTEM_PROMPT = "Você é um moderador de conteúdo rigoroso. Analise textos e identifique conteúdo inapropriado, incluindo palavrões, xingamentos e linguagem ofensiva. Responda sempre em JSON válido."
+
+
+def _montar_payload(texto):
+    """Monta o corpo da requisição de moderação para um texto."""
+    # Prompt para análise de moderação
+    prompt = f"""Analise o seguinte texto e verifique se ele contém conteúdo inapropriado.
+
+Texto: "{texto}"
+
+{CATEGORIAS}
 
 Responda APENAS com um JSON no formato:
 {{"is_safe": true/false, "category": "categoria detectada ou null", "reason": "explicação breve ou null"}}
@@ -48,87 +60,481 @@ Responda APENAS com um JSON no formato:
 Se o texto for seguro, retorne: {{"is_safe": true, "category": null, "reason": null}}
 Se o texto for inapropriado, retorne: {{"is_safe": false, "category": "nome_da_categoria", "reason": "breve explicação"}}"""
 
-        payload = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Você é um moderador de conteúdo rigoroso. Analise textos e identifique conteúdo inapropriado, incluindo palavrões, xingamentos e linguagem ofensiva. Responda sempre em JSON válido."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.0,
-            "max_tokens": 200
-        }
-        
-        response = requests.post(
-            f"{AZURE_OPENAI_ENDPOINT}?api-version={AZURE_API_VERSION}",
+    return {
+        "messages": [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "temperature": 0.0,
+        "max_tokens": 200
+    }
+
+
+def _extrair_json(result):
+    """Conteúdo da resposta do modelo como JSON, sem a cerca de markdown."""
+    content = result['choices'][0]['message']['content'].strip()
+
+    # Tentar extrair o JSON da resposta
+    # Remover markdown se houver
+    if content.startswith("```json"):
+        content = content.replace("```json", "").replace("```", "").strip()
+    elif content.startswith("```"):
+        content = content.replace("```", "").strip()
+
+    return json.loads(content)
+
+
+def _veredito(moderation_result):
+    if not moderation_result.get('is_safe', True):
+        category = moderation_result.get('category', 'conteúdo inapropriado')
+        reason = moderation_result.get('reason', 'detectado conteúdo inadequado')
+        mensagem = f"Conteúdo bloqueado: {category} - {reason}"
+        return False, {'category': category}, mensagem
+
+    return True, None, None
+
+
+# Categorias do filtro de conteúdo da Azure, que recusa o prompt com HTTP 400
+_CATEGORIAS_FILTRO = {
+    'hate': 'discriminação ou ódio',
+    'sexual': 'conteúdo sexual',
+    'violence': 'violência',
+    'self_harm': 'automutilação',
+    'jailbreak': 'tentativa de manipular a moderação',
+}
+
+
+def _veredito_filtro(erro):
+    """
+    Converte a recusa do filtro de conteúdo da Azure num veredito de bloqueio.
+
+    Returns:
+        tuple or None: o veredito, ou None se o 4xx não veio do filtro
+    """
+    try:
+        detalhe = json.loads(erro.body).get('error') or {}
+    except (ValueError, AttributeError):
+        return None
+    if detalhe.get('code') != 'content_filter':
+        return None
+    resultado = (detalhe.get('innererror') or {}).get('content_filter_result') or {}
+    filtradas = [nome for nome, info in resultado.items() if isinstance(info, dict) and info.get('filtered')]
+    category = next((_CATEGORIAS_FILTRO[nome] for nome in filtradas if nome in _CATEGORIAS_FILTRO),
+                    'conteúdo inapropriado')
+    return False, {'category': category}, f"Conteúdo bloqueado: {category} - recusado pelo filtro de conteúdo"
+
+
+def _interpretar_resposta(result):
+    """
+    Extrai o veredito da resposta da API.
+
+    Raises:
+        json.JSONDecodeError: se o modelo não respondeu com JSON
+
+    Returns:
+        tuple: (is_safe: bool, flagged_categories: dict or None, error_message: str or None)
+    """
+    return _veredito(_extrair_json(result))
+
+
+def _montar_payload_lote(itens):
+    """Monta uma requisição que modera vários textos, identificados por id, de uma vez."""
+    textos = "\n".join(json.dumps({"id": id_, "texto": texto}, ensure_ascii=False) for id_, texto in itens)
+    prompt = f"""Analise cada um dos textos abaixo (um objeto JSON por linha) e verifique se ele contém conteúdo inapropriado.
+
+Textos:
+{textos}
+
+{CATEGORIAS}
+
+Responda APENAS com um JSON no formato:
+{{"resultados": [{{"id": "id do texto", "is_safe": true/false, "category": "categoria detectada ou null", "reason": "explicação breve ou null"}}]}}
+
+Inclua exatamente um resultado para cada texto, com o mesmo id."""
+
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.0,
+        "max_tokens": 100 + 60 * len(itens),
+    }
+
+
+def _interpretar_lote(result):
+    """
+    Extrai os vereditos de uma resposta de lote.
+
+    Raises:
+        json.JSONDecodeError: se o modelo não respondeu com JSON
+
+    Returns:
+        dict: id -> (is_safe, flagged_categories, error_message); ids sem resultado ficam de fora
+    """
+    resultados = _extrair_json(result)
+    if isinstance(resultados, dict):
+        resultados = resultados.get('resultados', [])
+    return {
+        str(item['id']): _veredito(item)
+        for item in resultados
+        if isinstance(item, dict) and 'id' in item
+    }
+
+
+def veredito_local(termo_risco=None, texto=None):
+    """
+    Veredito quando a API não pode ser consultada (circuito aberto, limite de
+    chamadas simultâneas atingido, erro ou timeout).
+
+    Com MODERATION_FALLBACK=block_risky, textos em que o pré-filtro achou um
+    termo de risco são recusados até a API voltar. Com o classificador local
+    carregado, textos com probabilidade de bloqueio acima de
+    CLASSIFIER_FALLBACK_THRESHOLD também são recusados. O resto é permitido.
+
+    Returns:
+        tuple: (is_safe: bool, flagged_categories: dict or None, error_message: str or None)
+    """
+    if MODERATION_FALLBACK == "block_risky" and termo_risco:
+        mensagem = f"Conteúdo bloqueado: {UNAVAILABLE_CATEGORY} - tente novamente em alguns instantes"
+        return False, {'category': UNAVAILABLE_CATEGORY}, mensagem
+    probabilidade = local_classifier.probabilidade(texto) if texto else None
+    if probabilidade is None:
+        return True, None, None
+    if probabilidade >= CLASSIFIER_FALLBACK_THRESHOLD:
+        local_classifier.count('fallback_blocked')
+        return False, {'category': CLASSIFIER_CATEGORY}, f"Conteúdo bloqueado: {CLASSIFIER_CATEGORY}"
+    local_classifier.count('fallback_allowed')
+    return True, None, None
+
+
+async def verificar_conteudo_async(texto, estrito=False):
+    """
+    Verifica um texto pelo cliente compartilhado do processo (core/moderation_client.py).
+
+    Textos longos são divididos em trechos (core/moderation_chunks.py),
+    verificados em paralelo, e vale o bloqueio mais grave. Antes da API, o
+    pré-filtro local bloqueia termos ofensivos (e, se configurado, libera
+    textos curtos sem termos de risco), e textos ou trechos já moderados são
+    respondidos pelo cache de vereditos. Se a API não puder
+    ser consultada ou falhar, vale `veredito_local`; se responder algo que
+    não é JSON, o conteúdo é permitido. Nesses casos nada é guardado no cache.
+    Um texto recusado pelo filtro de conteúdo da Azure (HTTP 400) é bloqueado,
+    e esse veredito vai para o cache.
+    Com `estrito`, essas falhas são levantadas, para quem pode tentar de novo
+    mais tarde (a fila de moderação).
+
+    Returns:
+        tuple: (is_safe: bool, flagged_categories: dict or None, error_message: str or None)
+    """
+    if not texto or not texto.strip():
+        return True, None, None
+
+    trechos = dividir_em_trechos(texto)
+    if len(trechos) > 1:
+        return mais_grave(await asyncio.gather(*(verificar_conteudo_async(trecho, estrito) for trecho in trechos)))
+
+    decisao, termo = profanity_filter.check(texto)
+    if decisao == BLOCK:
+        return False, {'category': LOCAL_BLOCK_CATEGORY}, LOCAL_BLOCK_MESSAGE
+    if decisao == ALLOW:
+        return True, None, None
+
+    if not AZURE_API_KEY:
+        print("⚠️  AZURE_OPENAI_API_KEY não configurada - moderação desabilitada")
+        return True, None, None
+
+    chave = chave_texto(texto)
+    veredito = await verdict_cache.get_async(chave)
+    if veredito is not None:
+        return veredito
+
+    if CLASSIFIER_GATE:
+        probabilidade = local_classifier.probabilidade(texto)
+        if probabilidade is not None and probabilidade <= CLASSIFIER_GATE_ALLOW:
+            local_classifier.count('gate_allowed')
+            return True, None, None
+        if probabilidade is not None and probabilidade >= CLASSIFIER_GATE_BLOCK:
+            local_classifier.count('gate_blocked')
+            return False, {'category': CLASSIFIER_CATEGORY}, f"Conteúdo bloqueado: {CLASSIFIER_CATEGORY}"
+
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": AZURE_API_KEY
+    }
+
+    content = None
+    try:
+        inicio = time.perf_counter()
+        content = await moderation_client.post_json(
+            AZURE_OPENAI_ENDPOINT,
+            _montar_payload(texto),
+            params={"api-version": AZURE_API_VERSION},
             headers=headers,
-            json=payload,
-            timeout=10
+            timeout=MODERATION_TIMEOUT,
         )
-        
-        if response.status_code != 200:
-            print(f"Erro na API Azure OpenAI: {response.status_code} - {response.text}")
-            return True, None, None  # Em caso de erro, permitir o conteúdo
-        
-        result = response.json()
-        content = result['choices'][0]['message']['content'].strip()
-        
-        # Tentar extrair o JSON da resposta
-        # Remover markdown se houver
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "").strip()
-        elif content.startswith("```"):
-            content = content.replace("```", "").strip()
-            
-        moderation_result = json.loads(content)
-        
-        if not moderation_result.get('is_safe', True):
-            category = moderation_result.get('category', 'conteúdo inapropriado')
-            reason = moderation_result.get('reason', 'detectado conteúdo inadequado')
-            mensagem = f"Conteúdo bloqueado: {category} - {reason}"
-            return False, {'category': category}, mensagem
-        
-        return True, None, None
-            
+        veredito = _interpretar_resposta(content)
+
+    except ModerationRejected as e:
+        veredito = _veredito_filtro(e)
+        if veredito is None:
+            if estrito:
+                raise
+            print(f"Erro na API Azure OpenAI: {e}")
+            return veredito_local(termo, texto)
+    except ModerationUnavailable as e:
+        if estrito:
+            raise
+        print(f"Moderação indisponível ({e}) - usando a política local")
+        return veredito_local(termo, texto)
+    except ModerationError as e:
+        if estrito:
+            raise
+        print(f"Erro na API Azure OpenAI: {e}")
+        return veredito_local(termo, texto)
     except json.JSONDecodeError as e:
+        if estrito:
+            raise
         print(f"Erro ao parsear JSON da resposta de moderação: {e}")
         print(f"Resposta recebida: {content}")
         return True, None, None
-    except requests.exceptions.Timeout:
-        print("Timeout na verificação de moderação")
-        return True, None, None
     except Exception as e:
+        if estrito:
+            raise
         print(f"Erro ao verificar moderação: {e}")
-        import traceback
         traceback.print_exc()
         return True, None, None
 
+    await verdict_cache.set_async(chave, veredito, time.perf_counter() - inicio, texto)
+    return veredito
 
-def verificar_thread(title, description=None):
+
+async def verificar_campos_async(campos, estrito=False):
     """
-    Verifica título e descrição de uma thread.
-    
+    Verifica vários campos ao mesmo tempo e combina os vereditos.
+
+    Todas as chamadas são feitas em paralelo, então o tempo total é o da
+    chamada mais lenta. Se mais de um campo for bloqueado, vale o primeiro
+    na ordem recebida.
+
+    Args:
+        campos: lista de (rótulo, texto), ex. [("Título impróprio", title)]
+        estrito: levanta as falhas da API em vez de aplicar a política local
+
     Returns:
         tuple: (is_safe: bool, error_message: str or None)
     """
-    # Verificar título
-    is_safe, _, mensagem = verificar_conteudo(title)
-    if not is_safe:
-        return False, f"Título impróprio: {mensagem}"
-    
-    # Verificar descrição se fornecida
-    if description:
-        is_safe, _, mensagem = verificar_conteudo(description)
+    campos = [(rotulo, texto) for rotulo, texto in campos if texto]
+    if not campos:
+        return True, None
+
+    # Campos com o mesmo texto (ex. título repetido na descrição) geram uma só chamada;
+    # vai o texto original, cujos parágrafos orientam a divisão em trechos
+    textos = {}
+    for _, texto in campos:
+        textos.setdefault(normalizar_texto(texto), texto)
+
+    resultados = await asyncio.gather(*(verificar_conteudo_async(texto, estrito) for texto in textos.values()))
+    vereditos = dict(zip(textos, resultados))
+
+    for rotulo, texto in campos:
+        is_safe, _, mensagem = vereditos[normalizar_texto(texto)]
         if not is_safe:
-            return False, f"Descrição imprópria: {mensagem}"
+            return False, f"{rotulo}: {mensagem}"
+
+    return True, None
+
+
+async def verificar_lote_async(itens):
+    """
+    Modera vários textos numa única chamada, para a revisão em massa.
+
+    Trechos de textos longos, pré-filtro local e cache de vereditos valem
+    como em `verificar_conteudo_async`; só o resto vai para a IA, num prompt
+    só (cada trecho como um item).
+    Ao contrário da verificação de uma submissão, falhas não liberam o
+    conteúdo: são levantadas para quem chamou tentar de novo.
+
+    Args:
+        itens: lista de (id, texto); os ids devem ser strings únicas
+
+    Raises:
+        ModerationUnavailable, ModerationError: a API não pôde ser consultada
+        json.JSONDecodeError: o modelo não respondeu com JSON
+
+    Returns:
+        dict: id -> (is_safe, flagged_categories, error_message); ids que o
+        modelo deixou sem resposta ficam de fora
+    """
+    # Textos longos viram um item por trecho ("id#0", "id#1"...), recombinados no fim
+    trechos_por_id = {}
+    expandidos = []
+    for id_, texto in itens:
+        trechos = dividir_em_trechos(texto) if texto else [texto]
+        if len(trechos) == 1:
+            expandidos.append((id_, texto))
+        else:
+            trechos_por_id[id_] = [f"{id_}#{i}" for i in range(len(trechos))]
+            expandidos.extend(zip(trechos_por_id[id_], trechos))
+
+    vereditos = {}
+    consultar = []
+    for id_, texto in expandidos:
+        if not texto or not texto.strip():
+            vereditos[id_] = (True, None, None)
+            continue
+        decisao, _ = profanity_filter.check(texto)
+        if decisao == BLOCK:
+            vereditos[id_] = (False, {'category': LOCAL_BLOCK_CATEGORY}, LOCAL_BLOCK_MESSAGE)
+        elif decisao == ALLOW:
+            vereditos[id_] = (True, None, None)
+        else:
+            consultar.append((id_, texto))
+
+    # Consultas ao cache em paralelo, fora do loop (ver core/moderation_cache.py)
+    do_cache = await asyncio.gather(*(verdict_cache.get_async(chave_texto(texto)) for _, texto in consultar))
+    pendentes = []
+    for (id_, texto), veredito in zip(consultar, do_cache):
+        if veredito is not None:
+            vereditos[id_] = veredito
+        else:
+            pendentes.append((id_, texto))
+
+    if pendentes:
+        inicio = time.perf_counter()
+        try:
+            content = await moderation_client.post_json(
+                AZURE_OPENAI_ENDPOINT,
+                _montar_payload_lote(pendentes),
+                params={"api-version": AZURE_API_VERSION},
+                headers={"Content-Type": "application/json", "api-key": AZURE_API_KEY},
+                timeout=MODERATION_TIMEOUT,
+            )
+            respostas = _interpretar_lote(content)
+        except ModerationRejected as e:
+            # Num lote, a recusa do filtro só identifica o texto se ele estava sozinho
+            veredito = _veredito_filtro(e)
+            if veredito is None or len(pendentes) > 1:
+                raise
+            respostas = {pendentes[0][0]: veredito}
+        segundos = (time.perf_counter() - inicio) / len(pendentes)
+        respondidos = [(id_, texto) for id_, texto in pendentes if id_ in respostas]
+        for id_, _ in respondidos:
+            vereditos[id_] = respostas[id_]
+        await asyncio.gather(*(
+            verdict_cache.set_async(chave_texto(texto), respostas[id_], segundos, texto)
+            for id_, texto in respondidos
+        ))
+
+    for id_, ids_trechos in trechos_por_id.items():
+        dos_trechos = [vereditos.pop(id_trecho, None) for id_trecho in ids_trechos]
+        if None not in dos_trechos:
+            vereditos[id_] = mais_grave(dos_trechos)
+    return vereditos
+
+
+def _executar(coro, fallback=None):
+    """
+    Roda uma verificação no loop do cliente compartilhado e espera o resultado.
+
+    Se nem assim houver resposta no prazo (loop sobrecarregado, cópias do
+    hedge), a verificação é cancelada e vale `fallback()`, a política local;
+    sem `fallback`, o TimeoutError é levantado.
+    """
+    try:
+        return moderation_client.run(coro, timeout=MODERATION_TIMEOUT + QUEUE_TIMEOUT_SECONDS + 1)
+    except TimeoutError:
+        if fallback is None:
+            raise
+        print("Moderação sem resposta no prazo - usando a política local")
+        return fallback()
+
+
+def _veredito_local_texto(texto):
+    decisao, termo = profanity_filter.check(texto)
+    if decisao == BLOCK:
+        return False, {'category': LOCAL_BLOCK_CATEGORY}, LOCAL_BLOCK_MESSAGE
+    return veredito_local(termo, texto)
+
+
+def _veredito_local_campos(campos):
+    for rotulo, texto in campos:
+        if texto:
+            is_safe, _, mensagem = _veredito_local_texto(texto)
+            if not is_safe:
+                return False, f"{rotulo}: {mensagem}"
+    return True, None
+
+
+def verificar_campos(campos, estrito=False):
+    """
+    Versão síncrona de `verificar_campos_async`, para as views.
+
+    Returns:
+        tuple: (is_safe: bool, error_message: str or None)
+
+    Raises:
+        ModerationUnavailable, ModerationError, TimeoutError: só com `estrito`,
+        quando a API não pôde ser consultada
+    """
+    if not any(texto for _, texto in campos):
+        return True, None
+    if estrito:
+        return _executar(verificar_campos_async(campos, estrito=True))
+    return _executar(verificar_campos_async(campos), lambda: _veredito_local_campos(campos))
+
+
+def verificar_conteudo(texto):
+    """
+    Verifica se o conteúdo contém linguagem imprópria usando Azure OpenAI GPT-4.
     
+    Returns:
+        tuple: (is_safe: bool, flagged_categories: dict or None, error_message: str or None)
+    """
+    if not texto or not texto.strip():
+        return True, None, None
+    return _executar(verificar_conteudo_async(texto), lambda: _veredito_local_texto(texto))
+
+
+def verificar_campos_local(campos):
+    """
+    Só o pré-filtro local, sem a API nem o cache. Usado pela política de
+    moderação (api/threads/moderation_policy.py) para autores confiáveis,
+    cujo texto é publicado na hora e verificado pela API depois, ou por amostragem.
+
+    Returns:
+        tuple: (is_safe: bool, error_message: str or None)
+    """
+    for rotulo, texto in campos:
+        if texto and profanity_filter.check(texto, skip_short_safe=False)[0] == BLOCK:
+            return False, f"{rotulo}: {LOCAL_BLOCK_MESSAGE}"
     return True, None
 
 
+def _campos_thread(title, description):
+    return [("Título impróprio", title), ("Descrição imprópria", description)]
+
+
+def _campos_post(content):
+    return [("Conteúdo impróprio", content)]
+
+
+def verificar_thread(title, description=None):
+    """
+    Verifica título e descrição de uma thread, em paralelo.
+    
+    Returns:
+        tuple: (is_safe: bool, error_message: str or None)
+    """
+    return verificar_campos(_campos_thread(title, description))
+
+
 def verificar_post(content):
     """
     Verifica o conteúdo de um post.
@@ -136,8 +542,34 @@ def verificar_post(content):
     Returns:
         tuple: (is_safe: bool, error_message: str or None)
     """
-    is_safe, _, mensagem = verificar_conteudo(content)
-    if not is_safe:
-        return False, f"Conteúdo impróprio: {mensagem}"
-    
-    return True, None
+    return verificar_campos(_campos_post(content))
+
+
+def verificar_thread_estrito(title, description=None):
+    """`verificar_thread` que levanta as falhas da API, para a fila de moderação."""
+    return verificar_campos(_campos_thread(title, description), estrito=True)
+
+
+def verificar_post_estrito(content):
+    """`verificar_post` que levanta as falhas da API, para a fila de moderação."""
+    return verificar_campos(_campos_post(content), estrito=True)
+
+
+def verificar_thread_fallback(title, description=None):
+    """O veredito de `verificar_thread` quando a API não pôde ser consultada (`veredito_local`)."""
+    return _veredito_local_campos(_campos_thread(title, description))
+
+
+def verificar_post_fallback(content):
+    """O veredito de `verificar_post` quando a API não pôde ser consultada (`veredito_local`)."""
+    return _veredito_local_campos(_campos_post(content))
+
+
+def verificar_thread_local(title, description=None):
+    """`verificar_thread` só com o pré-filtro local."""
+    return verificar_campos_local(_campos_thread(title, description))
+
+
+def verificar_post_local(content):
+    """`verificar_post` só com o pré-filtro local."""
+    return verificar_campos_local(_campos_post(content))
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from mongoengine import BooleanField, DateTimeField, Document, IntField, StringField
+
+# Cache de vereditos de moderação
+#
+# Cada texto moderado é identificado pelo hash do texto normalizado. O
+# veredito fica num LRU em memória (por worker, com TTL) e na coleção
+# `moderation_verdicts`, compartilhada entre os workers e expirada por um
+# índice TTL. Só vereditos de fato devolvidos pelo modelo são guardados:
+# erros e timeouts, que liberam o conteúdo, nunca entram no cache.
+# O texto normalizado fica junto do veredito, como exemplo de treino do
+# classificador local (core/moderation_classifier.py).
+#
+# As verificações rodam no event loop compartilhado (core/moderation_client.py):
+# lá se usa `get_async`/`set_async`, que levam o acesso ao MongoDB para uma
+# thread do executor, e o loop não fica parado esperando o banco.
+
+# Mudar o prompt ou o modelo invalida o cache: incremente esta versão
+VERDICT_VERSION = 1
+
+MEMORY_CACHE_SIZE = 4096
+MEMORY_TTL_SECONDS = 60 * 60
+STORED_TTL_SECONDS = 30 * 24 * 60 * 60
+# Trechos têm no máximo ~1800 caracteres (core/moderation_chunks.py)
+STORED_TEXT_MAX_CHARS = 2000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalizar_texto(texto: str) -> str:
+    """Forma canônica do texto: Unicode NFKC e espaços colapsados."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", texto)).strip()
+
+
+def chave_texto(texto: str) -> str:
+    """Chave de cache de um texto."""
+    return hashlib.sha256(f"{VERDICT_VERSION}:{normalizar_texto(texto)}".encode("utf-8")).hexdigest()
+
+
+class ModerationVerdict(Document):
+    """Veredito de moderação guardado para um texto normalizado"""
+    _hash = StringField(primary_key=True)
+    _is_safe = BooleanField(required=True)
+    _category = StringField()
+    _message = StringField()
+    # Texto normalizado e versão do prompt, para treinar o classificador local
+    _text = StringField()
+    _version = IntField()
+    # Em UTC: o índice TTL compara com o relógio do servidor
+    _created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        'collection': 'moderation_verdicts',
+        'indexes': [
+            # Expira vereditos antigos
+            {'fields': ['_created_at'], 'expireAfterSeconds': STORED_TTL_SECONDS},
+        ]
+    }
+
+    def to_verdict(self) -> tuple:
+        flagged = {'category': self._category} if not self._is_safe else None
+        return self._is_safe, flagged, self._message
+
+
+class VerdictCache:
+    """LRU em memória com TTL na frente da coleção `moderation_verdicts`."""
+
+    def __init__(self, size: int = MEMORY_CACHE_SIZE, ttl: float = MEMORY_TTL_SECONDS):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave -> (guardado_em, veredito)
+        self._stats = {}
+        self.reset_stats()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {
+                'memory_hits': 0,
+                'stored_hits': 0,
+                'misses': 0,
+                'remote_calls': 0,
+                'remote_seconds': 0.0,
+                'store_errors': 0,
+            }
+
+    def _remember(self, key: str, verdict: tuple, now: float):
+        self._entries[key] = (now, verdict)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def _get_memory(self, key: str, now: float):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached[0] < self._ttl:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return cached[1]
+        return None
+
+    def get(self, key: str):
+        """O veredito guardado para a chave, ou None."""
+        now = time.monotonic()
+        verdict = self._get_memory(key, now)
+        if verdict is not None:
+            return verdict
+        return self._get_stored(key, now)
+
+    async def get_async(self, key: str):
+        """`get` para o event loop: a consulta ao MongoDB roda numa thread do executor."""
+        now = time.monotonic()
+        verdict = self._get_memory(key, now)
+        if verdict is not None:
+            return verdict
+        return await asyncio.to_thread(self._get_stored, key, now)
+
+    def _get_stored(self, key: str, now: float):
+        try:
+            stored = ModerationVerdict.objects(pk=key).first()
+        except Exception as e:
+            print(f"Erro ao ler cache de moderação: {e}")
+            stored = None
+            with self._lock:
+                self._stats['store_errors'] += 1
+
+        with self._lock:
+            if stored is None:
+                self._stats['misses'] += 1
+                return None
+            verdict = stored.to_verdict()
+            self._stats['stored_hits'] += 1
+            self._remember(key, verdict, now)
+        return verdict
+
+    def _set_memory(self, key: str, verdict: tuple, seconds: float):
+        with self._lock:
+            self._stats['remote_calls'] += 1
+            self._stats['remote_seconds'] += seconds
+            self._remember(key, verdict, time.monotonic())
+
+    def set(self, key: str, verdict: tuple, seconds: float, texto: str = None):
+        """Guarda o veredito que o modelo deu a `texto`; `seconds` é quanto a chamada levou."""
+        self._set_memory(key, verdict, seconds)
+        self._store(key, verdict, texto)
+
+    async def set_async(self, key: str, verdict: tuple, seconds: float, texto: str = None):
+        """`set` para o event loop: a gravação no MongoDB roda numa thread do executor."""
+        self._set_memory(key, verdict, seconds)
+        await asyncio.to_thread(self._store, key, verdict, texto)
+
+    def _store(self, key: str, verdict: tuple, texto: str = None):
+        is_safe, flagged, message = verdict
+        try:
+            ModerationVerdict(
+                _hash=key,
+                _is_safe=is_safe,
+                _category=(flagged or {}).get('category'),
+                _message=message,
+                _text=normalizar_texto(texto)[:STORED_TEXT_MAX_CHARS] if texto else None,
+                _version=VERDICT_VERSION,
+            ).save()
+        except Exception as e:
+            print(f"Erro ao gravar cache de moderação: {e}")
+            with self._lock:
+                self._stats['store_errors'] += 1
+
+    def stats(self) -> dict:
+        """
+        Contadores deste worker desde o início (ou desde `reset_stats`).
+
+        `estimated_seconds_saved` multiplica os acertos pela latência média
+        das chamadas ao modelo.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._entries)
+        hits = stats['memory_hits'] + stats['stored_hits']
+        lookups = hits + stats['misses']
+        average = stats['remote_seconds'] / stats['remote_calls'] if stats['remote_calls'] else 0.0
+        stats['hits'] = hits
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['average_remote_seconds'] = round(average, 4)
+        stats['estimated_seconds_saved'] = round(hits * average, 3)
+        stats['remote_seconds'] = round(stats['remote_seconds'], 3)
+        return stats
+
+
+# Um cache em memória por worker
+verdict_cache = VerdictCache()
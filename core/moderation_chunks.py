@@ -0,0 +1,152 @@
+import hashlib
+import re
+
+# Moderação de textos longos em trechos
+#
+# Textos acima de CHUNK_THRESHOLD_CHARS são divididos em blocos (parágrafos
+# e blocos de código ``` inteiros) e os blocos são agrupados em trechos de
+# até CHUNK_MAX_CHARS. Cada trecho é moderado em paralelo e tem seu próprio
+# veredito no cache; vale o veredito mais grave.
+#
+# O fim de um trecho depende do conteúdo (hash do último bloco), não só do
+# tamanho acumulado, para que editar um parágrafo mude apenas o trecho dele
+# (e o seguinte, pela sobreposição): os demais continuam no cache.
+# Cada trecho começa com os últimos CHUNK_OVERLAP_CHARS do anterior, para
+# que nada dividido na fronteira passe sem contexto.
+
+CHUNK_THRESHOLD_CHARS = 2000
+CHUNK_MIN_CHARS = 400
+CHUNK_TARGET_CHARS = 1200
+CHUNK_MAX_CHARS = 1600
+CHUNK_OVERLAP_CHARS = 200
+# Um trecho com a sobreposição não passa do limite, então nunca é dividido de novo
+assert CHUNK_MAX_CHARS + CHUNK_OVERLAP_CHARS + 2 <= CHUNK_THRESHOLD_CHARS
+# Em média um bloco a cada BOUNDARY_EVERY fecha um trecho (depois de CHUNK_MIN_CHARS)
+BOUNDARY_EVERY = 3
+
+_FENCE = re.compile(r"^\s*```")
+
+# Gravidade por palavra da categoria; categorias desconhecidas valem DEFAULT_SEVERITY
+_SEVERITY = (
+    # "moderação indisponível": bloqueio da política local, sem veredito da IA
+    ("indisponível", 0),
+    ("sexual", 5), ("suic", 5), ("mutila", 5), ("violên", 5), ("violen", 5), ("ameaça", 5),
+    ("discrimina", 4), ("racis", 4), ("ódio", 4), ("assédio", 4),
+    ("golpe", 3), ("fraude", 3),
+    ("ofensiv", 2), ("palavr", 2),
+    ("spam", 1),
+)
+DEFAULT_SEVERITY = 3
+
+
+def _blocos(texto: str) -> list[str]:
+    """Parágrafos separados por linhas em branco; um bloco de código ``` é um bloco só."""
+    blocos, atual, em_codigo = [], [], False
+    for linha in texto.split("\n"):
+        if _FENCE.match(linha):
+            if not em_codigo and atual:
+                blocos.append("\n".join(atual))
+                atual = []
+            atual.append(linha)
+            if em_codigo:
+                blocos.append("\n".join(atual))
+                atual = []
+            em_codigo = not em_codigo
+        elif not em_codigo and not linha.strip():
+            if atual:
+                blocos.append("\n".join(atual))
+                atual = []
+        else:
+            atual.append(linha)
+    if atual:
+        blocos.append("\n".join(atual))
+    return blocos
+
+
+def _partir(bloco: str) -> list[str]:
+    """Divide um bloco maior que CHUNK_MAX_CHARS em linhas (ou, em último caso, em pedaços fixos)."""
+    partes, atual = [], ""
+    for linha in bloco.split("\n"):
+        while len(linha) > CHUNK_MAX_CHARS:
+            if atual:
+                partes.append(atual)
+                atual = ""
+            partes.append(linha[:CHUNK_MAX_CHARS])
+            linha = linha[CHUNK_MAX_CHARS:]
+        if atual and len(atual) + 1 + len(linha) > CHUNK_MAX_CHARS:
+            partes.append(atual)
+            atual = linha
+        else:
+            atual = f"{atual}\n{linha}" if atual else linha
+    if atual:
+        partes.append(atual)
+    return partes
+
+
+def _fronteira(bloco: str) -> bool:
+    return hashlib.blake2b(bloco.encode("utf-8"), digest_size=2).digest()[0] % BOUNDARY_EVERY == 0
+
+
+def _sobreposicao(trecho: str) -> str:
+    """Final de um trecho usado como contexto do próximo, começando numa palavra."""
+    if len(trecho) <= CHUNK_OVERLAP_CHARS:
+        return trecho
+    cauda = trecho[-CHUNK_OVERLAP_CHARS:]
+    espaco = cauda.find(" ")
+    return cauda[espaco + 1:] if 0 <= espaco < len(cauda) - 1 else cauda
+
+
+def dividir_em_trechos(texto: str) -> list[str]:
+    """
+    Trechos a moderar de um texto longo; textos até CHUNK_THRESHOLD_CHARS voltam inteiros.
+
+    Returns:
+        list: trechos de até CHUNK_MAX_CHARS + CHUNK_OVERLAP_CHARS caracteres
+    """
+    if len(texto) <= CHUNK_THRESHOLD_CHARS:
+        return [texto]
+
+    blocos = [parte for bloco in _blocos(texto) for parte in _partir(bloco)]
+    grupos, atual = [], []
+    tamanho = 0
+    for bloco in blocos:
+        if atual and tamanho + 2 + len(bloco) > CHUNK_MAX_CHARS:
+            grupos.append(atual)
+            atual, tamanho = [], 0
+        atual.append(bloco)
+        tamanho += len(bloco) + (2 if tamanho else 0)
+        if tamanho >= CHUNK_TARGET_CHARS or (tamanho >= CHUNK_MIN_CHARS and _fronteira(bloco)):
+            grupos.append(atual)
+            atual, tamanho = [], 0
+    if atual:
+        grupos.append(atual)
+
+    trechos, anterior = [], None
+    for grupo in grupos:
+        corpo = "\n\n".join(grupo)
+        trechos.append(corpo if anterior is None else f"{_sobreposicao(anterior)}\n\n{corpo}")
+        anterior = corpo
+    return trechos
+
+
+def gravidade(veredito: tuple) -> int:
+    """Gravidade de um veredito bloqueado, pela categoria."""
+    _, flagged, _ = veredito
+    categoria = ((flagged or {}).get("category") or "").lower()
+    for palavra, valor in _SEVERITY:
+        if palavra in categoria:
+            return valor
+    return DEFAULT_SEVERITY
+
+
+def mais_grave(vereditos: list) -> tuple:
+    """
+    Combina os vereditos dos trechos: o bloqueio mais grave vence (no empate, o primeiro trecho).
+
+    Returns:
+        tuple: (is_safe: bool, flagged_categories: dict or None, error_message: str or None)
+    """
+    bloqueados = [veredito for veredito in vereditos if not veredito[0]]
+    if not bloqueados:
+        return True, None, None
+    return max(bloqueados, key=gravidade)
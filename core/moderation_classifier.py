@@ -0,0 +1,215 @@
+import os
+import threading
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Sem numpy não há classificador local; a moderação segue como antes
+    np = None
+
+from core.profanity import normalizar_termos
+
+# Classificador local de moderação
+#
+# Regressão logística sobre um bag-of-words com hashing: palavras e pares de
+# palavras do texto normalizado (core/profanity.py) caem em N_FEATURES
+# posições por CRC32, com sinal, e cada texto tem norma 1. Os pesos são
+# treinados offline com os vereditos da IA guardados em
+# `moderation_verdicts` (`flask threads train-moderation-classifier`) e
+# gravados num .npy que cada worker abre com mmap: o arquivo não é lido
+# inteiro, e as páginas ficam compartilhadas entre os processos.
+#
+# Usos, em core/moderation.py:
+# - fallback: quando a IA não pode ser consultada, textos com probabilidade
+#   de bloqueio >= CLASSIFIER_FALLBACK_THRESHOLD são recusados, em vez de
+#   tudo ser liberado
+# - portão de confiança (MODERATION_CLASSIFIER_GATE=1): probabilidade
+#   <= CLASSIFIER_GATE_ALLOW libera e >= CLASSIFIER_GATE_BLOCK bloqueia sem
+#   chamar a IA; o resto vai para a IA normalmente
+
+CLASSIFIER_PATH = os.getenv(
+    "MODERATION_CLASSIFIER_PATH", os.path.join(os.path.dirname(__file__), "moderation_classifier.npy")
+)
+CLASSIFIER_GATE = os.getenv("MODERATION_CLASSIFIER_GATE", "0") == "1"
+CLASSIFIER_GATE_ALLOW = float(os.getenv("MODERATION_CLASSIFIER_GATE_ALLOW", "0.02"))
+CLASSIFIER_GATE_BLOCK = float(os.getenv("MODERATION_CLASSIFIER_GATE_BLOCK", "0.98"))
+CLASSIFIER_FALLBACK_THRESHOLD = float(os.getenv("MODERATION_CLASSIFIER_FALLBACK_THRESHOLD", "0.5"))
+
+N_FEATURES = 2 ** 18
+
+# Treino: gradiente em lote completo com AdaGrad e regularização L2
+TRAIN_EPOCHS = 200
+TRAIN_LEARNING_RATE = 1.0
+TRAIN_L2 = 1e-4
+
+
+def _termos(texto: str) -> list[str]:
+    palavras = normalizar_termos(texto).split()
+    return palavras + [f"{a} {b}" for a, b in zip(palavras, palavras[1:])]
+
+
+def featurizar(textos: list[str], n_features: int = N_FEATURES):
+    """
+    Matriz esparsa (CSR) dos textos.
+
+    Returns:
+        tuple: (linhas, colunas, valores) com uma entrada por termo distinto de cada texto
+    """
+    linhas, colunas, valores = [], [], []
+    for linha, texto in enumerate(textos):
+        posicoes = {}
+        for termo in _termos(texto):
+            h = zlib.crc32(termo.encode("utf-8"))
+            # Colisões com sinais opostos se anulam em vez de se somarem
+            posicoes[h % n_features] = posicoes.get(h % n_features, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        if not posicoes:
+            continue
+        norma = sum(v * v for v in posicoes.values()) ** 0.5 or 1.0
+        linhas.extend([linha] * len(posicoes))
+        colunas.extend(posicoes)
+        valores.extend(v / norma for v in posicoes.values())
+    return (
+        np.asarray(linhas, dtype=np.int64),
+        np.asarray(colunas, dtype=np.int64),
+        np.asarray(valores, dtype=np.float32),
+    )
+
+
+def _sigmoide(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def _logits(pesos, n_textos: int, matriz):
+    linhas, colunas, valores = matriz
+    n_features = len(pesos) - 1
+    return np.bincount(linhas, weights=pesos[colunas] * valores, minlength=n_textos) + pesos[n_features]
+
+
+def treinar(textos: list[str], bloqueados: list[bool], n_features: int = N_FEATURES,
+            epochs: int = TRAIN_EPOCHS, learning_rate: float = TRAIN_LEARNING_RATE, l2: float = TRAIN_L2):
+    """
+    Treina a regressão logística; as duas classes pesam o mesmo, já que bloqueios são raros.
+
+    Returns:
+        numpy.ndarray: pesos float32, n_features posições mais o viés na última
+    """
+    y = np.asarray(bloqueados, dtype=np.float64)
+    n = len(y)
+    positivos = y.sum()
+    if n == 0 or positivos in (0, n):
+        raise ValueError("É preciso ter textos bloqueados e liberados para treinar")
+    peso_amostra = np.where(y == 1, n / (2 * positivos), n / (2 * (n - positivos)))
+
+    matriz = featurizar(textos, n_features)
+    linhas, colunas, valores = matriz
+    pesos = np.zeros(n_features + 1, dtype=np.float64)
+    acumulado = np.zeros(n_features + 1, dtype=np.float64)
+    for _ in range(epochs):
+        erro = (_sigmoide(_logits(pesos, n, matriz)) - y) * peso_amostra
+        gradiente = np.empty_like(pesos)
+        gradiente[:n_features] = np.bincount(colunas, weights=erro[linhas] * valores, minlength=n_features) / n
+        gradiente[:n_features] += l2 * pesos[:n_features]
+        gradiente[n_features] = erro.mean()
+        acumulado += gradiente * gradiente
+        pesos -= learning_rate * gradiente / (np.sqrt(acumulado) + 1e-8)
+    return pesos.astype(np.float32)
+
+
+def salvar_pesos(pesos, path: str = CLASSIFIER_PATH):
+    """Grava os pesos de forma atômica: workers que abrirem o arquivo nunca veem um .npy pela metade."""
+    temporario = f"{path}.tmp"
+    with open(temporario, "wb") as f:
+        np.save(f, np.asarray(pesos, dtype=np.float32))
+    os.replace(temporario, path)
+
+
+def carregar_exemplos(limite: int = None) -> tuple[list[str], list[bool]]:
+    """Textos e vereditos da IA guardados em `moderation_verdicts` com a versão atual do prompt."""
+    from core.moderation_cache import VERDICT_VERSION, ModerationVerdict
+
+    cursor = ModerationVerdict._get_collection().find(
+        {'_text': {'$nin': [None, '']}, '_version': VERDICT_VERSION}, {'_text': 1, '_is_safe': 1}
+    )
+    if limite:
+        cursor = cursor.limit(limite)
+    textos, bloqueados = [], []
+    for doc in cursor:
+        textos.append(doc['_text'])
+        bloqueados.append(not doc['_is_safe'])
+    return textos, bloqueados
+
+
+class LocalClassifier:
+    """Pesos abertos com mmap e contadores do worker."""
+
+    def __init__(self):
+        self._pesos = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {
+                'scored': 0,
+                'gate_allowed': 0,
+                'gate_blocked': 0,
+                'fallback_allowed': 0,
+                'fallback_blocked': 0,
+            }
+
+    def load(self, path: str = CLASSIFIER_PATH) -> bool:
+        """Abre o arquivo de pesos, se existir; retorna se o classificador ficou disponível."""
+        if np is None or not path or not os.path.exists(path):
+            return False
+        try:
+            pesos = np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Erro ao abrir o classificador de moderação {path}: {e}")
+            return False
+        if pesos.ndim != 1 or len(pesos) < 2:
+            print(f"Classificador de moderação inválido em {path}: formato {pesos.shape}")
+            return False
+        self._pesos = pesos
+        return True
+
+    def use(self, pesos):
+        """Usa pesos já em memória (testes e benchmarks); None desliga o classificador."""
+        self._pesos = pesos
+
+    @property
+    def loaded(self) -> bool:
+        return self._pesos is not None
+
+    def probabilidades(self, textos: list[str]):
+        """Probabilidade de bloqueio de cada texto, de uma vez; None sem classificador."""
+        pesos = self._pesos
+        if pesos is None:
+            return None
+        matriz = featurizar(textos, len(pesos) - 1)
+        with self._lock:
+            self._stats['scored'] += len(textos)
+        return _sigmoide(_logits(pesos, len(textos), matriz))
+
+    def probabilidade(self, texto: str) -> float | None:
+        probabilidades = self.probabilidades([texto])
+        return None if probabilidades is None else float(probabilidades[0])
+
+    def count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            loaded=self.loaded,
+            features=len(self._pesos) - 1 if self._pesos is not None else None,
+            gate=CLASSIFIER_GATE,
+        )
+        return stats
+
+
+# Um classificador por worker; os pesos são abertos na importação
+local_classifier = LocalClassifier()
+local_classifier.load()
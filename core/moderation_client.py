@@ -0,0 +1,466 @@
+import asyncio
+import bisect
+import collections
+import os
+import threading
+import time
+
+import aiohttp
+
+# Cliente HTTP compartilhado da moderação
+#
+# Cada processo tem um event loop próprio numa thread daemon, com uma única
+# aiohttp.ClientSession: as conexões com a Azure ficam abertas (keep-alive) e
+# são reaproveitadas por todas as requisições e workers de moderação do
+# processo. As chamadas síncronas das views entram nesse loop por
+# `ModerationClient.run`.
+#
+# Em volta de cada chamada:
+# - um semáforo limita as chamadas simultâneas do processo; quem espera mais
+#   que QUEUE_TIMEOUT_SECONDS por uma vaga desiste (ModerationUnavailable)
+# - um circuit breaker abre depois de FAILURE_THRESHOLD falhas seguidas
+#   (erro de rede, timeout, HTTP 5xx, 408 ou 429) e recusa chamadas por
+#   COOLDOWN_SECONDS; depois deixa passar uma chamada de teste. Os outros 4xx
+#   (ex. o filtro de conteúdo da Azure recusando um texto abusivo) mostram que
+#   o endpoint está no ar e não contam: senão alguns textos abusivos abririam
+#   o circuito e desligariam a moderação para todo mundo
+# - histogramas de latência por resultado
+#
+# Com MODERATION_HEDGING=1, uma chamada que não respondeu dentro do percentil
+# HEDGE_PERCENTILE das latências recentes ganha uma cópia; vale a primeira
+# resposta válida e a outra é cancelada. As cópias saem de um orçamento que
+# cresce HEDGE_BUDGET por chamada (5% de chamadas extras, no máximo). A espera
+# pela cópia fica abaixo de HEDGE_MAX_DELAY_FRACTION do timeout da chamada, e a
+# cópia só tem o que sobrou do timeout: as duas juntas não passam dele.
+
+MAX_CONNECTIONS = int(os.getenv("MODERATION_MAX_CONNECTIONS", "16"))
+MAX_CONCURRENCY = int(os.getenv("MODERATION_MAX_CONCURRENCY", "8"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("MODERATION_QUEUE_TIMEOUT", "2"))
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 30.0
+KEEPALIVE_SECONDS = 30.0
+
+HEDGING = os.getenv("MODERATION_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("MODERATION_HEDGE_PERCENTILE", "0.95"))
+HEDGE_BUDGET = float(os.getenv("MODERATION_HEDGE_BUDGET", "0.05"))
+HEDGE_BUDGET_BURST = 10.0
+# Até haver HEDGE_MIN_SAMPLES latências, a cópia sai após HEDGE_DEFAULT_DELAY_SECONDS
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY_SECONDS = 2.0
+HEDGE_MIN_DELAY_SECONDS = 0.05
+HEDGE_MAX_DELAY_FRACTION = 0.5
+
+# Limites superiores dos baldes dos histogramas, em milissegundos
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ModerationUnavailable(Exception):
+    """A chamada não foi feita: circuito aberto ou limite de concorrência."""
+
+
+class ModerationError(Exception):
+    """A chamada foi feita e falhou: erro de rede, timeout ou HTTP != 200."""
+
+
+class ModerationRejected(ModerationError):
+    """O endpoint respondeu com um 4xx que não é falha dele (ex. o filtro de conteúdo da Azure)."""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+# Status 4xx que ainda são falha do endpoint (timeout, limite de taxa)
+_ENDPOINT_FAILURE_4XX = (408, 429)
+
+
+class CircuitBreaker:
+    """Abre após `threshold` falhas seguidas; depois de `cooldown` segundos libera uma chamada de teste."""
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS, clock=time.monotonic):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probing = False
+            self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self._cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Se uma chamada pode ser feita agora; em meio-aberto, só uma por vez."""
+        return self.acquire() is not None
+
+    def acquire(self) -> str | None:
+        """
+        Como `allow`, dizendo como a chamada passou: CLOSED, ou HALF_OPEN se
+        ela é a chamada de teste (e só ela pode devolvê-la com `release`).
+        None se a chamada não pode ser feita.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return CLOSED
+            if self._clock() - self._opened_at < self._cooldown or self._probing:
+                return None
+            self._probing = True
+            return HALF_OPEN
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._threshold:
+                if self._state != OPEN:
+                    self.times_opened += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+            self._probing = False
+
+    def release(self):
+        """Devolve a vaga de teste de uma chamada cancelada antes de terminar; só para quem a obteve."""
+        with self._lock:
+            self._probing = False
+
+
+class HedgeBudget:
+    """Balde de fichas: cada chamada rende `ratio` ficha, cada cópia gasta uma."""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET, burst: float = HEDGE_BUDGET_BURST):
+        self._ratio = ratio
+        self._burst = burst
+        self._lock = threading.Lock()
+        self.tokens = 0.0
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self._burst, self.tokens + self._ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self.tokens = 0.0
+
+
+class LatencyHistogram:
+    """Contagem de latências em baldes fixos, separada por resultado."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self._buckets = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def observe(self, outcome: str, seconds: float):
+        i = bisect.bisect_left(self._buckets, seconds * 1000)
+        with self._lock:
+            counts = self._counts.setdefault(outcome, [0] * (len(self._buckets) + 1))
+            counts[i] += 1
+
+    def _percentile(self, counts: list, p: float):
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= p * total:
+                return self._buckets[i] if i < len(self._buckets) else None
+        return None
+
+    def snapshot(self) -> dict:
+        """
+        {"buckets_ms": [...], "<resultado>": {"counts": [...], "count": n, "p50_ms": x, "p99_ms": y}}
+
+        `counts` tem um balde a mais no fim para o que passou do último
+        limite; os percentis são o limite superior do balde (None se além do último).
+        """
+        with self._lock:
+            counts = {outcome: list(values) for outcome, values in self._counts.items()}
+        snapshot = {"buckets_ms": list(self._buckets)}
+        for outcome, values in counts.items():
+            snapshot[outcome] = {
+                "counts": values,
+                "count": sum(values),
+                "p50_ms": self._percentile(values, 0.5),
+                "p99_ms": self._percentile(values, 0.99),
+            }
+        return snapshot
+
+
+class ModerationClient:
+    """Conexões, limite de concorrência, circuit breaker e métricas das chamadas de moderação de um processo."""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, max_concurrency: int = MAX_CONCURRENCY,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS, breaker: CircuitBreaker = None,
+                 hedging: bool = None, hedge_percentile: float = HEDGE_PERCENTILE,
+                 hedge_budget: HedgeBudget = None):
+        self._max_connections = max_connections
+        self._max_concurrency = max_concurrency
+        self._queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.hedging = HEDGING if hedging is None else hedging
+        self._hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget or HedgeBudget()
+        self._recent = collections.deque(maxlen=HEDGE_WINDOW)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._slots = None
+        self._pid = None
+        self._in_flight = 0
+        self._counters = {}
+        self.reset_stats()
+
+    # Event loop
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # Depois de um fork (gunicorn --preload) a thread do loop não existe no filho
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                ready = threading.Event()
+                loop = asyncio.new_event_loop()
+
+                def serve():
+                    asyncio.set_event_loop(loop)
+                    self._slots = asyncio.Semaphore(self._max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                self._loop, self._session, self._pid = loop, None, os.getpid()
+                self._thread = threading.Thread(target=serve, name="moderation-client", daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def run(self, coro, timeout: float = None):
+        """Executa `coro` no loop do cliente e espera o resultado (para código síncrono)."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        """Fecha as conexões e para o loop."""
+        with self._lock:
+            loop, session = self._loop, self._session
+            self._loop = self._session = None
+        if loop is None:
+            return
+        if session is not None:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Sempre chamado de dentro do loop do cliente
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_connections,
+                limit_per_host=self._max_connections,
+                keepalive_timeout=KEEPALIVE_SECONDS,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    # Chamadas
+
+    async def post_json(self, url: str, payload: dict, params: dict = None, headers: dict = None,
+                        timeout: float = 10) -> dict:
+        """
+        POST de `payload` e o JSON da resposta, com cópia (hedge) se `hedging` estiver ligado.
+
+        Raises:
+            ModerationUnavailable: circuito aberto ou sem vaga em `queue_timeout` segundos
+            ModerationError: erro de rede, timeout ou status HTTP diferente de 200
+            ModerationRejected: 4xx que não é falha do endpoint (não conta para o circuit breaker)
+        """
+        if not self.hedging:
+            return await self._attempt(url, payload, params, headers, timeout)
+
+        self.hedge_budget.earn()
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self._attempt(url, payload, params, headers, timeout))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(timeout))
+            # Sem cópia se o circuito não está fechado ou se não há vaga livre agora
+            if (done or self.breaker.state != CLOSED or self._slots.locked()
+                    or not self.hedge_budget.spend()):
+                return await primary
+
+            # A cópia termina junto com a original: só leva o que sobrou do timeout
+            remaining = timeout - (time.perf_counter() - start)
+            self._count("hedges_sent")
+            hedge = asyncio.ensure_future(self._attempt(url, payload, params, headers, remaining))
+            tasks.add(hedge)
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedges_won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # A cópia que perdeu (ou as duas, se quem chamou foi cancelado)
+            for task in tasks:
+                task.cancel()
+
+    def hedge_delay(self, timeout: float = None) -> float:
+        """
+        Quanto esperar pela primeira resposta antes de mandar a cópia: o
+        percentil das latências recentes, até HEDGE_MAX_DELAY_FRACTION de `timeout`.
+        """
+        recent = sorted(self._recent)
+        if len(recent) < HEDGE_MIN_SAMPLES:
+            delay = HEDGE_DEFAULT_DELAY_SECONDS
+        else:
+            index = min(len(recent) - 1, int(len(recent) * self._hedge_percentile))
+            delay = max(HEDGE_MIN_DELAY_SECONDS, recent[index])
+        if timeout is not None:
+            delay = min(delay, timeout * HEDGE_MAX_DELAY_FRACTION)
+        return delay
+
+    async def _attempt(self, url: str, payload: dict, params: dict, headers: dict, timeout: float) -> dict:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._queue_timeout)
+        except asyncio.TimeoutError:
+            self._count("rejected_busy")
+            raise ModerationUnavailable("limite de chamadas simultâneas atingido")
+
+        try:
+            passage = self.breaker.acquire()
+            if passage is None:
+                self._count("short_circuited")
+                raise ModerationUnavailable("circuito aberto")
+
+            self._in_flight += 1
+            start = time.perf_counter()
+            try:
+                async with self._get_session().post(
+                    url, params=params, headers=headers, json=payload,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as response:
+                    if response.status != 200:
+                        body = await response.text()
+                        if 400 <= response.status < 500 and response.status not in _ENDPOINT_FAILURE_4XX:
+                            raise ModerationRejected(response.status, body)
+                        raise ModerationError(f"HTTP {response.status}: {body[:200]}")
+                    result = await response.json(content_type=None)
+            except asyncio.CancelledError:
+                # Perdeu para a outra cópia: não conta como falha. A vaga de
+                # teste só é devolvida por quem a tem, senão uma segunda
+                # chamada de teste passaria enquanto a primeira ainda corre
+                if passage == HALF_OPEN:
+                    self.breaker.release()
+                self._count("cancelled")
+                raise
+            except asyncio.TimeoutError:
+                self._failed("timeout", start)
+                raise ModerationError("timeout")
+            except ModerationRejected:
+                # O endpoint respondeu: fecha o circuito (e devolve a vaga de teste) como um sucesso
+                self.breaker.record_success()
+                self.latency.observe("rejected", time.perf_counter() - start)
+                self._count("rejected")
+                raise
+            except ModerationError:
+                self._failed("error", start)
+                raise
+            except (aiohttp.ClientError, ValueError) as e:
+                self._failed("error", start)
+                raise ModerationError(str(e) or type(e).__name__)
+            finally:
+                self._in_flight -= 1
+
+            elapsed = time.perf_counter() - start
+            self.breaker.record_success()
+            self.latency.observe("ok", elapsed)
+            self._recent.append(elapsed)
+            self._count("ok")
+            return result
+        finally:
+            self._slots.release()
+
+    def _failed(self, outcome: str, start: float):
+        self.breaker.record_failure()
+        self.latency.observe(outcome, time.perf_counter() - start)
+        self._count(outcome)
+
+    # Métricas
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters = {
+                "ok": 0, "error": 0, "timeout": 0, "rejected": 0, "short_circuited": 0, "rejected_busy": 0,
+                "cancelled": 0, "hedges_sent": 0, "hedges_won": 0,
+            }
+        self.latency.reset()
+
+    def reset(self):
+        """Fecha o circuito, esvazia o orçamento de cópias e zera as métricas e as latências recentes."""
+        self.breaker.reset()
+        self.hedge_budget.reset()
+        self._recent.clear()
+        self.reset_stats()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "circuit": self.breaker.state,
+            "times_opened": self.breaker.times_opened,
+            "in_flight": self._in_flight,
+            "max_concurrency": self._max_concurrency,
+            **counters,
+            "hedging": self.hedging,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "hedge_budget": round(self.hedge_budget.tokens, 2),
+            "latency": self.latency.snapshot(),
+        }
+
+
+# Um cliente por processo
+moderation_client = ModerationClient()
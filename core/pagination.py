@@ -0,0 +1,99 @@
+import base64
+
+from bson import json_util
+
+# Keyset (cursor) pagination utilities
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor or limit cannot be parsed."""
+
+
+def parse_limit(raw_limit, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE) -> int:
+    """Parse the `limit` query param, clamping it to `maximum`."""
+    if raw_limit is None or raw_limit == "":
+        return default
+    try:
+        limit = int(raw_limit)
+    except (TypeError, ValueError):
+        raise InvalidCursor("limit must be a positive integer")
+    if limit < 1:
+        raise InvalidCursor("limit must be a positive integer")
+    return min(limit, maximum)
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Encode the sort-key values of the last item of a page into an opaque cursor.
+
+    Values are serialized with bson's extended JSON so datetimes and ObjectIds
+    survive the round trip.
+    """
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor produced by `encode_cursor` holding `size` sort values."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def keyset_filter(sort_keys: list[tuple[str, int]], values: list) -> dict:
+    """
+    Build the raw Mongo filter selecting documents strictly after `values`.
+
+    `sort_keys` is the full ordering as (field, direction) pairs and must end
+    with a unique field (usually `_id`) so the ordering is total. For
+    [(a, -1), (b, -1)] and values [x, y] this yields
+    {a: {'$lte': x}, '$or': [{a: {'$lt': x}}, {a: x, b: {'$lt': y}}]}, which
+    Mongo answers with an index range scan instead of skipping over earlier
+    pages. The redundant bound on the leading key lets the planner keep a
+    single index scan in sort order rather than planning each `$or` branch.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort_keys):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort_keys[:i])}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    first_field, first_direction = sort_keys[0]
+    return {
+        first_field: {"$lte" if first_direction < 0 else "$gte": values[0]},
+        "$or": clauses,
+    }
+
+
+def cursor_values(doc, sort_keys: list[tuple[str, int]]) -> list:
+    """Read the sort-key values of a document, mapping `_id` to `id`."""
+    return [getattr(doc, "id" if field == "_id" else field) for field, _ in sort_keys]
+
+
+def paginate(queryset, sort_keys: list[tuple[str, int]], limit: int, cursor: str = None):
+    """
+    Fetch one page of `queryset` ordered by `sort_keys`.
+
+    Returns:
+        tuple: (documents: list, next_cursor: str or None)
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(sort_keys))
+        queryset = queryset.filter(__raw__=keyset_filter(sort_keys, values))
+
+    ordering = [("-" if direction < 0 else "") + ("id" if field == "_id" else field)
+                for field, direction in sort_keys]
+    docs = list(queryset.order_by(*ordering).limit(limit + 1))
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(cursor_values(docs[-1], sort_keys))
+    return docs, next_cursor
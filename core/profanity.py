@@ -0,0 +1,178 @@
+import os
+import re
+import threading
+import unicodedata
+
+# Pré-filtro local de moderação
+#
+# Roda antes da chamada à Azure OpenAI. Um autômato Aho-Corasick com todos
+# os termos procura, numa única passada sobre o texto normalizado (sem
+# acentos, leetspeak desfeito, letras repetidas colapsadas), palavras
+# inteiras das duas listas abaixo:
+#
+# - OFFENSIVE_TERMS: bloqueio imediato, sem chamar a IA
+# - RISKY_TERMS: o texto sempre vai para a IA, mesmo se for curto
+#
+# Com MODERATION_SKIP_SHORT_SAFE=1, textos de até SHORT_TEXT_MAX_CHARS
+# caracteres sem nenhum termo das listas são liberados localmente.
+
+SKIP_SHORT_SAFE = os.getenv("MODERATION_SKIP_SHORT_SAFE", "0") == "1"
+SHORT_TEXT_MAX_CHARS = 40
+
+BLOCK = "block"
+ALLOW = "allow"
+REMOTE = "remote"
+
+OFFENSIVE = "offensive"
+RISKY = "risky"
+
+OFFENSIVE_TERMS = (
+    # Português
+    "arrombada", "arrombado", "buceta", "caralho", "corno", "cuzão", "desgraçada",
+    "desgraçado", "fdp", "filha da puta", "filho da puta", "foda", "foda-se", "fodase",
+    "foder", "fodido", "pau no cu", "piroca", "porra", "puta", "putaria", "puto",
+    "merda", "tomar no cu", "vai se foder", "vsf",
+    # English
+    "asshole", "bastard", "bitch", "bullshit", "cunt", "dickhead", "fuck", "fucker",
+    "fucking", "motherfucker", "shit", "stfu", "wanker",
+)
+
+RISKY_TERMS = (
+    # Português
+    "ameaça", "arma", "bomba", "cartão", "droga", "drogas", "golpe", "matar", "me matar",
+    "morrer", "morte", "nude", "nudes", "ódio", "pix", "racista", "senha", "sexo",
+    "suicídio", "suicidar",
+    # English
+    "bomb", "die", "gun", "hate", "kill", "password", "sex", "suicide",
+)
+
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+# Dígitos, @ e $ grudados numa letra ("c4r4lh0", "@ss"); ! e | só entre letras ("sh!t"), para não mudar "merda!"
+_LEET_ADJACENT = re.compile(r"[013457@$](?=[a-z])|(?<=[a-z])[013457@$]")
+_LEET_BETWEEN = re.compile(r"(?<=[a-z])[!|](?=[a-z])")
+_INNER_PUNCTUATION = re.compile(r"(?<=[a-z])[.\-_*]+(?=[a-z])")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_SPACED_LETTERS = re.compile(r"\b[a-z](?: [a-z]\b){2,}")
+_REPEATS = re.compile(r"([a-z])\1+")
+
+
+def normalizar_termos(texto: str) -> str:
+    """
+    Forma usada na comparação: minúsculas, sem acentos, leetspeak desfeito,
+    "p.u.t.a" e "p u t a" juntados, letras repetidas colapsadas e palavras
+    separadas por um espaço.
+    """
+    # NFKD separa os acentos, que o encode descarta com o resto do que não é ASCII
+    texto = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    if "!" in texto or "|" in texto:
+        texto = _LEET_BETWEEN.sub("i", texto)
+    if any(c in texto for c in "013457@$"):
+        texto = _LEET_ADJACENT.sub(lambda m: m.group(0).translate(_LEET), texto)
+    texto = _INNER_PUNCTUATION.sub("", texto)
+    texto = _NON_ALNUM.sub(" ", texto).strip()
+    texto = _SPACED_LETTERS.sub(lambda m: m.group(0).replace(" ", ""), texto)
+    return _REPEATS.sub(r"\1", texto)
+
+
+class AhoCorasick:
+    """Autômato de múltiplos padrões: acha todas as ocorrências numa passada."""
+
+    def __init__(self, patterns: dict[str, str]):
+        """`patterns` mapeia cada padrão para um rótulo devolvido em `search`."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern, label in patterns.items():
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += ((pattern, label),)
+
+        # Links de falha em largura; cada estado herda as saídas do seu link e,
+        # para a busca não precisar segui-los, as transições que ele não tem
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+            if state:
+                for char, nxt in self._goto[self._fail[state]].items():
+                    self._goto[state].setdefault(char, nxt)
+
+    def search(self, text: str):
+        """Gera (padrão, rótulo) para cada ocorrência, na ordem em que terminam no texto."""
+        goto, out = self._goto, self._out
+        state = 0
+        for char in text:
+            state = goto[state].get(char, 0)
+            if out[state]:
+                yield from out[state]
+
+
+class ProfanityFilter:
+    """Classifica um texto como bloqueado, liberado ou a enviar para a IA."""
+
+    def __init__(self, offensive=OFFENSIVE_TERMS, risky=RISKY_TERMS):
+        patterns = {}
+        for terms, label in ((risky, RISKY), (offensive, OFFENSIVE)):
+            for term in terms:
+                # Espaços nas pontas: só casa palavras inteiras ("cu" não casa "curso")
+                patterns[f" {normalizar_termos(term)} "] = label
+        self._automaton = AhoCorasick(patterns)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'checked': 0, 'blocked': 0, 'skipped_short': 0, 'passed': 0}
+
+    def check(self, texto: str, skip_short_safe: bool = None) -> tuple[str, str | None]:
+        """
+        Returns:
+            tuple: (BLOCK, termo) para um termo ofensivo, (ALLOW, None) para um
+            texto curto sem termos de risco quando `skip_short_safe`, e
+            (REMOTE, termo de risco ou None) nos demais casos
+        """
+        if skip_short_safe is None:
+            skip_short_safe = SKIP_SHORT_SAFE
+        normalizado = normalizar_termos(texto)
+        risky = None
+        for pattern, label in self._automaton.search(f" {normalizado} "):
+            if label == OFFENSIVE:
+                self._count('blocked')
+                return BLOCK, pattern.strip()
+            risky = risky or pattern.strip()
+
+        if risky is None and skip_short_safe and len(texto.strip()) <= SHORT_TEXT_MAX_CHARS:
+            self._count('skipped_short')
+            return ALLOW, None
+        self._count('passed')
+        return REMOTE, risky
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._stats['checked'] += 1
+            self._stats[outcome] += 1
+
+    def stats(self) -> dict:
+        """Contadores deste worker; `remote_calls_avoided` soma bloqueios e textos curtos liberados."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['remote_calls_avoided'] = stats['blocked'] + stats['skipped_short']
+        return stats
+
+
+# Um filtro por worker; o autômato é montado uma vez, na importação
+profanity_filter = ProfanityFilter()
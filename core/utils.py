@@ -10,10 +10,13 @@ from email.mime.text import MIMEText
 import pytz
 from dotenv import load_dotenv
 from flask_bcrypt import Bcrypt
-from jinja2 import Template
+from jinja2 import TemplateNotFound
 
 load_dotenv()
 
+# After load_dotenv: the registry reads EMAIL_TEMPLATE_CACHE_DIR at import
+from core.email_registry import email_templates  # noqa: E402
+
 # Time Utilities
 
 BRASILIA_TZ = pytz.timezone("America/Sao_Paulo")
@@ -204,21 +207,13 @@ def validation_error_response(errors):
 # email sending utils
 
 
-def send_email(to_email, subject, template_html="", context=None):
+def validate_email_request(to_email, subject):
     """
-    Send an email with HTML content rendered by Jinja2.
+    Check the recipient and subject of an email.
 
-    Args:
-        to_email (str): The recipient's email address
-        subject (str): The email subject
-        template_html (str): Filename of the HTML template inside core/email_templates
-        context (dict): Context used by Jinja2 to render the template (e.g. {'verify_email_link': '...'})
     Returns:
-        tuple: (response_data, status_code)
+        tuple or None: (response_data, status_code) describing the problem, or None when valid
     """
-    if context is None:
-        context = {}
-
     # Validate input parameters
     if not to_email or not subject:
         return {
@@ -239,46 +234,78 @@ def send_email(to_email, subject, template_html="", context=None):
                 "details": f"The email address '{to_email}' is not in a valid format",
             }
         }, 400  # Bad Request
+    return None
 
-    sender_email = os.environ.get("EMAIL", "example@email.com")
-    password = os.environ.get("EMAIL_PASS", "1234567890")
 
-    # Resolve template path relative to this utils.py file
-    base_dir = os.path.join(os.path.dirname(__file__), "email_templates")
-    template_path = os.path.join(base_dir, template_html + ".html")
+def build_email(to_email, subject, template_html="", context=None):
+    """
+    Render an email template into a MIME message ready to send, with the
+    HTML part and its plain-text alternative.
+
+    Returns:
+        tuple: (message, None) on success, or (None, (response_data, status_code)) on failure
+    """
+    if context is None:
+        context = {}
+
+    error = validate_email_request(to_email, subject)
+    if error:
+        return None, error
+
+    sender_email = os.environ.get("EMAIL", "example@email.com")
 
+    # Render the precompiled template (core/email_registry.py) with the provided context (e.g. verification_link)
     try:
-        with open(template_path, "r", encoding="utf-8") as f:
-            template_content = f.read()
-    except FileNotFoundError:
-        return {
+        rendered_html, rendered_text = email_templates.render(template_html, context)
+    except TemplateNotFound:
+        return None, ({
             "error": {
                 "code": "TEMPLATE_NOT_FOUND",
                 "message": "Email template not found",
-                "details": f"Could not find template file '{template_html}' in '{base_dir}'",
+                "details": f"Could not find template file '{template_html}' in '{email_templates.directory}'",
             }
-        }, 400
-
-    # Render template with Jinja2 using provided context (e.g. verify_email_link)
-    try:
-        rendered_html = Template(template_content).render(**context)
+        }, 400)
     except Exception as e:
-        return {
+        return None, ({
             "error": {
                 "code": "TEMPLATE_RENDER_ERROR",
                 "message": "Failed to render email template",
                 "details": str(e),
             }
-        }, 500
+        }, 500)
 
     message = MIMEMultipart("alternative")
     message["Subject"] = subject
     message["From"] = sender_email
     message["To"] = to_email
 
-    # Attach rendered HTML
-    part = MIMEText(rendered_html, "html")
-    message.attach(part)
+    # Plain text first: clients show the last alternative they support
+    message.attach(MIMEText(rendered_text, "plain"))
+    message.attach(MIMEText(rendered_html, "html"))
+    return message, None
+
+
+def send_email(to_email, subject, template_html="", context=None):
+    """
+    Send an email with HTML content rendered by Jinja2, over a new SMTP connection.
+
+    Request handlers should use `core.email_outbox.queue_email` instead, which
+    sends from a background thread over pooled connections.
+
+    Args:
+        to_email (str): The recipient's email address
+        subject (str): The email subject
+        template_html (str): Filename of the HTML template inside core/email_templates
+        context (dict): Context used by Jinja2 to render the template (e.g. {'verify_email_link': '...'})
+    Returns:
+        tuple: (response_data, status_code)
+    """
+    message, error = build_email(to_email, subject, template_html, context)
+    if error:
+        return error
+
+    sender_email = os.environ.get("EMAIL", "example@email.com")
+    password = os.environ.get("EMAIL_PASS", "1234567890")
 
     # Send email
     try:
@@ -43,6 +43,24 @@ except Exception as e:
     # For development, we'll continue and let the routes handle the errors
     pass
 
+try:
+    # Make sure every model's indexes exist before serving requests
+    from core.indexes import ensure_indexes
+
+    ensure_indexes()
+    print("MongoDB indexes ensured.")
+except Exception as e:
+    print(f"Failed to ensure MongoDB indexes: {e}")
+
+try:
+    # Compile the email templates once; the bytecode cache lets the other workers skip parsing
+    from core.email_registry import email_templates
+
+    email_templates.precompile()
+    print("Email templates compiled.")
+except Exception as e:
+    print(f"Failed to compile email templates: {e}")
+
 try:
     # Update the index JSON file at startup
     update_index_json()
@@ -57,6 +75,7 @@ from api.search.routes import search_bp  # noqa: E402
 # Blueprints
 from api.threads.routes import threads_bp  # noqa: E402
 from api.reports.routes import reports_bp  # noqa: E402
+from api.moderation.routes import moderation_bp  # noqa: E402
 
 # Register blueprints
 app.register_blueprint(threads_bp, url_prefix="/api")
@@ -64,6 +83,14 @@ app.register_blueprint(search_bp, url_prefix="/api")
 app.register_blueprint(health_bp, url_prefix="/health")
 app.register_blueprint(auth_bp, url_prefix="/api/auth")
 app.register_blueprint(reports_bp, url_prefix="/api")
+app.register_blueprint(moderation_bp, url_prefix="/api")
+
+# CLI commands (flask <group> <command>)
+from api.threads.commands import threads_cli  # noqa: E402
+from core.indexes import db_cli  # noqa: E402
+
+app.cli.add_command(threads_cli)
+app.cli.add_command(db_cli)
 
 
 # Global error handlers
@@ -96,5 +123,42 @@ def index():
     return jsonify(index_data), 200
 
 
+def start_background_services():
+    """
+    Start this process's background threads. Only the serving process calls
+    this (wsgi.py under gunicorn, or `python main.py`); importing the app, as
+    the `flask` CLI and the tests do, starts nothing.
+    """
+    try:
+        # Build this worker's search/typeahead indexes and keep them synced in the background
+        from api.search.indexing import start_background_sync
+
+        if start_background_sync():
+            print("Search index sync started.")
+    except Exception as e:
+        print(f"Failed to start search index sync: {e}")
+
+    try:
+        # Moderate new threads/posts in the background when ASYNC_MODERATION=1 or MODERATION_POLICY=1
+        from api.threads.moderation_queue import start_moderation_workers
+
+        if start_moderation_workers():
+            print("Moderation workers started.")
+    except Exception as e:
+        print(f"Failed to start moderation workers: {e}")
+
+    try:
+        # Send queued emails (verification, etc.) in the background unless EMAIL_SENDER=0
+        from core.email_outbox import start_email_sender
+
+        if start_email_sender():
+            print("Email sender started.")
+    except Exception as e:
+        print(f"Failed to start email sender: {e}")
+
+
 if __name__ == "__main__":
+    # With debug=True the reloader runs the app in a child process; start the threads only there
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
     app.run(host="0.0.0.0", port=5000, debug=True)
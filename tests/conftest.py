@@ -1,14 +1,28 @@
 import pytest
+import os
+
+# Tests drive the search indexes through the view hooks; no background sync thread
+os.environ.setdefault('SEARCH_BACKGROUND_SYNC', '0')
+# Tests send queued emails with drain_outbox against a local SMTP server; no sender threads
+os.environ.setdefault('EMAIL_SENDER', '0')
+
 from main import app as flask_app
 import mongoengine as me
-import os
 from dotenv import load_dotenv
 from api.authentication.models import User, AuthToken
-from unittest.mock import patch
+from api.search.indexing import clear_indexes
+from api.threads.moderation_policy import moderation_policy
+from core.moderation_cache import verdict_cache
+from core.moderation_classifier import local_classifier
+from core.moderation_client import moderation_client
+from core.profanity import profanity_filter
 
 # Load environment variables from .env for test configuration
 load_dotenv()
 
+# Tests never use a classifier trained on this machine; the ones that need it train their own
+local_classifier.use(None)
+
 # Use a separate test database
 TEST_MONGODB_URI = os.environ.get('MONGODB_TEST', 'mongodb://localhost:27017/forum_test_db')
 
@@ -63,6 +77,14 @@ def cleanup_db_after_each_test(app):
     for collection_name in db.list_collection_names():
         if collection_name != 'system.indexes': # Don't drop system collections like 'system.indexes'
             db.drop_collection(collection_name)
+    # The search indexes and moderation verdicts live in memory, so they must be emptied with the collections
+    clear_indexes()
+    verdict_cache.clear()
+    verdict_cache.reset_stats()
+    profanity_filter.reset_stats()
+    moderation_client.reset()
+    moderation_policy.clear()
+    local_classifier.reset_stats()
 
 @pytest.fixture
 def auth_data():
@@ -134,11 +156,3 @@ def post_data():
     return {
         "content": "This is the content of a test post."
     }
-
-@pytest.fixture(autouse=True)
-def mock_send_email():
-    """Mock the send_email function to prevent actual email sending during tests."""
-    with patch('api.authentication.views.send_email') as mock:
-        # Make send_email return success
-        mock.return_value = ({"message": "Email sent successfully"}, 200)
-        yield mock
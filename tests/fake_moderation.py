@@ -0,0 +1,165 @@
+"""
+A local stand-in for the Azure OpenAI chat completions endpoint.
+
+Runs an aiohttp server on 127.0.0.1 in a background thread and answers the
+moderation prompt in the same format the real model does. The verdict comes
+from markers in the moderated text:
+
+- ``PROIBIDO`` -> unsafe, category "ofensivo"
+- ``ERRO500``  -> HTTP 500
+- ``LIXO``     -> a reply that is not JSON
+- ``FILTRO``   -> HTTP 400 from the Azure content filter (category "hate")
+
+Batch prompts (one JSON object per line under ``Textos:``) get one result
+per item, judged by the same markers; a batch with ``ERRO500``, ``FILTRO`` or ``LIXO``
+in any item fails as a whole, and items with ``OMITIR`` are left out of the
+reply. Each batch is recorded in ``batches`` as its list of texts.
+
+Every reply waits ``delay`` seconds first, so tests can tell concurrent
+calls from sequential ones. To simulate an outage, set ``delay`` higher than
+the client timeout or set ``fail_status`` to answer every call with that
+HTTP status. For uneven latency, set ``latency`` to a function of the call
+number (0, 1, 2...) returning that call's delay; ``reset()`` restores all
+three. ``connections`` collects the client
+address of every call, so tests can check that connections are reused.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+
+from aiohttp import web
+
+_TEXT = re.compile(r'Texto: "(.*)"\n\nCategorias', re.S)
+_BATCH = re.compile(r'\nTextos:\n(.*?)\n\nCategorias', re.S)
+_CONTENT_FILTER = {"error": {
+    "message": "The response was filtered due to the prompt triggering Azure OpenAI's content management policy.",
+    "code": "content_filter",
+    "status": 400,
+    "innererror": {"code": "ResponsibleAIPolicyViolation", "content_filter_result": {
+        "hate": {"filtered": True, "severity": "high"},
+        "sexual": {"filtered": False, "severity": "safe"},
+        "violence": {"filtered": False, "severity": "safe"},
+        "self_harm": {"filtered": False, "severity": "safe"},
+    }},
+}}
+
+
+def _judge(text: str) -> dict:
+    if "PROIBIDO" in text:
+        return {"is_safe": False, "category": "ofensivo", "reason": "termo proibido"}
+    return {"is_safe": True, "category": None, "reason": None}
+
+
+class FakeModerationServer:
+    def __init__(self, delay: float = 0.0):
+        self.delay = self._initial_delay = delay
+        self.fail_status = None
+        self.latency = None
+        self.connections = set()
+        self.calls = []  # Moderated texts, in arrival order
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self.url = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        prompt = payload["messages"][-1]["content"]
+        batch = _BATCH.search(prompt)
+        if batch:
+            items = [json.loads(line) for line in batch.group(1).splitlines()]
+            self.batches.append([item["texto"] for item in items])
+            text = " ".join(item["texto"] for item in items)
+        else:
+            items = None
+            text = _TEXT.search(prompt).group(1)
+        call_number = len(self.calls)
+        self.calls.append(text)
+        self.connections.add(request.transport.get_extra_info("peername"))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency(call_number) if self.latency else self.delay)
+        finally:
+            self.in_flight -= 1
+
+        if self.fail_status:
+            return web.Response(status=self.fail_status, text="injected failure")
+        if "ERRO500" in text:
+            return web.Response(status=500, text="internal error")
+        if "FILTRO" in text:
+            return web.json_response(_CONTENT_FILTER, status=400)
+        if "LIXO" in text:
+            content = "não sei responder"
+        elif items is not None:
+            results = [dict(_judge(item["texto"]), id=item["id"]) for item in items if "OMITIR" not in item["texto"]]
+            content = json.dumps({"resultados": results})
+        elif "PROIBIDO" in text:
+            content = json.dumps(_judge(text))
+        else:
+            content = "```json\n" + json.dumps(_judge(text)) + "\n```"
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    def start(self) -> "FakeModerationServer":
+        started = threading.Event()
+
+        async def serve():
+            app = web.Application()
+            app.router.add_post("/chat/completions", self._handle)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://127.0.0.1:{port}/chat/completions"
+            started.set()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-moderation", daemon=True)
+        self._thread.start()
+        if not started.wait(5):
+            raise RuntimeError("fake moderation server did not start")
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
+
+    def reset(self):
+        # Let replies abandoned by a timed-out client finish first
+        deadline = time.monotonic() + self.delay + 1
+        while self.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.calls.clear()
+        self.batches.clear()
+        self.connections.clear()
+        self.max_in_flight = 0
+        self.delay = self._initial_delay
+        self.fail_status = None
+        self.latency = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def timed(fn, *args):
+    """Run fn(*args) and return (result, seconds)."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
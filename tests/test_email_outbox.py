@@ -0,0 +1,218 @@
+import socket
+import smtplib
+import time
+from datetime import timedelta
+from email.mime.text import MIMEText
+
+import pytest
+
+from core import email_outbox
+from core.email_outbox import (
+    FAILED, MAX_ATTEMPTS, QUEUED, OutboxEmail, RateLimiter, SMTPPool, drain_outbox, queue_email,
+)
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+from aiosmtpd.smtp import AuthResult  # noqa: E402
+
+USERNAME = 'forum@example.com'
+PASSWORD = 'app-password'
+REFUSED = 'bounce@al.insper.edu.br'
+GREYLISTED = 'greylist@al.insper.edu.br'
+
+
+class Mailbox:
+    """aiosmtpd handler that keeps every message, refuses REFUSED and defers GREYLISTED"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return '550 No such user'
+        if address == GREYLISTED:
+            return '451 Greylisted, try again later'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode('utf-8', 'replace')))
+        return '250 OK'
+
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=(auth_data.login, auth_data.password) == (USERNAME.encode(), PASSWORD.encode()))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    """A local SMTP server with AUTH, standing in for Gmail."""
+    mailbox = Mailbox()
+    controller = aiosmtpd_controller.Controller(
+        mailbox, hostname='127.0.0.1', port=free_port(), authenticator=authenticate, auth_require_tls=False,
+    )
+    controller.start()
+    mailbox.port = controller.port
+    yield mailbox
+    controller.stop()
+
+
+@pytest.fixture
+def pool(smtp_server):
+    pool = SMTPPool(host='127.0.0.1', port=smtp_server.port, security='none', username=USERNAME, password=PASSWORD)
+    yield pool
+    pool.close()
+
+
+def message(to='someone@al.insper.edu.br', body='Olá'):
+    msg = MIMEText(body)
+    msg['Subject'] = 'Teste'
+    msg['From'] = USERNAME
+    msg['To'] = to
+    return msg
+
+
+def later(seconds):
+    return email_outbox._utcnow() + timedelta(seconds=seconds)
+
+
+class TestSMTPPool:
+    """Connection reuse against the local server"""
+
+    def test_one_login_for_many_messages(self, pool, smtp_server):
+        for i in range(5):
+            pool.send(message(body=f'mensagem {i}'))
+
+        assert len(smtp_server.messages) == 5
+        assert pool.stats() == {'connections': 1, 'reused': 4, 'sent': 5, 'idle': 1}
+
+    def test_reconnects_after_max_messages(self, pool):
+        pool.max_messages = 2
+        for _ in range(5):
+            pool.send(message())
+        assert pool.stats()['connections'] == 3
+
+    def test_idle_connections_expire(self, pool):
+        pool.send(message())
+        pool.idle_seconds = 0
+        pool.send(message())
+        assert (pool.stats()['connections'], pool.stats()['reused']) == (2, 0)
+
+    def test_connection_dropped_by_the_server_is_replaced(self, pool, smtp_server):
+        pool.send(message())
+        pool._idle[0][0].close()
+
+        pool.send(message())
+
+        assert len(smtp_server.messages) == 2
+        assert pool.stats()['connections'] == 2
+
+    def test_refused_recipient_keeps_the_connection(self, pool, smtp_server):
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            pool.send(message(to=REFUSED))
+        pool.send(message())
+
+        assert pool.stats()['connections'] == 1
+        assert len(smtp_server.messages) == 1
+
+
+class TestRateLimiter:
+
+    def test_spaces_calls(self):
+        limiter = RateLimiter(rate=50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+        assert time.monotonic() - start >= 5 / 50 * 0.9
+
+    def test_zero_rate_is_unlimited(self):
+        limiter = RateLimiter(rate=0)
+        start = time.monotonic()
+        for _ in range(1000):
+            limiter.wait()
+        assert time.monotonic() - start < 0.5
+
+
+class TestOutbox:
+    """Messages queued by the auth views and sent by drain_outbox"""
+
+    def test_register_queues_the_verification_email(self, client, auth_data):
+        response = client.post('/api/auth/register', json=auth_data)
+
+        assert response.status_code == 201
+        email = OutboxEmail.objects.get()
+        assert (email._to, email._template, email._state) == (auth_data['email'], 'verify_email', QUEUED)
+        assert '/verify-email?token=' in email._context['verification_link']
+
+    def test_resend_queues_another_email(self, client, auth_data):
+        client.post('/api/auth/register', json=auth_data)
+        response = client.post('/api/auth/resend-verification', json={'email': auth_data['email']})
+
+        assert response.status_code == 200
+        assert OutboxEmail.objects.count() == 2
+
+    def test_invalid_requests_are_not_queued(self):
+        assert queue_email('not-an-email', 'Assunto', 'verify_email')[1] == 400
+        assert queue_email('a@al.insper.edu.br', 'Assunto', 'missing_template')[1] == 400
+        assert OutboxEmail.objects.count() == 0
+
+    def test_drain_sends_and_deletes(self, client, auth_data, pool, smtp_server):
+        client.post('/api/auth/register', json=auth_data)
+        link = OutboxEmail.objects.get()._context['verification_link']
+
+        assert drain_outbox(pool) == 1
+
+        assert OutboxEmail.objects.count() == 0
+        recipients, content = smtp_server.messages[0]
+        assert recipients == [auth_data['email']]
+        assert link in content
+
+    def test_unreachable_server_is_retried(self, client, auth_data):
+        client.post('/api/auth/register', json=auth_data)
+        down = SMTPPool(host='127.0.0.1', port=free_port(), security='none', login=False, timeout=1)
+
+        assert drain_outbox(down) == 1
+        email = OutboxEmail.objects.get()
+        assert (email._state, email._attempts) == (QUEUED, 1)
+        assert email._run_at > email_outbox._utcnow()
+        assert drain_outbox(down) == 0  # Waiting on the backoff
+
+        # With a later clock every retry is due at once
+        assert drain_outbox(down, now=later(86400)) == MAX_ATTEMPTS - 1
+        email.reload()
+        assert (email._state, email._attempts) == (FAILED, MAX_ATTEMPTS)
+
+    def test_refused_recipient_fails_at_once(self, pool, smtp_server):
+        queue_email(REFUSED, 'Assunto', 'verify_email', {'verification_link': 'http://x'})
+
+        assert drain_outbox(pool) == 1
+
+        email = OutboxEmail.objects.get()
+        assert (email._state, email._attempts) == (FAILED, 1)
+        assert 'Recipient refused' in email._last_error
+
+    def test_deferred_recipient_is_retried(self, pool, smtp_server):
+        queue_email(GREYLISTED, 'Assunto', 'verify_email', {'verification_link': 'http://x'})
+
+        assert drain_outbox(pool) == 1
+
+        email = OutboxEmail.objects.get()
+        assert (email._state, email._attempts) == (QUEUED, 1)
+        assert '451' in email._last_error
+
+    def test_rate_limit_is_waited_before_claiming(self, pool, smtp_server):
+        queue_email('someone@al.insper.edu.br', 'Assunto', 'verify_email', {'verification_link': 'http://x'})
+        states = []
+
+        class RecordingLimiter(RateLimiter):
+            def wait(self):
+                states.append(OutboxEmail.objects.get()._state)
+
+        assert email_outbox.process_next(pool, limiter=RecordingLimiter())
+        assert states == [QUEUED]
+        assert OutboxEmail.objects.count() == 0
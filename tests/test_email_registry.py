@@ -0,0 +1,103 @@
+import os
+
+import pytest
+from jinja2 import TemplateNotFound, UndefinedError
+
+from core.email_registry import EmailTemplateRegistry, email_templates, html_to_text
+from core.utils import build_email
+
+LINK = 'http://localhost:5173/verify-email?token=abc&x=1'
+
+
+@pytest.fixture
+def templates(tmp_path):
+    """A registry over a temporary template directory, with its own bytecode cache."""
+    directory = tmp_path / 'templates'
+    directory.mkdir()
+    (directory / 'welcome.html').write_text(
+        '<html><head><title>Oi</title></head><body><h1>Olá, {{ name }}!</h1>'
+        '<p>Entre pelo <a href="{{ link }}">link</a>.</p></body></html>',
+        encoding='utf-8',
+    )
+    cache = tmp_path / 'cache'
+    cache.mkdir()
+    return directory, cache
+
+
+class TestRegistry:
+
+    def test_precompiles_the_shipped_templates(self):
+        assert 'verify_email' in email_templates.precompile()
+
+    def test_renders_html_and_text(self):
+        html, text = email_templates.render('verify_email', {'verification_link': LINK})
+
+        assert 'href="http://localhost:5173/verify-email?token=abc&amp;x=1"' in html
+        assert f'Verify Email: {LINK}' in text
+        assert '<' not in text
+
+    def test_missing_variable_is_an_error(self):
+        with pytest.raises(UndefinedError):
+            email_templates.render('verify_email', {})
+
+    def test_unknown_template(self):
+        with pytest.raises(TemplateNotFound):
+            email_templates.render('missing', {})
+        assert not email_templates.exists('missing')
+
+    def test_no_file_access_after_precompile(self, templates, monkeypatch):
+        directory, cache = templates
+        registry = EmailTemplateRegistry(str(directory), str(cache))
+        assert registry.precompile() == ['welcome']
+
+        def no_io(*args, **kwargs):
+            raise AssertionError('template file read after precompile')
+
+        monkeypatch.setattr(registry.environment.loader, 'get_source', no_io)
+        monkeypatch.setattr(registry.environment.bytecode_cache, 'load_bytecode', no_io)
+        assert registry.render('welcome', {'name': 'Ana', 'link': 'http://x'})[1].startswith('Olá, Ana!')
+
+    def test_bytecode_is_shared_through_the_cache_dir(self, templates, monkeypatch):
+        directory, cache = templates
+        EmailTemplateRegistry(str(directory), str(cache)).precompile()
+        assert len(os.listdir(cache)) == 2  # HTML and plain-text parts
+
+        registry = EmailTemplateRegistry(str(directory), str(cache))
+        monkeypatch.setattr(registry.environment, '_parse', lambda *args: pytest.fail('template parsed again'))
+        registry.precompile()
+        assert registry.render('welcome', {'name': 'Ana', 'link': 'http://x'})[0].count('Ana') == 1
+
+    def test_text_file_overrides_the_derived_part(self, templates):
+        directory, cache = templates
+        (directory / 'welcome.txt').write_text('Oi {{ name }}, use {{ link }}', encoding='utf-8')
+        registry = EmailTemplateRegistry(str(directory), str(cache))
+
+        assert registry.render('welcome', {'name': 'Ana', 'link': 'http://x'})[1] == 'Oi Ana, use http://x'
+
+
+class TestHtmlToText:
+
+    def test_keeps_text_links_and_jinja_tags(self):
+        source = (
+            '<html><head><style>p {}</style></head><body><h1>Título</h1><p>Clique <a href="{{ url }}">aqui</a>'
+            '<br>ou ignore &amp; apague.</p><ul><li>um</li><li>dois</li></ul></body></html>'
+        )
+        assert html_to_text(source) == 'Título\n\nClique aqui: {{ url }}\nou ignore & apague.\n\num\ndois\n'
+
+
+class TestBuildEmail:
+
+    def test_message_has_both_parts(self):
+        message, error = build_email('a@al.insper.edu.br', 'Assunto', 'verify_email', {'verification_link': LINK})
+
+        assert error is None
+        assert [part.get_content_type() for part in message.get_payload()] == ['text/plain', 'text/html']
+
+    def test_missing_variable_is_reported(self):
+        message, error = build_email('a@al.insper.edu.br', 'Assunto', 'verify_email', {})
+
+        assert message is None
+        assert (error[0]['error']['code'], error[1]) == ('TEMPLATE_RENDER_ERROR', 500)
+
+    def test_unknown_template_is_reported(self):
+        assert build_email('a@al.insper.edu.br', 'Assunto', 'missing')[1][1] == 400
@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+
 import pytest
 from api.threads.models import Thread
 from mongoengine.queryset import QuerySet
@@ -78,3 +82,16 @@ def test_health_endpoint_method_not_allowed(client, registered_user_token):
     assert response_detailed.status_code in (404, 405)
     if response_detailed.status_code == 405:
         assert response_detailed.json == {'error': 'Method not allowed'}
+
+@pytest.mark.parametrize('thread_prefix, env', [
+    ('moderation-worker', {'ASYNC_MODERATION': '1'}),
+    ('search-index-sync', {'SEARCH_BACKGROUND_SYNC': '1'}),
+    ('email-sender', {'EMAIL_SENDER': '1'}),
+])
+def test_importing_the_app_starts_no_background_threads(thread_prefix, env):
+    """Only the serving process (wsgi.py, python main.py) starts background threads; the flask CLI just imports main."""
+    script = "import threading, main; print('THREADS', [t.name for t in threading.enumerate()])"
+    result = subprocess.run([sys.executable, '-c', script], env=dict(os.environ, **env), capture_output=True,
+                            text=True, timeout=120, cwd=os.path.dirname(os.path.dirname(__file__)) or '.')
+    threads = next(line for line in result.stdout.splitlines() if line.startswith('THREADS'))
+    assert thread_prefix not in threads
@@ -0,0 +1,148 @@
+"""
+Tests that every query shape used by the views is served by an index.
+
+Each test runs explain() on the same query a view builds and fails if the
+winning plan contains a collection scan or an in-memory (blocking) sort.
+"""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from api.authentication.models import AuthToken
+from api.reports.models import Report
+from api.threads.models import HIDDEN_STATUSES, PENDING_MODERATION, Post, Thread, Vote, THREAD_SORT_KEYS, visible_to
+from api.threads.moderation_queue import QUEUED, RUNNING, ModerationJob
+from core.email_outbox import QUEUED as EMAIL_QUEUED, SENDING, OutboxEmail
+from core.indexes import ensure_indexes
+from core.pagination import keyset_filter
+
+THREAD_ORDERING = ('-_score', '-_created_at', '-id')
+USER = str(ObjectId())
+
+
+@pytest.fixture(autouse=True)
+def indexes(app):
+    """The per-test cleanup drops collections, so recreate the indexes first."""
+    ensure_indexes()
+
+
+def plan_stages(plan):
+    """Yield every stage name found in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def assert_indexed(queryset):
+    """Fail if the query's winning plan scans the collection or sorts in memory."""
+    winning_plan = queryset.explain()['queryPlanner']['winningPlan']
+    stages = set(plan_stages(winning_plan))
+    assert 'COLLSCAN' not in stages, f'Collection scan in plan: {winning_plan}'
+    assert 'SORT' not in stages, f'In-memory sort in plan: {winning_plan}'
+
+
+class TestThreadQueries:
+    """Queries built by list_threads and the search index refresh."""
+
+    def test_list_threads_unfiltered(self):
+        assert_indexed(Thread.objects(visible_to(USER)).order_by(*THREAD_ORDERING).limit(21))
+
+    def test_list_threads_by_semester(self):
+        assert_indexed(Thread.objects(visible_to(USER), semester=3).order_by(*THREAD_ORDERING).limit(21))
+
+    def test_list_threads_by_semester_and_courses(self):
+        queryset = Thread.objects(visible_to(USER), semester=3, courses__in=['cc', 'adm'])
+        assert_indexed(queryset.order_by(*THREAD_ORDERING).limit(21))
+
+    def test_list_threads_by_semester_and_subjects(self):
+        queryset = Thread.objects(visible_to(USER), semester=3, subjects__in=['Banco de Dados'])
+        assert_indexed(queryset.order_by(*THREAD_ORDERING).limit(21))
+
+    def test_list_threads_next_page(self):
+        after = keyset_filter(THREAD_SORT_KEYS, [0, datetime(2025, 1, 1), ObjectId()])
+        queryset = Thread.objects(visible_to(USER), semester=3).filter(__raw__=after)
+        assert_indexed(queryset.order_by(*THREAD_ORDERING).limit(21))
+
+    def test_search_index_build(self):
+        assert_indexed(Thread.objects(_status__nin=HIDDEN_STATUSES).order_by('_updated_at'))
+
+    def test_search_index_refresh(self):
+        assert_indexed(Thread.objects(_updated_at__gte=datetime(2025, 1, 1)).order_by('_updated_at'))
+
+
+class TestPostQueries:
+    """Queries built by get_thread_by_id."""
+
+    def test_posts_of_thread(self):
+        assert_indexed(Post.objects(visible_to(USER), _thread=ObjectId()))
+
+
+class TestModerationQueueQueries:
+    """Queries built by the moderation queue."""
+
+    def test_claim_job(self):
+        queryset = ModerationJob.objects(_state__in=[QUEUED, RUNNING], _run_at__lte=datetime(2025, 1, 1))
+        assert_indexed(queryset.order_by('_run_at'))
+
+    @pytest.mark.parametrize('model', [Thread, Post])
+    def test_recover_pending(self, model):
+        assert_indexed(model.objects(_status=PENDING_MODERATION))
+
+
+class TestEmailOutboxQueries:
+    """Queries built by the email sender."""
+
+    def test_claim_email(self):
+        queryset = OutboxEmail.objects(_state__in=[EMAIL_QUEUED, SENDING], _run_at__lte=datetime(2025, 1, 1))
+        assert_indexed(queryset.order_by('_run_at'))
+
+
+class TestVoteQueries:
+    """Query built by VoteLoader."""
+
+    def test_user_votes_for_page(self):
+        query = {
+            '_user': ObjectId(),
+            '_value': {'$ne': 0},
+            '$or': [{'_target_type': 'thread', '_target_id': {'$in': [ObjectId(), ObjectId()]}}],
+        }
+        assert_indexed(Vote.objects(__raw__=query))
+
+
+class TestReportQueries:
+    """Queries built by create_report and list_reports."""
+
+    def test_duplicate_report_check(self):
+        assert_indexed(Report.objects(_reporter=ObjectId(), _content_type='thread', _content_id=str(ObjectId())))
+
+    def test_list_reports(self):
+        assert_indexed(Report.objects())
+
+    def test_moderation_report_upsert(self):
+        assert_indexed(Report.objects(_content_type='post', _content_id=str(ObjectId()), _source='moderation'))
+
+    def test_one_moderation_report_per_content(self):
+        content_id = str(ObjectId())
+        Report._get_collection().insert_one({'_content_type': 'post', '_content_id': content_id,
+                                             '_source': 'moderation', '_report_type': 'other'})
+        with pytest.raises(DuplicateKeyError):
+            Report._get_collection().insert_one({'_content_type': 'post', '_content_id': content_id,
+                                                 '_source': 'moderation', '_report_type': 'spam'})
+        # User reports are not covered by the partial index
+        for _ in range(2):
+            Report._get_collection().insert_one({'_content_type': 'post', '_content_id': content_id,
+                                                 '_source': 'user', '_report_type': 'spam'})
+
+
+class TestAuthTokenQueries:
+    """Query built by resend_verification."""
+
+    def test_latest_token_of_user(self):
+        assert_indexed(AuthToken.objects(_user=ObjectId()).order_by('-_created_at'))
@@ -0,0 +1,839 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from core import moderation, moderation_cache, moderation_classifier
+from core.moderation import (
+    verificar_campos, verificar_conteudo, verificar_post, verificar_post_estrito, verificar_thread,
+    verificar_thread_estrito,
+)
+from core.moderation_cache import ModerationVerdict, chave_texto, verdict_cache
+from core.moderation_chunks import CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS, dividir_em_trechos, mais_grave
+from core.moderation_client import (
+    CLOSED, HALF_OPEN, HEDGE_MIN_SAMPLES, OPEN, CircuitBreaker, HedgeBudget, ModerationClient, ModerationError,
+)
+from core.profanity import ALLOW, BLOCK, REMOTE, AhoCorasick, ProfanityFilter, normalizar_termos, profanity_filter
+from tests.fake_moderation import FakeModerationServer, timed
+
+DELAY = 0.3
+
+
+@pytest.fixture(scope='module')
+def fake_server():
+    with FakeModerationServer(delay=DELAY) as server:
+        yield server
+
+
+@pytest.fixture
+def fake_moderation(fake_server, monkeypatch):
+    """Point the moderation client at the local fake server."""
+    monkeypatch.setattr(moderation, 'AZURE_OPENAI_ENDPOINT', fake_server.url)
+    fake_server.reset()
+    return fake_server
+
+
+class TestModerationClient:
+    """The async moderation client against a local fake endpoint"""
+
+    def test_safe_text(self, fake_moderation):
+        assert verificar_conteudo("Como funciona o git rebase?") == (True, None, None)
+        assert fake_moderation.calls == ["Como funciona o git rebase?"]
+
+    def test_unsafe_text(self, fake_moderation):
+        is_safe, flagged, message = verificar_conteudo("isso é PROIBIDO")
+        assert is_safe is False
+        assert flagged == {'category': 'ofensivo'}
+        assert message == "Conteúdo bloqueado: ofensivo - termo proibido"
+
+    def test_empty_text_is_not_sent(self, fake_moderation):
+        assert verificar_conteudo("   ") == (True, None, None)
+        assert verificar_thread("Título", None) == (True, None)
+        assert fake_moderation.calls == ["Título"]
+
+    def test_fails_open_on_server_error(self, fake_moderation):
+        assert verificar_conteudo("ERRO500") == (True, None, None)
+
+    def test_fails_open_on_invalid_reply(self, fake_moderation):
+        assert verificar_conteudo("LIXO") == (True, None, None)
+
+    def test_fails_open_on_timeout(self, fake_moderation, monkeypatch):
+        monkeypatch.setattr(moderation, 'MODERATION_TIMEOUT', DELAY / 3)
+        (is_safe, message), elapsed = timed(verificar_thread, "PROIBIDO", "PROIBIDO")
+        assert (is_safe, message) == (True, None)
+        assert elapsed < DELAY
+
+    def test_fails_open_when_unreachable(self, fake_moderation, monkeypatch):
+        monkeypatch.setattr(moderation, 'AZURE_OPENAI_ENDPOINT', 'http://127.0.0.1:9/chat/completions')
+        assert verificar_post("PROIBIDO") == (True, None)
+
+    def test_strict_check_raises_instead_of_failing_open(self, fake_moderation, monkeypatch):
+        with pytest.raises(ModerationError):
+            verificar_post_estrito("ERRO500")
+        monkeypatch.setattr(moderation, 'AZURE_OPENAI_ENDPOINT', 'http://127.0.0.1:9/chat/completions')
+        with pytest.raises(ModerationError):
+            verificar_thread_estrito("Um título", "PROIBIDO")
+
+    def test_strict_check_verdicts(self, fake_moderation):
+        assert verificar_post_estrito("uma resposta") == (True, None)
+        assert verificar_thread_estrito("ok", "PROIBIDO")[0] is False
+
+    def test_thread_fields_are_checked_concurrently(self, fake_moderation):
+        (is_safe, message), elapsed = timed(verificar_thread, "Um título", "Uma descrição")
+        assert (is_safe, message) == (True, None)
+        assert sorted(fake_moderation.calls) == sorted(["Um título", "Uma descrição"])
+        assert fake_moderation.max_in_flight == 2
+        # Bounded by the slowest call, not the sum of both
+        assert elapsed < 2 * DELAY
+
+    def test_many_fields_take_one_round_trip(self, fake_moderation):
+        campos = [(f"Campo {i}", f"texto {i}") for i in range(8)]
+        (is_safe, _), elapsed = timed(verificar_campos, campos)
+        assert is_safe
+        assert fake_moderation.max_in_flight == 8
+        assert elapsed < 2 * DELAY
+
+    @pytest.mark.parametrize("title, description, expected", [
+        ("PROIBIDO", "ok", "Título impróprio: Conteúdo bloqueado: ofensivo - termo proibido"),
+        ("ok", "PROIBIDO", "Descrição imprópria: Conteúdo bloqueado: ofensivo - termo proibido"),
+        # Both blocked: the title is reported, as when the checks ran in order
+        ("PROIBIDO", "PROIBIDO", "Título impróprio: Conteúdo bloqueado: ofensivo - termo proibido"),
+    ])
+    def test_combined_verdict(self, fake_moderation, title, description, expected):
+        assert verificar_thread(title, description) == (False, expected)
+
+    def test_post_verdict(self, fake_moderation):
+        assert verificar_post("PROIBIDO") == (False, "Conteúdo impróprio: Conteúdo bloqueado: ofensivo - termo proibido")
+
+
+class TestVerdictCache:
+    """Verdicts are reused for the same normalized text"""
+
+    def test_repeated_text_is_sent_once(self, fake_moderation):
+        assert verificar_post("resposta copiada") == (True, None)
+        assert verificar_post("resposta copiada") == (True, None)
+
+        assert fake_moderation.calls == ["resposta copiada"]
+        stats = verdict_cache.stats()
+        assert (stats['misses'], stats['memory_hits'], stats['remote_calls']) == (1, 1, 1)
+        assert stats['hit_rate'] == 0.5
+
+    def test_blocked_verdict_is_cached(self, fake_moderation):
+        first = verificar_post("texto PROIBIDO")
+        assert verificar_post("texto PROIBIDO") == first
+        assert first[0] is False
+        assert len(fake_moderation.calls) == 1
+
+    def test_whitespace_variants_share_a_verdict(self, fake_moderation):
+        verificar_post("texto   PROIBIDO\n")
+        assert verificar_post(" texto PROIBIDO")[0] is False
+        # Sent as written (paragraphs guide chunking), cached under the normalized text
+        assert fake_moderation.calls == ["texto   PROIBIDO\n"]
+        assert chave_texto("a  b\t") == chave_texto("a b")
+
+    def test_verdict_is_shared_through_mongo(self, fake_moderation):
+        verificar_post("pergunta comum")
+        assert ModerationVerdict.objects(pk=chave_texto("pergunta comum")).count() == 1
+
+        # Another worker has an empty memory cache but finds the stored verdict
+        verdict_cache.clear()
+        assert verificar_post("pergunta comum") == (True, None)
+        assert fake_moderation.calls == ["pergunta comum"]
+        assert verdict_cache.stats()['stored_hits'] == 1
+
+    def test_errors_are_not_cached(self, fake_moderation):
+        verificar_post("ERRO500")
+        verificar_post("ERRO500")
+        verificar_post("LIXO")
+        assert len(fake_moderation.calls) == 3
+        assert ModerationVerdict.objects.count() == 0
+
+    def test_new_verdict_version_misses(self, fake_moderation, monkeypatch):
+        verificar_post("mesmo texto")
+        monkeypatch.setattr(moderation_cache, 'VERDICT_VERSION', moderation_cache.VERDICT_VERSION + 1)
+        verificar_post("mesmo texto")
+        assert len(fake_moderation.calls) == 2
+
+    def test_same_text_in_two_fields_is_sent_once(self, fake_moderation):
+        assert verificar_thread("Dúvida de cálculo", "Dúvida de cálculo") == (True, None)
+        assert fake_moderation.calls == ["Dúvida de cálculo"]
+
+    def test_memory_entries_expire(self, fake_moderation, monkeypatch):
+        monkeypatch.setattr(verdict_cache, '_ttl', 0)
+        verificar_post("texto qualquer")
+        verificar_post("texto qualquer")
+        # Expired in memory, still answered by the stored verdict
+        assert len(fake_moderation.calls) == 1
+        assert verdict_cache.stats()['stored_hits'] == 1
+
+
+    def test_stored_lookups_run_off_the_event_loop(self, fake_moderation, monkeypatch):
+        threads = []
+
+        def record(original):
+            def wrapper(*args):
+                threads.append(threading.current_thread().name)
+                return original(*args)
+            return wrapper
+
+        monkeypatch.setattr(verdict_cache, '_get_stored', record(verdict_cache._get_stored))
+        monkeypatch.setattr(verdict_cache, '_store', record(verdict_cache._store))
+        verificar_post("texto novo")
+        moderation.moderation_client.run(moderation.verificar_lote_async([("1", "outro texto"), ("2", "texto novo")]))
+
+        # Lookup and write for each new text; "texto novo" is then a memory hit
+        assert len(threads) == 4
+        assert 'moderation-client' not in threads
+
+class TestProfanityFilter:
+    """The local pre-filter that runs before the remote call"""
+
+    @pytest.mark.parametrize("text", [
+        "Que porra é essa",
+        "PORRAAAA",
+        "c4r4lh0",
+        "m e r d a",
+        "p.u.t.a",
+        "sh!t happens",
+        "@sshole",
+        "Cuzão",
+        "vai se foder",
+    ])
+    def test_blocks_obfuscated_terms(self, text):
+        assert ProfanityFilter().check(text)[0] == BLOCK
+
+    @pytest.mark.parametrize("text", [
+        "Qual o melhor curso?",        # "cu" only matches as a whole word
+        "Como declarar uma classe?",   # nor "ass" inside "classe"
+        "Dúvida em Cálculo 3",
+        "merdalina",                   # nor terms inside other words
+    ])
+    def test_no_false_positives(self, text):
+        assert ProfanityFilter().check(text, skip_short_safe=True) == (ALLOW, None)
+
+    def test_risky_short_text_goes_remote(self):
+        assert ProfanityFilter().check("vou me matar", skip_short_safe=True) == (REMOTE, "me matar")
+
+    def test_long_text_goes_remote(self):
+        text = "Alguém pode me explicar a diferença entre lista e tupla em Python?"
+        assert ProfanityFilter().check(text, skip_short_safe=True) == (REMOTE, None)
+
+    def test_short_text_goes_remote_unless_enabled(self):
+        assert ProfanityFilter().check("Valeu!", skip_short_safe=False) == (REMOTE, None)
+
+    def test_normalization(self):
+        assert normalizar_termos("  Fodaaa-SE!! ") == "fodase"
+        assert normalizar_termos("Ação 2025") == "acao 2025"
+
+    def test_aho_corasick_matches_naive_search(self):
+        import random
+        rng = random.Random(7)
+        patterns = {''.join(rng.choice('ab') for _ in range(rng.randint(1, 5))): None for _ in range(40)}
+        automaton = AhoCorasick(patterns)
+        for _ in range(200):
+            text = ''.join(rng.choice('abc') for _ in range(40))
+            expected = sorted(p for p in patterns for i in range(len(text)) if text.startswith(p, i))
+            assert sorted(p for p, _ in automaton.search(text)) == expected
+
+    def test_blocked_locally_without_remote_call(self, fake_moderation):
+        is_safe, flagged, message = verificar_conteudo("que merda de prova")
+
+        assert is_safe is False
+        assert flagged == {'category': 'linguagem ofensiva'}
+        assert message == "Conteúdo bloqueado: linguagem ofensiva - termo ofensivo detectado"
+        assert fake_moderation.calls == []
+
+    def test_short_safe_text_skips_remote_call(self, fake_moderation, monkeypatch):
+        monkeypatch.setattr('core.profanity.SKIP_SHORT_SAFE', True)
+        assert verificar_thread("Obrigado!", "vou me matar de estudar") == (True, None)
+        assert fake_moderation.calls == ["vou me matar de estudar"]
+
+    def test_stats(self, fake_moderation, monkeypatch):
+        monkeypatch.setattr('core.profanity.SKIP_SHORT_SAFE', True)
+        verificar_post("porra")
+        verificar_post("ok")
+        verificar_post("Uma resposta longa o bastante para ir até o modelo remoto")
+
+        stats = profanity_filter.stats()
+        assert (stats['checked'], stats['blocked'], stats['skipped_short'], stats['passed']) == (3, 1, 1, 1)
+        assert stats['remote_calls_avoided'] == 2
+        assert len(fake_moderation.calls) == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    """Replace the process-wide moderation client with a configured one."""
+    clients = []
+
+    def make(**kwargs):
+        client = ModerationClient(**kwargs)
+        clients.append(client)
+        monkeypatch.setattr(moderation, 'moderation_client', client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+class TestPooledClient:
+    """Connection reuse, concurrency cap, circuit breaker and latency histograms"""
+
+    def test_connections_are_reused(self, fake_moderation, make_client):
+        make_client()
+        for i in range(4):
+            assert verificar_post(f"resposta número {i}") == (True, None)
+
+        assert len(fake_moderation.calls) == 4
+        assert len(fake_moderation.connections) == 1
+
+    def test_concurrency_is_capped(self, fake_moderation, make_client):
+        make_client(max_concurrency=2)
+        campos = [(f"Campo {i}", f"texto {i}") for i in range(6)]
+
+        (is_safe, _), elapsed = timed(verificar_campos, campos)
+
+        assert is_safe
+        assert len(fake_moderation.calls) == 6
+        assert fake_moderation.max_in_flight == 2
+        assert elapsed >= 3 * DELAY
+
+    def test_no_free_slot_uses_local_policy(self, fake_moderation, make_client):
+        client = make_client(max_concurrency=1, queue_timeout=DELAY / 3)
+
+        assert verificar_thread("Um título", "Uma descrição PROIBIDO") == (True, None)
+
+        assert len(fake_moderation.calls) == 1
+        assert client.stats()['rejected_busy'] == 1
+
+    def test_breaker_opens_after_consecutive_failures(self, fake_moderation, make_client):
+        client = make_client(breaker=CircuitBreaker(threshold=3, cooldown=30, clock=FakeClock()))
+        fake_moderation.fail_status = 503
+
+        for i in range(5):
+            assert verificar_post(f"texto PROIBIDO {i}") == (True, None)
+
+        # Only the first three reached the endpoint; the rest failed fast
+        assert len(fake_moderation.calls) == 3
+        stats = client.stats()
+        assert (stats['circuit'], stats['times_opened']) == (OPEN, 1)
+        assert (stats['error'], stats['short_circuited']) == (3, 2)
+
+    def test_content_filter_rejections_keep_breaker_closed(self, fake_moderation, make_client):
+        client = make_client(breaker=CircuitBreaker(threshold=3, cooldown=30, clock=FakeClock()))
+
+        for i in range(5):
+            is_safe, message = verificar_post(f"texto FILTRO {i}")
+            assert is_safe is False
+            assert message == ("Conteúdo impróprio: Conteúdo bloqueado: discriminação ou ódio"
+                               " - recusado pelo filtro de conteúdo")
+
+        assert len(fake_moderation.calls) == 5
+        stats = client.stats()
+        assert (stats['circuit'], stats['times_opened']) == (CLOSED, 0)
+        assert (stats['rejected'], stats['error']) == (5, 0)
+
+    def test_client_errors_do_not_trip_breaker(self, fake_moderation, make_client):
+        client = make_client(breaker=CircuitBreaker(threshold=2, cooldown=30, clock=FakeClock()))
+        fake_moderation.fail_status = 401
+
+        for i in range(3):
+            assert verificar_post(f"texto PROIBIDO {i}") == (True, None)
+        with pytest.raises(ModerationError):
+            verificar_post_estrito("texto PROIBIDO")
+
+        assert len(fake_moderation.calls) == 4
+        assert client.stats()['circuit'] == CLOSED
+
+    def test_content_filter_in_a_batch(self, fake_moderation, make_client):
+        make_client()
+        lote = moderation.verificar_lote_async
+
+        # A lone pending text gets the filter's verdict; with others the rejection is ambiguous
+        vereditos = moderation.moderation_client.run(lote([("1", "texto FILTRO")]))
+        assert vereditos["1"][1] == {'category': 'discriminação ou ódio'}
+        with pytest.raises(moderation.ModerationRejected):
+            moderation.moderation_client.run(lote([("1", "outro FILTRO"), ("2", "texto comum")]))
+
+    def test_rate_limit_trips_breaker(self, fake_moderation, make_client):
+        client = make_client(breaker=CircuitBreaker(threshold=2, cooldown=30, clock=FakeClock()))
+        fake_moderation.fail_status = 429
+
+        for i in range(3):
+            verificar_post(f"texto {i}")
+
+        assert len(fake_moderation.calls) == 2
+        assert client.stats()['circuit'] == OPEN
+
+    def test_success_resets_failure_count(self, fake_moderation, make_client):
+        client = make_client(breaker=CircuitBreaker(threshold=2, cooldown=30, clock=FakeClock()))
+
+        verificar_post("ERRO500 um")
+        verificar_post("resposta boa")
+        verificar_post("ERRO500 dois")
+
+        assert client.stats()['circuit'] == CLOSED
+
+    def test_probe_after_cooldown_closes_breaker(self, fake_moderation, make_client):
+        clock = FakeClock()
+        client = make_client(breaker=CircuitBreaker(threshold=1, cooldown=30, clock=clock))
+        verificar_post("ERRO500")
+        assert client.stats()['circuit'] == OPEN
+
+        clock.now += 31
+        assert client.stats()['circuit'] == HALF_OPEN
+        assert verificar_post("isso é PROIBIDO") == (False, "Conteúdo impróprio: Conteúdo bloqueado: ofensivo - termo proibido")
+
+        assert client.stats()['circuit'] == CLOSED
+        assert fake_moderation.calls == ["ERRO500", "isso é PROIBIDO"]
+
+    def test_failed_probe_reopens_breaker(self, fake_moderation, make_client):
+        clock = FakeClock()
+        client = make_client(breaker=CircuitBreaker(threshold=1, cooldown=30, clock=clock))
+        verificar_post("ERRO500")
+
+        clock.now += 31
+        verificar_post("ERRO500 de novo")
+        verificar_post("outro texto")
+
+        assert client.stats()['circuit'] == OPEN
+        assert fake_moderation.calls == ["ERRO500", "ERRO500 de novo"]
+
+    def test_half_open_allows_a_single_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=1, cooldown=30, clock=clock)
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        clock.now += 31
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.allow()
+
+    def test_cancelled_call_keeps_another_calls_probe(self, fake_moderation, make_client):
+        clock = FakeClock()
+        client = make_client(breaker=CircuitBreaker(threshold=1, cooldown=30, clock=clock))
+        call = asyncio.run_coroutine_threadsafe(
+            client.post_json(fake_moderation.url, moderation._montar_payload("texto lento")),
+            client._ensure_loop(),
+        )
+        while client.stats()['in_flight'] == 0:
+            time.sleep(0.01)
+
+        # Meanwhile the circuit opens and, after the cooldown, another call takes the probe
+        client.breaker.record_failure()
+        clock.now += 31
+        assert client.breaker.acquire() == HALF_OPEN
+
+        call.cancel()
+        while client.stats()['cancelled'] == 0:
+            time.sleep(0.01)
+
+        assert not client.breaker.allow()
+
+    def test_slow_endpoint_trips_breaker(self, fake_moderation, make_client, monkeypatch):
+        client = make_client(breaker=CircuitBreaker(threshold=2, cooldown=30, clock=FakeClock()))
+        monkeypatch.setattr(moderation, 'MODERATION_TIMEOUT', DELAY / 3)
+
+        verificar_post("primeiro texto")
+        verificar_post("segundo texto")
+        _, elapsed = timed(verificar_post, "terceiro texto")
+
+        assert len(fake_moderation.calls) == 2
+        assert client.stats()['timeout'] == 2
+        assert elapsed < DELAY / 3
+
+    def test_block_risky_fallback(self, fake_moderation, make_client, monkeypatch):
+        client = make_client(breaker=CircuitBreaker(threshold=1, cooldown=30, clock=FakeClock()))
+        client.breaker.record_failure()
+        monkeypatch.setattr(moderation, 'MODERATION_FALLBACK', 'block_risky')
+
+        is_safe, message = verificar_post("vou matar esse bug hoje")
+        assert is_safe is False
+        assert message == "Conteúdo impróprio: Conteúdo bloqueado: moderação indisponível - tente novamente em alguns instantes"
+        assert verificar_post("uma resposta comum") == (True, None)
+        assert fake_moderation.calls == []
+
+    def test_overdue_check_falls_back_to_local_policy(self, fake_moderation, make_client, monkeypatch):
+        client = make_client()
+        run = client.run
+        monkeypatch.setattr(client, 'run', lambda coro, timeout: run(coro, timeout=DELAY / 3))
+        monkeypatch.setattr(moderation, 'MODERATION_FALLBACK', 'block_risky')
+
+        (is_safe, message), elapsed = timed(verificar_post, "vou matar esse bug hoje")
+
+        assert is_safe is False
+        assert message.endswith("moderação indisponível - tente novamente em alguns instantes")
+        assert elapsed < DELAY
+        assert verificar_conteudo("uma resposta comum") == (True, None, None)
+
+    def test_unavailable_verdicts_are_not_cached(self, fake_moderation, make_client):
+        client = make_client(breaker=CircuitBreaker(threshold=1, cooldown=30, clock=FakeClock()))
+        client.breaker.record_failure()
+        verificar_post("isso é PROIBIDO")
+
+        client.breaker.reset()
+        assert verificar_post("isso é PROIBIDO")[0] is False
+
+    def test_latency_histogram(self, fake_moderation, make_client):
+        client = make_client()
+        verificar_post("primeiro texto")
+        verificar_post("segundo texto")
+        fake_moderation.fail_status = 502
+        verificar_post("terceiro texto")
+
+        latency = client.stats()['latency']
+        # DELAY (300 ms) falls in the (250, 500] bucket
+        bucket = latency['buckets_ms'].index(500)
+        assert latency['ok']['count'] == 2
+        assert latency['ok']['counts'][bucket] == 2
+        assert latency['ok']['p50_ms'] == 500
+        assert latency['error']['count'] == 1
+
+
+class TestHedging:
+    """A slow call gets a duplicate after the recent-latency percentile, within the budget"""
+
+    SLOW = 3 * DELAY
+    FAST = 0.01
+
+    def warm_up(self):
+        for i in range(HEDGE_MIN_SAMPLES):
+            verificar_post(f"aquecimento {i}")
+
+    def test_hedge_answers_slow_call(self, fake_moderation, make_client):
+        client = make_client(hedging=True, hedge_budget=HedgeBudget(ratio=1.0))
+        fake_moderation.latency = lambda n: self.SLOW if n == HEDGE_MIN_SAMPLES else self.FAST
+        self.warm_up()
+
+        result, elapsed = timed(verificar_post, "isso é PROIBIDO")
+
+        assert result == (False, "Conteúdo impróprio: Conteúdo bloqueado: ofensivo - termo proibido")
+        assert elapsed < self.SLOW / 2
+        assert fake_moderation.calls[HEDGE_MIN_SAMPLES:] == ["isso é PROIBIDO", "isso é PROIBIDO"]
+        stats = client.stats()
+        assert (stats['hedges_sent'], stats['hedges_won'], stats['cancelled']) == (1, 1, 1)
+
+    def test_fast_call_is_not_hedged(self, fake_moderation, make_client):
+        client = make_client(hedging=True, hedge_budget=HedgeBudget(ratio=1.0))
+        fake_moderation.latency = lambda n: self.FAST
+        self.warm_up()
+
+        verificar_post("resposta rápida")
+
+        assert len(fake_moderation.calls) == HEDGE_MIN_SAMPLES + 1
+        assert client.stats()['hedges_sent'] == 0
+
+    def test_waits_for_samples_before_hedging(self, fake_moderation, make_client):
+        client = make_client(hedging=True, hedge_budget=HedgeBudget(ratio=1.0))
+
+        verificar_post("primeira chamada")
+
+        assert client.stats()['hedges_sent'] == 0
+        assert fake_moderation.calls == ["primeira chamada"]
+
+    def test_budget_limits_extra_calls(self, fake_moderation, make_client):
+        client = make_client(hedging=True, hedge_budget=HedgeBudget(ratio=0.05))
+        # Every call after the warm-up is slow, hedges included
+        fake_moderation.latency = lambda n: self.FAST if n < HEDGE_MIN_SAMPLES else DELAY
+        self.warm_up()
+
+        for i in range(3):
+            assert verificar_post(f"resposta lenta {i}") == (True, None)
+
+        # 23 calls earn 1.15 hedges: only one is sent
+        assert client.stats()['hedges_sent'] == 1
+        assert len(fake_moderation.calls) == HEDGE_MIN_SAMPLES + 3 + 1
+
+    def test_hedge_delay_stays_below_the_timeout(self, make_client):
+        client = make_client(hedging=True)
+        client._recent.extend([5.0] * HEDGE_MIN_SAMPLES)
+
+        assert client.hedge_delay() == 5.0
+        assert client.hedge_delay(timeout=1.0) == 0.5
+
+    def test_hedge_only_gets_the_remaining_time(self, fake_moderation, make_client, monkeypatch):
+        client = make_client(hedging=True, hedge_budget=HedgeBudget(ratio=1.0))
+        client._recent.extend([5.0] * HEDGE_MIN_SAMPLES)
+        fake_moderation.latency = lambda n: self.SLOW
+        monkeypatch.setattr(moderation, 'MODERATION_TIMEOUT', DELAY)
+
+        result, elapsed = timed(verificar_post, "resposta lenta")
+
+        # Hedge sent at DELAY / 2 and timed out with the original, not DELAY after it
+        assert result == (True, None)
+        assert elapsed < 1.3 * DELAY
+        stats = client.stats()
+        assert (stats['hedges_sent'], stats['timeout']) == (1, 2)
+
+    def test_budget_accumulates_per_call(self):
+        budget = HedgeBudget(ratio=0.25, burst=2)
+        for _ in range(3):
+            budget.earn()
+        assert not budget.spend()
+        budget.earn()
+        assert budget.spend()
+        assert not budget.spend()
+
+        for _ in range(100):
+            budget.earn()
+        assert budget.tokens == 2
+
+
+def long_text(paragraphs=12, edited=None, marker=""):
+    """A multi-paragraph answer well over the chunking threshold, with a code block in the middle."""
+    blocks = [f"Parágrafo {i}: " + "uma explicação detalhada sobre recursão e casos base " * 5 for i in range(paragraphs)]
+    blocks.insert(paragraphs // 2, "```python\ndef fatorial(n):\n\n    return 1 if n == 0 else n * fatorial(n - 1)\n```")
+    if edited is not None:
+        blocks[edited] += " (editado)"
+    if marker:
+        blocks[-3] += f" {marker}"
+    return "\n\n".join(blocks)
+
+
+class TestChunkedModeration:
+    """Long texts are split into overlapping chunks checked in parallel"""
+
+    def test_short_text_is_one_chunk(self):
+        assert dividir_em_trechos("Uma resposta curta") == ["Uma resposta curta"]
+
+    def test_chunks_follow_paragraphs_and_code_blocks(self):
+        text = long_text()
+        chunks = dividir_em_trechos(text)
+
+        assert len(chunks) > 1
+        assert all(len(chunk) <= CHUNK_MAX_CHARS + CHUNK_OVERLAP_CHARS + 2 for chunk in chunks)
+        code = text.split("\n\n```")[1].split("```")[0]
+        assert any(code in chunk for chunk in chunks)
+        for paragraph in text.split("\n\n"):
+            if not paragraph.startswith(("```", "def", "    ")):
+                assert any(paragraph in chunk for chunk in chunks)
+
+    def test_chunks_overlap(self):
+        chunks = dividir_em_trechos(long_text())
+        for previous, chunk in zip(chunks, chunks[1:]):
+            context = chunk.split("\n\n")[0]
+            assert previous.endswith(context)
+
+    def test_long_text_is_checked_in_parallel(self, fake_moderation):
+        text = long_text()
+        chunks = dividir_em_trechos(text)
+
+        (is_safe, _), elapsed = timed(verificar_post, text)
+
+        assert is_safe
+        assert sorted(fake_moderation.calls) == sorted(chunks)
+        assert fake_moderation.max_in_flight == len(chunks)
+        assert elapsed < 2 * DELAY
+
+    def test_one_flagged_chunk_blocks_the_text(self, fake_moderation):
+        assert verificar_post(long_text(marker="PROIBIDO")) == (
+            False, "Conteúdo impróprio: Conteúdo bloqueado: ofensivo - termo proibido"
+        )
+
+    def test_edit_rechecks_only_changed_chunks(self, fake_moderation):
+        verificar_post(long_text())
+        chunks = len(fake_moderation.calls)
+        fake_moderation.reset()
+
+        verificar_post(long_text(edited=8))
+
+        assert 1 <= len(fake_moderation.calls) <= 2 < chunks
+
+    def test_batch_items_are_chunked(self, fake_moderation):
+        text = long_text(marker="PROIBIDO")
+        verdicts = moderation.moderation_client.run(
+            moderation.verificar_lote_async([("longo", text), ("curto", "Uma resposta curta")])
+        )
+
+        assert fake_moderation.batches == [dividir_em_trechos(text) + ["Uma resposta curta"]]
+        assert set(verdicts) == {"longo", "curto"}
+        assert verdicts["longo"][0] is False
+        assert verdicts["curto"] == (True, None, None)
+
+    def test_most_severe_verdict_wins(self):
+        offensive = (False, {'category': 'linguagem ofensiva'}, "ofensivo")
+        violence = (False, {'category': 'Violência ou ameaças'}, "violência")
+        unavailable = (False, {'category': 'moderação indisponível'}, "indisponível")
+        safe = (True, None, None)
+
+        assert mais_grave([safe, offensive, violence, safe]) == violence
+        assert mais_grave([unavailable, offensive]) == offensive
+        assert mais_grave([offensive, (False, {'category': 'palavrões'}, "outro")]) == offensive
+        assert mais_grave([safe, safe]) == safe
+
+
+SPAM = [
+    "compre seguidores baratos agora mesmo",
+    "seguidores baratos e curtidas no link da bio",
+    "ganhe dinheiro rápido clicando no link",
+    "promoção de seguidores e curtidas baratos",
+    "clique no link e ganhe dinheiro fácil",
+    "curtidas baratas, compre agora no link",
+]
+QUESTIONS = [
+    "como funciona a recursão em python",
+    "dúvida sobre a lista de exercícios de cálculo",
+    "alguém entendeu o caso base da recursão",
+    "qual a diferença entre lista e tupla em python",
+    "como estudar para a prova de cálculo",
+    "não entendi o exercício sobre ponteiros",
+]
+
+
+@pytest.fixture
+def spam_classifier(monkeypatch):
+    """A classifier trained on a toy set: spam is blocked, course questions are not."""
+    np = pytest.importorskip("numpy")
+    pesos = moderation_classifier.treinar(SPAM + QUESTIONS, [True] * len(SPAM) + [False] * len(QUESTIONS),
+                                          n_features=2 ** 12)
+    monkeypatch.setattr(moderation_classifier.local_classifier, '_pesos', pesos)
+    moderation_classifier.local_classifier.reset_stats()
+    return np
+
+
+class TestLocalClassifier:
+    """Hashed bag-of-words logistic regression used as fallback and confidence gate"""
+
+    def test_features_are_normalized(self, spam_classifier):
+        linhas, colunas, valores = moderation_classifier.featurizar(["um dois tres", "", "um um"], 2 ** 12)
+
+        # Three words and two pairs; nothing; "um" once plus the pair "um um"
+        assert list(spam_classifier.bincount(linhas, minlength=3)) == [5, 0, 2]
+        for linha in (0, 2):
+            assert spam_classifier.linalg.norm(valores[linhas == linha]) == pytest.approx(1.0, abs=1e-6)
+        assert colunas.max() < 2 ** 12
+
+    def test_training_separates_the_classes(self, spam_classifier):
+        probabilidades = moderation_classifier.local_classifier.probabilidades(
+            ["compre curtidas baratas no link", "dúvida sobre recursão em python"]
+        )
+        assert probabilidades[0] > 0.9
+        assert probabilidades[1] < 0.1
+        assert moderation_classifier.local_classifier.stats()['scored'] == 2
+
+    def test_training_needs_both_classes(self):
+        pytest.importorskip("numpy")
+        with pytest.raises(ValueError):
+            moderation_classifier.treinar(QUESTIONS, [False] * len(QUESTIONS))
+
+    def test_weights_are_memory_mapped(self, spam_classifier, tmp_path):
+        classificador = moderation_classifier.LocalClassifier()
+        caminho = str(tmp_path / "classificador.npy")
+        moderation_classifier.salvar_pesos(moderation_classifier.local_classifier._pesos, caminho)
+
+        assert classificador.load(caminho)
+        assert isinstance(classificador._pesos, spam_classifier.memmap)
+        assert classificador.probabilidade("compre seguidores") == pytest.approx(
+            moderation_classifier.local_classifier.probabilidade("compre seguidores"), abs=1e-6
+        )
+        assert not classificador.load(str(tmp_path / "inexistente.npy"))
+
+    def test_no_classifier_keeps_failing_open(self, fake_moderation, monkeypatch):
+        monkeypatch.setattr(moderation_classifier.local_classifier, '_pesos', None)
+        fake_moderation.fail_status = 500
+        assert verificar_conteudo("compre seguidores baratos no link") == (True, None, None)
+
+    def test_fallback_when_the_api_fails(self, fake_moderation, spam_classifier):
+        fake_moderation.fail_status = 500
+
+        is_safe, flagged, _ = verificar_conteudo("compre seguidores baratos no link")
+        assert (is_safe, flagged) == (False, {'category': moderation.CLASSIFIER_CATEGORY})
+        assert verificar_conteudo("como funciona a recursão") == (True, None, None)
+        stats = moderation_classifier.local_classifier.stats()
+        assert (stats['fallback_blocked'], stats['fallback_allowed']) == (1, 1)
+        # Fallback verdicts are not cached
+        assert verdict_cache.stats()['remote_calls'] == 0
+
+    def test_gate_skips_confident_predictions(self, fake_moderation, spam_classifier, monkeypatch):
+        monkeypatch.setattr(moderation, 'CLASSIFIER_GATE', True)
+        monkeypatch.setattr(moderation, 'CLASSIFIER_GATE_ALLOW', 0.1)
+        monkeypatch.setattr(moderation, 'CLASSIFIER_GATE_BLOCK', 0.9)
+
+        assert verificar_conteudo("como funciona a recursão em python")[0] is True
+        assert verificar_conteudo("compre seguidores baratos no link")[0] is False
+        # Nothing confident either way: the API decides
+        assert verificar_conteudo("Resposta PROIBIDO sobre outra coisa")[0] is False
+        assert fake_moderation.calls == ["Resposta PROIBIDO sobre outra coisa"]
+        stats = moderation_classifier.local_classifier.stats()
+        assert (stats['gate_allowed'], stats['gate_blocked']) == (1, 1)
+
+    def test_verdicts_keep_their_text_for_training(self, fake_moderation):
+        verificar_conteudo("Como  funciona o git rebase?")
+
+        stored = ModerationVerdict.objects(pk=chave_texto("Como funciona o git rebase?")).first()
+        assert (stored._text, stored._version) == ("Como funciona o git rebase?", moderation_cache.VERDICT_VERSION)
+
+
+class TestModeratedViews:
+    """Thread views reject content the moderation endpoint flags"""
+
+    def test_create_thread_blocked_description(self, client, registered_user_token, thread_data, fake_moderation):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        blocked = dict(thread_data, description="texto PROIBIDO")
+
+        response = client.post('/api/threads', json=blocked, headers=headers)
+
+        assert response.status_code == 400
+        assert response.json['error'].startswith("Descrição imprópria:")
+        assert fake_moderation.max_in_flight == 2
+
+    def test_update_thread_blocked_title(self, client, registered_user_token, thread_data, fake_moderation):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+
+        response = client.put(f'/api/threads/{thread_id}', json={'title': 'PROIBIDO'}, headers=headers)
+
+        assert response.status_code == 400
+        assert response.json['error'].startswith("Título impróprio:")
+
+    def test_edit_keeping_title_only_checks_description(self, client, registered_user_token, thread_data, fake_moderation):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+        fake_moderation.reset()
+
+        response = client.put(
+            f'/api/threads/{thread_id}',
+            json={'title': thread_data['title'], 'description': 'Nova descrição'},
+            headers=headers,
+        )
+
+        assert response.status_code == 201
+        assert fake_moderation.calls == ['Nova descrição']
+
+    def test_post_edit_rechecks_only_changed_chunks(self, client, registered_user_token, thread_data, fake_moderation):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+        post_id = client.post(f'/api/threads/{thread_id}/posts', json={'content': long_text()}, headers=headers).json['id']
+        fake_moderation.reset()
+
+        response = client.put(f'/api/posts/{post_id}', json={'content': long_text(edited=2)}, headers=headers)
+
+        assert response.status_code == 201
+        assert 1 <= len(fake_moderation.calls) <= 2
+
+    def test_moderation_health(self, client, registered_user_token, thread_data, fake_moderation):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        client.post('/api/threads', json=thread_data, headers=headers)
+        client.post('/api/threads', json=thread_data, headers=headers)
+
+        response = client.get('/health/moderation', headers=headers)
+
+        assert response.status_code == 200
+        stats = response.json['verdict_cache']
+        assert stats['remote_calls'] == 2
+        assert stats['hits'] == 2
+        assert stats['estimated_seconds_saved'] > 0
+        assert response.json['prefilter']['checked'] == 4
+        assert response.json['client']['circuit'] == 'closed'
+        assert response.json['client']['ok'] == 2
+        assert response.json['policy']['enabled'] is False
@@ -0,0 +1,313 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from api.authentication.models import User
+from api.reports.models import Report
+from api.threads import moderation_policy as policy_module
+from api.threads.models import Thread
+from api.threads.moderation_policy import (
+    NEW, POSTHOC, SKIP, SYNC, TRUSTED, VETERAN, ModerationPolicy, author_tier, moderation_policy, tier_for,
+)
+from api.threads.moderation_queue import MAX_ATTEMPTS, ModerationJob, drain_moderation_queue
+from tests.test_moderation_queue import fake_moderator, later
+
+
+@pytest.fixture
+def policy_on(monkeypatch):
+    monkeypatch.setattr(policy_module, 'MODERATION_POLICY', True)
+
+
+@pytest.fixture
+def auth_headers(registered_user_token):
+    return {'Authorization': f'Bearer {registered_user_token}'}
+
+
+@pytest.fixture
+def other_headers(other_user_token):
+    return {'Authorization': f'Bearer {other_user_token}'}
+
+
+@pytest.fixture
+def author(auth_headers, auth_data):
+    return User.objects.get(_email=auth_data['email'])
+
+
+@pytest.fixture
+def reputation(author):
+    """Give the test user points and an account age; clears the cached tier."""
+    def set_reputation(points, age_days):
+        User.objects(id=author.id).update(
+            set___pointTotal=points, set___created_at=datetime.now() - timedelta(days=age_days)
+        )
+        moderation_policy.forget(author.id)
+    return set_reputation
+
+
+@pytest.fixture
+def remote_checks(monkeypatch):
+    """Replace the full checks in the views with fakes that record their calls."""
+    calls = []
+
+    def check_thread(title, description=None):
+        calls.append(title)
+        return (False, 'Título impróprio: termo proibido') if 'PROIBIDO' in title else (True, None)
+
+    def check_post(content):
+        calls.append(content)
+        return (False, 'Conteúdo impróprio: termo proibido') if 'PROIBIDO' in content else (True, None)
+
+    monkeypatch.setattr('api.threads.views.verificar_thread', check_thread)
+    monkeypatch.setattr('api.threads.views.verificar_post', check_post)
+    return calls
+
+
+@pytest.fixture
+def thread_id(client, auth_headers, thread_data, remote_checks):
+    thread_id = client.post('/api/threads', json=thread_data, headers=auth_headers).json['id']
+    remote_checks.clear()
+    return thread_id
+
+
+class TestTiers:
+    """Reputation tiers from points, account age and strikes"""
+
+    @pytest.mark.parametrize('points, age_days, strikes, expected', [
+        (0, 365, 0, NEW),
+        (49, 365, 0, NEW),
+        (50, 6, 0, NEW),
+        (50, 7, 0, TRUSTED),
+        (199, 365, 0, TRUSTED),
+        (200, 29, 0, TRUSTED),
+        (200, 30, 0, VETERAN),
+        (5000, 365, 1, NEW),
+    ])
+    def test_tier_for(self, points, age_days, strikes, expected):
+        assert tier_for(points, age_days, strikes) == expected
+
+    def test_author_without_points_is_new(self, author):
+        assert author_tier(author.id) == NEW
+
+    def test_points_and_age(self, author, reputation):
+        reputation(60, 10)
+        assert author_tier(author.id) == TRUSTED
+        reputation(300, 60)
+        assert author_tier(author.id) == VETERAN
+
+    def test_report_on_own_content_is_a_strike(self, client, author, reputation, auth_headers, thread_data,
+                                               remote_checks):
+        thread_id = client.post('/api/threads', json=thread_data, headers=auth_headers).json['id']
+        reputation(300, 60)
+        report = Report(_content_type='thread', _content_id=thread_id, _report_type='spam')
+        report.save()
+        assert author_tier(author.id) == NEW
+
+        report._status = 'dismissed'
+        report.save()
+        assert author_tier(author.id) == VETERAN
+
+    def test_rejected_content_is_a_strike(self, client, author, reputation, auth_headers, thread_data,
+                                          remote_checks):
+        thread_id = client.post('/api/threads', json=thread_data, headers=auth_headers).json['id']
+        Thread.objects(id=thread_id).update(set___status='rejected')
+        reputation(300, 60)
+        assert author_tier(author.id) == NEW
+
+
+class TestDecisions:
+    """Per-submission decisions and their counters"""
+
+    def test_always_sync_when_disabled(self, author, reputation):
+        reputation(300, 60)
+        assert moderation_policy.decide(author.id) == SYNC
+        assert moderation_policy.stats()['sync'] == 0
+
+    def test_veterans_are_sampled(self, author, reputation, policy_on):
+        reputation(300, 60)
+        policy = ModerationPolicy(sample_rate=0.25, rng=random.Random(7))
+
+        decisions = [policy.decide(author.id) for _ in range(400)]
+
+        assert set(decisions) == {POSTHOC, SKIP}
+        assert 0.15 < decisions.count(POSTHOC) / len(decisions) < 0.35
+        stats = policy.stats()
+        assert (stats['veteran'], stats['posthoc'] + stats['skip']) == (400, 400)
+        assert stats['cached_authors'] == 1
+
+    def test_tier_is_cached(self, author, reputation, policy_on):
+        reputation(60, 10)
+        assert moderation_policy.decide(author.id) == POSTHOC
+        User.objects(id=author.id).update(set___pointTotal=0)
+
+        assert moderation_policy.decide(author.id) == POSTHOC
+        moderation_policy.forget(author.id)
+        assert moderation_policy.decide(author.id) == SYNC
+
+
+class TestModeratedSubmissions:
+    """Views under MODERATION_POLICY=1"""
+
+    def test_new_author_gets_the_full_check(self, client, auth_headers, thread_data, policy_on, remote_checks):
+        response = client.post('/api/threads', json=thread_data, headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == [thread_data['title']]
+        assert ModerationJob.objects.count() == 0
+
+    def test_trusted_author_is_checked_after_publishing(self, client, auth_headers, thread_data, reputation,
+                                                        policy_on, remote_checks):
+        reputation(60, 10)
+        response = client.post('/api/threads', json=thread_data, headers=auth_headers)
+
+        assert response.status_code == 201
+        assert response.json['status'] == 'published'
+        assert remote_checks == []
+        job = ModerationJob.objects.get()
+        assert (str(job._target_id), job._posthoc) == (response.json['id'], True)
+
+        assert drain_moderation_queue(fake_moderator) == 1
+        assert Thread.objects.get(id=response.json['id']).status == 'published'
+
+    def test_trusted_author_still_hits_the_prefilter(self, client, auth_headers, thread_id, reputation,
+                                                     policy_on, remote_checks):
+        reputation(60, 10)
+        response = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'que merda de prova'},
+                               headers=auth_headers)
+
+        assert response.status_code == 400
+        assert 'linguagem ofensiva' in response.json['error']
+        assert remote_checks == []
+
+    def test_posthoc_block_takes_the_post_down(self, client, auth_headers, other_headers, thread_id, author,
+                                               reputation, policy_on, remote_checks):
+        reputation(60, 10)
+        response = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta PROIBIDO'},
+                               headers=auth_headers)
+        assert response.status_code == 201
+        assert client.get(f'/api/threads/{thread_id}', headers=other_headers).json['post_count'] == 1
+
+        drain_moderation_queue(fake_moderator)
+
+        post_id = response.json['id']
+        assert client.get(f'/api/posts/{post_id}', headers=other_headers).status_code == 404
+        assert client.get(f'/api/posts/{post_id}', headers=auth_headers).json['status'] == 'rejected'
+        assert client.get(f'/api/threads/{thread_id}', headers=other_headers).json['post_count'] == 0
+        # The rejection is a strike: the next post gets the full check
+        client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Outra resposta'}, headers=auth_headers)
+        assert remote_checks == ['Outra resposta']
+
+    def test_posthoc_block_unindexes_the_thread(self, client, auth_headers, other_headers, thread_data,
+                                                reputation, policy_on, remote_checks):
+        reputation(60, 10)
+        blocked = dict(thread_data, title='Test PROIBIDO')
+        client.post('/api/threads', json=blocked, headers=auth_headers)
+        assert client.get('/api/search/threads?q=Test', headers=other_headers).json['count'] == 1
+
+        drain_moderation_queue(fake_moderator)
+
+        assert client.get('/api/search/threads?q=Test', headers=other_headers).json['count'] == 0
+
+    def test_posthoc_block_reaches_other_workers_indexes(self, client, auth_headers, other_headers, thread_data,
+                                                         reputation, policy_on, remote_checks):
+        """Indexes of another worker drop the rejected thread on their next refresh."""
+        from api.search.engine import ThreadSearchIndex
+        from api.search.suggest import TitleSuggestIndex
+
+        reputation(60, 10)
+        thread_id = client.post('/api/threads', json=dict(thread_data, title='Test PROIBIDO'),
+                                headers=auth_headers).json['id']
+        other_search, other_suggest = ThreadSearchIndex(), TitleSuggestIndex()
+        other_search.refresh(force=True)
+        other_suggest.refresh(force=True)
+        assert [t for _, _, t in other_search.rank('proibido')] == [ObjectId(thread_id)]
+        assert [s['id'] for s in other_suggest.suggest('proib')] == [thread_id]
+
+        drain_moderation_queue(fake_moderator)  # Runs in "this" worker only
+        other_search.refresh(force=True)
+        other_suggest.refresh(force=True)
+
+        assert other_search.rank('proibido') == []
+        assert other_suggest.suggest('proib') == []
+
+    def test_posthoc_failures_leave_content_published(self, client, auth_headers, thread_id, reputation,
+                                                      policy_on, remote_checks):
+        def broken(target_type, target):
+            raise RuntimeError('API down')
+
+        reputation(60, 10)
+        post_id = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta'},
+                              headers=auth_headers).json['id']
+        # With a later clock every retry is due at once
+        assert drain_moderation_queue(broken, now=later(86400)) == MAX_ATTEMPTS
+
+        assert client.get(f'/api/posts/{post_id}', headers=auth_headers).json['status'] == 'published'
+        assert ModerationJob.objects.get()._state == 'failed'
+
+    def test_skipped_veteran_post_is_not_queued(self, client, auth_headers, thread_id, reputation, policy_on,
+                                                remote_checks, monkeypatch):
+        reputation(300, 60)
+        monkeypatch.setattr(moderation_policy, 'sample_rate', 0.0)
+
+        response = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta'},
+                               headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == []
+        assert ModerationJob.objects.count() == 0
+
+    def test_trusted_edit_is_checked_after_saving(self, client, auth_headers, thread_id, reputation, policy_on,
+                                                  remote_checks):
+        post_id = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta'},
+                              headers=auth_headers).json['id']
+        reputation(60, 10)
+        remote_checks.clear()
+
+        response = client.put(f'/api/posts/{post_id}', json={'content': 'Resposta PROIBIDO'}, headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == []
+        drain_moderation_queue(fake_moderator)
+        assert client.get(f'/api/posts/{post_id}', headers=auth_headers).json['status'] == 'rejected'
+
+    def test_edited_rejected_post_is_published_again(self, client, auth_headers, other_headers, thread_id,
+                                                     reputation, policy_on, remote_checks):
+        reputation(60, 10)
+        post_id = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta PROIBIDO'},
+                              headers=auth_headers).json['id']
+        drain_moderation_queue(fake_moderator)
+        remote_checks.clear()
+
+        # The rejection was a strike, so the edit gets the full check and is published at once
+        response = client.put(f'/api/posts/{post_id}', json={'content': 'Resposta corrigida'}, headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == ['Resposta corrigida']
+        post = client.get(f'/api/posts/{post_id}', headers=other_headers).json
+        assert post['status'] == 'published'
+        assert 'moderation_message' not in post
+        assert client.get(f'/api/threads/{thread_id}', headers=other_headers).json['post_count'] == 1
+
+    def test_rejected_edit_of_rejected_thread_stays_rejected(self, client, auth_headers, other_headers, thread_data,
+                                                             reputation, policy_on, remote_checks):
+        reputation(60, 10)
+        thread_id = client.post('/api/threads', json=dict(thread_data, title='Test PROIBIDO'),
+                                headers=auth_headers).json['id']
+        drain_moderation_queue(fake_moderator)
+
+        response = client.put(f'/api/threads/{thread_id}', json={'title': 'Ainda PROIBIDO'}, headers=auth_headers)
+
+        assert response.status_code == 400
+        assert client.get(f'/api/threads/{thread_id}', headers=auth_headers).json['status'] == 'rejected'
+
+    def test_other_fields_do_not_resubmit(self, client, auth_headers, thread_data, reputation, policy_on,
+                                          remote_checks):
+        reputation(60, 10)
+        thread_id = client.post('/api/threads', json=dict(thread_data, title='Test PROIBIDO'),
+                                headers=auth_headers).json['id']
+        drain_moderation_queue(fake_moderator)
+
+        client.put(f'/api/threads/{thread_id}', json={'semester': 3}, headers=auth_headers)
+
+        assert client.get(f'/api/threads/{thread_id}', headers=auth_headers).json['status'] == 'rejected'
+        assert ModerationJob.objects.count() == 0
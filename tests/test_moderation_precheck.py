@@ -0,0 +1,196 @@
+import pytest
+from api.authentication.models import User
+from api.moderation import rate_limit, tokens
+from api.moderation.tokens import content_hash, sign_verdict, verdict_matches
+from api.threads import moderation_queue
+from api.threads.moderation_queue import ModerationJob
+from core.moderation_client import ModerationUnavailable
+
+
+@pytest.fixture
+def auth_headers(registered_user_token):
+    return {'Authorization': f'Bearer {registered_user_token}'}
+
+
+@pytest.fixture
+def remote_checks(monkeypatch):
+    """Replace the full checks with fakes that record their calls, in the precheck and the submit views."""
+    calls = []
+
+    def check_thread(title, description=None):
+        calls.append(title)
+        return (False, 'Título impróprio: termo proibido') if 'PROIBIDO' in title else (True, None)
+
+    def check_post(content):
+        calls.append(content)
+        return (False, 'Conteúdo impróprio: termo proibido') if 'PROIBIDO' in content else (True, None)
+
+    monkeypatch.setattr('api.threads.views.verificar_thread', check_thread)
+    monkeypatch.setattr('api.threads.views.verificar_post', check_post)
+    monkeypatch.setattr('api.moderation.views.verificar_thread_estrito', check_thread)
+    monkeypatch.setattr('api.moderation.views.verificar_post_estrito', check_post)
+    return calls
+
+
+@pytest.fixture
+def thread_id(client, auth_headers, thread_data, remote_checks):
+    thread_id = client.post('/api/threads', json=thread_data, headers=auth_headers).json['id']
+    remote_checks.clear()
+    return thread_id
+
+
+def precheck(client, headers, **draft):
+    return client.post('/api/moderation/precheck', json=draft, headers=headers)
+
+
+class TestTokens:
+    """Signed verdict tokens"""
+
+    def test_hash_ignores_whitespace_but_not_text(self):
+        assert content_hash('post', 'Olá   mundo\n') == content_hash('post', 'Olá mundo')
+        assert content_hash('post', 'Olá mundo') != content_hash('post', 'Olá mundo!')
+        assert content_hash('post', 'Olá') != content_hash('thread', 'Olá')
+        assert content_hash('thread', 'a b', '') != content_hash('thread', 'a', 'b')
+
+    def test_token_is_bound_to_user_and_text(self, app):
+        with app.app_context():
+            token = sign_verdict('user-1', 'post', 'Resposta')
+
+            assert verdict_matches(token, 'user-1', 'post', 'Resposta')
+            assert not verdict_matches(token, 'user-2', 'post', 'Resposta')
+            assert not verdict_matches(token, 'user-1', 'post', 'Resposta editada')
+            assert not verdict_matches(token[:-2], 'user-1', 'post', 'Resposta')
+            assert not verdict_matches(None, 'user-1', 'post', 'Resposta')
+
+    def test_expired_token_is_refused(self, app, monkeypatch):
+        with app.app_context():
+            token = sign_verdict('user-1', 'post', 'Resposta')
+            monkeypatch.setattr(tokens, 'PRECHECK_TOKEN_MAX_AGE', -1)
+            assert not verdict_matches(token, 'user-1', 'post', 'Resposta')
+
+
+class TestPrecheck:
+    """POST /api/moderation/precheck and the submit views"""
+
+    def test_safe_draft_gets_a_token(self, client, auth_headers, remote_checks):
+        response = precheck(client, auth_headers, type='post', content='Obrigado pela ajuda')
+
+        assert response.status_code == 200
+        assert response.json['safe'] is True
+        assert response.json['expires_in'] == tokens.PRECHECK_TOKEN_MAX_AGE
+        assert response.json['moderation_token']
+
+    def test_flagged_draft_gets_the_message(self, client, auth_headers, remote_checks):
+        response = precheck(client, auth_headers, type='post', content='Resposta PROIBIDO')
+
+        assert response.status_code == 200
+        assert response.json == {'safe': False, 'error': 'Conteúdo impróprio: termo proibido'}
+
+    @pytest.mark.parametrize('draft, error', [
+        ({'type': 'post'}, 'Content is required'),
+        ({'type': 'thread', 'description': 'x'}, 'Title is required'),
+        ({'type': 'thread', 'title': 'x' * 201}, 'Title must be less than 200 characters'),
+        ({'type': 'comment', 'content': 'x'}, "Type must be 'thread' or 'post'"),
+    ])
+    def test_invalid_drafts(self, client, auth_headers, remote_checks, draft, error):
+        response = precheck(client, auth_headers, **draft)
+        assert (response.status_code, response.json['error']) == (400, error)
+
+    def test_requires_authentication(self, client):
+        assert precheck(client, {}, type='post', content='Olá').status_code == 401
+
+    def test_token_skips_the_check_on_create_post(self, client, auth_headers, thread_id, remote_checks):
+        token = precheck(client, auth_headers, type='post', content='Obrigado pela ajuda').json['moderation_token']
+        remote_checks.clear()
+
+        response = client.post(f'/api/threads/{thread_id}/posts',
+                               json={'content': 'Obrigado pela ajuda', 'moderation_token': token},
+                               headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == []
+
+    def test_token_skips_the_check_on_create_thread(self, client, auth_headers, thread_data, remote_checks):
+        token = precheck(client, auth_headers, type='thread', title=thread_data['title'],
+                         description=thread_data['description']).json['moderation_token']
+        remote_checks.clear()
+
+        response = client.post('/api/threads', json=dict(thread_data, moderation_token=token), headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == []
+
+    def test_edited_text_is_checked_again(self, client, auth_headers, thread_id, remote_checks):
+        token = precheck(client, auth_headers, type='post', content='Obrigado pela ajuda').json['moderation_token']
+        remote_checks.clear()
+
+        response = client.post(f'/api/threads/{thread_id}/posts',
+                               json={'content': 'Obrigado PROIBIDO', 'moderation_token': token},
+                               headers=auth_headers)
+
+        assert response.status_code == 400
+        assert remote_checks == ['Obrigado PROIBIDO']
+
+    def test_token_still_goes_through_the_prefilter(self, client, app, auth_headers, auth_data, thread_id,
+                                                     remote_checks):
+        user = User.objects.get(_email=auth_data['email'])
+        with app.app_context():
+            # A token signed for a text the precheck would have refused
+            token = sign_verdict(user.id, 'post', 'que merda de prova')
+        response = client.post(f'/api/threads/{thread_id}/posts',
+                               json={'content': 'que merda de prova', 'moderation_token': token},
+                               headers=auth_headers)
+
+        assert response.status_code == 400
+
+    def test_token_skips_the_queue(self, client, auth_headers, thread_id, remote_checks, monkeypatch):
+        monkeypatch.setattr(moderation_queue, 'ASYNC_MODERATION', True)
+        token = precheck(client, auth_headers, type='post', content='Obrigado pela ajuda').json['moderation_token']
+
+        response = client.post(f'/api/threads/{thread_id}/posts',
+                               json={'content': 'Obrigado pela ajuda', 'moderation_token': token},
+                               headers=auth_headers)
+
+        assert response.status_code == 201
+        assert response.json['status'] == 'published'
+        assert ModerationJob.objects.count() == 0
+
+    def test_token_on_post_edit(self, client, auth_headers, thread_id, remote_checks):
+        post_id = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta'},
+                              headers=auth_headers).json['id']
+        token = precheck(client, auth_headers, type='post', content='Resposta corrigida').json['moderation_token']
+        remote_checks.clear()
+
+        response = client.put(f'/api/posts/{post_id}',
+                              json={'content': 'Resposta corrigida', 'moderation_token': token},
+                              headers=auth_headers)
+
+        assert response.status_code == 201
+        assert remote_checks == []
+
+    def test_no_token_when_moderation_is_unavailable(self, client, auth_headers, monkeypatch):
+        def unavailable(*fields):
+            raise ModerationUnavailable('circuito aberto')
+
+        monkeypatch.setattr('api.moderation.views.verificar_post_estrito', unavailable)
+
+        response = precheck(client, auth_headers, type='post', content='Obrigado pela ajuda')
+
+        assert response.status_code == 200
+        assert response.json == {'safe': True, 'moderation_token': None}
+
+    def test_prechecks_are_rate_limited_per_user(self, client, auth_headers, other_user_token, remote_checks,
+                                                 monkeypatch):
+        monkeypatch.setattr(rate_limit, 'PRECHECK_RATE_LIMIT', 2)
+        monkeypatch.setattr(rate_limit, 'PRECHECK_RATE_WINDOW_SECONDS', 3600)
+        for _ in range(2):
+            assert precheck(client, auth_headers, type='post', content='Olá').status_code == 200
+
+        response = precheck(client, auth_headers, type='post', content='Olá')
+
+        assert response.status_code == 429
+        assert 0 < response.json['details']['retry_after'] <= 3600
+        assert len(remote_checks) == 2
+        # Other users have their own quota
+        other_headers = {'Authorization': f'Bearer {other_user_token}'}
+        assert precheck(client, other_headers, type='post', content='Olá').status_code == 200
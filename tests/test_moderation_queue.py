@@ -0,0 +1,280 @@
+from datetime import timedelta
+
+import pytest
+from api.threads import moderation_queue
+from api.threads.models import Post, Thread
+from core import moderation
+from api.threads.moderation_queue import (
+    FAILED, LEASE_SECONDS, MAX_ATTEMPTS, QUEUED, ModerationJob,
+    claim_job, drain_moderation_queue, recover_pending,
+)
+
+
+def fake_moderator(target_type, target):
+    """Blocks any text containing PROIBIDO, without calling the moderation API."""
+    text = target._content if target_type == 'post' else f"{target._title} {target._description}"
+    if 'PROIBIDO' in text:
+        return False, 'Conteúdo impróprio: termo proibido'
+    return True, None
+
+
+def later(seconds):
+    return moderation_queue._utcnow() + timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def async_moderation(monkeypatch):
+    monkeypatch.setattr(moderation_queue, 'ASYNC_MODERATION', True)
+
+
+@pytest.fixture
+def auth_headers(registered_user_token):
+    return {'Authorization': f'Bearer {registered_user_token}'}
+
+
+@pytest.fixture
+def other_headers(other_user_token):
+    return {'Authorization': f'Bearer {other_user_token}'}
+
+
+@pytest.fixture
+def pending_thread(client, auth_headers, thread_data, async_moderation):
+    response = client.post('/api/threads', json=thread_data, headers=auth_headers)
+    assert response.status_code == 202
+    return response.json['id']
+
+
+class TestPendingThreads:
+    """Threads created with ASYNC_MODERATION=1"""
+
+    def test_create_returns_202_and_queues_a_job(self, client, auth_headers, thread_data, async_moderation):
+        response = client.post('/api/threads', json=thread_data, headers=auth_headers)
+
+        assert response.status_code == 202
+        assert response.json['status'] == 'pending_moderation'
+        assert response.json['message'] == 'Thread submitted for moderation'
+        job = ModerationJob.objects.get()
+        assert (job._target_type, str(job._target_id), job._state) == ('thread', response.json['id'], QUEUED)
+
+    def test_pending_thread_hidden_from_others(self, client, auth_headers, other_headers, pending_thread):
+        assert client.get(f'/api/threads/{pending_thread}', headers=other_headers).status_code == 404
+        listed = client.get('/api/threads', headers=other_headers).json['threads']
+        assert pending_thread not in [t['id'] for t in listed]
+
+    def test_pending_thread_visible_to_author(self, client, auth_headers, pending_thread):
+        response = client.get(f'/api/threads/{pending_thread}', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json['status'] == 'pending_moderation'
+        listed = client.get('/api/threads', headers=auth_headers).json['threads']
+        assert pending_thread in [t['id'] for t in listed]
+
+    def test_pending_thread_not_searchable(self, client, auth_headers, pending_thread):
+        response = client.get('/api/search/threads?q=Test', headers=auth_headers)
+        assert response.json['count'] == 0
+
+    def test_drain_publishes_safe_thread(self, client, auth_headers, other_headers, pending_thread):
+        assert drain_moderation_queue(fake_moderator) == 1
+
+        response = client.get(f'/api/threads/{pending_thread}', headers=other_headers)
+        assert response.status_code == 200
+        assert response.json['status'] == 'published'
+        assert ModerationJob.objects.count() == 0
+        search = client.get('/api/search/threads?q=Test', headers=other_headers)
+        assert [r['id'] for r in search.json['results']] == [pending_thread]
+
+    def test_drain_rejects_flagged_thread(self, client, auth_headers, other_headers, thread_data, async_moderation):
+        blocked = dict(thread_data, title='Título PROIBIDO')
+        thread_id = client.post('/api/threads', json=blocked, headers=auth_headers).json['id']
+
+        drain_moderation_queue(fake_moderator)
+
+        assert client.get(f'/api/threads/{thread_id}', headers=other_headers).status_code == 404
+        own = client.get(f'/api/threads/{thread_id}', headers=auth_headers).json
+        assert own['status'] == 'rejected'
+        assert own['moderation_message'] == 'Conteúdo impróprio: termo proibido'
+
+    def test_deleted_before_moderation(self, client, auth_headers, pending_thread):
+        client.delete(f'/api/threads/{pending_thread}', headers=auth_headers)
+
+        # The cascade removes the job along with the thread
+        assert ModerationJob.objects.count() == 0
+        assert drain_moderation_queue(fake_moderator) == 0
+
+    def test_deleted_thread_takes_its_posts_jobs(self, client, auth_headers, other_headers, thread_data,
+                                                 async_moderation):
+        thread_id = client.post('/api/threads', json=thread_data, headers=auth_headers).json['id']
+        drain_moderation_queue(fake_moderator)
+        post_ids = [client.post(f'/api/threads/{thread_id}/posts', json={'content': f'Resposta {i}'},
+                                headers=other_headers).json['id'] for i in range(2)]
+        assert ModerationJob.objects.count() == 2
+
+        client.delete(f'/api/posts/{post_ids[0]}', headers=other_headers)
+        assert [str(job._target_id) for job in ModerationJob.objects] == [post_ids[1]]
+
+        client.delete(f'/api/threads/{thread_id}', headers=auth_headers)
+        assert ModerationJob.objects.count() == 0
+
+    def test_resubmitted_thread_waits_for_a_job(self, client, auth_headers, other_headers, thread_data,
+                                                async_moderation):
+        thread_id = client.post('/api/threads', json=dict(thread_data, title='Test PROIBIDO'),
+                                headers=auth_headers).json['id']
+        drain_moderation_queue(fake_moderator)
+        thread = Thread.objects.get(id=thread_id)
+        thread.update({'title': 'Test corrigido'})
+
+        # An edit that only passed the local pre-filter goes back to the queue
+        assert moderation_queue.resubmit('thread', thread, verified=False) == 'pending_moderation'
+        own = client.get(f'/api/threads/{thread_id}', headers=auth_headers).json
+        assert own['status'] == 'pending_moderation'
+        assert 'moderation_message' not in own
+
+        assert drain_moderation_queue(fake_moderator) == 1
+        assert client.get(f'/api/threads/{thread_id}', headers=other_headers).json['status'] == 'published'
+        search = client.get('/api/search/threads?q=corrigido', headers=other_headers)
+        assert [r['id'] for r in search.json['results']] == [thread_id]
+
+    def test_resubmit_leaves_published_content_alone(self, client, auth_headers, thread_data):
+        thread = Thread.objects.get(id=client.post('/api/threads', json=thread_data, headers=auth_headers).json['id'])
+
+        assert moderation_queue.resubmit('thread', thread, verified=False) == 'published'
+        assert ModerationJob.objects.count() == 0
+
+    def test_sync_mode_unchanged(self, client, auth_headers, thread_data):
+        response = client.post('/api/threads', json=thread_data, headers=auth_headers)
+        assert response.status_code == 201
+        assert response.json['status'] == 'published'
+        assert ModerationJob.objects.count() == 0
+
+
+class TestPendingPosts:
+    """Posts created with ASYNC_MODERATION=1"""
+
+    @pytest.fixture
+    def thread_id(self, client, auth_headers, thread_data):
+        return client.post('/api/threads', json=thread_data, headers=auth_headers).json['id']
+
+    def create_post(self, client, headers, thread_id, content):
+        return client.post(f'/api/threads/{thread_id}/posts', json={'content': content}, headers=headers)
+
+    def test_pending_post_not_counted_or_shown(self, client, auth_headers, other_headers, thread_id, async_moderation):
+        response = self.create_post(client, other_headers, thread_id, 'Minha resposta')
+        assert response.status_code == 202
+        assert response.json['status'] == 'pending_moderation'
+
+        thread = client.get(f'/api/threads/{thread_id}', headers=auth_headers).json
+        assert thread['post_count'] == 0
+        assert thread['posts'] == []
+        # The author sees their own pending post
+        own = client.get(f'/api/threads/{thread_id}', headers=other_headers).json
+        assert [p['status'] for p in own['posts']] == ['pending_moderation']
+
+    def test_published_post_is_counted(self, client, auth_headers, other_headers, thread_id, async_moderation):
+        post_id = self.create_post(client, other_headers, thread_id, 'Minha resposta').json['id']
+
+        drain_moderation_queue(fake_moderator)
+
+        thread = client.get(f'/api/threads/{thread_id}', headers=auth_headers).json
+        assert thread['post_count'] == 1
+        assert [p['id'] for p in thread['posts']] == [post_id]
+
+    def test_rejected_post_delete_keeps_count(self, client, auth_headers, other_headers, thread_id, async_moderation):
+        post_id = self.create_post(client, other_headers, thread_id, 'PROIBIDO').json['id']
+        drain_moderation_queue(fake_moderator)
+        assert client.get(f'/api/posts/{post_id}', headers=auth_headers).status_code == 404
+        assert client.get(f'/api/posts/{post_id}', headers=other_headers).json['status'] == 'rejected'
+
+        client.delete(f'/api/posts/{post_id}', headers=other_headers)
+
+        assert Thread.objects.get(id=thread_id).post_count == 0
+
+    def test_post_on_hidden_thread(self, client, other_headers, pending_thread, monkeypatch):
+        for async_mode in (True, False):
+            monkeypatch.setattr(moderation_queue, 'ASYNC_MODERATION', async_mode)
+            response = self.create_post(client, other_headers, pending_thread, 'Resposta')
+            assert response.status_code == 404
+        assert Post.objects.count() == 0
+        assert Thread.objects.get(id=pending_thread).post_count == 0
+
+    def test_post_on_missing_thread(self, client, auth_headers, async_moderation):
+        response = self.create_post(client, auth_headers, '507f1f77bcf86cd799439011', 'Resposta')
+        assert response.status_code == 404
+        assert Post.objects.count() == 0
+
+
+class TestQueueReliability:
+    """Retries, leases and recovery"""
+
+    def test_failure_is_retried_with_backoff(self, pending_thread):
+        calls = []
+
+        def flaky(target_type, target):
+            calls.append(target.id)
+            if len(calls) == 1:
+                raise ConnectionError('moderation API unreachable')
+            return True, None
+
+        assert drain_moderation_queue(flaky) == 1
+        job = ModerationJob.objects.get()
+        assert (job._state, job._attempts, job._last_error) == (QUEUED, 1, 'moderation API unreachable')
+        assert job._run_at > moderation_queue._utcnow()
+
+        # Not ready until the backoff has passed
+        assert drain_moderation_queue(flaky) == 0
+        assert drain_moderation_queue(flaky, now=later(moderation_queue.RETRY_MAX_SECONDS * 2)) == 1
+        assert Thread.objects.get(id=pending_thread).status == 'published'
+        assert len(calls) == 2
+
+    def test_gives_up_after_max_attempts(self, pending_thread):
+        def broken(target_type, target):
+            raise RuntimeError('always fails')
+
+        drain_moderation_queue(broken, now=later(10 ** 6))
+
+        job = ModerationJob.objects.get()
+        assert (job._state, job._attempts) == (FAILED, MAX_ATTEMPTS)
+        # Fail open, like synchronous moderation
+        assert Thread.objects.get(id=pending_thread).status == 'published'
+
+    def test_job_of_crashed_worker_is_reclaimed(self, pending_thread):
+        # A worker claims the job and dies before finishing it
+        assert claim_job() is not None
+        assert drain_moderation_queue(fake_moderator) == 0
+
+        # Once its lease runs out, another worker takes it
+        assert drain_moderation_queue(fake_moderator, now=later(LEASE_SECONDS + 1)) == 1
+        assert Thread.objects.get(id=pending_thread).status == 'published'
+
+    def test_recover_pending_without_job(self, pending_thread):
+        ModerationJob.objects.delete()  # The process died between save and enqueue
+
+        assert recover_pending() == 1
+        assert recover_pending() == 0
+        assert drain_moderation_queue(fake_moderator) == 1
+        assert Thread.objects.get(id=pending_thread).status == 'published'
+
+    def test_enqueue_is_idempotent(self, pending_thread):
+        moderation_queue.enqueue('thread', pending_thread)
+        assert ModerationJob.objects.count() == 1
+
+    def test_default_moderator_retries_when_the_api_fails(self, pending_thread, monkeypatch):
+        monkeypatch.setattr(moderation, 'AZURE_OPENAI_ENDPOINT', 'http://127.0.0.1:9/chat/completions')
+
+        assert drain_moderation_queue() == 1
+
+        job = ModerationJob.objects.get()
+        assert (job._state, job._attempts) == (QUEUED, 1)
+        assert Thread.objects.get(id=pending_thread).status == 'pending_moderation'
+
+    def test_enqueue_restarts_a_failed_job(self, pending_thread):
+        def broken(target_type, target):
+            raise RuntimeError('always fails')
+
+        drain_moderation_queue(broken, now=later(10 ** 6))
+        assert ModerationJob.objects.get()._state == FAILED
+
+        moderation_queue.enqueue('thread', pending_thread, posthoc=True)
+
+        job = ModerationJob.objects.get()
+        assert (job._state, job._attempts, job._posthoc) == (QUEUED, 0, True)
+        assert drain_moderation_queue(fake_moderator) == 1
+        assert ModerationJob.objects.count() == 0
@@ -0,0 +1,221 @@
+import asyncio
+import time
+
+import pytest
+from api.reports.models import Report
+from api.threads import moderation_rescan
+from api.threads.moderation_rescan import RateLimiter, RescanCheckpoint, report_type_for, rescan_content
+from core import moderation
+from core.moderation_client import FAILURE_THRESHOLD
+from tests.fake_moderation import FakeModerationServer
+
+RATE = 1000  # Batches per second: no throttling unless a test asks for it
+
+
+@pytest.fixture(scope='module')
+def fake_server():
+    with FakeModerationServer() as server:
+        yield server
+
+
+@pytest.fixture
+def fake_moderation(fake_server, monkeypatch):
+    monkeypatch.setattr(moderation, 'AZURE_OPENAI_ENDPOINT', fake_server.url)
+    monkeypatch.setattr(moderation_rescan, 'RETRY_BASE_SECONDS', 0.01)
+    fake_server.reset()
+    return fake_server
+
+
+@pytest.fixture
+def auth_headers(registered_user_token):
+    return {'Authorization': f'Bearer {registered_user_token}'}
+
+
+@pytest.fixture
+def create_content(client, auth_headers, monkeypatch):
+    """Create threads and posts with moderation switched off, as content written before a policy change."""
+    def create(threads=(), posts=()):
+        with monkeypatch.context() as m:
+            m.setattr('api.threads.views.verificar_thread', lambda title, description=None: (True, None))
+            m.setattr('api.threads.views.verificar_post', lambda content: (True, None))
+            thread_ids = [
+                client.post('/api/threads', json={'title': title, 'description': 'Uma descrição'},
+                            headers=auth_headers).json['id']
+                for title in threads or ['Tópico das respostas']
+            ]
+            post_ids = [
+                client.post(f'/api/threads/{thread_ids[0]}/posts', json={'content': content},
+                            headers=auth_headers).json['id']
+                for content in posts
+            ]
+        return thread_ids, post_ids
+    return create
+
+
+class TestRescan:
+    """Bulk moderation of existing threads and posts"""
+
+    def test_flags_content_and_files_reports(self, fake_moderation, create_content):
+        (safe_thread, bad_thread), (safe_post, bad_post) = create_content(
+            threads=['Dúvida sobre recursão', 'Título PROIBIDO'],
+            posts=['Obrigado pela ajuda', 'Resposta PROIBIDO'],
+        )
+
+        result = rescan_content(rate=RATE)
+
+        assert (result['scanned'], result['flagged'], result['errors'], result['reports']) == (4, 2, 0, 2)
+        assert result['finished']
+        reports = {(r.content_type, r.content_id): r for r in Report.objects(_source='moderation')}
+        assert set(reports) == {('thread', bad_thread), ('post', bad_post)}
+        report = reports[('post', bad_post)]
+        assert (report.status, report.report_type, report.reporter) == ('pending', 'other', None)
+        assert report.description == 'Conteúdo bloqueado: ofensivo - termo proibido'
+
+    def test_texts_are_packed_into_batches(self, fake_moderation, create_content):
+        create_content(posts=[f'Resposta número {i}' for i in range(5)])
+
+        rescan_content(batch_size=2, rate=RATE)
+
+        # One thread, then five posts two at a time
+        assert [len(batch) for batch in fake_moderation.batches] == [1, 2, 2, 1]
+        assert fake_moderation.batches[0] == ['Tópico das respostas\n\nUma descrição']
+
+    def test_resumes_from_checkpoint(self, fake_moderation, create_content):
+        create_content(posts=[f'Resposta número {i}' for i in range(4)])
+
+        first = rescan_content(batch_size=2, limit=3, rate=RATE)
+        assert (first['scanned'], first['finished']) == (3, False)
+
+        second = rescan_content(batch_size=2, rate=RATE)
+        assert (second['scanned'], second['finished']) == (5, True)
+        texts = [text for batch in fake_moderation.batches for text in batch]
+        assert len(texts) == len(set(texts)) == 5
+
+    def test_finished_rescan_is_not_repeated(self, fake_moderation, create_content):
+        create_content(posts=['Resposta PROIBIDO'])
+        rescan_content(rate=RATE)
+        fake_moderation.reset()
+
+        assert rescan_content(rate=RATE)['scanned'] == 2
+        assert fake_moderation.batches == []
+
+    def test_restart_does_not_duplicate_reports(self, fake_moderation, create_content):
+        create_content(posts=['Resposta PROIBIDO'])
+        rescan_content(rate=RATE)
+        moderation.verdict_cache.clear()
+
+        result = rescan_content(rate=RATE, restart=True)
+
+        assert (result['flagged'], result['reports']) == (1, 0)
+        assert Report.objects(_source='moderation').count() == 1
+        assert RescanCheckpoint.objects.count() == 1
+
+    def test_failed_batch_is_retried_then_kept_for_the_next_run(self, fake_moderation, create_content):
+        create_content(posts=['ERRO500', 'Resposta PROIBIDO', 'Outra resposta'])
+
+        result = rescan_content(batch_size=2, rate=RATE)
+
+        # The batch with ERRO500 fails three times; the other batches still go through
+        assert (result['scanned'], result['errors'], result['finished']) == (4, 2, False)
+        failing = [batch for batch in fake_moderation.batches if 'ERRO500' in batch]
+        assert len(failing) == moderation_rescan.MAX_BATCH_ATTEMPTS
+        fake_moderation.reset()
+
+        # The next run checks the two failed texts one per prompt: ERRO500 fails again alone
+        result = rescan_content(batch_size=2, rate=RATE)
+
+        assert (result['scanned'], result['flagged'], result['errors'], result['finished']) == (4, 1, 1, False)
+        assert ['Resposta PROIBIDO'] in fake_moderation.batches
+        assert Report.objects(_source='moderation').count() == 1
+
+    def test_text_that_keeps_failing_is_given_up_and_reported(self, fake_moderation, create_content, monkeypatch):
+        monkeypatch.setattr(moderation_rescan, 'MAX_TEXT_ATTEMPTS', 2)
+        (_, (post_id,)) = create_content(posts=['ERRO500'])
+
+        first = rescan_content(rate=RATE)
+        assert (first['errors'], first['skipped'], first['finished']) == (1, 0, False)
+        assert RescanCheckpoint.objects.get()._failed['posts'] == {post_id: 1}
+
+        moderation.moderation_client.reset()  # Keep the breaker closed: these are the text's failures
+        second = rescan_content(rate=RATE)
+
+        assert (second['errors'], second['skipped'], second['reports'], second['finished']) == (0, 1, 1, True)
+        report = Report.objects.get(_source='moderation')
+        assert (report.content_id, report.report_type) == (post_id, 'other')
+        assert report.description == moderation_rescan.GIVE_UP_MESSAGE
+
+    def test_failures_while_the_api_is_down_are_not_attempts(self, fake_moderation, create_content, monkeypatch):
+        monkeypatch.setattr(moderation_rescan, 'MAX_TEXT_ATTEMPTS', 2)
+        create_content(posts=['ERRO500'])
+        rescan_content(rate=RATE)
+        for _ in range(FAILURE_THRESHOLD):
+            moderation.moderation_client.breaker.record_failure()  # The API went down
+
+        result = rescan_content(rate=RATE)
+
+        assert (result['errors'], result['skipped']) == (1, 0)
+        assert list(RescanCheckpoint.objects.get()._failed['posts'].values()) == [1]
+
+    def test_outage_stops_the_run_and_failed_texts_are_checked_later(self, fake_moderation, create_content):
+        create_content(posts=['Resposta PROIBIDO', 'Outra resposta'])
+        fake_moderation.fail_status = 503
+
+        # The thread's batch fails and is recorded; by the posts' page the breaker is open, so the run stops
+        first = rescan_content(batch_size=2, concurrency=1, rate=RATE)
+        assert (first['scanned'], first['errors'], first['finished']) == (1, 1, False)
+        assert 'posts' not in RescanCheckpoint.objects.get()._positions
+
+        fake_moderation.fail_status = None
+        moderation.moderation_client.reset()  # The API is back and the breaker closed
+        second = rescan_content(batch_size=2, concurrency=1, rate=RATE)
+
+        assert (second['scanned'], second['flagged'], second['errors'], second['finished']) == (3, 1, 0, True)
+
+    def test_items_missing_from_reply_are_errors(self, fake_moderation, create_content):
+        create_content(posts=['OMITIR esta', 'Resposta PROIBIDO'])
+
+        result = rescan_content(rate=RATE)
+
+        assert (result['scanned'], result['flagged'], result['errors']) == (3, 1, 1)
+
+    def test_local_prefilter_and_cache_skip_the_model(self, fake_moderation, create_content):
+        create_content(posts=['que merda de prova', 'Obrigado pela ajuda'])
+        moderation.verificar_conteudo('Obrigado pela ajuda')
+        fake_moderation.reset()
+
+        result = rescan_content(rate=RATE)
+
+        assert result['flagged'] == 1
+        assert fake_moderation.batches == [['Tópico das respostas\n\nUma descrição']]
+
+    def test_hidden_content_is_skipped(self, fake_moderation, create_content, client, auth_headers, monkeypatch):
+        (thread_id,), _ = create_content()
+        monkeypatch.setattr('api.threads.moderation_queue.ASYNC_MODERATION', True)
+        response = client.post(f'/api/threads/{thread_id}/posts', json={'content': 'Resposta pendente'},
+                               headers=auth_headers)
+        assert response.status_code == 202
+
+        assert rescan_content(rate=RATE)['scanned'] == 1
+
+    def test_rate_limit(self):
+        async def calls(n):
+            limiter = RateLimiter(20)
+            await asyncio.gather(*(limiter.wait() for _ in range(n)))
+
+        start = time.perf_counter()
+        asyncio.run(calls(5))
+        # The first call goes at once, the next four 50 ms apart
+        assert time.perf_counter() - start >= 0.19
+
+    @pytest.mark.parametrize('category, expected', [
+        ('Conteúdo sexual explícito', 'sexual'),
+        ('violência ou ameaças', 'violence'),
+        ('Discriminação', 'discrimination'),
+        ('golpes ou fraudes', 'scam'),
+        ('Auto-mutilação ou suicídio', 'self_harm'),
+        ('spam excessivo', 'spam'),
+        ('linguagem ofensiva', 'other'),
+        (None, 'other'),
+    ])
+    def test_report_type_for_category(self, category, expected):
+        assert report_type_for(category) == expected
@@ -276,6 +276,183 @@ class TestGetSubjects:
         subjects = response.json
         assert len(subjects) == len(set(subjects))
 
+    def test_search_subjects_accent_insensitive(self, client, registered_user_token):
+        """Test that subject search ignores accents."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        with_accent = client.get('/api/filters/subjects?q=programação', headers=headers).json
+        without_accent = client.get('/api/filters/subjects?q=programacao', headers=headers).json
+
+        assert with_accent == without_accent
+        assert 'Programação Eficaz' in without_accent
+
+    def test_search_subjects_respects_filters(self, client, registered_user_token):
+        """Test that search only returns subjects of the selected course and semester."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/filters/subjects?q=dados&courses=cc&semester=3', headers=headers)
+
+        assert response.json == ['Banco de Dados']
+
+    def test_subjects_unknown_course_falls_back_to_defaults(self, client, registered_user_token):
+        """Test that courses without a subject list get the default subjects."""
+        from core.constants import DEFAULT_SUBJECTS
+
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/filters/subjects?courses=direito', headers=headers)
+
+        assert response.json == sorted(DEFAULT_SUBJECTS)
+
+
+class TestFilterCaching:
+    """Tests for the pre-serialized filter responses."""
+
+    @pytest.mark.parametrize('url', [
+        '/api/filters/config',
+        '/api/filters/semesters',
+        '/api/filters/courses',
+        '/api/filters/subjects?courses=cc&semester=3',
+    ])
+    def test_etag_revalidation(self, client, registered_user_token, url):
+        """Test that a matching If-None-Match gets an empty 304."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get(url, headers=headers)
+
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert etag
+
+        response = client.get(url, headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_etag_differs_per_subject_case(self, client, registered_user_token):
+        """Test that each course/semester case has its own ETag."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        cc = client.get('/api/filters/subjects?courses=cc', headers=headers).headers['ETag']
+        adm = client.get('/api/filters/subjects?courses=adm', headers=headers).headers['ETag']
+
+        assert cc != adm
+
+    def test_unknown_filter_type(self, client, registered_user_token):
+        """Test that an unknown filter type is a 404."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/filters/unknown', headers=headers)
+
+        assert response.status_code == 404
+
+
+class TestFilterFacets:
+    """Tests for the facet counts endpoint."""
+
+    def test_facets_without_filters(self, client, registered_user_token, threads_for_search):
+        """Test counts over every thread."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/filters/facets', headers=headers)
+
+        assert response.status_code == 200
+        assert response.json['total'] == 4
+        assert response.json['semester'] == {'3': 4}
+        assert response.json['course'] == {'cc': 3, 'adm': 1}
+        assert response.json['subject'] == {'Programação Eficaz': 2, 'Banco de Dados': 1, 'Marketing': 1}
+
+    def test_facets_ignore_their_own_filter(self, client, registered_user_token, threads_for_search):
+        """Test that selecting a course still shows the other courses, but narrows the other facets."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/filters/facets?courses=adm', headers=headers)
+
+        assert response.json['total'] == 1
+        assert response.json['course'] == {'cc': 3, 'adm': 1}
+        assert response.json['subject'] == {'Marketing': 1}
+        assert response.json['semester'] == {'3': 1}
+
+    def test_facets_follow_thread_writes(self, client, registered_user_token, threads_for_search, thread_data):
+        """Test that cached counts change with creates, edits and deletes."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        assert client.get('/api/filters/facets?semester=3', headers=headers).json['total'] == 4
+
+        new = {**thread_data, "semester": 5, "courses": ["adm"], "subjects": ["Logística"]}
+        thread_id = client.post('/api/threads', json=new, headers=headers).json['id']
+        response = client.get('/api/filters/facets?semester=3', headers=headers).json
+        assert response['total'] == 4
+        assert response['semester'] == {'3': 4, '5': 1}
+        assert 'Logística' not in response['subject']
+
+        client.put(f'/api/threads/{thread_id}', json={"semester": 3}, headers=headers)
+        response = client.get('/api/filters/facets?semester=3', headers=headers).json
+        assert response['total'] == 5
+        assert response['subject']['Logística'] == 1
+        assert response['course'] == {'cc': 3, 'adm': 2}
+
+        client.delete(f'/api/threads/{thread_id}', headers=headers)
+        response = client.get('/api/filters/facets?semester=3', headers=headers).json
+        assert response['total'] == 4
+        assert 'Logística' not in response['subject']
+
+    def test_facets_unauthorized(self, client):
+        """Test that facets require authentication."""
+        assert client.get('/api/filters/facets').status_code == 401
+
+
+class TestFacetCache:
+    """Unit tests for the incremental facet updates, against a recount from scratch."""
+
+    @staticmethod
+    def recount(threads, semester=None, courses=None, subjects=None):
+        def matches(thread, use_semester=True, use_courses=True, use_subjects=True):
+            t_semester, t_courses, t_subjects = thread
+            return (not (use_semester and semester) or t_semester == semester) \
+                and (not (use_courses and courses) or not t_courses.isdisjoint(courses)) \
+                and (not (use_subjects and subjects) or not t_subjects.isdisjoint(subjects))
+
+        facets = {'semester': {}, 'course': {}, 'subject': {}, 'total': 0}
+        for thread in threads:
+            if matches(thread, use_semester=False):
+                facets['semester'][thread[0]] = facets['semester'].get(thread[0], 0) + 1
+            if matches(thread, use_courses=False):
+                for course in thread[1]:
+                    facets['course'][course] = facets['course'].get(course, 0) + 1
+            if matches(thread, use_subjects=False):
+                for subject in thread[2]:
+                    facets['subject'][subject] = facets['subject'].get(subject, 0) + 1
+            facets['total'] += matches(thread)
+        return facets
+
+    def test_incremental_updates_match_recount(self, monkeypatch):
+        import random
+        from api.search import facets as facets_module
+
+        rng = random.Random(3)
+        threads = {}
+
+        def random_thread():
+            return (
+                rng.randint(1, 3),
+                frozenset(rng.sample(['cc', 'adm', 'eco'], rng.randint(0, 2))),
+                frozenset(rng.sample(['A', 'B', 'C', 'D'], rng.randint(0, 2))),
+            )
+
+        monkeypatch.setattr(facets_module, 'compute_facets',
+                            lambda *key: self.recount(threads.values(), *key))
+        cache = facets_module.FacetCache()
+        selections = [(None, None, None), (2, None, None), (None, ['cc'], ['A', 'B']), (1, ['adm', 'eco'], ['C'])]
+        for selection in selections:
+            cache.get(*selection)  # Warm the cache before the writes
+
+        for i in range(200):
+            action = rng.choice(['create', 'edit', 'delete']) if threads else 'create'
+            if action == 'create':
+                threads[i] = random_thread()
+                cache.thread_changed(None, threads[i])
+            elif action == 'edit':
+                thread_id = rng.choice(list(threads))
+                before, threads[thread_id] = threads[thread_id], random_thread()
+                cache.thread_changed(before, threads[thread_id])
+            else:
+                thread_id = rng.choice(list(threads))
+                cache.thread_changed(threads.pop(thread_id), None)
+
+        for selection in selections:
+            assert cache.get(*selection) == self.recount(threads.values(), *selection)
+
 
 class TestSearchThreads:
     """Tests for searching threads."""
@@ -433,6 +610,332 @@ class TestSearchThreads:
         # Should find threads with "autenticação"
         assert any('autenticação' in r['title'].lower() for r in results)
 
+    def test_search_threads_accent_insensitive(self, client, registered_user_token, threads_for_search):
+        """Test that accents in the query or the title do not affect matching."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/threads?q=autenticacao', headers=headers)
+
+        assert response.status_code == 200
+        assert any('autenticação' in r['title'].lower() for r in response.json['results'])
+
+        response = client.get('/api/search/threads?q=DÚVIDA', headers=headers)
+        assert any('dúvida' in r['title'].lower() for r in response.json['results'])
+
+    def test_search_threads_matches_description(self, client, registered_user_token, thread_data):
+        """Test that words only present in the description are found."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        thread = {**thread_data, "title": "Erro no deploy", "description": "O container do gunicorn reinicia sozinho"}
+        response = client.post('/api/threads', json=thread, headers=headers)
+        thread_id = response.json['id']
+
+        response = client.get('/api/search/threads?q=gunicorn', headers=headers)
+
+        assert response.status_code == 200
+        assert [r['id'] for r in response.json['results']] == [thread_id]
+
+    def test_search_threads_ranked_by_relevance(self, client, registered_user_token, thread_data):
+        """Test that a title match outranks a description-only match."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        in_description = {**thread_data, "title": "Pergunta geral", "description": "Alguém usa recursão em Python?"}
+        in_title = {**thread_data, "title": "Recursão em Python", "description": "Como evitar estouro de pilha?"}
+        description_id = client.post('/api/threads', json=in_description, headers=headers).json['id']
+        title_id = client.post('/api/threads', json=in_title, headers=headers).json['id']
+
+        response = client.get('/api/search/threads?q=recursao', headers=headers)
+
+        ids = [r['id'] for r in response.json['results']]
+        assert ids == [title_id, description_id]
+        relevances = [r['relevance'] for r in response.json['results']]
+        assert relevances == sorted(relevances, reverse=True)
+
+    def test_search_threads_cursor_pagination(self, client, registered_user_token, thread_data):
+        """Test that following next_cursor walks every result exactly once."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        created = {
+            client.post('/api/threads', json={**thread_data, "title": f"Dúvida de cálculo {i}"}, headers=headers).json['id']
+            for i in range(5)
+        }
+
+        seen = []
+        url = '/api/search/threads?q=calculo&limit=2'
+        response = client.get(url, headers=headers)
+        while True:
+            assert response.status_code == 200
+            assert response.json['count'] == 5
+            assert len(response.json['results']) <= 2
+            seen.extend(r['id'] for r in response.json['results'])
+            if not response.json['next_cursor']:
+                break
+            response = client.get(f"{url}&cursor={response.json['next_cursor']}", headers=headers)
+
+        assert len(seen) == 5
+        assert set(seen) == created
+
+    def test_search_threads_invalid_cursor(self, client, registered_user_token, threads_for_search):
+        """Test that a malformed cursor is rejected."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/threads?q=JWT&cursor=not-a-cursor', headers=headers)
+
+        assert response.status_code == 400
+
+    def test_search_threads_special_characters(self, client, registered_user_token, threads_for_search):
+        """Test that regex metacharacters in the query are treated as plain text."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/threads?q=.*(JWT', headers=headers)
+
+        assert response.status_code == 200
+        assert all('jwt' in r['title'].lower() for r in response.json['results'])
+        assert response.json['count'] >= 2
+
+    def test_search_threads_reflects_updates_and_deletes(self, client, registered_user_token, threads_for_search):
+        """Test that edits and deletes are visible to the next search."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        thread_id = threads_for_search[3]  # "Como calcular ROI em marketing digital"
+
+        client.put(f'/api/threads/{thread_id}', json={"title": "Como calcular payback"}, headers=headers)
+        assert client.get('/api/search/threads?q=ROI', headers=headers).json['count'] == 0
+        assert client.get('/api/search/threads?q=payback', headers=headers).json['count'] == 1
+
+        client.delete(f'/api/threads/{thread_id}', headers=headers)
+        assert client.get('/api/search/threads?q=payback', headers=headers).json['count'] == 0
+
+    def test_search_threads_drops_threads_deleted_elsewhere(self, client, registered_user_token, threads_for_search):
+        """Test that threads deleted without going through this worker's index are not returned."""
+        from api.threads.models import Thread
+
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        client.get('/api/search/threads?q=JWT', headers=headers)  # build the index
+        Thread.objects(id=threads_for_search[0]).delete()
+
+        response = client.get('/api/search/threads?q=JWT', headers=headers)
+
+        assert threads_for_search[0] not in [r['id'] for r in response.json['results']]
+        assert response.json['count'] == 1
+
+
+class TestSearchEngine:
+    """Unit tests for the in-memory index behind thread search."""
+
+    def test_tokenize_folds_accents_and_case(self):
+        from api.search.engine import tokenize
+        assert tokenize('Autenticação JWT, em Flask?') == ['autenticacao', 'jwt', 'em', 'flask']
+
+    def test_prefix_and_exact_matches(self):
+        from bson import ObjectId
+        from api.search.engine import ThreadSearchIndex
+
+        index = ThreadSearchIndex()
+        exact, prefix = ObjectId(), ObjectId()
+        index.upsert(exact, 'Banco de dados')
+        index.upsert(prefix, 'Bancos de investimento')
+
+        ranked = [thread_id for _, _, thread_id in index.rank('banco')]
+        assert ranked == [exact, prefix]
+
+    def test_filters(self):
+        from bson import ObjectId
+        from api.search.engine import ThreadSearchIndex
+
+        index = ThreadSearchIndex()
+        cc, adm = ObjectId(), ObjectId()
+        index.upsert(cc, 'Prova de cálculo', semester=1, courses=['cc'], subjects=['Cálculo'])
+        index.upsert(adm, 'Prova de cálculo', semester=2, courses=['adm'], subjects=['Cálculo'])
+
+        assert [t for _, _, t in index.rank('prova', semester_id=1)] == [cc]
+        assert [t for _, _, t in index.rank('prova', course_ids=['adm'])] == [adm]
+        assert len(index.rank('prova', subject_ids=['Cálculo'])) == 2
+        assert index.rank('prova', subject_ids=['Marketing']) == []
+
+    def test_remove_drops_terms(self):
+        from bson import ObjectId
+        from api.search.engine import ThreadSearchIndex
+
+        index = ThreadSearchIndex()
+        thread_id = ObjectId()
+        index.upsert(thread_id, 'Tema único')
+        index.remove(thread_id)
+
+        assert len(index) == 0
+        assert index.rank('unico') == []
+        assert index.rank('un') == []
+
+
+    def test_sync_window_rereads_the_overlap_once(self):
+        from datetime import datetime, timedelta
+        from types import SimpleNamespace
+        from bson import ObjectId
+        from api.search.engine import SyncWindow
+
+        window = SyncWindow(overlap=60)
+        now = datetime(2025, 3, 1, 12, 0, 0)
+        first = SimpleNamespace(id=ObjectId(), _updated_at=now)
+
+        assert window.is_new(first)
+        assert window.since() == now - timedelta(seconds=60)
+        assert not window.is_new(first)
+        # Edited later: a new version
+        assert window.is_new(SimpleNamespace(id=first.id, _updated_at=now + timedelta(seconds=1)))
+        # Stamped before the newest timestamp but committed later: still new
+        assert window.is_new(SimpleNamespace(id=ObjectId(), _updated_at=now - timedelta(seconds=5)))
+        assert window.until == now + timedelta(seconds=1)
+
+        window.is_new(SimpleNamespace(id=ObjectId(), _updated_at=now + timedelta(seconds=120)))
+        window.prune()
+        assert len(window._seen) == 1
+
+    def test_refresh_picks_up_a_late_commit(self, client, registered_user_token, thread_data):
+        from datetime import timedelta
+        from api.authentication.models import User
+        from api.search.engine import ThreadSearchIndex
+        from api.search.suggest import TitleSuggestIndex
+        from api.threads.models import Thread
+
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        client.post('/api/threads', json={**thread_data, 'title': 'Primeira pergunta'}, headers=headers)
+        search, suggest = ThreadSearchIndex(), TitleSuggestIndex()
+        search.refresh(force=True)
+        suggest.refresh(force=True)
+
+        # Another worker stamped this thread before the one already synced, and committed it after
+        newest = Thread.objects.order_by('-_updated_at').first()._updated_at
+        Thread(_title='Pergunta atrasada', _author=User.objects.first(),
+               _updated_at=newest - timedelta(seconds=5)).save()
+        search.refresh(force=True)
+        suggest.refresh(force=True)
+
+        assert len(search.rank('atrasada')) == 1
+        assert [s['title'] for s in suggest.suggest('atras')] == ['Pergunta atrasada']
+
+class TestSuggestThreads:
+    """Tests for the typeahead endpoint."""
+
+    def test_suggest_by_prefix(self, client, registered_user_token, threads_for_search):
+        """Test that a partial word suggests the threads with a title word starting with it."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/suggest?q=aut', headers=headers)
+
+        assert response.status_code == 200
+        assert response.json['query'] == 'aut'
+        titles = [s['title'] for s in response.json['suggestions']]
+        assert titles == ["Como implementar autenticação JWT em Flask?"]
+        assert set(response.json['suggestions'][0]) == {'id', 'title', 'score'}
+
+    def test_suggest_multiple_words(self, client, registered_user_token, threads_for_search):
+        """Test that every typed word must prefix some word of the title."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/suggest?q=jwt ses', headers=headers)
+
+        assert [s['title'] for s in response.json['suggestions']] == ["JWT vs Session: qual usar?"]
+
+    def test_suggest_accent_insensitive(self, client, registered_user_token, threads_for_search):
+        """Test that accents are ignored on both sides."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/suggest?q=duvi', headers=headers)
+
+        assert [s['title'] for s in response.json['suggestions']] == ["Dúvida sobre banco de dados relacionais"]
+
+    def test_suggest_ranked_by_score(self, client, registered_user_token, other_user_token, threads_for_search):
+        """Test that suggestions follow the thread score, including votes cast after indexing."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        other_headers = {'Authorization': f'Bearer {other_user_token}'}
+        client.get('/api/search/suggest?q=jwt', headers=headers)  # build the index
+
+        client.post(f'/api/threads/{threads_for_search[2]}/upvote', headers=other_headers)
+        response = client.get('/api/search/suggest?q=jwt', headers=headers)
+
+        assert [s['id'] for s in response.json['suggestions']] == [threads_for_search[2], threads_for_search[0]]
+        assert response.json['suggestions'][0]['score'] == 1
+
+        client.post(f'/api/threads/{threads_for_search[0]}/upvote', headers=other_headers)
+        client.post(f'/api/threads/{threads_for_search[2]}/upvote', headers=other_headers)  # Toggled off
+        response = client.get('/api/search/suggest?q=jwt', headers=headers)
+
+        assert [s['id'] for s in response.json['suggestions']] == [threads_for_search[0], threads_for_search[2]]
+
+    def test_suggest_with_filters(self, client, registered_user_token, threads_for_search):
+        """Test that the semester/course/subject filters apply."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+
+        response = client.get('/api/search/suggest?q=como&courses=adm', headers=headers)
+        assert [s['title'] for s in response.json['suggestions']] == ["Como calcular ROI em marketing digital"]
+
+        response = client.get('/api/search/suggest?q=como&subjects=Programação Eficaz', headers=headers)
+        assert [s['title'] for s in response.json['suggestions']] == ["Como implementar autenticação JWT em Flask?"]
+
+        response = client.get('/api/search/suggest?q=como&semester=4', headers=headers)
+        assert response.json['suggestions'] == []
+
+    def test_suggest_limit(self, client, registered_user_token, threads_for_search):
+        """Test that limit caps the number of suggestions."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/suggest?q=c&limit=1', headers=headers)
+
+        assert response.status_code == 200
+        assert len(response.json['suggestions']) == 1
+
+    def test_suggest_reflects_writes(self, client, registered_user_token, threads_for_search, thread_data):
+        """Test that created, edited and deleted threads show up immediately."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        client.get('/api/search/suggest?q=jwt', headers=headers)  # build the index
+
+        new_id = client.post('/api/threads', json={**thread_data, "title": "Kubernetes na AWS"}, headers=headers).json['id']
+        assert [s['id'] for s in client.get('/api/search/suggest?q=kube', headers=headers).json['suggestions']] == [new_id]
+
+        client.put(f'/api/threads/{new_id}', json={"title": "Terraform na AWS"}, headers=headers)
+        assert client.get('/api/search/suggest?q=kube', headers=headers).json['suggestions'] == []
+        assert len(client.get('/api/search/suggest?q=terra', headers=headers).json['suggestions']) == 1
+
+        client.delete(f'/api/threads/{new_id}', headers=headers)
+        assert client.get('/api/search/suggest?q=terra', headers=headers).json['suggestions'] == []
+
+    def test_suggest_missing_query(self, client, registered_user_token):
+        """Test that q is required."""
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+        response = client.get('/api/search/suggest', headers=headers)
+
+        assert response.status_code == 400
+
+    def test_suggest_unauthorized(self, client):
+        """Test that suggestions require authentication."""
+        response = client.get('/api/search/suggest?q=jwt')
+        assert response.status_code == 401
+
+
+class TestTitleSuggestIndex:
+    """Unit tests for the in-memory typeahead index."""
+
+    @pytest.mark.parametrize('collect_cost', [0.0, 1e9])
+    def test_collect_and_walk_agree(self, monkeypatch, collect_cost):
+        """Test that collecting matches and walking in score order give the same top threads."""
+        from bson import ObjectId
+        from api.search import suggest
+        from api.search.suggest import TitleSuggestIndex
+
+        monkeypatch.setattr(suggest, 'COLLECT_COST', collect_cost)
+        index = TitleSuggestIndex()
+        ids = [ObjectId() for _ in range(10)]
+        for i, thread_id in enumerate(ids):
+            index.upsert(thread_id, f'Prova {"final" if i % 2 else "parcial"}', score=i, semester=1 + i % 3)
+
+        assert [s['id'] for s in index.suggest('pro', limit=3)] == [str(ids[9]), str(ids[8]), str(ids[7])]
+        assert [s['id'] for s in index.suggest('pro fin', limit=2)] == [str(ids[9]), str(ids[7])]
+        assert [s['id'] for s in index.suggest('pro', semester_id=1, limit=2)] == [str(ids[9]), str(ids[6])]
+
+        index.set_score(ids[0], 100)
+        assert index.suggest('pro', limit=1)[0]['id'] == str(ids[0])
+
+    def test_remove(self):
+        from bson import ObjectId
+        from api.search.suggest import TitleSuggestIndex
+
+        index = TitleSuggestIndex()
+        thread_id = ObjectId()
+        index.upsert(thread_id, 'Tema único', score=5)
+        index.remove(thread_id)
+
+        assert len(index) == 0
+        assert index.suggest('tem') == []
+
 
 class TestSearchAndFilterIntegration:
     """Integration tests for search and filters."""
@@ -1,7 +1,8 @@
 import pytest
 import json
-from api.threads.models import Thread, Post
+from api.threads.models import Thread, Post, Vote
 from api.authentication.models import User
+from api.reports.models import Report
 
 def test_create_thread_success(client, registered_user_token, thread_data):
     """Test successful creation of a thread."""
@@ -43,6 +44,63 @@ def test_delete_thread_success(client, registered_user_token, thread_data):
 
     response = client.delete(f'/api/threads/{thread_id}', headers=headers)
     assert response.status_code == 200 # No Content
+
+def test_delete_thread_cascades(client, registered_user_token, other_user_token, thread_data, post_data):
+    """Test that deleting a thread removes its posts and the reports and votes on both."""
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    other_headers = {'Authorization': f'Bearer {other_user_token}'}
+    thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+    post_id = client.post(f'/api/threads/{thread_id}/posts', json=post_data, headers=headers).json['id']
+
+    client.post(f'/api/threads/{thread_id}/upvote', headers=other_headers)
+    client.post(f'/api/posts/{post_id}/downvote', headers=other_headers)
+    for content_type, content_id in (('thread', thread_id), ('post', post_id)):
+        client.post('/api/reports', json={
+            'content_type': content_type, 'content_id': content_id, 'report_type': 'spam'
+        }, headers=other_headers)
+    assert Report.objects.count() == 2
+
+    response = client.delete(f'/api/threads/{thread_id}', headers=headers)
+    assert response.status_code == 200
+    assert Thread.objects(id=thread_id).count() == 0
+    assert Post.objects(_thread=thread_id).count() == 0
+    assert Report.objects.count() == 0
+    assert Vote.objects.count() == 0
+
+def test_delete_large_thread_cleans_up_in_background(client, registered_user_token, thread_data, post_data):
+    """Test that posts of threads over the sync limit are removed by the background cleanup."""
+    from api.threads.cascade import delete_thread_cascade
+
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+    for _ in range(3):
+        client.post(f'/api/threads/{thread_id}/posts', json=post_data, headers=headers)
+
+    cleanup = delete_thread_cascade(thread_id, sync_limit=1)
+    assert Thread.objects(id=thread_id).count() == 0
+    assert cleanup is not None
+    assert cleanup.result(timeout=10) == 3
+    assert Post.objects(_thread=thread_id).count() == 0
+
+
+def test_purge_orphan_posts_finishes_a_lost_cleanup(client, registered_user_token, thread_data, post_data):
+    """Test that posts left by a background cleanup cut short by a restart are purged."""
+    from bson import ObjectId
+    from api.threads.cascade import _delete_thread_only, purge_orphan_posts
+
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+    kept_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+    for target in (thread_id, thread_id, kept_id):
+        client.post(f'/api/threads/{target}/posts', json=post_data, headers=headers)
+
+    # The thread is deleted inline and the process dies before its cleanup runs
+    _delete_thread_only(ObjectId(thread_id))
+
+    assert purge_orphan_posts() == 2
+    assert Post.objects(_thread=thread_id).count() == 0
+    assert Post.objects(_thread=kept_id).count() == 1
+    assert purge_orphan_posts() == 0
     
     
 def test_delete_thread_unauthorized(client, thread_data, registered_user_token):
@@ -85,6 +143,59 @@ def test_get_all_threads(client, registered_user_token, thread_data):
     assert 'threads' in response.json
     assert len(response.json['threads']) == 1
     assert response.json['threads'][0]['title'] == thread_data['title']
+    assert response.json['next_cursor'] is None
+
+def test_get_threads_cursor_pagination(client, registered_user_token, thread_data):
+    """Test walking every page of threads with limit/cursor."""
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    created = set()
+    for i in range(5):
+        r = client.post('/api/threads', json={**thread_data, "title": f"Thread {i}"}, headers=headers)
+        created.add(r.json['id'])
+
+    seen = []
+    cursor = None
+    while True:
+        params = {'limit': 2, 'semester': thread_data['semester']}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/threads', query_string=params, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json['threads']) <= 2
+        seen.extend(t['id'] for t in response.json['threads'])
+        cursor = response.json['next_cursor']
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen)) == 5
+    assert set(seen) == created
+
+def test_get_threads_resolves_each_author(client, registered_user_token, other_user_token, thread_data, post_data):
+    """Test that batched author loading keeps every author's username."""
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    other_headers = {'Authorization': f'Bearer {other_user_token}'}
+    r = client.post('/api/threads', json={**thread_data, "title": "Mine"}, headers=headers)
+    thread_id = r.json['id']
+    client.post('/api/threads', json={**thread_data, "title": "Theirs"}, headers=other_headers)
+    client.post(f'/api/threads/{thread_id}/posts', json=post_data, headers=other_headers)
+
+    response = client.get('/api/threads', headers=headers)
+    authors = {t['title']: t['author'] for t in response.json['threads']}
+    assert authors == {'Mine': 'test', 'Theirs': 'other'}
+
+    response = client.get(f'/api/threads/{thread_id}', headers=headers)
+    assert response.json['author'] == 'test'
+    assert response.json['posts'][0]['author'] == 'other'
+    assert response.json['posts'][0]['thread_id'] == thread_id
+
+def test_get_threads_invalid_cursor(client, registered_user_token):
+    """Test that malformed cursors and limits are rejected."""
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    response = client.get('/api/threads?cursor=not-a-cursor', headers=headers)
+    assert response.status_code == 400
+
+    response = client.get('/api/threads?limit=0', headers=headers)
+    assert response.status_code == 400
 
 def test_get_single_thread(client, registered_user_token, thread_data):
     """Test retrieving a single thread by ID."""
@@ -297,9 +408,11 @@ def test_update_post_invalid_id(client, registered_user_token):
     assert response.status_code == 400
     assert response.json == {'error': 'Invalid post ID'}
 
-def test_thread_post_vote_lifecycle(client, registered_user_token, thread_data, post_data):
+def test_thread_post_vote_lifecycle(client, registered_user_token, other_user_token, thread_data, post_data):
     """Create thread, create post, vote flow (upvote/duplicate/remove/downvote)."""
     headers = {'Authorization': f'Bearer {registered_user_token}'}
+    # Authors cannot vote on their own content
+    voter_headers = {'Authorization': f'Bearer {other_user_token}'}
 
     # Create thread
     r = client.post('/api/threads', json=thread_data, headers=headers)
@@ -325,13 +438,13 @@ def test_thread_post_vote_lifecycle(client, registered_user_token, thread_data,
     assert r.status_code in (401, 422, 404)
 
     # Upvote with auth
-    r = client.post(f'/api/posts/{post_id}/upvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 1
         
     # upvote again to remove
-    r = client.post(f'/api/posts/{post_id}/upvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 0
@@ -341,32 +454,32 @@ def test_thread_post_vote_lifecycle(client, registered_user_token, thread_data,
     assert r.status_code in (401, 422, 404)
     
     # Downvote with auth
-    r = client.post(f'/api/posts/{post_id}/downvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/downvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == -1
 
     # downvote again to remove
-    r = client.post(f'/api/posts/{post_id}/downvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/downvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 0
         
     # Verify vote toggling works correctly
     # upvote again to +1
-    r = client.post(f'/api/posts/{post_id}/upvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 1
         
     # downvote again to -1
-    r = client.post(f'/api/posts/{post_id}/downvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/downvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == -1
         
     # upvote again to +1
-    r = client.post(f'/api/posts/{post_id}/upvote', headers=headers)
+    r = client.post(f'/api/posts/{post_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 1
@@ -379,13 +492,13 @@ def test_thread_post_vote_lifecycle(client, registered_user_token, thread_data,
     assert r.status_code in (401, 422, 404)
     
     # Upvote thread with auth
-    r = client.post(f'/api/threads/{thread_id}/upvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 1
         
     # upvote again to remove
-    r = client.post(f'/api/threads/{thread_id}/upvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 0
@@ -396,32 +509,32 @@ def test_thread_post_vote_lifecycle(client, registered_user_token, thread_data,
     assert r.status_code in (401, 422, 404)
     
     # Downvote thread with auth
-    r = client.post(f'/api/threads/{thread_id}/downvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/downvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == -1
     
     # downvote again to remove
-    r = client.post(f'/api/threads/{thread_id}/downvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/downvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 0
         
     # Verify vote toggling works correctly
     # upvote again to +1
-    r = client.post(f'/api/threads/{thread_id}/upvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 1
     
     # downvote again to -1
-    r = client.post(f'/api/threads/{thread_id}/downvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/downvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == -1
         
     # upvote again to +1
-    r = client.post(f'/api/threads/{thread_id}/upvote', headers=headers)
+    r = client.post(f'/api/threads/{thread_id}/upvote', headers=voter_headers)
     assert r.status_code in (200, 201, 409)
     if r.status_code in (200, 201):
         assert 'score' in r.json and r.json['score'] == 1
@@ -457,3 +570,24 @@ def test_thread_pin_unpin_flow_if_supported(client, registered_user_token, threa
         # Unpin
         r_unpin = client.delete(f'/api/posts/{post_id}/pin', headers=headers)
         assert r_unpin.status_code in (200, 404)
+
+def test_thread_post_count_tracks_posts(client, registered_user_token, thread_data, post_data):
+    """Test that post_count follows post creation and deletion."""
+    from api.threads.commands import reconcile_post_counts
+
+    headers = {'Authorization': f'Bearer {registered_user_token}'}
+    thread_id = client.post('/api/threads', json=thread_data, headers=headers).json['id']
+    post_ids = [
+        client.post(f'/api/threads/{thread_id}/posts', json=post_data, headers=headers).json['id']
+        for _ in range(2)
+    ]
+    assert client.get(f'/api/threads/{thread_id}', headers=headers).json['post_count'] == 2
+
+    client.delete(f'/api/posts/{post_ids[0]}', headers=headers)
+    client.delete(f'/api/posts/{post_ids[0]}', headers=headers)
+    response = client.get('/api/threads', headers=headers)
+    assert response.json['threads'][0]['post_count'] == 1
+
+    Thread.objects(id=thread_id).update_one(set___post_count=10)
+    assert reconcile_post_counts() == 1
+    assert Thread.objects.get(id=thread_id).post_count == 1
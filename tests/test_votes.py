@@ -2,7 +2,9 @@
 Tests for the Voting system (upvote/downvote for threads and posts).
 """
 import pytest
-from api.threads.models import Thread, Post
+from bson import ObjectId
+from pymongo.collection import Collection
+from api.threads.models import Thread, Post, SelfVoteError, Vote, cast_vote
 from api.authentication.models import User
 
 
@@ -30,6 +32,19 @@ def post_for_voting(client, registered_user_token, thread_data, post_data):
     return post_response.json['id']
 
 
+@pytest.fixture
+def third_user_token(client):
+    """Register, verify and log in a third user, so two users other than the author can vote."""
+    from api.authentication.models import AuthToken
+
+    third_user_data = {"email": "third@al.insper.edu.br", "password": "thirdpassword"}
+    client.post('/api/auth/register', json=third_user_data)
+    user = User.objects(_email=third_user_data['email']).first()
+    token = AuthToken.objects(_user=user, _token_type="email_verification").first()
+    client.post('/api/auth/verify-email', json={"authToken": str(token.id)})
+    return client.post('/api/auth/login', json=third_user_data).get_json().get('access_token')
+
+
 class TestThreadUpvote:
     """Tests for upvoting threads."""
 
@@ -335,9 +350,9 @@ class TestPostDownvote:
 class TestVotingScenarios:
     """Complex voting scenarios."""
 
-    def test_multiple_users_voting(self, client, registered_user_token, other_user_token, thread_for_voting):
+    def test_multiple_users_voting(self, client, third_user_token, other_user_token, thread_for_voting):
         """Test multiple users voting on the same thread."""
-        headers1 = {'Authorization': f'Bearer {registered_user_token}'}
+        headers1 = {'Authorization': f'Bearer {third_user_token}'}
         headers2 = {'Authorization': f'Bearer {other_user_token}'}
 
         # User 1 upvotes
@@ -408,9 +423,9 @@ class TestVotingScenarios:
         assert thread is not None
         assert thread['user_vote'] == 'upvote'
 
-    def test_different_users_see_different_vote_status(self, client, registered_user_token, other_user_token, thread_for_voting):
+    def test_different_users_see_different_vote_status(self, client, third_user_token, other_user_token, thread_for_voting):
         """Test that different users see their own vote status."""
-        headers1 = {'Authorization': f'Bearer {registered_user_token}'}
+        headers1 = {'Authorization': f'Bearer {third_user_token}'}
         headers2 = {'Authorization': f'Bearer {other_user_token}'}
 
         # User 1 upvotes
@@ -450,3 +465,211 @@ class TestVotingEdgeCases:
         # Try to vote on deleted thread
         vote_response = client.post(f'/api/threads/{thread_id}/upvote', headers=headers2)
         assert vote_response.status_code == 404
+
+
+class TestSelfVotes:
+    """Authors cannot vote on their own content, so votes cannot inflate their own reputation."""
+
+    @pytest.mark.parametrize('action', ['upvote', 'downvote'])
+    def test_self_vote_on_thread_is_rejected(self, client, auth_data, registered_user_token, thread_for_voting, action):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+
+        response = client.post(f'/api/threads/{thread_for_voting}/{action}', headers=headers)
+
+        assert response.status_code == 403
+        assert response.json == {'error': 'Cannot vote on your own thread'}
+        assert Thread.objects.get(id=thread_for_voting)._score == 0
+        assert Vote.objects(_target_id=ObjectId(thread_for_voting)).count() == 0
+        author = User.objects.get(_email=auth_data['email'])
+        assert (author._pointTotal or 0, author._pointMonth or 0) == (0, 0)
+
+    @pytest.mark.parametrize('action', ['upvote', 'downvote'])
+    def test_self_vote_on_post_is_rejected(self, client, registered_user_token, post_for_voting, action):
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+
+        response = client.post(f'/api/posts/{post_for_voting}/{action}', headers=headers)
+
+        assert response.status_code == 403
+        assert response.json == {'error': 'Cannot vote on your own post'}
+        assert Post.objects.get(id=post_for_voting)._score == 0
+        assert Vote.objects(_target_id=ObjectId(post_for_voting)).count() == 0
+
+    def test_rejected_self_vote_keeps_an_existing_vote_row(self, client, registered_user_token, thread_for_voting):
+        """A self-vote row left from before the check is restored, not flipped."""
+        author = User.objects.get(_email='test@al.insper.edu.br')
+        Vote(_target_type='thread', _target_id=ObjectId(thread_for_voting), _user=author.id, _value=1).save()
+        headers = {'Authorization': f'Bearer {registered_user_token}'}
+
+        assert client.post(f'/api/threads/{thread_for_voting}/downvote', headers=headers).status_code == 403
+        assert Vote.objects.get(_target_id=ObjectId(thread_for_voting))._value == 1
+
+
+class TestScoreReconciliation:
+    """Score reads never write; drift is fixed by the reconcile command."""
+
+    def test_get_does_not_rewrite_drifted_score(self, client, other_user_token, thread_for_voting):
+        """Test that reading a thread leaves a drifted score untouched."""
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+        Thread.objects(id=thread_for_voting).update_one(set___score=7)
+
+        response = client.get(f'/api/threads/{thread_for_voting}', headers=headers)
+        assert response.json['score'] == 7
+        assert Thread.objects.get(id=thread_for_voting)._score == 7
+
+    def test_reconcile_scores_fixes_drift(self, client, other_user_token, post_for_voting):
+        """Test that reconcile_scores recomputes scores from the votes."""
+        from api.threads.commands import reconcile_scores
+
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+        client.post(f'/api/posts/{post_for_voting}/upvote', headers=headers)
+        Post.objects(id=post_for_voting).update_one(set___score=-3)
+
+        fixed = reconcile_scores()
+        assert fixed['posts'] == 1
+        assert Post.objects.get(id=post_for_voting)._score == 1
+        assert reconcile_scores() == {'threads': 0, 'posts': 0}
+
+
+class TestAuthorPoints:
+    """Thread votes credit the author atomically."""
+
+    def test_thread_votes_update_author_points(self, client, auth_data, other_user_token, thread_for_voting):
+        """Test that every vote transition applies its delta to the author's points."""
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+
+        def points():
+            user = User.objects.get(_email=auth_data['email'])
+            return user._pointTotal, user._pointMonth
+
+        client.post(f'/api/threads/{thread_for_voting}/upvote', headers=headers)
+        assert points() == (1, 1)
+
+        client.post(f'/api/threads/{thread_for_voting}/downvote', headers=headers)
+        assert points() == (-1, -1)
+
+        client.post(f'/api/threads/{thread_for_voting}/downvote', headers=headers)
+        assert points() == (0, 0)
+
+    def test_vote_keeps_single_vote_row(self, client, other_user_token, thread_for_voting):
+        """Test that switching votes updates the user's single vote row."""
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+        client.post(f'/api/threads/{thread_for_voting}/upvote', headers=headers)
+        client.post(f'/api/threads/{thread_for_voting}/downvote', headers=headers)
+
+        votes = Vote.objects(_target_type='thread', _target_id=ObjectId(thread_for_voting))
+        assert votes.count() == 1
+        assert votes.first()._value == -1
+        assert Thread.objects.get(id=thread_for_voting)._score == -1
+
+
+class TestVoteRoundTrips:
+    """Database calls per vote, pinned so a new one is a deliberate change."""
+
+    @pytest.fixture
+    def round_trips(self, monkeypatch):
+        calls = []
+        for name in ('find_one_and_update', 'update_one', 'delete_one', 'count_documents', 'find_one', 'find'):
+            original = getattr(Collection, name)
+
+            def counted(collection, *args, _name=name, _original=original, **kwargs):
+                calls.append((collection.name, _name))
+                return _original(collection, *args, **kwargs)
+
+            monkeypatch.setattr(Collection, name, counted)
+        return calls
+
+    def test_thread_vote_takes_three(self, other_user_token, thread_for_voting, round_trips):
+        """Every transition (new vote, switch, toggle off) costs the same three calls."""
+        voter = str(User.objects.get(_email='other@al.insper.edu.br').id)
+
+        for value, score in ((1, 1), (-1, -1), (-1, 0)):
+            round_trips.clear()
+            assert cast_vote(Thread, 'thread', thread_for_voting, voter, value, award_points=True) == score
+            assert [name for name, _ in round_trips] == ['votes', 'threads', 'users']
+
+    def test_post_vote_takes_two(self, other_user_token, post_for_voting, round_trips):
+        voter = str(User.objects.get(_email='other@al.insper.edu.br').id)
+
+        for value, score in ((-1, -1), (1, 1), (1, 0)):
+            round_trips.clear()
+            assert cast_vote(Post, 'post', post_for_voting, voter, value) == score
+            assert [name for name, _ in round_trips] == ['votes', 'posts']
+
+    def test_rarer_paths(self, other_user_token, post_for_voting, round_trips):
+        """A rejected self-vote costs two more calls and undoing a legacy vote one more."""
+        author = str(Post.objects.get(id=post_for_voting).author_id)
+        round_trips.clear()
+        with pytest.raises(SelfVoteError):
+            cast_vote(Post, 'post', post_for_voting, author, 1)
+        assert [name for name, _ in round_trips] == ['votes', 'posts', 'votes', 'posts']
+
+        voter = User.objects.get(_email='other@al.insper.edu.br').id
+        Post._get_collection().update_one({'_id': ObjectId(post_for_voting)},
+                                          {'$set': {'_upvoted_users': [voter], '_score': 1}})
+        round_trips.clear()
+        assert cast_vote(Post, 'post', post_for_voting, str(voter), 1) == 0
+        assert [name for name, _ in round_trips] == ['votes', 'posts', 'votes']
+
+class TestVoteMigration:
+    """Legacy embedded voter lists are moved into the votes collection."""
+
+    def test_migrate_votes_moves_arrays(self, client, auth_data, other_user_token, thread_for_voting):
+        """Test that migrate_votes creates vote rows and drops the arrays, and is re-runnable."""
+        from api.threads.commands import migrate_votes
+
+        upvoter = str(User.objects.get(_email=auth_data['email']).id)
+        downvoter = str(User.objects.get(_email='other@al.insper.edu.br').id)
+        Thread._get_collection().update_one(
+            {'_id': ObjectId(thread_for_voting)},
+            {'$set': {'_upvoted_users': [upvoter], '_downvoted_users': [downvoter], '_score': 0}},
+        )
+
+        assert migrate_votes()['threads'] == 1
+        assert migrate_votes()['threads'] == 0
+
+        raw = Thread._get_collection().find_one({'_id': ObjectId(thread_for_voting)})
+        assert '_upvoted_users' not in raw and '_downvoted_users' not in raw
+        values = sorted(v._value for v in Vote.objects(_target_id=ObjectId(thread_for_voting)))
+        assert values == [-1, 1]
+
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+        response = client.get(f'/api/threads/{thread_for_voting}', headers=headers)
+        assert response.json['user_vote'] == 'downvote'
+
+    def test_legacy_vote_is_toggled_not_counted_twice(self, client, auth_data, other_user_token, thread_for_voting):
+        """Test that before the migration a legacy upvoter who upvotes again removes their vote."""
+        voter = str(User.objects.get(_email='other@al.insper.edu.br').id)
+        Thread._get_collection().update_one(
+            {'_id': ObjectId(thread_for_voting)},
+            {'$set': {'_upvoted_users': [voter], '_downvoted_users': [], '_score': 1}},
+        )
+
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+        response = client.post(f'/api/threads/{thread_for_voting}/upvote', headers=headers)
+
+        assert response.json['score'] == 0
+        raw = Thread._get_collection().find_one({'_id': ObjectId(thread_for_voting)})
+        assert (raw['_score'], raw['_upvoted_users']) == (0, [])
+        assert Vote.objects.get(_target_id=ObjectId(thread_for_voting))._value == 0
+        assert User.objects.get(_email=auth_data['email'])._pointTotal == -1
+
+        from api.threads.commands import migrate_votes
+
+        migrate_votes()
+        assert Vote.objects.get(_target_id=ObjectId(thread_for_voting))._value == 0
+
+    def test_legacy_vote_is_switched(self, client, other_user_token, post_for_voting):
+        """Test that before the migration a legacy downvoter who upvotes moves the score by two."""
+        voter = User.objects.get(_email='other@al.insper.edu.br').id
+        Post._get_collection().update_one(
+            {'_id': ObjectId(post_for_voting)},
+            {'$set': {'_downvoted_users': [voter], '_score': -1}},
+        )
+
+        headers = {'Authorization': f'Bearer {other_user_token}'}
+        response = client.post(f'/api/posts/{post_for_voting}/upvote', headers=headers)
+
+        assert response.json['score'] == 1
+        assert Vote.objects.get(_target_id=ObjectId(post_for_voting))._value == 1
+        raw = Post._get_collection().find_one({'_id': ObjectId(post_for_voting)})
+        assert raw['_downvoted_users'] == [] and '_upvoted_users' not in raw
@@ -0,0 +1,5 @@
+# WSGI entry point for the serving process: gunicorn wsgi:app
+from main import app, start_background_services
+
+# Each gunicorn worker imports this module, so each runs its own background threads
+start_background_services()